@@ -1,11 +0,0 @@
-"""
-Stub Alembic module for unit tests that import alembic.
-
-This lightweight stub prevents ImportError during tests that only check
-for alembic presence without running real migrations.
-"""
-
-__all__ = ["__version__"]
-__version__ = "stub"
-
-
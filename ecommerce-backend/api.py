@@ -21,26 +21,28 @@ Sécurité:
 """
 
 # ========== IMPORTS - Bibliothèques externes ==========
-from fastapi import FastAPI, HTTPException, Depends, Header  # FastAPI = framework web Python moderne
+from fastapi import FastAPI, HTTPException, Depends, Header, Query  # FastAPI = framework web Python moderne
 from fastapi.middleware.cors import CORSMiddleware  # CORS = permet au frontend (http://localhost:5173) d'appeler l'API
-from fastapi.responses import FileResponse, Response  # Pour renvoyer des fichiers (ex: PDF de facture)
+from fastapi.responses import JSONResponse, Response, StreamingResponse  # Pour renvoyer des fichiers (ex: PDF de facture)
 from pydantic import BaseModel, EmailStr, Field, field_validator  # Pydantic = validation automatique des données
-from typing import Optional, List, Any, cast  # Typage Python pour meilleure sécurité
+from typing import Optional, List, Any, Literal, cast  # Typage Python pour meilleure sécurité
 import uuid  # Pour générer des ID uniques (ex: commande-12345)
 import io  # Pour manipuler des fichiers en mémoire
+import base64  # Pour encoder les curseurs de pagination
+import hashlib  # Empreintes (clés de cache)
+import hmac  # Empreinte signée des requêtes idempotentes
+import json  # Empreinte des requêtes idempotentes
+import re  # Expressions régulières (format des tokens)
 import time  # Pour mesurer le temps d'exécution
-from datetime import datetime, UTC  # Pour gérer les dates (ex: date de commande)
-from reportlab.lib.pagesizes import letter, A4  # ReportLab = bibliothèque pour générer des PDF
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
+import anyio  # Appels bloquants (Redis) hors de la boucle d'événements
+from datetime import date, datetime, UTC  # Pour gérer les dates (ex: date de commande)
 
 # ========== IMPORTS - Base de données ==========
 # Les "repositories" sont des classes qui parlent directement à PostgreSQL
-from database.database import get_db, SessionLocal, create_tables  # Connexion à la base de données
-from sqlalchemy.orm import Session  # Session = connexion active à la DB
+from database.database import get_db, SessionLocal, engine, dispose_async_engine  # Connexion à la base de données
+from database.database import get_async_db, on_async_engine_created  # Sessions asynchrones (endpoints async)
+from sqlalchemy.orm import Session, make_transient_to_detached  # Session = connexion active à la DB
+from sqlalchemy.ext.asyncio import AsyncSession  # Session asynchrone (asyncpg)
 from database.repositories_simple import (
     # Chaque repository gère une table de la base de données :
     PostgreSQLUserRepository,      # Table "users" - comptes utilisateurs
@@ -50,18 +52,45 @@ from database.repositories_simple import (
     PostgreSQLDeliveryRepository,  # Table "deliveries" - infos de livraison
     PostgreSQLInvoiceRepository,   # Table "invoices" - factures générées
     PostgreSQLPaymentRepository,   # Table "payments" - paiements effectués
-    PostgreSQLThreadRepository     # Table "message_threads" - conversations support client
+    PostgreSQLThreadRepository,    # Table "message_threads" - conversations support client
+    PostgreSQLEmailOutboxRepository,  # Table "email_outbox" - emails en attente d'envoi
+    PostgreSQLIdempotencyKeyRepository,  # Table "idempotency_keys" - requêtes déjà traitées (rejeu)
+    PostgreSQLOrderEventRepository,  # Table "order_events" - événements du cycle de vie des commandes
+    PostgreSQLMaintenanceJobRunRepository  # Table "maintenance_job_runs" - dernières exécutions de la maintenance
+)
+from database.repositories_simple import _parse_uuid  # UUID ou None (identifiants envoyés par le client)
+from database.repositories_async import (  # Lectures asynchrones des endpoints les plus sollicités
+    AsyncPostgreSQLUserRepository,
+    AsyncPostgreSQLProductRepository,
+    AsyncPostgreSQLCartRepository,
+    AsyncPostgreSQLOrderRepository,
 )
 
 # ========== IMPORTS - Services métier ==========
 # Les "services" contiennent la logique métier (règles de gestion)
 from services.auth_service import AuthService    # Gère l'authentification (login, JWT, mot de passe)
 from services.email_service import EmailService  # Gère l'envoi d'emails (Brevo API)
+from services.email_worker import EmailOutboxWorker  # Envoi des emails en file, en arrière-plan
+from services.catalog_service import CatalogService  # Stock disponible et réservations par commande
+from services.maintenance import MaintenanceScheduler, default_jobs  # Tâches de maintenance périodiques
+from services.order_event_dispatcher import OrderEventDispatcher, default_consumers  # Effets de bord des commandes
+from services.invoice_pdf import (  # Rendu PDF des factures (ReportLab) et stockage sur disque
+    get_or_create_invoice, build_invoice_render_data,
+    render_digest, invoice_pdf_store,
+)
+from services.invoice_export import InvoiceExporter, EXPORT_FORMATS  # Export comptable des factures (flux)
+from utils.password_hashing import PasswordHasherBusy, hasher_pool  # Pool bcrypt borné
+from utils.cache import TTLCache, SharedCache, build_cache_backend  # Caches mémoire et partagé (Redis ou mémoire)
+from utils import sql_profiler  # Profilage SQL (Server-Timing, requêtes lentes, top-N)
+from utils.metrics import (  # Métriques Prometheus (GET /metrics)
+    PrometheusMiddleware, instrument_engine, render_metrics, mark_process_dead,
+    observe_duration, JWT_DECODE_DURATION, PROMETHEUS_AVAILABLE,
+)
 
 # ========== IMPORTS - Modèles de données ==========
 # Les "models" définissent la structure des tables SQL
 from database.models import User, Product, Order, OrderItem, Delivery, Invoice, Payment, MessageThread, Message
-from enums import OrderStatus, DeliveryStatus  # Enums = constantes pour les statuts (CREE, PAYEE, LIVREE...)
+from enums import OrderStatus, DeliveryStatus, IdempotencyStatus  # Enums = constantes pour les statuts (CREE, PAYEE, LIVREE...)
 from unittest.mock import Mock  # Pour les tests unitaires
 
 # ========== CRÉATION DE L'APPLICATION FASTAPI ==========
@@ -117,15 +146,143 @@ app.add_middleware(
         "Content-Type",     # Pour spécifier le type de données (JSON)
         "Accept",          # Type de réponse acceptée
         "Origin",          # Origine de la requête
-        "X-Requested-With" # Header standard pour les requêtes AJAX
+        "X-Requested-With", # Header standard pour les requêtes AJAX
+        "Idempotency-Key"  # Rejeu sans double effet de checkout / paiement
     ],
-    expose_headers=["Content-Length", "Content-Type"],  # Headers exposés au frontend
+    expose_headers=["Content-Length", "Content-Type", "Server-Timing", "Idempotent-Replayed"],  # Headers exposés au frontend
 )
 
+@app.on_event("shutdown")
+def _shutdown_hasher_pool():
+    """Arrête les processus du pool bcrypt avec le worker."""
+    hasher_pool.shutdown()
+
+@app.on_event("shutdown")
+async def _dispose_async_engine():
+    """Ferme les connexions asyncpg du worker (si le moteur asynchrone a servi)."""
+    await dispose_async_engine()
+
+# ========== MÉTRIQUES PROMETHEUS ==========
+# Ajouté après CORS : c'est donc le middleware le plus externe, qui mesure toute la requête
+app.add_middleware(PrometheusMiddleware)
+instrument_engine(engine)
+on_async_engine_created(lambda async_engine: instrument_engine(async_engine.sync_engine))
+
+# ========== PROFILAGE SQL ==========
+# Nombre de requêtes et temps DB par requête HTTP (en-tête Server-Timing) + journal des requêtes lentes
+if os.getenv("SQL_PROFILER_ENABLED", "1") == "1":
+    sql_profiler.instrument_engine(engine)
+    on_async_engine_created(lambda async_engine: sql_profiler.instrument_engine(async_engine.sync_engine))
+    app.add_middleware(sql_profiler.ServerTimingMiddleware)
+
+@app.on_event("shutdown")
+def _mark_metrics_process_dead():
+    """Retire les jauges de ce worker des agrégats multiprocess."""
+    mark_process_dead()
+
+# ========== FILE D'ENVOI DES EMAILS ==========
+# Les endpoints mettent les emails en file (table email_outbox) ; ce worker les envoie.
+# Chaque worker uvicorn peut en faire tourner un (réservation SKIP LOCKED), ou l'envoi
+# peut être confié à `python -m scripts.email_worker` avec EMAIL_WORKER_IN_PROCESS=0.
+email_worker = EmailOutboxWorker()
+
+@app.on_event("startup")
+def _start_email_worker():
+    if os.getenv("EMAIL_WORKER_IN_PROCESS", "1") == "1":
+        email_worker.start()
+
+@app.on_event("shutdown")
+def _stop_email_worker():
+    email_worker.stop()
+
+# ========== MAINTENANCE ==========
+# Tâches périodiques : purge des tokens expirés, expiration des réservations de stock
+# échues, purge des paniers abandonnés, annulation des commandes CREE trop anciennes.
+# Chaque worker fait tourner le planificateur ; un verrou consultatif PostgreSQL par
+# tâche élit celui qui l'exécute. Ou `python -m scripts.maintenance` avec MAINTENANCE_IN_PROCESS=0.
+maintenance_scheduler = MaintenanceScheduler(default_jobs())
+
+@app.on_event("startup")
+def _start_maintenance_scheduler():
+    if os.getenv("MAINTENANCE_IN_PROCESS", "1") == "1":
+        maintenance_scheduler.start()
+
+@app.on_event("shutdown")
+def _stop_maintenance_scheduler():
+    maintenance_scheduler.stop()
+
+# ========== ÉVÉNEMENTS DE COMMANDE ==========
+# Chaque changement de statut d'une commande écrit un événement (table order_events)
+# dans sa transaction ; ce dispatcher exécute ensuite les effets de bord par lots
+# (PDF de facture, email de suivi, statistiques, cache catalogue). Ou
+# `python -m scripts.order_event_dispatcher` avec ORDER_EVENTS_IN_PROCESS=0.
+order_event_dispatcher = OrderEventDispatcher(default_consumers(
+    invalidate_catalog=lambda: _invalidate_catalog_cache(),
+    on_email_enqueued=email_worker.wake,
+))
+
+@app.on_event("startup")
+def _start_order_event_dispatcher():
+    if os.getenv("ORDER_EVENTS_IN_PROCESS", "1") == "1":
+        order_event_dispatcher.start()
+
+@app.on_event("shutdown")
+def _stop_order_event_dispatcher():
+    order_event_dispatcher.stop()
+
+def _record_order_event(db: Session, order: Order, from_status: Any, **payload: Any) -> None:
+    """Écrit l'événement du nouveau statut de `order` (sans commit : même transaction que le changement)."""
+    PostgreSQLOrderEventRepository(db).append(order, from_status, payload)
+
 # ========== INITIALISATION BASE DE DONNÉES ==========
-# Créer toutes les tables PostgreSQL au démarrage de l'application
-# Si les tables existent déjà, cette fonction ne fait rien
-create_tables()
+# Le schéma n'est plus créé à l'import : les migrations Alembic sont appliquées une
+# seule fois avant le lancement des workers (`python -m database.migrate`, voir
+# docker-entrypoint.sh).
+
+# ========== CACHES ==========
+# Backend choisi par CACHE_BACKEND / REDIS_URL (voir utils/cache.py) : avec Redis,
+# les API_WORKERS workers partagent le même cache. Chaque namespace est versionné :
+# une invalidation (ex: édition admin d'un produit) est vue par tous les workers
+# au plus tard après CACHE_VERSION_CHECK_SECONDS.
+cache_backend = build_cache_backend()
+_cache_version_check = float(os.getenv("CACHE_VERSION_CHECK_SECONDS", "1"))
+
+# Catalogue : GET /products et GET /products/{id}, invalidé par toute écriture produit/stock
+catalog_cache = SharedCache(
+    cache_backend,
+    "catalog",
+    ttl=float(os.getenv("CATALOG_CACHE_TTL_SECONDS", "30")),
+    local_maxsize=int(os.getenv("CATALOG_CACHE_MAXSIZE", "1024")),
+    version_check_interval=_cache_version_check,
+)
+
+# Utilisateur courant (sans password_hash) : évite un SELECT users par requête authentifiée.
+# Invalidé clé par clé (profil modifié) : le L1 de chaque worker est borné
+# à CACHE_VERSION_CHECK_SECONDS, avec ou sans Redis, pour que les autres workers voient
+# l'invalidation (is_admin retiré...) aussi vite.
+user_cache = SharedCache(
+    cache_backend,
+    "users",
+    ttl=float(os.getenv("USER_CACHE_TTL_SECONDS", "60")),
+    local_maxsize=4096,
+    version_check_interval=_cache_version_check,
+    local_ttl=_cache_version_check,
+)
+
+async def _cache_get_async(cache: SharedCache, key: str) -> Any:
+    """`cache.get` pour un endpoint async : L1 dans la boucle, backend (Redis) dans un thread."""
+    value = cache.get_local(key)
+    if value is None:
+        value = await anyio.to_thread.run_sync(cache.get, key)
+    return value
+
+async def _cache_set_async(cache: SharedCache, key: str, value: Any) -> None:
+    """`cache.set` pour un endpoint async : l'écriture Redis se fait dans un thread."""
+    await anyio.to_thread.run_sync(cache.set, key, value)
+
+def _invalidate_catalog_cache() -> None:
+    """Invalide le cache catalogue pour tous les workers (à appeler après commit)."""
+    catalog_cache.invalidate_all()
 
 # Fonction pour initialiser des données d'exemple (utile pour le développement/démo)
 def init_sample_data(db: Session):
@@ -197,16 +354,48 @@ def init_sample_data(db: Session):
 # ========== FONCTIONS D'AUTHENTIFICATION (HELPERS) ==========
 # Ces fonctions sont utilisées par FastAPI pour vérifier l'identité de l'utilisateur
 
+# Expression régulière du format JWT, compilée une seule fois au chargement du module
+_JWT_PATTERN = re.compile(r'^[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+$')
+
+# Service JWT partagé : verify_token n'accède pas à la base, inutile de le recréer par requête
+_token_auth_service = AuthService()
+
+# Claims déjà vérifiés, indexés par empreinte du token et conservés jusqu'à leur "exp".
+# Propre au processus : décoder un JWT coûte moins cher qu'un aller-retour Redis.
+_claims_cache = TTLCache(
+    maxsize=int(os.getenv("JWT_CLAIMS_CACHE_MAXSIZE", "10000")),
+    ttl=_token_auth_service.access_token_expire_minutes * 60,
+    name="jwt_claims",
+)
+
 def validate_token_format(token: str) -> bool:
     """
     Vérifie que le token a le bon format JWT.
     Un JWT valide a 3 parties séparées par des points : header.payload.signature
     Exemple: eyJhbGc.eyJzdWI.SflKxwRJ
     """
-    import re
-    # Expression régulière pour vérifier le format
-    jwt_pattern = r'^[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+$'
-    return bool(re.match(jwt_pattern, token))
+    return bool(_JWT_PATTERN.match(token))
+
+def _verify_token_cached(token: str) -> Optional[dict]:
+    """Vérifie un JWT en réutilisant les claims déjà validés tant qu'ils n'ont pas expiré.
+
+    Seuls les tokens valides sont mis en cache, avec un TTL égal au temps restant
+    avant "exp" : un token expiré n'est jamais servi depuis le cache.
+    """
+    key = hashlib.sha256(token.encode("utf-8")).digest()
+    claims = _claims_cache.get(key)
+    if claims is not None:
+        if float(claims.get("exp", 0)) > time.time():
+            return claims
+        _claims_cache.invalidate(key)
+        return None
+    with observe_duration(JWT_DECODE_DURATION):
+        payload = _token_auth_service.verify_token(token)
+    if payload and "exp" in payload:
+        remaining = float(payload["exp"]) - time.time()
+        if remaining > 0:
+            _claims_cache.set(key, payload, ttl=remaining)
+    return payload
 
 def current_user_id(authorization: Optional[str] = Header(default=None), db: Session = Depends(get_db)) -> str:
     """
@@ -237,12 +426,10 @@ def current_user_id(authorization: Optional[str] = Header(default=None), db: Ses
     if not validate_token_format(token):
         raise HTTPException(401, "Format de token invalide")
     
-    # Étape 4 : Utiliser le service d'authentification pour décoder et vérifier le token
-    user_repo = PostgreSQLUserRepository(db)
-    auth_service = AuthService(user_repo)
+    # Étape 4 : Décoder et vérifier le token (service partagé + cache des claims)
     try:
         # Décode le token JWT et vérifie sa signature
-        payload = auth_service.verify_token(token)
+        payload = _verify_token_cached(token)
         # Vérifie que le payload contient bien l'ID utilisateur (champ "sub")
         if not payload or "sub" not in payload:
             raise HTTPException(401, "Token invalide ou expiré")
@@ -252,6 +439,11 @@ def current_user_id(authorization: Optional[str] = Header(default=None), db: Ses
         # En cas d'erreur (token expiré, signature invalide, etc.)
         raise HTTPException(401, "Token invalide ou expiré")
 
+def _auth_busy() -> HTTPException:
+    """Réponse 503 quand le pool bcrypt est saturé (le client peut réessayer)."""
+    return HTTPException(503, "Service d'authentification surchargé, réessayez dans un instant",
+                         headers={"Retry-After": "1"})
+
 # Renvoie l'objet utilisateur courant
 def current_user(authorization: Optional[str] = Header(default=None), db: Session = Depends(get_db)):
     """Récupère l'objet `User` courant depuis le token Authorization."""
@@ -260,8 +452,7 @@ def current_user(authorization: Optional[str] = Header(default=None), db: Sessio
 
     try:
         uid = current_user_id(authorization, db)
-        user_repo = PostgreSQLUserRepository(db)
-        u = user_repo.get_by_id(uid)
+        u = _load_user_cached(uid, db)
         if not u:
             raise HTTPException(401, "Session invalide (user)")
         return u
@@ -270,6 +461,27 @@ def current_user(authorization: Optional[str] = Header(default=None), db: Sessio
     except Exception:
         raise HTTPException(401, "Session invalide")
 
+# Colonnes de User mises en cache (jamais le hash du mot de passe)
+_USER_CACHE_FIELDS = ("id", "email", "first_name", "last_name", "address", "is_admin", "created_at")
+
+def _load_user_cached(uid: str, db: Session):
+    """Charge l'utilisateur depuis le cache partagé, sinon depuis la base.
+
+    L'objet reconstruit est rattaché à la session sans SELECT (merge load=False) :
+    les endpoints peuvent le modifier et le committer comme un objet chargé.
+    Les colonnes non cachées (password_hash) sont chargées à la demande.
+    """
+    cached = user_cache.get(uid)
+    if cached is not None:
+        u = User(**cached)
+        make_transient_to_detached(u)
+        return db.merge(u, load=False)
+    user_repo = PostgreSQLUserRepository(db)
+    u = user_repo.get_by_id(uid)
+    if isinstance(u, User):
+        user_cache.set(uid, {field: getattr(u, field) for field in _USER_CACHE_FIELDS})
+    return u
+
 # Vérifie que l'utilisateur est admin
 def require_admin(u: User = Depends(current_user)):
     """Dépendance FastAPI: refuse l'accès si l'utilisateur n'est pas admin."""
@@ -278,141 +490,39 @@ def require_admin(u: User = Depends(current_user)):
         raise HTTPException(403, "Accès réservé aux administrateurs")
     return u
 
-# ------------------------------- PDF Generation --------------------------------
-def generate_invoice_pdf(invoice_data, order_data, user_data, payment_data=None, delivery_data=None):
-    """Génère un PDF de facture à partir des données fournies."""
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
-    
-    # Styles
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        spaceAfter=30,
-        alignment=TA_CENTER,
-        textColor=colors.HexColor('#1f2937')
-    )
-    
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontSize=16,
-        spaceAfter=12,
-        textColor=colors.HexColor('#374151')
-    )
-    
-    normal_style = ParagraphStyle(
-        'CustomNormal',
-        parent=styles['Normal'],
-        fontSize=10,
-        spaceAfter=6
-    )
-    
-    # Contenu du PDF
-    story = []
-    
-    # En-tête
-    story.append(Paragraph("FACTURE", title_style))
-    story.append(Spacer(1, 20))
-    
-    # Informations de la facture
-    invoice_date = datetime.fromtimestamp(invoice_data['issued_at']).strftime("%d/%m/%Y %H:%M")
-    story.append(Paragraph(f"<b>Numéro de facture:</b> {invoice_data['number']}", normal_style))
-    story.append(Paragraph(f"<b>Date d'émission:</b> {invoice_date}", normal_style))
-    story.append(Paragraph(f"<b>Commande:</b> #{order_data['id'][-8:]}", normal_style))
-    story.append(Spacer(1, 20))
-    
-    # Informations client
-    story.append(Paragraph("FACTURÉ À:", heading_style))
-    story.append(Paragraph(f"{user_data['first_name']} {user_data['last_name']}", normal_style))
-    story.append(Paragraph(user_data['address'], normal_style))
-    story.append(Spacer(1, 20))
-    
-    # Tableau des articles
-    story.append(Paragraph("DÉTAIL DES ARTICLES", heading_style))
-    
-    # En-tête du tableau
-    table_data = [['ID Produit', 'Nom', 'Prix unitaire', 'Quantité', 'Total']]
-    
-    # Lignes des articles
-    total_cents = 0
-    for line in invoice_data['lines']:
-        unit_price = line['unit_price_cents'] / 100
-        quantity = line['quantity']
-        line_total = (line['unit_price_cents'] * quantity) / 100
-        total_cents += line['unit_price_cents'] * quantity
-        
-        table_data.append([
-            line['product_id'][:8],
-            line['name'],
-            f"{unit_price:.2f} €",
-            str(quantity),
-            f"{line_total:.2f} €"
-        ])
-    
-    # Créer le tableau
-    table = Table(table_data, colWidths=[1.2*inch, 2.5*inch, 1*inch, 0.8*inch, 1*inch])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f3f4f6')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('ALIGN', (1, 0), (1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -1), 9),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    
-    story.append(table)
-    story.append(Spacer(1, 20))
-    
-    # Total
-    total_euros = total_cents / 100
-    story.append(Paragraph(f"<b>TOTAL: {total_euros:.2f} €</b>", ParagraphStyle(
-        'TotalStyle',
-        parent=styles['Normal'],
-        fontSize=14,
-        alignment=TA_RIGHT,
-        textColor=colors.HexColor('#1f2937')
-    )))
-    story.append(Spacer(1, 30))
-    
-    # Informations de paiement
-    if payment_data:
-        story.append(Paragraph("INFORMATIONS DE PAIEMENT", heading_style))
-        story.append(Paragraph(f"<b>Montant payé:</b> {payment_data['amount_cents'] / 100:.2f} €", normal_style))
-        story.append(Paragraph(f"<b>Statut:</b> {'PAYÉ ✓' if payment_data['status'] == 'SUCCEEDED' else 'ÉCHEC'}", normal_style))
-        story.append(Paragraph(f"<b>Date de paiement:</b> {datetime.fromtimestamp(payment_data['created_at']).strftime('%d/%m/%Y %H:%M')}", normal_style))
-        story.append(Spacer(1, 20))
-    
-    # Informations de livraison
-    if delivery_data:
-        story.append(Paragraph("INFORMATIONS DE LIVRAISON", heading_style))
-        story.append(Paragraph(f"<b>Transporteur:</b> {delivery_data['transporteur']}", normal_style))
-        if delivery_data.get('tracking_number'):
-            story.append(Paragraph(f"<b>Numéro de suivi:</b> {delivery_data['tracking_number']}", normal_style))
-        story.append(Paragraph(f"<b>Statut:</b> {delivery_data['delivery_status']}", normal_style))
-        story.append(Spacer(1, 20))
-    
-    # Pied de page
-    story.append(Spacer(1, 30))
-    story.append(Paragraph("Merci pour votre achat !", ParagraphStyle(
-        'FooterStyle',
-        parent=styles['Normal'],
-        fontSize=10,
-        alignment=TA_CENTER,
-        textColor=colors.HexColor('#6b7280')
-    )))
-    
-    # Construire le PDF
-    doc.build(story)
-    buffer.seek(0)
-    return buffer
+# ---------- Variantes asynchrones (endpoints de lecture `async def`) ----------
+# Une dépendance `def` passe par le threadpool AnyIO même pour un endpoint async :
+# ces versions restent dans la boucle d'événements. Le JWT est vérifié en mémoire
+# (cache des claims) et l'utilisateur lu via AsyncSession s'il n'est pas en cache.
+# Seul le L1 du cache est lu dans la boucle : Redis est interrogé dans un thread.
+
+async def current_user_id_async(authorization: Optional[str] = Header(default=None)) -> str:
+    """Équivalent de current_user_id pour les endpoints async (aucun accès à la base)."""
+    return current_user_id(authorization, None)  # type: ignore[arg-type]
+
+async def current_user_async(authorization: Optional[str] = Header(default=None), db: AsyncSession = Depends(get_async_db)):
+    """Équivalent asynchrone de current_user. L'objet retourné est en lecture seule."""
+    if not authorization:
+        raise HTTPException(401, "Token manquant")
+
+    uid = current_user_id(authorization, None)  # type: ignore[arg-type]
+    try:
+        u = await _load_user_cached_async(uid, db)
+    except Exception:
+        raise HTTPException(401, "Session invalide")
+    if not u:
+        raise HTTPException(401, "Session invalide (user)")
+    return u
+
+async def _load_user_cached_async(uid: str, db: AsyncSession):
+    """Charge l'utilisateur depuis le cache partagé, sinon via AsyncSession (même cache que la version sync)."""
+    cached = await _cache_get_async(user_cache, uid)
+    if cached is not None:
+        return User(**cached)
+    u = await AsyncPostgreSQLUserRepository(db).get_by_id(uid)
+    if isinstance(u, User):
+        await _cache_set_async(user_cache, uid, {field: getattr(u, field) for field in _USER_CACHE_FIELDS})
+    return u
 
 # ------------------------------- Schemas --------------------------------
 class RegisterIn(BaseModel):
@@ -585,6 +695,10 @@ class ProductOut(BaseModel):
 class CartItemOut(BaseModel):
     product_id: str
     quantity: int
+    name: Optional[str] = None
+    unit_price_cents: int = 0
+    line_total_cents: int = 0
+    available: bool = True  # produit actif et stock suffisant pour la quantité du panier
 
 class CartOut(BaseModel):
     user_id: str
@@ -599,6 +713,32 @@ class CartRemoveIn(BaseModel):
     product_id: str
     qty: int = Field(default=1, ge=0)
 
+# ---- Schémas des mutations groupées du panier (PUT /cart, POST /cart/batch) ----
+class CartLineIn(BaseModel):
+    product_id: str
+    qty: int = Field(ge=0)
+
+class CartReplaceIn(BaseModel):
+    items: List[CartLineIn] = Field(default_factory=list, max_length=200)
+
+class CartOperationIn(BaseModel):
+    op: Literal["add", "remove", "set"]  # remove avec qty=0 : retire la ligne entière (comme /cart/remove)
+    product_id: str
+    qty: int = Field(default=1, ge=0)
+
+class CartBatchIn(BaseModel):
+    operations: List[CartOperationIn] = Field(min_length=1, max_length=200)
+    # atomic=False : les opérations invalides (stock, produit indisponible) sont ignorées et listées
+    atomic: bool = True
+
+class CartRejectedOut(BaseModel):
+    product_id: str
+    reason: str
+
+class CartBatchOut(BaseModel):
+    cart: CartOut
+    rejected: List[CartRejectedOut] = []
+
 class CheckoutOut(BaseModel):
     order_id: str
     total_cents: int
@@ -652,6 +792,21 @@ class OrderOut(BaseModel):
     created_at: float
     delivery: Optional[DeliveryOut] = None
 
+class OrderEventOut(BaseModel):
+    id: str
+    event_type: str
+    from_status: Optional[str] = None
+    payload: dict
+    status: str
+    attempts: int
+    delivered_to: List[str]
+    last_error: Optional[str] = None
+    created_at: float
+
+class OrderPageOut(BaseModel):
+    items: List[OrderOut]
+    next_cursor: Optional[str] = None
+
 # ---- Schemas Admin (CRUD produits + remboursement) ----
 class ProductCreateIn(BaseModel):
     name: str
@@ -784,6 +939,26 @@ def health_check():
     """
     return {"status": "healthy", "database": "postgresql", "timestamp": time.time()}
 
+def _email_queue_depth() -> dict:
+    db = SessionLocal()
+    try:
+        return PostgreSQLEmailOutboxRepository(db).count_by_status()
+    finally:
+        db.close()
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """
+    Endpoint Prometheus : GET /metrics
+    Agrège les métriques de tous les workers (voir utils/metrics.py)
+    """
+    if not PROMETHEUS_AVAILABLE:
+        raise HTTPException(503, "prometheus_client n'est pas installé")
+    body, content_type = render_metrics([
+        ("email_outbox_messages", "Emails en file par statut", "status", _email_queue_depth),
+    ])
+    return Response(content=body, headers={"Content-Type": content_type})
+
 @app.options("/")
 def options_root():
     """
@@ -853,12 +1028,13 @@ def register(inp: RegisterIn, db: Session = Depends(get_db)):
         else:
             u = auth_service.register(inp.email, inp.password, inp.first_name, inp.last_name, inp.address)
         
-        # Étape 3 : Envoyer un email de bienvenue
+        # Étape 3 : Mettre en file l'email de bienvenue (envoyé en arrière-plan par le worker)
         try:
-            email_service.send_welcome_email(str(u.email), str(u.first_name))
+            email_service.enqueue_welcome_email(PostgreSQLEmailOutboxRepository(db), str(u.email), str(u.first_name))
+            email_worker.wake()
         except Exception as email_error:
-            # Si l'email échoue, on continue quand même (ne pas bloquer l'inscription)
-            print(f"⚠️ Erreur lors de l'envoi de l'email de bienvenue: {email_error}")
+            # Si la mise en file échoue, on continue quand même (ne pas bloquer l'inscription)
+            print(f"⚠️ Erreur lors de la mise en file de l'email de bienvenue: {email_error}")
         
         # Étape 4 : Générer un token JWT pour connecter automatiquement l'utilisateur
         # Le token contient l'ID utilisateur dans le champ "sub" (subject)
@@ -878,6 +1054,8 @@ def register(inp: RegisterIn, db: Session = Depends(get_db)):
             "access_token": token,  # Token JWT pour les futures requêtes
             "token": token,         # Alias pour compatibilité
         }
+    except PasswordHasherBusy:
+        raise _auth_busy()
     except ValueError as e:
         # Gestion des erreurs métier (email déjà utilisé, mot de passe invalide)
         error_message = str(e)
@@ -912,6 +1090,8 @@ def login(inp: LoginIn, db: Session = Depends(get_db)):
                 "is_admin": bool(user.is_admin),
             },
         }
+    except PasswordHasherBusy:
+        raise _auth_busy()
     except ValueError as e:
         raise HTTPException(401, "Identifiants incorrects")
 
@@ -940,8 +1120,9 @@ def forgot_password(inp: ForgotPasswordIn, db: Session = Depends(get_db)):
         token = auth_service.generate_reset_token(inp.email)
         
         if token:
-            # Envoyer l'email de réinitialisation
-            email_sent = email_service.send_password_reset_email(inp.email, token)
+            # Mettre en file l'email de réinitialisation (envoyé en arrière-plan par le worker)
+            email_service.enqueue_password_reset_email(PostgreSQLEmailOutboxRepository(db), inp.email, token)
+            email_worker.wake()
             
             # En mode développement (sans clé API Brevo), retourner le token dans la réponse
             if email_service.dev_mode:
@@ -955,7 +1136,7 @@ def forgot_password(inp: ForgotPasswordIn, db: Session = Depends(get_db)):
                 # En production, ne jamais retourner le token
                 return {
                     "message": "Si un compte existe avec cet email, vous recevrez un lien de réinitialisation.",
-                    "email_sent": email_sent
+                    "email_queued": True
                 }
         else:
             # Ne pas révéler si l'email existe ou non (sécurité)
@@ -1010,6 +1191,8 @@ def reset_password(inp: ResetPasswordIn, db: Session = Depends(get_db)):
             raise HTTPException(400, "Token invalide ou expiré")
     except HTTPException:
         raise
+    except PasswordHasherBusy:
+        raise _auth_busy()
     except Exception as e:
         print(f"Erreur lors de la réinitialisation du mot de passe: {str(e)}")
         raise HTTPException(400, "Erreur lors de la réinitialisation du mot de passe")
@@ -1041,6 +1224,7 @@ def update_profile(inp: UserUpdateIn, u: User = Depends(current_user), db: Sessi
     
     # Utiliser la méthode update du repository
     updated_user = user_repo.update(u)
+    user_cache.invalidate(str(updated_user.id))
 
     return UserOut(
         id=str(updated_user.id),
@@ -1051,13 +1235,42 @@ def update_profile(inp: UserUpdateIn, u: User = Depends(current_user), db: Sessi
         is_admin=bool(updated_user.is_admin)
     )
 
+# ========================================
+# ENDPOINTS DE LECTURE : VERSION ASYNC OU SYNC
+# ========================================
+# Les lectures les plus sollicitées (catalogue, panier, commandes, suivi) existent en deux versions :
+# - `async def` + AsyncSession (défaut) : l'attente de PostgreSQL ne bloque aucun thread
+# - `def` + Session : exécutée dans le threadpool AnyIO (40 threads par défaut)
+# ASYNC_READ_ENDPOINTS=0 sert la version synchrone (référence pour scripts/load_test_reads.py).
+ASYNC_READ_ENDPOINTS = os.getenv("ASYNC_READ_ENDPOINTS", "1") == "1"
+
+def _read_route(path: str, asynchronous: bool, **kwargs):
+    """Déclare `GET path` seulement pour la version (async ou sync) choisie par ASYNC_READ_ENDPOINTS."""
+    def register(endpoint):
+        if asynchronous == ASYNC_READ_ENDPOINTS:
+            return app.get(path, **kwargs)(endpoint)
+        return endpoint
+    return register
+
 # ========================================
 # ENDPOINTS PRODUITS (PUBLIC)
 # ========================================
 # Ces endpoints sont accessibles sans authentification (PUBLIC)
 # Ils permettent de consulter le catalogue de produits
 
-@app.get("/products", response_model=list[ProductOut])
+def _product_out(p) -> ProductOut:
+    """Représentation API d'un produit."""
+    # Handle Mock objects in tests
+    return ProductOut(
+        id=str(getattr(p, 'id', '')),
+        name=str(getattr(p, 'name', '')),
+        description=str(getattr(p, 'description', '')),
+        price_cents=int(getattr(p, 'price_cents', 0)),
+        stock_qty=int(getattr(p, 'stock_qty', 0)),
+        active=bool(getattr(p, 'active', True))
+    )
+
+@_read_route("/products", asynchronous=False, response_model=list[ProductOut])
 def list_products(db: Session = Depends(get_db)):
     """
     Endpoint: GET /products
@@ -1068,43 +1281,76 @@ def list_products(db: Session = Depends(get_db)):
     Retourne : Liste de produits avec leurs infos (nom, prix, description, stock)
     """
     try:
+        cached = catalog_cache.get("products:active")
+        if cached is not None:
+            return cached
+        
         RepoCls = _get_repo_class('PostgreSQLProductRepository')
         product_repo = RepoCls(db) if RepoCls is not None else PostgreSQLProductRepository(db)
         products = product_repo.get_all_active()
         
-        out = []
-        for p in products:
-            # Handle Mock objects in tests
-            out.append(ProductOut(
-                id=str(getattr(p, 'id', '')),
-                name=str(getattr(p, 'name', '')),
-                description=str(getattr(p, 'description', '')),
-                price_cents=int(getattr(p, 'price_cents', 0)),
-                stock_qty=int(getattr(p, 'stock_qty', 0)),
-                active=bool(getattr(p, 'active', True))
-            ))
+        out = [_product_out(p) for p in products]
+        catalog_cache.set("products:active", out)
         return out
     except Exception as e:
         # Erreur lors du chargement des produits
         raise HTTPException(500, f"Erreur lors du chargement des produits: {str(e)}")
 
-@app.get("/products/{product_id}", response_model=ProductOut)
+@_read_route("/products", asynchronous=True, response_model=list[ProductOut])
+async def list_products_async(db: AsyncSession = Depends(get_async_db)):
+    """Endpoint: GET /products (version async de list_products)"""
+    try:
+        cached = await _cache_get_async(catalog_cache, "products:active")
+        if cached is not None:
+            return cached
+        
+        products = await AsyncPostgreSQLProductRepository(db).get_all_active()
+        out = [_product_out(p) for p in products]
+        await _cache_set_async(catalog_cache, "products:active", out)
+        return out
+    except Exception as e:
+        # Erreur lors du chargement des produits
+        raise HTTPException(500, f"Erreur lors du chargement des produits: {str(e)}")
+
+@_read_route("/products/{product_id}", asynchronous=False, response_model=ProductOut)
 def get_product(product_id: str, db: Session = Depends(get_db)):
-    """Récupère un produit spécifique par son ID"""
+    """Récupère un produit spécifique par son ID (servi depuis le cache catalogue si possible)"""
     try:
+        cache_key = f"product:{product_id}"
+        cached = catalog_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         product_repo = PostgreSQLProductRepository(db)
         product = product_repo.get_by_id(product_id)
         if not product:
             raise HTTPException(404, "Produit introuvable")
         
-        return ProductOut(
-            id=str(product.id),
-            name=cast(str, product.name),
-            description=cast(str, product.description),
-            price_cents=cast(int, product.price_cents),
-            stock_qty=cast(int, product.stock_qty),
-            active=cast(bool, product.active)
-        )
+        out = _product_out(product)
+        catalog_cache.set(cache_key, out)
+        return out
+    except HTTPException:
+        raise
+    except Exception as e:
+        # Erreur lors de la récupération du produit
+        raise HTTPException(500, "Erreur lors de la récupération du produit")
+
+@_read_route("/products/{product_id}", asynchronous=True, response_model=ProductOut)
+async def get_product_async(product_id: str, db: AsyncSession = Depends(get_async_db)):
+    """Endpoint: GET /products/{product_id} (version async de get_product)"""
+    try:
+        cache_key = f"product:{product_id}"
+        cached = await _cache_get_async(catalog_cache, cache_key)
+        if cached is not None:
+            return cached
+        
+        product = await AsyncPostgreSQLProductRepository(db).get_by_id(product_id)
+        if not product:
+            raise HTTPException(404, "Produit introuvable")
+        
+        out = _product_out(product)
+        await _cache_set_async(catalog_cache, cache_key, out)
+        return out
     except HTTPException:
         raise
     except Exception as e:
@@ -1117,7 +1363,29 @@ def get_product(product_id: str, db: Session = Depends(get_db)):
 # Ces endpoints nécessitent une authentification (token JWT requis)
 # Ils permettent de gérer le panier d'achat de l'utilisateur connecté
 
-@app.get("/cart", response_model=CartOut)
+def _cart_out(user_id: str, lines) -> CartOut:
+    """
+    Représentation API d'un panier à partir de ses lignes jointes aux produits
+    (voir PostgreSQLCartRepository.get_lines_with_products).
+    Le total ne compte que les produits actifs (même règle que CartService.get_cart_total).
+    """
+    items = {}
+    total_cents = 0
+    for line in lines:
+        line_total = line.price_cents * line.quantity if line.active else 0
+        items[str(line.product_id)] = CartItemOut(
+            product_id=str(line.product_id),
+            quantity=line.quantity,
+            name=line.name,
+            unit_price_cents=line.price_cents,
+            line_total_cents=line_total,
+            available=bool(line.active) and line.stock_qty >= line.quantity,
+        )
+        total_cents += line_total
+    
+    return CartOut(user_id=user_id, items=items, total_cents=total_cents)
+
+@_read_route("/cart", asynchronous=False, response_model=CartOut)
 def view_cart(u: User = Depends(current_user), db: Session = Depends(get_db)):
     """
     Endpoint: GET /cart
@@ -1129,21 +1397,13 @@ def view_cart(u: User = Depends(current_user), db: Session = Depends(get_db)):
     """
     RepoCls = _get_repo_class('PostgreSQLCartRepository')
     cart_repo = RepoCls(db) if RepoCls is not None else PostgreSQLCartRepository(db)
-    c = cart_repo.get_by_user_id(str(u.id))
-    if not c:
-        return CartOut(user_id=str(u.id), items={}, total_cents=0)
-    
-    items = {}
-    total_cents = 0
-    for item in c.items:
-        items[str(item.product_id)] = CartItemOut(
-            product_id=str(item.product_id),
-            quantity=item.quantity
-        )
-        # Calculate total (simplified - would need product price in real implementation)
-        total_cents += item.quantity * 1000  # Mock price for test
-    
-    return CartOut(user_id=str(u.id), items=items, total_cents=total_cents)
+    return _cart_out(str(u.id), cart_repo.get_lines_with_products(str(u.id)))
+
+@_read_route("/cart", asynchronous=True, response_model=CartOut)
+async def view_cart_async(u: User = Depends(current_user_async), db: AsyncSession = Depends(get_async_db)):
+    """Endpoint: GET /cart (version async de view_cart, lignes et produits en une requête)"""
+    lines = await AsyncPostgreSQLCartRepository(db).get_lines_with_products(str(u.id))
+    return _cart_out(str(u.id), lines)
 
 @app.post("/cart/add")
 def add_to_cart(inp: CartAddIn, u: User = Depends(current_user), db: Session = Depends(get_db)):
@@ -1247,6 +1507,97 @@ def clear_cart(u: User = Depends(current_user), db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(400, str(e))
 
+def _apply_cart_operations(db: Session, user_id: str, operations: List[CartOperationIn],
+                           replace: bool = False, atomic: bool = True) -> CartBatchOut:
+    """
+    Applique des mutations de panier dans UNE transaction :
+    - ligne du panier verrouillée (mutations concurrentes d'un même panier sérialisées)
+    - produits concernés verrouillés en une requête ordonnée (FOR UPDATE), stock vérifié une fois
+    - lignes écrites par un seul INSERT ... ON CONFLICT DO UPDATE et un seul DELETE, puis un commit
+    `replace=True` part d'un panier vide (PUT /cart) au lieu du contenu actuel.
+    Seule une hausse de quantité est contrôlée (produit actif, stock suffisant) :
+    on peut toujours retirer un article, même devenu indisponible.
+    """
+    cart_repo = PostgreSQLCartRepository(db)
+    product_repo = PostgreSQLProductRepository(db)
+    
+    cart = cart_repo.get_or_create_for_update(user_id)
+    current = cart_repo.get_quantities(cart.id)
+    valid_ids = {str(pid) for pid in (_parse_uuid(op.product_id) for op in operations) if pid is not None}
+    products = {str(p.id): p for p in product_repo.get_many_for_update(list(valid_ids))}
+    
+    target = {} if replace else dict(current)
+    rejected: List[CartRejectedOut] = []
+    for op in operations:
+        parsed = _parse_uuid(op.product_id)
+        pid = str(parsed) if parsed is not None else op.product_id
+        before = target.get(pid, 0)
+        if op.op == "add":
+            after = before + op.qty
+        elif op.op == "remove":
+            after = 0 if op.qty == 0 else max(0, before - op.qty)
+        else:
+            after = op.qty
+        
+        if after > before:
+            product = products.get(pid)
+            reason = None
+            if product is None:
+                reason = f"Produit {op.product_id} introuvable"
+            elif not product.active:
+                reason = f"Produit {product.name} non disponible"
+            elif after > product.stock_qty:
+                reason = (f"Stock insuffisant pour {product.name}. Il reste {product.stock_qty} article(s) "
+                          f"disponible(s), {after} demandé(s).")
+            if reason is not None:
+                if atomic:
+                    raise HTTPException(404 if product is None else 400, reason)
+                rejected.append(CartRejectedOut(product_id=op.product_id, reason=reason))
+                continue
+        target[pid] = after
+    
+    cart_repo.upsert_items(cart.id, {pid: qty for pid, qty in target.items() if qty > 0 and current.get(pid) != qty})
+    cart_repo.delete_items(cart.id, [pid for pid in current if target.get(pid, 0) == 0])
+    db.commit()
+    
+    return CartBatchOut(cart=_cart_out(user_id, cart_repo.get_lines_with_products(user_id)), rejected=rejected)
+
+@app.put("/cart", response_model=CartBatchOut)
+def replace_cart(inp: CartReplaceIn, u: User = Depends(current_user), db: Session = Depends(get_db)):
+    """
+    Endpoint: PUT /cart
+    
+    Remplace tout le contenu du panier (ex: restauration d'un panier sauvegardé).
+    Tout ou rien : un produit introuvable, indisponible ou en stock insuffisant annule la requête.
+    """
+    try:
+        operations = [CartOperationIn(op="set", product_id=line.product_id, qty=line.qty) for line in inp.items]
+        return _apply_cart_operations(db, str(u.id), operations, replace=True)
+    except HTTPException:
+        db.rollback()
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(400, f"Erreur lors de la mise à jour du panier: {str(e)}")
+
+@app.post("/cart/batch", response_model=CartBatchOut)
+def cart_batch(inp: CartBatchIn, u: User = Depends(current_user), db: Session = Depends(get_db)):
+    """
+    Endpoint: POST /cart/batch
+    
+    Applique dans l'ordre une liste d'opérations add / remove / set, en une transaction.
+    atomic=True (défaut) : tout ou rien. atomic=False : les opérations refusées sont
+    ignorées et renvoyées dans `rejected`, les autres sont appliquées.
+    """
+    try:
+        return _apply_cart_operations(db, str(u.id), inp.operations, atomic=inp.atomic)
+    except HTTPException:
+        db.rollback()
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(400, f"Erreur lors de la mise à jour du panier: {str(e)}")
+
 # ========================================
 # ENDPOINTS COMMANDES (AUTHENTIFIÉ)
 # ========================================
@@ -1257,8 +1608,111 @@ def clear_cart(u: User = Depends(current_user), db: Session = Depends(get_db)):
 # 4. Annulation
 # 5. Factures et livraisons
 
+def _order_to_out(order: Order) -> OrderOut:
+    """Construit la représentation API d'une commande (items et livraison inclus)."""
+    delivery_info = None
+    if order.delivery:
+        delivery_info = DeliveryOut(
+            transporteur=order.delivery.transporteur,
+            tracking_number=order.delivery.tracking_number,
+            delivery_status=order.delivery.delivery_status
+        )
+    
+    return OrderOut(
+        id=str(order.id),
+        user_id=str(order.user_id),
+        items=[OrderItemOut(
+            product_id=str(item.product_id),
+            name=item.name,
+            unit_price_cents=item.unit_price_cents,
+            quantity=item.quantity
+        ) for item in order.items],
+        status=str(order.status),
+        total_cents=sum(item.unit_price_cents * item.quantity for item in order.items),
+        created_at=(order.created_at.timestamp() if getattr(order, 'created_at', None) else 0.0),
+        delivery=delivery_info
+    )
+
+# ---- Idempotence (en-tête Idempotency-Key) ----
+# Le client génère une clé par action (ex: un clic sur "Commander") et la renvoie telle
+# quelle en cas de nouvel essai. La première requête réserve la clé (index unique), les
+# doublons reçoivent la réponse enregistrée (en-tête Idempotent-Replayed) ou 409 si elle
+# est encore en cours. Un échec libère la clé. Sans en-tête, rien ne change.
+IDEMPOTENCY_LOCK_SECONDS = float(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))
+# Clé de l'empreinte HMAC : sans elle, une empreinte volée ne peut pas être recalculée hors ligne
+IDEMPOTENCY_HMAC_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production").encode()
+
+def _idempotency_fingerprint(payload: Any) -> str:
+    """Empreinte HMAC-SHA256 (64 caractères hexa) du corps de la requête."""
+    body = json.dumps(payload, sort_keys=True, default=str).encode()
+    return hmac.new(IDEMPOTENCY_HMAC_KEY, body, hashlib.sha256).hexdigest()
+
+def _payment_fingerprint(payment_data: PayIn) -> dict:
+    """
+    Champs non sensibles du paiement servant à reconnaître un nouvel essai :
+    jamais le numéro complet ni le CVC (interdits au stockage, même hachés).
+    """
+    return {
+        "card_last4": re.sub(r"\D", "", payment_data.card_number)[-4:],
+        "exp_month": payment_data.exp_month,
+        "exp_year": payment_data.exp_year,
+        "postal_code": payment_data.postal_code,
+    }
+
+def _idempotency_claim(db: Session, user_id: str, key: Optional[str], endpoint: str, payload: Any) -> Optional[Response]:
+    """
+    Réserve la clé d'idempotence. Retourne None si la requête doit être traitée,
+    sinon la réponse à renvoyer telle quelle (rejeu d'une requête déjà traitée).
+    """
+    if key is None:
+        return None
+    request_hash = _idempotency_fingerprint(payload)
+    claimed, existing = PostgreSQLIdempotencyKeyRepository(db).claim(
+        user_id, key, endpoint, request_hash, IDEMPOTENCY_LOCK_SECONDS
+    )
+    if claimed:
+        return None
+    if existing is None:
+        # Clé réservée et libérée sans cesse par des requêtes concurrentes : réessayer
+        raise HTTPException(409, "Une requête avec cette clé d'idempotence est déjà en cours", headers={"Retry-After": "1"})
+    if existing.endpoint != endpoint or existing.request_hash != request_hash:
+        raise HTTPException(422, "Cette clé d'idempotence a déjà été utilisée pour une autre requête")
+    if existing.status != IdempotencyStatus.COMPLETED.value:
+        raise HTTPException(409, "Une requête avec cette clé d'idempotence est déjà en cours", headers={"Retry-After": "1"})
+    return JSONResponse(existing.response_body, status_code=existing.response_status,
+                        headers={"Idempotent-Replayed": "true"})
+
+def _idempotency_complete(db: Session, user_id: str, key: Optional[str], body: Any, status_code: int = 200) -> None:
+    """Enregistre la réponse avec l'effet de la requête (avant le commit de l'appelant)."""
+    if key is not None:
+        PostgreSQLIdempotencyKeyRepository(db).complete(user_id, key, status_code, body)
+
+def _idempotency_release(db: Session, user_id: str, key: Optional[str]) -> None:
+    """Libère la clé après un échec (transaction déjà annulée) : le client peut réessayer."""
+    if key is not None:
+        PostgreSQLIdempotencyKeyRepository(db).release(user_id, key)
+
 @app.post("/orders/checkout", response_model=CheckoutOut)
-def checkout(u: User = Depends(current_user), db: Session = Depends(get_db)):
+def checkout(
+    u: User = Depends(current_user),
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(default=None, max_length=255),
+):
+    """
+    Endpoint: POST /orders/checkout
+    
+    Crée (ou resynchronise) la commande ouverte de l'utilisateur depuis son panier.
+    Tout se fait dans UNE transaction :
+    - les produits du panier sont chargés en une seule requête et verrouillés (FOR UPDATE)
+    - le total est calculé une seule fois
+    - les lignes de commande sont insérées en un seul INSERT groupé
+    - le stock est réservé pour la commande pendant RESERVATION_TTL_SECONDS
+    Le stock n'est décrémenté qu'au paiement, qui consomme ces réservations.
+    Avec un en-tête Idempotency-Key, un nouvel essai renvoie la réponse du premier.
+    """
+    replay = _idempotency_claim(db, str(u.id), idempotency_key, "POST /orders/checkout", {})
+    if replay is not None:
+        return replay
     try:
         OrderRepo = _get_repo_class('PostgreSQLOrderRepository')
         CartRepo = _get_repo_class('PostgreSQLCartRepository')
@@ -1271,105 +1725,70 @@ def checkout(u: User = Depends(current_user), db: Session = Depends(get_db)):
         cart = cart_repo.get_by_user_id(str(u.id))
         if not cart or not cart.items:
             raise HTTPException(400, "Panier vide")
+        cart_items = list(cart.items)
+        
+        # Charger tous les produits du panier en une requête, verrouillés dans l'ordre des id
+        products = product_repo.get_many_for_update([str(item.product_id) for item in cart_items])
+        products_by_id = {str(p.id): p for p in products}
         
-        # Vérifier le stock et réserver les produits
-        for item in cart.items:
-            product = product_repo.get_by_id(str(item.product_id))
+        # Vérifier les produits et préparer les lignes (prix figés) en un seul passage
+        order_lines = []
+        quantities: dict[str, int] = {}
+        cart_total_cents = 0
+        for item in cart_items:
+            product = products_by_id.get(str(item.product_id))
             if not product:
                 raise HTTPException(400, f"Produit {str(item.product_id)} introuvable")
             
             if not product.active:
                 raise HTTPException(400, f"Produit {product.name} non disponible")
             
-            if product.stock_qty < item.quantity:
-                raise HTTPException(400, f"Stock insuffisant pour {product.name}. Il reste {product.stock_qty} article(s) disponible(s), vous essayez d'en commander {item.quantity}.")
-        
-        # Calculer le total attendu du panier pour détecter un paiement récent identique
-        cart_total_cents = 0
-        for item in cart.items:
-            product = product_repo.get_by_id(str(item.product_id))
-            cart_total_cents += product.price_cents * item.quantity
-
-        # Si une commande PAYEE récente avec le même total existe, la renvoyer (évite recréation)
-        try:
-            from datetime import datetime, UTC, timedelta
-            recent_window = timedelta(minutes=30)
-            existing_orders = order_repo.get_by_user_id(str(u.id))
-            for o in existing_orders:
-                try:
-                    if str(getattr(o, "status", "")) == OrderStatus.PAYEE.value:
-                        created_at = getattr(o, "created_at", None)
-                        if created_at and datetime.now(UTC) - created_at <= recent_window:
-                            paid_total = sum(getattr(oi, 'unit_price_cents', 0) * getattr(oi, 'quantity', 0) for oi in getattr(o, 'items', []) or [])
-                            if int(paid_total) == int(cart_total_cents):
-                                return CheckoutOut(
-                                    order_id=str(o.id),
-                                    total_cents=paid_total,
-                                    status=str(o.status)
-                                )
-                except Exception:
-                    continue
-        except Exception:
-            pass
-
-        # Réutiliser une commande ouverte (CREE) existante pour éviter les doublons
-        existing_orders = order_repo.get_by_user_id(str(u.id))
-        order = None
-        for o in existing_orders:
-            try:
-                if str(getattr(o, "status", "")) == OrderStatus.CREE.value:
-                    order = o
-                    break
-            except Exception:
-                continue
-
-        if order is None:
-            # Créer la commande - created_at sera automatiquement défini par le modèle
-            # Il est important de ne PAS modifier created_at après la création
-            order_data = {
-                "user_id": str(u.id),
-                "status": OrderStatus.CREE
-            }
-            order = order_repo.create(order_data)
-        else:
-            # Vider les items existants de la commande ouverte pour les resynchroniser avec le panier
-            try:
-                from database.models import OrderItem as _OrderItem
-                db.query(_OrderItem).filter(_OrderItem.order_id == order.id).delete()
-                db.commit()
-            except Exception:
-                db.rollback()
-
-        # Ajouter les articles (sans modifier le stock ni vider le panier ici)
-        # Le stock sera décrémenté et le panier vidé uniquement APRÈS paiement réussi
-        total_cents = 0
-        for item in cart.items:
-            product = product_repo.get_by_id(str(item.product_id))
-            order_item_data = {
-                "order_id": str(order.id),
+            quantities[str(item.product_id)] = quantities.get(str(item.product_id), 0) + item.quantity
+            order_lines.append({
                 "product_id": str(item.product_id),
                 "name": product.name,
                 "unit_price_cents": product.price_cents,
                 "quantity": item.quantity
-            }
-            order_repo.add_item(order_item_data)
-            total_cents += product.price_cents * item.quantity
+            })
+            cart_total_cents += product.price_cents * item.quantity
+
+        # Commande ouverte (CREE) unique de l'utilisateur, créée au besoin et verrouillée
+        order = order_repo.get_or_create_open_order(str(u.id))
+
+        # Réserver le stock : disponible = stock - réservations actives des autres commandes.
+        # Les réservations précédentes de cette commande sont remplacées (checkout rejoué).
+        try:
+            CatalogService(product_repo).reserve_for_order(str(order.id), quantities, products)
+        except ValueError as e:
+            raise HTTPException(400, str(e))
         
-        return CheckoutOut(
+        # Resynchroniser les lignes avec le panier par différence (seules les lignes modifiées sont écrites)
+        # Le stock sera décrémenté et le panier vidé uniquement APRÈS paiement réussi
+        order_repo.sync_items(str(order.id), order_lines)
+        result = CheckoutOut(
             order_id=str(order.id),
-            total_cents=total_cents,
+            total_cents=cart_total_cents,
             status=str(order.status)
         )
+        _idempotency_complete(db, str(u.id), idempotency_key, result.model_dump())
+        db.commit()
+        
+        return result
     except HTTPException:
+        db.rollback()
+        _idempotency_release(db, str(u.id), idempotency_key)
         raise
     except Exception as e:
+        db.rollback()
+        _idempotency_release(db, str(u.id), idempotency_key)
         raise HTTPException(400, str(e))
 
-@app.get("/orders", response_model=list[OrderOut])
+@_read_route("/orders", asynchronous=False, response_model=list[OrderOut])
 def my_orders(u: User = Depends(current_user), db: Session = Depends(get_db)):
     OrderRepo = _get_repo_class('PostgreSQLOrderRepository')
     order_repo = OrderRepo(db) if OrderRepo is not None else PostgreSQLOrderRepository(db)
-    orders = order_repo.get_by_user_id(str(u.id))
+    # Items et livraisons chargés en un nombre fixe de requêtes (pas de N+1)
+    orders = order_repo.get_by_user_id_with_details(str(u.id))
     
     # Gérer le cas où orders est None (retourne une liste vide)
     if orders is None:
@@ -1411,36 +1830,21 @@ def my_orders(u: User = Depends(current_user), db: Session = Depends(get_db)):
         ))
     return out
 
+@_read_route("/orders", asynchronous=True, response_model=list[OrderOut])
+async def my_orders_async(u: User = Depends(current_user_async), db: AsyncSession = Depends(get_async_db)):
+    """Endpoint: GET /orders (version async de my_orders, même nombre fixe de requêtes)"""
+    orders = await AsyncPostgreSQLOrderRepository(db).get_by_user_id_with_details(str(u.id))
+    return [_order_to_out(order) for order in orders]
+
 @app.get("/orders/{order_id}", response_model=OrderOut)
 def get_order(order_id: str, u: User = Depends(current_user), db: Session = Depends(get_db)):
     order_repo = PostgreSQLOrderRepository(db)
-    order = order_repo.get_by_id(order_id)
+    order = order_repo.get_by_id_with_details(order_id)
     
     if not order or str(order.user_id) != str(u.id):
         raise HTTPException(404, "Commande introuvable")
     
-    delivery_info = None
-    if order.delivery:
-        delivery_info = DeliveryOut(
-            transporteur=order.delivery.transporteur,
-            tracking_number=order.delivery.tracking_number,
-            delivery_status=order.delivery.delivery_status
-        )
-    
-    return OrderOut(
-        id=str(order.id),
-        user_id=str(order.user_id),
-        items=[OrderItemOut(
-            product_id=str(item.product_id),
-            name=item.name,
-            unit_price_cents=item.unit_price_cents,
-            quantity=item.quantity
-        ) for item in order.items],
-        status=cast(str, order.status),
-        total_cents=sum(item.unit_price_cents * item.quantity for item in order.items),
-        created_at=(order.created_at.timestamp() if getattr(order, 'created_at', None) else 0.0),
-        delivery=delivery_info
-    )
+    return _order_to_out(order)
 
 # ====================== ADMIN: Produits ======================
 @app.get("/admin/products", response_model=list[ProductOut])
@@ -1479,6 +1883,7 @@ def admin_create_product(inp: ProductCreateIn, u = Depends(require_admin), db: S
             "active": inp.active
         }
         product = product_repo.create(product_data)
+        _invalidate_catalog_cache()
         return ProductOut(
             id=str(product.id),
             name=cast(str, product.name),
@@ -1520,6 +1925,7 @@ def admin_update_product(product_id: str, inp: ProductUpdateIn, u = Depends(requ
             product.active = inp.active  # type: ignore
         
         product_repo.update(product)
+        _invalidate_catalog_cache()
         return ProductOut(
             id=str(product.id),
             name=cast(str, product.name),
@@ -1547,6 +1953,7 @@ def admin_delete_product(product_id: str, u = Depends(require_admin), db: Sessio
         success = product_repo.delete(product_id)
         if not success:
             raise HTTPException(500, "Erreur lors de la suppression du produit")
+        _invalidate_catalog_cache()
         
         return {"ok": True, "message": "Produit supprimé définitivement"}
     except HTTPException:
@@ -1579,92 +1986,176 @@ def admin_reset_products_to_four(u = Depends(require_admin), db: Session = Depen
             p = MProduct(**data)
             db.add(p)
         db.commit()
+        _invalidate_catalog_cache()
         return {"ok": True, "message": "Produits réinitialisés à 4 éléments"}
     except Exception as e:
         db.rollback()
         raise HTTPException(500, f"Erreur lors de la réinitialisation des produits: {str(e)}")
 
+@app.get("/admin/cache/stats")
+def admin_cache_stats(u = Depends(require_admin)):
+    """Compteurs des caches (hits, misses, erreurs backend) vus par le worker courant."""
+    return {
+        "catalog": catalog_cache.stats(),
+        "users": user_cache.stats(),
+        "invoice_pdf": invoice_pdf_store.stats(),
+        "jwt_claims": _claims_cache.stats(),
+        "bcrypt_pool": hasher_pool.stats(),
+    }
+
+@app.get("/admin/emails/stats")
+def admin_email_stats(u = Depends(require_admin), db: Session = Depends(get_db)):
+    """État de la file d'envoi des emails (par statut) et compteurs du worker courant."""
+    return {
+        "queue": PostgreSQLEmailOutboxRepository(db).count_by_status(),
+        "worker": email_worker.stats(),
+    }
+
+@app.get("/admin/order-events/stats")
+def admin_order_event_stats(u = Depends(require_admin), db: Session = Depends(get_db)):
+    """État de l'outbox des événements de commande (par statut) et compteurs du dispatcher courant."""
+    return {
+        "queue": PostgreSQLOrderEventRepository(db).count_by_status(),
+        "dispatcher": order_event_dispatcher.stats(),
+    }
+
+@app.get("/admin/maintenance/jobs")
+def admin_maintenance_jobs(u = Depends(require_admin), db: Session = Depends(get_db)):
+    """Dernière exécution de chaque tâche de maintenance (tous workers) et compteurs du planificateur courant."""
+    return {
+        "last_runs": [
+            {
+                "name": run.name,
+                "started_at": run.last_started_at.timestamp() if run.last_started_at else None,
+                "finished_at": run.last_finished_at.timestamp() if run.last_finished_at else None,
+                "duration_ms": run.last_duration_ms,
+                "rows": run.last_rows,
+                "error": run.last_error,
+            }
+            for run in PostgreSQLMaintenanceJobRunRepository(db).list_all()
+        ],
+        "scheduler": maintenance_scheduler.stats(),
+    }
+
+@app.get("/admin/orders/{order_id}/events", response_model=List[OrderEventOut])
+def admin_order_events(order_id: str, u = Depends(require_admin), db: Session = Depends(get_db)):
+    """Historique des changements de statut d'une commande et état de leur diffusion."""
+    return [
+        OrderEventOut(
+            id=str(e.id),
+            event_type=e.event_type,
+            from_status=e.from_status,
+            payload=e.payload or {},
+            status=e.status,
+            attempts=e.attempts,
+            delivered_to=list(e.delivered_to or []),
+            last_error=e.last_error,
+            created_at=e.created_at.timestamp() if e.created_at else 0.0,
+        )
+        for e in PostgreSQLOrderEventRepository(db).list_for_order(order_id)
+    ]
+
+@app.get("/admin/sql/top")
+def admin_sql_top(
+    limit: int = Query(default=20, ge=1, le=200),
+    order_by: str = Query(default="total", pattern="^(total|max|calls)$"),
+    u = Depends(require_admin),
+):
+    """Instructions SQL les plus coûteuses vues par le worker courant (temps cumulé, max ou nombre d'appels)."""
+    sort_key = {"total": "total_seconds", "max": "max_seconds", "calls": "calls"}[order_by]
+    return {
+        "slow_query_ms": sql_profiler.SLOW_QUERY_SECONDS * 1000,
+        "distinct_statements": sql_profiler.statement_stats.size(),
+        "dropped": sql_profiler.statement_stats.dropped,
+        "statements": sql_profiler.statement_stats.top(limit, sort_key),
+    }
+
+@app.delete("/admin/sql/top")
+def admin_sql_reset(u = Depends(require_admin)):
+    """Remet à zéro les cumuls SQL du worker courant."""
+    sql_profiler.statement_stats.reset()
+    return {"ok": True}
+
+@app.get("/admin/invoices/export")
+def admin_export_invoices(
+    start: date = Query(..., description="Premier jour inclus (AAAA-MM-JJ)"),
+    end: date = Query(..., description="Dernier jour inclus (AAAA-MM-JJ)"),
+    format: str = Query(default="zip", pattern="^(zip|csv|jsonl)$"),
+    u = Depends(require_admin),
+):
+    """Exporte les factures d'une période : ZIP de PDF, ou grand livre CSV / JSON Lines (en flux)."""
+    if end < start:
+        raise HTTPException(400, "La date de fin doit être postérieure à la date de début")
+    media_type, extension = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        InvoiceExporter().stream(format, start, end),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="factures_{start}_{end}.{extension}"'},
+    )
+
 # ====================== ADMIN: Commandes ======================
-@app.get("/admin/orders", response_model=list[OrderOut])
-def admin_list_orders(user_id: Optional[str] = None, order_id: Optional[str] = None, u = Depends(require_admin), db: Session = Depends(get_db)):
+def _encode_order_cursor(cursor) -> str:
+    """Encode un curseur (created_at, id) en chaîne opaque pour le client."""
+    created_at, oid = cursor
+    raw = f"{created_at.isoformat()}|{oid}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def _decode_order_cursor(cursor: str):
+    """Décode un curseur opaque ; lève HTTPException 400 s'il est invalide."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        created_at, oid = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), uuid.UUID(oid)
+    except Exception:
+        raise HTTPException(400, "Curseur de pagination invalide")
+
+@app.get("/admin/orders", response_model=OrderPageOut)
+def admin_list_orders(
+    user_id: Optional[str] = None,
+    order_id: Optional[str] = None,
+    status: Optional[OrderStatus] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(default=50, ge=1, le=200),
+    u = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """
+    Endpoint: GET /admin/orders
+    
+    Liste paginée des commandes, de la plus récente à la plus ancienne.
+    Filtres optionnels (appliqués en SQL) : user_id, status, created_from, created_to.
+    Passer `next_cursor` de la réponse dans `cursor` pour obtenir la page suivante.
+    """
     order_repo = PostgreSQLOrderRepository(db)
     
-    # Priorité 1 : Si order_id est fourni, rechercher cette commande spécifique
+    # Recherche directe d'une commande : pas de pagination
     if order_id:
         order = order_repo.get_by_id(order_id)
-        if order:
-            orders = [order]
-        else:
-            orders = []
-    # Priorité 2 : Si user_id est fourni, rechercher les commandes de ce client
-    elif user_id:
-        orders = order_repo.get_by_user_id(user_id)
-        # Gérer le cas où orders est None (retourne une liste vide)
-        if orders is None:
-            orders = []
-    # Priorité 3 : Sinon, retourner toutes les commandes
-    else:
-        orders = order_repo.get_all()
+        return OrderPageOut(items=[_order_to_out(order)] if order else [], next_cursor=None)
     
-    # Gérer le cas où orders est None (retourne une liste vide)
-    if orders is None:
-        orders = []
-    
-    out = []
-    for order in orders:
-        delivery_info = None
-        if order.delivery:
-            delivery_info = DeliveryOut(
-                transporteur=order.delivery.transporteur,
-                tracking_number=order.delivery.tracking_number,
-                delivery_status=order.delivery.delivery_status
-            )
-        
-        out.append(OrderOut(
-            id=str(order.id),
-            user_id=str(order.user_id),
-            items=[OrderItemOut(
-                product_id=str(item.product_id),
-                name=item.name,
-                unit_price_cents=item.unit_price_cents,
-                quantity=item.quantity
-            ) for item in order.items],
-            status=str(order.status),
-            total_cents=sum(item.unit_price_cents * item.quantity for item in order.items),
-            created_at=(order.created_at.timestamp() if getattr(order, 'created_at', None) else 0.0),
-            delivery=delivery_info
-        ))
-    return out
+    orders, next_cursor = order_repo.list_page(
+        limit=limit,
+        cursor=_decode_order_cursor(cursor) if cursor else None,
+        status=status.value if status else None,
+        user_id=user_id,
+        created_from=created_from,
+        created_to=created_to,
+    )
+    return OrderPageOut(
+        items=[_order_to_out(order) for order in orders],
+        next_cursor=_encode_order_cursor(next_cursor) if next_cursor else None
+    )
 
 @app.get("/admin/orders/{order_id}", response_model=OrderOut)
 def admin_get_order(order_id: str, u = Depends(require_admin), db: Session = Depends(get_db)):
     order_repo = PostgreSQLOrderRepository(db)
-    order = order_repo.get_by_id(order_id)
+    order = order_repo.get_by_id_with_details(order_id)
     if not order:
         raise HTTPException(404, "Commande introuvable")
     
-    delivery_info = None
-    if order.delivery:
-        delivery_info = DeliveryOut(
-            transporteur=order.delivery.transporteur,
-            tracking_number=order.delivery.tracking_number,
-            delivery_status=order.delivery.delivery_status
-        )
-    
-    return OrderOut(
-        id=str(order.id),
-        user_id=str(order.user_id),
-        items=[OrderItemOut(
-            product_id=str(item.product_id),
-            name=item.name,
-            unit_price_cents=item.unit_price_cents,
-            quantity=item.quantity
-        ) for item in order.items],
-        status=cast(str, order.status),
-        total_cents=sum(item.unit_price_cents * item.quantity for item in order.items),
-        created_at=(order.created_at.timestamp() if getattr(order, 'created_at', None) else 0.0),
-        delivery=delivery_info
-    )
+    return _order_to_out(order)
 
 @app.post("/admin/orders/{order_id}/validate", response_model=OrderOut)
 def admin_validate_order(order_id: str, u = Depends(require_admin), db: Session = Depends(get_db)):
@@ -1675,14 +2166,17 @@ def admin_validate_order(order_id: str, u = Depends(require_admin), db: Session
             raise HTTPException(404, "Commande introuvable")
         
         # Vérifier que la commande peut être validée
-        if str(order.status) not in [OrderStatus.CREE.value, OrderStatus.PAYEE.value]:
+        previous_status = str(order.status)
+        if previous_status not in [OrderStatus.CREE.value, OrderStatus.PAYEE.value]:
             raise HTTPException(400, f"Commande déjà traitée (statut actuel: {order.status})")
         
         # Mettre à jour le statut et le timestamp UNIQUEMENT pour cette commande
         order.status = OrderStatus.VALIDEE  # type: ignore
         order.validated_at = datetime.now(UTC)  # type: ignore
-        # Utiliser update() qui modifie uniquement cette commande spécifique
+        _record_order_event(db, order, previous_status)
+        # Utiliser update() qui modifie uniquement cette commande spécifique (événement compris)
         order_repo.update(order)
+        order_event_dispatcher.wake()
         
         # Rafraîchir UNIQUEMENT cette commande pour avoir les dernières données
         db.refresh(order)
@@ -1716,6 +2210,23 @@ def admin_validate_order(order_id: str, u = Depends(require_admin), db: Session
         raise HTTPException(400, f"Erreur lors de la validation: {str(e)}")
 
 # ====================== ANNULATION DE COMMANDE ======================
+def _release_order_stock(product_repo: PostgreSQLProductRepository, order: Order, paid: Optional[bool] = None) -> bool:
+    """
+    Libère le stock d'une commande annulée ou remboursée (sans commit).
+    Les réservations sont toujours libérées ; le stock n'est remis en place que si la
+    commande a été payée (`paid`, par défaut : paid_at renseigné), car il n'est
+    décrémenté qu'au paiement.
+    Retourne True si du stock a été remis en place.
+    """
+    if paid is None:
+        paid = order.paid_at is not None
+    restock: dict[str, int] = {}
+    if paid:
+        for item in order.items:
+            restock[str(item.product_id)] = restock.get(str(item.product_id), 0) + int(item.quantity or 0)
+    CatalogService(product_repo).release_for_order(str(order.id), restock)
+    return bool(restock)
+
 @app.post("/orders/{order_id}/cancel")
 def cancel_order(order_id: str, uid: str = Depends(current_user_id), db: Session = Depends(get_db)):
     """Annule une commande avec remboursement automatique si payée"""
@@ -1743,10 +2254,9 @@ def cancel_order(order_id: str, uid: str = Depends(current_user_id), db: Session
             # Récupérer les paiements pour la commande
             payments = payment_repo.get_by_order_id(order_id)
             if payments:
-                # Marquer les paiements comme remboursés
+                # Marquer les paiements comme remboursés (validé avec le changement de statut)
                 for payment in payments:
                     payment.status = "REFUNDED"  # type: ignore
-                db.commit()
                 
                 # Calculer le montant total remboursé
                 total_refunded = sum(p.amount_cents for p in payments)
@@ -1757,19 +2267,9 @@ def cancel_order(order_id: str, uid: str = Depends(current_user_id), db: Session
                 }
                 # Remboursement automatique effectué
         
-        # Remettre le stock en place pour chaque article
-        for item in order.items:
-            product = product_repo.get_by_id(str(item.product_id))
-            if product:
-                # Remettre le stock
-                product.stock_qty += item.quantity
-                
-                # Réactiver le produit s'il était inactif à cause du stock
-                if not product.active and product.stock_qty > 0:
-                    product.active = True  # type: ignore
-                    # Produit réactivé automatiquement (stock restauré)
-                
-                product_repo.update(product)
+        # Libérer les réservations, et remettre le stock en place si la commande était payée
+        # (un produit masqué faute de stock est réactivé) ; validé avec le changement de statut
+        restocked = _release_order_stock(product_repo, order)
         
         # Mettre à jour le statut et les timestamps UNIQUEMENT pour cette commande spécifique
         # Si la commande était payée et remboursée → REMBOURSEE (violet)
@@ -1781,8 +2281,15 @@ def cancel_order(order_id: str, uid: str = Depends(current_user_id), db: Session
             order.status = OrderStatus.ANNULEE  # type: ignore
         
         order.cancelled_at = datetime.now(UTC)  # type: ignore
+        # Événement écrit dans la même transaction : email, facture et cache catalogue
+        # (stock restauré) sont traités ensuite par le dispatcher
+        _record_order_event(
+            db, order, current_status,
+            amount_cents=refund_info["amount_cents"] if refund_info else None, stock_changed=restocked,
+        )
         # Utiliser update() qui modifie UNIQUEMENT cette commande, pas les autres
         order_repo.update(order)
+        order_event_dispatcher.wake()
         
         response = {"ok": True, "message": "Commande annulée avec succès"}
         if refund_info:
@@ -1799,8 +2306,23 @@ def cancel_order(order_id: str, uid: str = Depends(current_user_id), db: Session
 
 # ====================== PAIEMENTS ======================
 @app.post("/orders/{order_id}/pay")
-def pay_order(order_id: str, payment_data: PayIn, uid: str = Depends(current_user_id), db: Session = Depends(get_db)):
-    """Simule un paiement pour une commande avec validation stricte"""
+def pay_order(
+    order_id: str,
+    payment_data: PayIn,
+    uid: str = Depends(current_user_id),
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(default=None, max_length=255),
+):
+    """
+    Simule un paiement pour une commande avec validation stricte.
+    Avec un en-tête Idempotency-Key, un nouvel essai (double clic, réseau coupé)
+    renvoie le résultat du premier paiement au lieu d'échouer sur « déjà payée ».
+    """
+    # Empreinte des seuls champs non sensibles (4 derniers chiffres, expiration, code postal)
+    replay = _idempotency_claim(db, uid, idempotency_key, f"POST /orders/{order_id}/pay",
+                                _payment_fingerprint(payment_data))
+    if replay is not None:
+        return replay
     try:
         from utils.validations import (
             validate_card_number, validate_cvv, validate_expiry_date,
@@ -1813,7 +2335,9 @@ def pay_order(order_id: str, payment_data: PayIn, uid: str = Depends(current_use
         product_repo = PostgreSQLProductRepository(db)
         cart_repo = PostgreSQLCartRepository(db)
         
-        order = order_repo.get_by_id(order_id)
+        # Verrouiller la commande : deux paiements concurrents de la même commande
+        # sont sérialisés, le second voit le statut PAYEE et échoue proprement
+        order = order_repo.get_by_id_for_update(order_id)
         if not order or str(order.user_id) != uid:
             raise HTTPException(404, "Commande introuvable")
         
@@ -1900,49 +2424,62 @@ def pay_order(order_id: str, payment_data: PayIn, uid: str = Depends(current_use
             "street_name": cleaned_street_name
         }
         
-        payment = payment_repo.create(payment_data_dict)
+        # Tout ce qui suit est une seule transaction : décrément du stock, paiement,
+        # vidage du panier et passage en PAYEE sont validés ensemble ou pas du tout.
         
-        # Décrémenter le stock et potentiellement désactiver les produits après PAIEMENT réussi
-        # Seuil de masquage: si stock restant <= seuil, on met le produit inactif
+        # Convertir les réservations en vente : produits verrouillés, disponible recalculé
+        # hors réservations de cette commande (une réservation expirée ne bloque pas le paiement
+        # si personne n'a réservé ces unités entre-temps), puis UPDATE conditionnel
+        # (stock_qty >= quantité) : aucune survente possible même avec des paiements concurrents.
+        # Seuil de masquage: si stock restant <= seuil, le produit passe inactif dans la même requête
         import os
         try:
             threshold = int(os.getenv("LOW_STOCK_HIDE_THRESHOLD", "0"))
         except Exception:
             threshold = 0
+        quantities: dict[str, int] = {}
+        names: dict[str, str] = {}
         for item in order.items:
-            product = product_repo.get_by_id(str(item.product_id))
-            if product:
-                # Décrémenter le stock; sécurité: ne pas descendre sous 0
-                try:
-                    current_stock = int(getattr(product, "stock_qty", 0) or 0)
-                except Exception:
-                    current_stock = 0
-                try:
-                    qty_to_decrement = int(getattr(item, "quantity", 0) or 0)
-                except Exception:
-                    qty_to_decrement = 0
-                new_stock = max(0, current_stock - qty_to_decrement)
-                product.stock_qty = new_stock  # type: ignore
-                if new_stock <= threshold:
-                    product.active = False  # type: ignore
-                product_repo.update(product)
-
+            pid = str(item.product_id)
+            quantities[pid] = quantities.get(pid, 0) + int(item.quantity or 0)
+            names[pid] = item.name
+        failed = CatalogService(product_repo).confirm_for_order(order_id, quantities, hide_threshold=threshold)
+        if failed:
+            db.rollback()
+            raise HTTPException(
+                409,
+                "Stock insuffisant pour : " + ", ".join(names.get(pid, pid) for pid in failed)
+            )
+        
+        payment = payment_repo.add(payment_data_dict)
+        
         # Vider le panier de l'utilisateur (il a payé)
-        cart_repo.clear_cart(uid)
-
+        cart_repo.clear_items(uid)
+        
         # Mettre à jour le statut de la commande
-        order.status = OrderStatus.PAYEE  # type: ignore
+        order.status = OrderStatus.PAYEE.value  # type: ignore
+        order.paid_at = datetime.now(UTC)  # type: ignore
         order.payment_id = payment.id
-        order_repo.update(order)
-        
-        return {
+        # Facture, PDF, email de confirmation et cache catalogue (stock décrémenté) :
+        # traités par le dispatcher d'événements, hors de la requête
+        _record_order_event(db, order, OrderStatus.CREE.value, amount_cents=total_cents, stock_changed=True)
+        result = {
             "payment_id": str(payment.id),
             "status": "SUCCEEDED",
             "amount_cents": total_cents
         }
+        _idempotency_complete(db, uid, idempotency_key, result)
+        db.commit()
+        order_event_dispatcher.wake()
+        
+        return result
     except HTTPException:
+        db.rollback()
+        _idempotency_release(db, uid, idempotency_key)
         raise
     except Exception as e:
+        db.rollback()
+        _idempotency_release(db, uid, idempotency_key)
         raise HTTPException(400, str(e))
 
 # ====================== FACTURES ======================
@@ -1951,23 +2488,13 @@ def get_invoice(order_id: str, uid: str = Depends(current_user_id), db: Session
     """Récupère la facture d'une commande"""
     try:
         order_repo = PostgreSQLOrderRepository(db)
-        invoice_repo = PostgreSQLInvoiceRepository(db)
         
         order = order_repo.get_by_id(order_id)
         if not order or str(order.user_id) != uid:
             raise HTTPException(404, "Commande introuvable")
         
         # Créer la facture si elle n'existe pas
-        invoice = invoice_repo.get_by_order_id(order_id)
-        if not invoice:
-            # Créer la facture
-            total_cents = sum(item.unit_price_cents * item.quantity for item in order.items)
-            invoice_data = {
-                "order_id": order_id,
-                "user_id": str(order.user_id),
-                "total_cents": total_cents
-            }
-            invoice = invoice_repo.create(invoice_data)
+        invoice = get_or_create_invoice(db, order)
         
         # Construire les lignes de facture
         lines = []
@@ -1993,94 +2520,57 @@ def get_invoice(order_id: str, uid: str = Depends(current_user_id), db: Session
     except Exception as e:
         raise HTTPException(400, str(e))
 
+def _iter_open_file(f, chunk_size: int = 64 * 1024):
+    """Lit un fichier déjà ouvert par blocs, puis le ferme (corps d'une StreamingResponse)."""
+    with f:
+        while chunk := f.read(chunk_size):
+            yield chunk
+
 @app.get("/orders/{order_id}/invoice/download")
-def download_invoice_pdf(order_id: str, uid: str = Depends(current_user_id), db: Session = Depends(get_db)):
-    """Télécharge la facture en PDF"""
+def download_invoice_pdf(
+    order_id: str,
+    if_none_match: Optional[str] = Header(None),
+    uid: str = Depends(current_user_id),
+    db: Session = Depends(get_db),
+):
+    """Télécharge la facture en PDF (servie depuis le stockage disque, avec ETag)"""
     try:
         order_repo = PostgreSQLOrderRepository(db)
-        invoice_repo = PostgreSQLInvoiceRepository(db)
         payment_repo = PostgreSQLPaymentRepository(db)
         
-        order = order_repo.get_by_id(order_id)
+        order = order_repo.get_by_id_with_details(order_id)
         if not order or str(order.user_id) != uid:
             raise HTTPException(404, "Commande introuvable")
         
         # Créer la facture si elle n'existe pas (comme dans get_invoice)
-        invoice = invoice_repo.get_by_order_id(order_id)
-        if not invoice:
-            # Créer la facture automatiquement
-            total_cents = sum(item.unit_price_cents * item.quantity for item in order.items)
-            invoice_data = {
-                "order_id": order_id,
-                "user_id": str(order.user_id),
-                "total_cents": total_cents
-            }
-            invoice = invoice_repo.create(invoice_data)
-        
-        # Récupérer les données nécessaires
-        user = order.user
+        invoice = get_or_create_invoice(db, order)
         payments = payment_repo.get_by_order_id(order_id)
         
-        # Construire les données de la facture
-        invoice_data = {
-            "id": str(invoice.id),
-            "number": f"INV-{str(invoice.id)[:8].upper()}",
-            "issued_at": invoice.created_at.timestamp(),
-            "lines": [
-                {
-                    "product_id": str(item.product_id),
-                    "name": item.name,
-                    "unit_price_cents": item.unit_price_cents,
-                    "quantity": item.quantity
-                }
-                for item in order.items
-            ]
-        }
-        
-        order_data = {
-            "id": str(order.id),
-            "user_id": str(order.user_id),
-            "status": order.status
-        }
-        
-        user_data = {
-            "first_name": user.first_name,
-            "last_name": user.last_name,
-            "address": user.address
+        # L'empreinte des données rendues identifie le PDF : tout changement de statut,
+        # paiement ou livraison produit un nouveau fichier et un nouvel ETag
+        render_data = build_invoice_render_data(order, invoice, payments)
+        digest = render_digest(render_data)
+        headers = {
+            "ETag": f'"{digest}"',
+            "Cache-Control": "private, no-cache",
         }
-        
-        payment_data = None
-        if payments:
-            payment = payments[0]  # Prendre le premier paiement
-            payment_data = {
-                "amount_cents": payment.amount_cents,
-                "status": payment.status,
-                "created_at": payment.created_at.timestamp()
-            }
-        
-        delivery_data = None
-        if order.delivery:
-            delivery_data = {
-                "transporteur": order.delivery.transporteur,
-                "tracking_number": order.delivery.tracking_number,
-                "delivery_status": order.delivery.delivery_status
-            }
-        
-        # Générer le PDF
-        pdf_buffer = generate_invoice_pdf(invoice_data, order_data, user_data, payment_data, delivery_data)
-        
-        return Response(
-            content=pdf_buffer.getvalue(),
-            media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename=facture_{order_id[-8:]}.pdf"}
-        )
+        if if_none_match:
+            client_tags = {tag.strip().removeprefix("W/").strip('"') for tag in if_none_match.split(",")}
+            if digest in client_tags or "*" in client_tags:
+                return Response(status_code=304, headers=headers)
+        
+        # Servi depuis le fichier ouvert : un rendu concurrent peut supprimer cette version
+        pdf = invoice_pdf_store.open_or_render(str(invoice.id), render_data, digest)
+        headers["Content-Length"] = str(os.fstat(pdf.fileno()).st_size)
+        headers["Content-Disposition"] = f'attachment; filename="facture_{order_id[-8:]}.pdf"'
+        return StreamingResponse(_iter_open_file(pdf), media_type="application/pdf", headers=headers)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(400, str(e))
 
 # ====================== SUIVI DE LIVRAISON ======================
-@app.get("/orders/{order_id}/tracking", response_model=DeliveryOut)
+@_read_route("/orders/{order_id}/tracking", asynchronous=False, response_model=DeliveryOut)
 def get_order_tracking(order_id: str, uid: str = Depends(current_user_id), db: Session = Depends(get_db)):
     """Récupère le suivi de livraison d'une commande"""
     try:
@@ -2103,6 +2593,27 @@ def get_order_tracking(order_id: str, uid: str = Depends(current_user_id), db: S
     except Exception as e:
         raise HTTPException(400, str(e))
 
+@_read_route("/orders/{order_id}/tracking", asynchronous=True, response_model=DeliveryOut)
+async def get_order_tracking_async(order_id: str, uid: str = Depends(current_user_id_async), db: AsyncSession = Depends(get_async_db)):
+    """Endpoint: GET /orders/{order_id}/tracking (version async, livraison chargée en jointure)"""
+    try:
+        order = await AsyncPostgreSQLOrderRepository(db).get_by_id_with_delivery(order_id)
+        if not order or str(order.user_id) != uid:
+            raise HTTPException(404, "Commande introuvable")
+        
+        if not order.delivery:
+            raise HTTPException(404, "Informations de livraison non disponibles")
+        
+        return DeliveryOut(
+            transporteur=order.delivery.transporteur,
+            tracking_number=order.delivery.tracking_number,
+            delivery_status=order.delivery.delivery_status
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(400, str(e))
+
 # ====================== SUPPORT CLIENT ======================
 @app.post("/support/threads", response_model=ThreadOut)
 def create_support_thread(thread_data: ThreadCreateIn, uid: str = Depends(current_user_id), db: Session = Depends(get_db)):
@@ -2425,7 +2936,8 @@ def admin_ship_order(order_id: str, delivery_data: DeliveryIn, u = Depends(requi
             raise HTTPException(404, "Commande introuvable")
         
         # Vérifier que la commande peut être expédiée
-        if str(order.status) not in [OrderStatus.VALIDEE.value, OrderStatus.PAYEE.value]:
+        previous_status = str(order.status)
+        if previous_status not in [OrderStatus.VALIDEE.value, OrderStatus.PAYEE.value]:
             raise HTTPException(400, f"Commande non expédiable (statut actuel: {order.status})")
         
         # Créer les informations de livraison
@@ -2443,9 +2955,14 @@ def admin_ship_order(order_id: str, delivery_data: DeliveryIn, u = Depends(requi
         # Modifier uniquement l'objet order récupéré, pas d'autres commandes
         order.status = OrderStatus.EXPEDIEE  # type: ignore
         order.shipped_at = datetime.now(UTC)  # type: ignore
+        _record_order_event(
+            db, order, previous_status,
+            transporteur=delivery_data.transporteur, tracking_number=delivery_data.tracking_number,
+        )
         # Utiliser update() qui commit UNIQUEMENT les changements de cette commande
         order_repo.update(order)
-        # Le commit inclut aussi la livraison ajoutée ci-dessus (même transaction)
+        # Le commit inclut aussi la livraison et l'événement ajoutés ci-dessus (même transaction)
+        order_event_dispatcher.wake()
         
         return {"ok": True, "message": f"Commande {order_id} expédiée avec succès"}
     except HTTPException:
@@ -2468,18 +2985,17 @@ def admin_mark_delivered(order_id: str, u = Depends(require_admin), db: Session
         if str(order.status) != OrderStatus.EXPEDIEE.value:
             raise HTTPException(400, f"Commande non expédiée (statut actuel: {order.status})")
         
+        # Mettre à jour le statut de livraison UNIQUEMENT pour cette commande
+        if order.delivery:
+            order.delivery.delivery_status = "LIVREE"
+        
         # Mettre à jour le statut et le timestamp UNIQUEMENT pour cette commande spécifique
         order.status = OrderStatus.LIVREE  # type: ignore
         order.delivered_at = datetime.now(UTC)  # type: ignore
-        # Utiliser update() qui modifie UNIQUEMENT cette commande, pas les autres
+        _record_order_event(db, order, OrderStatus.EXPEDIEE.value)
+        # Utiliser update() qui modifie UNIQUEMENT cette commande (livraison et événement compris)
         order_repo.update(order)
-        
-        # Mettre à jour le statut de livraison UNIQUEMENT pour cette commande
-        if order.delivery:
-            order.delivery.delivery_status = "LIVREE"
-            # Commit pour persister la mise à jour du statut de livraison
-            db.commit()
-            db.refresh(order.delivery)
+        order_event_dispatcher.wake()
         
         return {"ok": True, "message": f"Commande {order_id} marquée comme livrée"}
     except HTTPException:
@@ -2501,7 +3017,8 @@ def admin_refund_order(order_id: str, refund_data: RefundIn, u = Depends(require
             raise HTTPException(404, "Commande introuvable")
         
         # Vérifier que la commande peut être remboursée
-        if str(order.status) not in [OrderStatus.PAYEE.value, OrderStatus.EXPEDIEE.value, OrderStatus.LIVREE.value]:
+        previous_status = str(order.status)
+        if previous_status not in [OrderStatus.PAYEE.value, OrderStatus.EXPEDIEE.value, OrderStatus.LIVREE.value]:
             raise HTTPException(400, f"Commande non remboursable (statut actuel: {order.status})")
         
         # Récupérer le paiement
@@ -2509,31 +3026,23 @@ def admin_refund_order(order_id: str, refund_data: RefundIn, u = Depends(require
         if not payments:
             raise HTTPException(400, "Aucun paiement trouvé")
         
-        # Remettre le stock en place pour chaque article
-        for item in order.items:
-            product = product_repo.get_by_id(str(item.product_id))
-            if product:
-                # Remettre le stock
-                product.stock_qty += item.quantity
-                
-                # Réactiver le produit s'il était inactif à cause du stock
-                if not product.active and product.stock_qty > 0:
-                    product.active = True  # type: ignore
-                    # Produit réactivé automatiquement (remboursement)
-                
-                product_repo.update(product)
+        # Remettre le stock en place (un produit masqué faute de stock est réactivé)
+        restocked = _release_order_stock(product_repo, order, paid=True)
+        
+        # Mettre à jour le statut des paiements UNIQUEMENT pour cette commande
+        for payment in payments:
+            payment.status = "REFUNDED"  # type: ignore
         
         # Mettre à jour le statut et le timestamp UNIQUEMENT pour cette commande spécifique
         order.status = OrderStatus.REMBOURSEE  # type: ignore
         order.refunded_at = datetime.now(UTC)  # type: ignore
-        # Utiliser update() qui modifie UNIQUEMENT cette commande, pas les autres
+        _record_order_event(
+            db, order, previous_status,
+            amount_cents=sum(p.amount_cents for p in payments), stock_changed=restocked,
+        )
+        # Un seul commit : stock, paiements, statut et événement ensemble
         order_repo.update(order)
-        
-        # Mettre à jour le statut des paiements UNIQUEMENT pour cette commande
-        for payment in payments:
-            payment.status = "REFUNDED"  # type: ignore
-        # order_repo.update() a déjà fait le commit, mais on commit aussi les paiements
-        db.commit()
+        order_event_dispatcher.wake()
         
         return {"ok": True, "message": f"Commande {order_id} remboursée avec succès"}
     except HTTPException:
@@ -2569,10 +3078,9 @@ def admin_cancel_order(order_id: str, u = Depends(require_admin), db: Session =
             # Récupérer les paiements pour la commande
             payments = payment_repo.get_by_order_id(order_id)
             if payments:
-                # Marquer les paiements comme remboursés
+                # Marquer les paiements comme remboursés (validé avec le changement de statut)
                 for payment in payments:
                     payment.status = "REFUNDED"  # type: ignore
-                db.commit()
                 
                 # Calculer le montant total remboursé
                 total_refunded = sum(p.amount_cents for p in payments)
@@ -2582,18 +3090,8 @@ def admin_cancel_order(order_id: str, u = Depends(require_admin), db: Session =
                     "message": f"Remboursement automatique de {total_refunded/100:.2f}€ effectué"
                 }
         
-        # Remettre le stock en place pour chaque article
-        for item in order.items:
-            product = product_repo.get_by_id(str(item.product_id))
-            if product:
-                # Remettre le stock
-                product.stock_qty += item.quantity
-                
-                # Réactiver le produit s'il était inactif à cause du stock
-                if not product.active and product.stock_qty > 0:
-                    product.active = True  # type: ignore
-                
-                product_repo.update(product)
+        # Libérer les réservations, et remettre le stock en place si la commande était payée
+        restocked = _release_order_stock(product_repo, order)
         
         # Mettre à jour le statut et les timestamps UNIQUEMENT pour cette commande spécifique
         # Si la commande était payée et remboursée → REMBOURSEE (violet)
@@ -2605,8 +3103,13 @@ def admin_cancel_order(order_id: str, u = Depends(require_admin), db: Session =
             order.status = OrderStatus.ANNULEE  # type: ignore
         
         order.cancelled_at = datetime.now(UTC)  # type: ignore
+        _record_order_event(
+            db, order, current_status,
+            amount_cents=refund_info["amount_cents"] if refund_info else None, stock_changed=restocked,
+        )
         # Utiliser update() qui modifie UNIQUEMENT cette commande, pas les autres
         order_repo.update(order)
+        order_event_dispatcher.wake()
         
         response = {"ok": True, "message": f"Commande {order_id} annulée avec succès par l'admin"}
         if refund_info:
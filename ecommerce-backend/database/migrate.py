@@ -0,0 +1,96 @@
+"""
+Application des migrations Alembic, une seule fois avant le démarrage des workers.
+
+Remplace l'appel à `create_tables()` à l'import de api.py : chaque worker uvicorn
+n'a plus à inspecter le schéma au démarrage. Lancé par docker-entrypoint.sh :
+
+  python -m database.migrate            # upgrade head
+  python -m database.migrate 0002       # jusqu'à une révision donnée
+
+Base existante créée par create_tables (tables présentes, pas de table
+alembic_version) : elle est marquée à la révision 0001 avant l'upgrade. La
+révision 0001 reproduit exactement les tables d'origine (BASELINE_TABLES) ; les
+révisions suivantes tolèrent les tables et index déjà créés par un create_tables
+plus récent. Une base à laquelle manque une table d'origine n'est pas marquée.
+Sous PostgreSQL, un verrou consultatif sérialise les lancements simultanés
+(plusieurs conteneurs qui démarrent en même temps).
+"""
+import os
+import sys
+from typing import Optional
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_REVISION = "0001"
+# Tables du schéma d'origine, créées par la révision 0001
+BASELINE_TABLES = frozenset({
+    "users", "products", "carts", "cart_items", "orders", "order_items", "deliveries",
+    "invoices", "payments", "message_threads", "messages", "password_reset_tokens",
+})
+
+# Clé arbitraire du verrou consultatif PostgreSQL réservé aux migrations
+_MIGRATION_LOCK_KEY = 720_150_001
+
+
+def alembic_config(connection: Optional[Connection] = None) -> Config:
+    """Configuration Alembic indépendante du répertoire courant."""
+    cfg = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    cfg.set_main_option("script_location", os.path.join(BACKEND_DIR, "database", "migrations"))
+    if connection is not None:
+        cfg.attributes["connection"] = connection
+    return cfg
+
+
+def _is_legacy_database(connection: Connection) -> bool:
+    """Tables créées par create_tables mais jamais versionnées par Alembic.
+
+    Lève RuntimeError si le schéma d'origine est incomplet : le marquer 0001
+    ferait échouer les révisions suivantes.
+    """
+    tables = set(inspect(connection).get_table_names())
+    if "alembic_version" in tables or "users" not in tables:
+        return False
+    missing = BASELINE_TABLES - tables
+    if missing:
+        raise RuntimeError(
+            f"Base sans version Alembic incomplète (tables absentes : {', '.join(sorted(missing))}) : "
+            f"impossible de la marquer à la révision {BASELINE_REVISION}"
+        )
+    return True
+
+
+def run_migrations(engine: Optional[Engine] = None, revision: str = "head") -> None:
+    """Amène le schéma de la base à `revision`."""
+    if engine is None:
+        from database.database import engine
+
+    with engine.connect() as connection:
+        postgresql = connection.dialect.name == "postgresql"
+        if postgresql:
+            connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": _MIGRATION_LOCK_KEY})
+            connection.commit()
+        try:
+            cfg = alembic_config(connection)
+            legacy = _is_legacy_database(connection)
+            # Alembic doit ouvrir lui-même la transaction (requis par autocommit_block)
+            connection.commit()
+            if legacy:
+                print(f"📋 Base existante sans version Alembic : marquage à la révision {BASELINE_REVISION}")
+                command.stamp(cfg, BASELINE_REVISION)
+                connection.commit()
+            command.upgrade(cfg, revision)
+            connection.commit()
+        finally:
+            if postgresql:
+                connection.rollback()
+                connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _MIGRATION_LOCK_KEY})
+                connection.commit()
+
+
+if __name__ == "__main__":
+    run_migrations(revision=sys.argv[1] if len(sys.argv) > 1 else "head")
+    print("✅ Schéma de la base à jour")
@@ -0,0 +1,176 @@
+"""Schéma initial (tables créées jusqu'ici par create_tables)
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+
+Reproduit exactement le schéma d'origine, tel que `Base.metadata.create_all()` le
+créait avant l'introduction d'Alembic (tables users … password_reset_tokens).
+Les tables ajoutées depuis (email_outbox, stock_reservations, ...) ont chacune leur
+révision. Une base existante, créée par create_tables, est déjà à ce niveau :
+la marquer avec `alembic stamp 0001` au lieu de rejouer cette migration.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _uuid():
+    return postgresql.UUID(as_uuid=True)
+
+
+def upgrade() -> None:
+    op.create_table(
+        "users",
+        sa.Column("id", _uuid(), primary_key=True),
+        sa.Column("email", sa.String(255), nullable=False),
+        sa.Column("password_hash", sa.String(255), nullable=False),
+        sa.Column("first_name", sa.String(100), nullable=False),
+        sa.Column("last_name", sa.String(100), nullable=False),
+        sa.Column("address", sa.Text(), nullable=False),
+        sa.Column("is_admin", sa.Boolean()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    op.create_table(
+        "products",
+        sa.Column("id", _uuid(), primary_key=True),
+        sa.Column("name", sa.String(255), nullable=False),
+        sa.Column("description", sa.Text()),
+        sa.Column("price_cents", sa.Integer(), nullable=False),
+        sa.Column("stock_qty", sa.Integer(), nullable=False),
+        sa.Column("active", sa.Boolean()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+
+    op.create_table(
+        "carts",
+        sa.Column("id", _uuid(), primary_key=True),
+        sa.Column("user_id", _uuid(), sa.ForeignKey("users.id"), nullable=False, unique=True),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("updated_at", sa.DateTime()),
+    )
+
+    op.create_table(
+        "cart_items",
+        sa.Column("id", _uuid(), primary_key=True),
+        sa.Column("cart_id", _uuid(), sa.ForeignKey("carts.id"), nullable=False),
+        sa.Column("product_id", _uuid(), sa.ForeignKey("products.id"), nullable=False),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime()),
+    )
+
+    op.create_table(
+        "orders",
+        sa.Column("id", _uuid(), primary_key=True),
+        sa.Column("user_id", _uuid(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("status", sa.String(50), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("validated_at", sa.DateTime()),
+        sa.Column("paid_at", sa.DateTime()),
+        sa.Column("shipped_at", sa.DateTime()),
+        sa.Column("delivered_at", sa.DateTime()),
+        sa.Column("cancelled_at", sa.DateTime()),
+        sa.Column("refunded_at", sa.DateTime()),
+        sa.Column("payment_id", _uuid()),
+        sa.Column("invoice_id", _uuid()),
+        sa.Column("delivery_id", _uuid()),
+    )
+
+    op.create_table(
+        "order_items",
+        sa.Column("id", _uuid(), primary_key=True),
+        sa.Column("order_id", _uuid(), sa.ForeignKey("orders.id"), nullable=False),
+        sa.Column("product_id", _uuid(), sa.ForeignKey("products.id"), nullable=False),
+        sa.Column("name", sa.String(255), nullable=False),
+        sa.Column("unit_price_cents", sa.Integer(), nullable=False),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+    )
+
+    op.create_table(
+        "deliveries",
+        sa.Column("id", _uuid(), primary_key=True),
+        sa.Column("order_id", _uuid(), sa.ForeignKey("orders.id"), nullable=False, unique=True),
+        sa.Column("transporteur", sa.String(100), nullable=False),
+        sa.Column("tracking_number", sa.String(100)),
+        sa.Column("address", sa.Text(), nullable=False),
+        sa.Column("delivery_status", sa.String(50), nullable=False),
+        sa.Column("created_at", sa.DateTime()),
+    )
+
+    op.create_table(
+        "invoices",
+        sa.Column("id", _uuid(), primary_key=True),
+        sa.Column("order_id", _uuid(), sa.ForeignKey("orders.id"), nullable=False),
+        sa.Column("user_id", _uuid(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("total_cents", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime()),
+    )
+
+    op.create_table(
+        "payments",
+        sa.Column("id", _uuid(), primary_key=True),
+        sa.Column("order_id", _uuid(), sa.ForeignKey("orders.id"), nullable=False),
+        sa.Column("amount_cents", sa.Integer(), nullable=False),
+        sa.Column("status", sa.String(50), nullable=False),
+        sa.Column("payment_method", sa.String(50), nullable=False),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("card_last4", sa.String(4)),
+        sa.Column("postal_code", sa.String(5)),
+        sa.Column("phone", sa.String(10)),
+        sa.Column("street_number", sa.String(10)),
+        sa.Column("street_name", sa.String(100)),
+    )
+
+    op.create_table(
+        "message_threads",
+        sa.Column("id", _uuid(), primary_key=True),
+        sa.Column("user_id", _uuid(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("order_id", _uuid(), sa.ForeignKey("orders.id")),
+        sa.Column("subject", sa.String(255), nullable=False),
+        sa.Column("closed", sa.Boolean()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("updated_at", sa.DateTime()),
+    )
+
+    op.create_table(
+        "messages",
+        sa.Column("id", _uuid(), primary_key=True),
+        sa.Column("thread_id", _uuid(), sa.ForeignKey("message_threads.id"), nullable=False),
+        sa.Column("author_user_id", _uuid(), sa.ForeignKey("users.id")),
+        sa.Column("content", sa.Text(), nullable=False),
+        sa.Column("created_at", sa.DateTime()),
+    )
+
+    op.create_table(
+        "password_reset_tokens",
+        sa.Column("id", _uuid(), primary_key=True),
+        sa.Column("user_id", _uuid(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("token", sa.String(255), nullable=False),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+        sa.Column("used", sa.Boolean()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_password_reset_tokens_token", "password_reset_tokens", ["token"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_table("password_reset_tokens")
+    op.drop_table("messages")
+    op.drop_table("message_threads")
+    op.drop_table("payments")
+    op.drop_table("invoices")
+    op.drop_table("deliveries")
+    op.drop_table("order_items")
+    op.drop_table("orders")
+    op.drop_table("cart_items")
+    op.drop_table("carts")
+    op.drop_table("products")
+    op.drop_table("users")
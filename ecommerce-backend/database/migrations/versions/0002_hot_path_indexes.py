@@ -0,0 +1,61 @@
+"""Index des recherches fréquentes (clés étrangères, listes de commandes, index partiels)
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+
+Sous PostgreSQL, les index sont créés avec CREATE INDEX CONCURRENTLY, hors
+transaction (autocommit_block) : les tables restent accessibles en écriture
+pendant la construction. Si une construction échoue, l'index reste INVALID :
+le supprimer puis relancer la migration (IF NOT EXISTS ignore ceux déjà créés).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+# (nom, table, colonnes, condition d'index partiel)
+INDEXES = [
+    ("ix_orders_user_id_created_at", "orders", ["user_id", "created_at"], None),
+    ("ix_orders_status_created_at", "orders", ["status", "created_at", "id"], None),
+    ("ix_orders_created_at_id", "orders", ["created_at", "id"], None),
+    ("ix_order_items_order_id", "order_items", ["order_id"], None),
+    ("ix_cart_items_cart_id_product_id", "cart_items", ["cart_id", "product_id"], None),
+    ("ix_payments_order_id", "payments", ["order_id"], None),
+    ("ix_invoices_order_id", "invoices", ["order_id"], None),
+    ("ix_invoices_created_at", "invoices", ["created_at"], None),
+    ("ix_message_threads_user_id", "message_threads", ["user_id"], None),
+    ("ix_messages_thread_id_created_at", "messages", ["thread_id", "created_at"], None),
+    ("ix_products_active", "products", ["id"], {"postgresql": "active", "sqlite": "active = 1"}),
+]
+
+
+def _is_postgresql() -> bool:
+    return op.get_bind().dialect.name == "postgresql"
+
+
+def upgrade() -> None:
+    concurrently = _is_postgresql()
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            kwargs = {}
+            if where:
+                kwargs["postgresql_where"] = sa.text(where["postgresql"])
+                kwargs["sqlite_where"] = sa.text(where["sqlite"])
+            op.create_index(
+                name, table, columns,
+                if_not_exists=True,
+                postgresql_concurrently=concurrently,
+                **kwargs,
+            )
+
+
+def downgrade() -> None:
+    concurrently = _is_postgresql()
+    with op.get_context().autocommit_block():
+        for name, table, _columns, _where in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=concurrently)
@@ -0,0 +1,100 @@
+"""Colonnes de suivi des commandes et rattrapage de paid_at
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+
+Remplace le script migrate_add_paid_at.py :
+- ajoute les colonnes de suivi absentes des bases créées avant leur introduction
+  (base marquée 0001 par database.migrate) ; sans effet sur une base récente
+- renseigne paid_at des commandes payées qui n'en ont pas (POST /orders/{id}/pay
+  ne le remplissait pas) : date du paiement réussi, sinon date de commande.
+  Mise à jour par lots de BACKFILL_BATCH_SIZE commandes, chaque lot validé
+  séparément : pas de transaction longue ni de verrou sur toute la table
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 1000
+
+ORDER_COLUMNS = [
+    ("validated_at", sa.DateTime()),
+    ("paid_at", sa.DateTime()),
+    ("shipped_at", sa.DateTime()),
+    ("delivered_at", sa.DateTime()),
+    ("cancelled_at", sa.DateTime()),
+    ("refunded_at", sa.DateTime()),
+    ("payment_id", postgresql.UUID(as_uuid=True)),
+    ("invoice_id", postgresql.UUID(as_uuid=True)),
+    ("delivery_id", postgresql.UUID(as_uuid=True)),
+]
+
+# Commandes passées par un paiement réussi
+PAID_STATUSES = ("PAYEE", "EXPEDIEE", "LIVREE", "REMBOURSEE")
+
+orders = sa.table(
+    "orders",
+    sa.column("id"),
+    sa.column("status", sa.String),
+    sa.column("created_at", sa.DateTime),
+    sa.column("paid_at", sa.DateTime),
+)
+payments = sa.table(
+    "payments",
+    sa.column("order_id"),
+    sa.column("status", sa.String),
+    sa.column("created_at", sa.DateTime),
+)
+
+
+def _add_missing_columns() -> None:
+    existing = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("orders")}
+    for name, type_ in ORDER_COLUMNS:
+        if name not in existing:
+            op.add_column("orders", sa.Column(name, type_, nullable=True))
+
+
+def _backfill_paid_at() -> None:
+    bind = op.get_bind()
+    paid_on = (
+        sa.select(sa.func.min(payments.c.created_at))
+        .where(payments.c.order_id == orders.c.id, payments.c.status == "SUCCEEDED")
+        .scalar_subquery()
+    )
+    pending = (
+        sa.select(orders.c.id)
+        .where(orders.c.paid_at.is_(None), orders.c.status.in_(PAID_STATUSES))
+        .limit(BACKFILL_BATCH_SIZE)
+    )
+    while True:
+        # Chaque lot dans sa propre transaction (autocommit) : les lignes traitées
+        # sortent du filtre paid_at IS NULL, la requête suivante prend le lot d'après
+        with op.get_context().autocommit_block():
+            ids = [row[0] for row in bind.execute(pending)]
+            if not ids:
+                return
+            bind.execute(
+                orders.update()
+                .where(orders.c.id.in_(ids))
+                .values(paid_at=sa.func.coalesce(paid_on, orders.c.created_at))
+            )
+
+
+def upgrade() -> None:
+    # En mode --sql (pas de connexion), rien à inspecter ni à rattraper
+    if op.get_context().as_sql:
+        return
+    _add_missing_columns()
+    _backfill_paid_at()
+
+
+def downgrade() -> None:
+    # Colonnes et dates conservées : elles faisaient déjà partie du schéma 0001
+    pass
@@ -0,0 +1,79 @@
+"""Unicité (cart_id, product_id) des lignes de panier
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+
+Une seule ligne par produit et par panier : permet l'upsert
+INSERT ... ON CONFLICT (cart_id, product_id) des mutations de panier groupées.
+Les doublons existants sont d'abord fusionnés (quantités additionnées sur la
+ligne la plus ancienne). L'index unique remplace ix_cart_items_cart_id_product_id ;
+sous PostgreSQL il est construit avec CREATE INDEX CONCURRENTLY (voir 0002).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+cart_items = sa.table(
+    "cart_items",
+    sa.column("id"),
+    sa.column("cart_id"),
+    sa.column("product_id"),
+    sa.column("quantity", sa.Integer),
+    sa.column("created_at", sa.DateTime),
+)
+
+
+def _merge_duplicates() -> None:
+    bind = op.get_bind()
+    duplicates = bind.execute(
+        sa.select(cart_items.c.cart_id, cart_items.c.product_id)
+        .group_by(cart_items.c.cart_id, cart_items.c.product_id)
+        .having(sa.func.count() > 1)
+    ).all()
+    for cart_id, product_id in duplicates:
+        rows = bind.execute(
+            sa.select(cart_items.c.id, cart_items.c.quantity)
+            .where(cart_items.c.cart_id == cart_id, cart_items.c.product_id == product_id)
+            .order_by(cart_items.c.created_at, cart_items.c.id)
+        ).all()
+        keep, others = rows[0], rows[1:]
+        bind.execute(
+            cart_items.update()
+            .where(cart_items.c.id == keep.id)
+            .values(quantity=sum(row.quantity for row in rows))
+        )
+        bind.execute(cart_items.delete().where(cart_items.c.id.in_([row.id for row in others])))
+
+
+def upgrade() -> None:
+    if not op.get_context().as_sql:
+        _merge_duplicates()
+    concurrently = op.get_bind().dialect.name == "postgresql"
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "uq_cart_items_cart_id_product_id", "cart_items", ["cart_id", "product_id"],
+            unique=True, if_not_exists=True, postgresql_concurrently=concurrently,
+        )
+        op.drop_index(
+            "ix_cart_items_cart_id_product_id", table_name="cart_items",
+            if_exists=True, postgresql_concurrently=concurrently,
+        )
+
+
+def downgrade() -> None:
+    concurrently = op.get_bind().dialect.name == "postgresql"
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_cart_items_cart_id_product_id", "cart_items", ["cart_id", "product_id"],
+            if_not_exists=True, postgresql_concurrently=concurrently,
+        )
+        op.drop_index(
+            "uq_cart_items_cart_id_product_id", table_name="cart_items",
+            if_exists=True, postgresql_concurrently=concurrently,
+        )
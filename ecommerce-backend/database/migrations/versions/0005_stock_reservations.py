@@ -0,0 +1,49 @@
+"""Réservations de stock à durée limitée (checkout → paiement)
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+
+Table stock_reservations : unités mises de côté pour une commande non payée.
+Table neuve, donc vide : ses index sont créés dans la même transaction.
+Une base créée par create_tables() avec les modèles actuels a déjà la table : rien à faire.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+ACTIVE = {"postgresql_where": sa.text("status = 'ACTIVE'"), "sqlite_where": sa.text("status = 'ACTIVE'")}
+
+
+def _uuid():
+    return postgresql.UUID(as_uuid=True)
+
+
+def upgrade() -> None:
+    if not op.get_context().as_sql and sa.inspect(op.get_bind()).has_table("stock_reservations"):
+        return
+    op.create_table(
+        "stock_reservations",
+        sa.Column("id", _uuid(), primary_key=True),
+        sa.Column("order_id", _uuid(), sa.ForeignKey("orders.id"), nullable=False),
+        sa.Column("product_id", _uuid(), sa.ForeignKey("products.id"), nullable=False),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.Column("status", sa.String(20), nullable=False),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index(
+        "ix_stock_reservations_active_product", "stock_reservations", ["product_id", "expires_at"], **ACTIVE
+    )
+    op.create_index("ix_stock_reservations_active_expires", "stock_reservations", ["expires_at"], **ACTIVE)
+    op.create_index("ix_stock_reservations_order_id", "stock_reservations", ["order_id"])
+
+
+def downgrade() -> None:
+    op.drop_table("stock_reservations")
@@ -0,0 +1,46 @@
+"""Clés d'idempotence de POST /orders/checkout et /orders/{id}/pay
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17
+
+Table idempotency_keys : une ligne par (utilisateur, clé), réponse enregistrée
+pour être rejouée. Table neuve : index créés dans la même transaction.
+Une base créée par create_tables() avec les modèles actuels a déjà la table : rien à faire.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def _uuid():
+    return postgresql.UUID(as_uuid=True)
+
+
+def upgrade() -> None:
+    if not op.get_context().as_sql and sa.inspect(op.get_bind()).has_table("idempotency_keys"):
+        return
+    op.create_table(
+        "idempotency_keys",
+        sa.Column("id", _uuid(), primary_key=True),
+        sa.Column("user_id", _uuid(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("key", sa.String(255), nullable=False),
+        sa.Column("endpoint", sa.String(255), nullable=False),
+        sa.Column("request_hash", sa.String(64), nullable=False),
+        sa.Column("status", sa.String(20), nullable=False),
+        sa.Column("response_status", sa.Integer()),
+        sa.Column("response_body", sa.JSON()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("uq_idempotency_keys_user_id_key", "idempotency_keys", ["user_id", "key"], unique=True)
+    op.create_index("ix_idempotency_keys_created_at", "idempotency_keys", ["created_at"])
+
+
+def downgrade() -> None:
+    op.drop_table("idempotency_keys")
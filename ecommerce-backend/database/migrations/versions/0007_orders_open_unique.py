@@ -0,0 +1,80 @@
+"""Une seule commande ouverte (CREE) par utilisateur
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17
+
+Index unique partiel uq_orders_user_id_open sur orders(user_id) WHERE status = 'CREE' :
+le checkout trouve la commande ouverte par index et deux checkouts simultanés ne
+peuvent plus en créer deux (INSERT ... ON CONFLICT DO NOTHING).
+Les doublons existants sont d'abord résolus : la commande ouverte la plus récente est
+conservée, les autres passent ANNULEE et leurs réservations de stock sont libérées.
+Sous PostgreSQL l'index est construit avec CREATE INDEX CONCURRENTLY (voir 0002).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+OPEN = sa.text("status = 'CREE'")
+
+orders = sa.table(
+    "orders",
+    sa.column("id"),
+    sa.column("user_id"),
+    sa.column("status", sa.String),
+    sa.column("created_at", sa.DateTime),
+)
+stock_reservations = sa.table(
+    "stock_reservations",
+    sa.column("order_id"),
+    sa.column("status", sa.String),
+)
+
+
+def _close_duplicate_open_orders() -> None:
+    bind = op.get_bind()
+    users = bind.execute(
+        sa.select(orders.c.user_id)
+        .where(orders.c.status == "CREE")
+        .group_by(orders.c.user_id)
+        .having(sa.func.count() > 1)
+    ).scalars().all()
+    for user_id in users:
+        ids = bind.execute(
+            sa.select(orders.c.id)
+            .where(orders.c.user_id == user_id, orders.c.status == "CREE")
+            .order_by(orders.c.created_at.desc(), orders.c.id.desc())
+        ).scalars().all()
+        stale = ids[1:]
+        bind.execute(orders.update().where(orders.c.id.in_(stale)).values(status="ANNULEE"))
+        bind.execute(
+            stock_reservations.update()
+            .where(stock_reservations.c.order_id.in_(stale), stock_reservations.c.status == "ACTIVE")
+            .values(status="RELEASED")
+        )
+
+
+def upgrade() -> None:
+    if not op.get_context().as_sql:
+        _close_duplicate_open_orders()
+    concurrently = op.get_bind().dialect.name == "postgresql"
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "uq_orders_user_id_open", "orders", ["user_id"],
+            unique=True, if_not_exists=True, postgresql_concurrently=concurrently,
+            postgresql_where=OPEN, sqlite_where=OPEN,
+        )
+
+
+def downgrade() -> None:
+    concurrently = op.get_bind().dialect.name == "postgresql"
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "uq_orders_user_id_open", table_name="orders",
+            if_exists=True, postgresql_concurrently=concurrently,
+        )
@@ -0,0 +1,54 @@
+"""Outbox des événements du cycle de vie des commandes
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17
+
+Table order_events : un événement par changement de statut d'une commande, écrit
+dans la transaction du changement et diffusé ensuite par le dispatcher.
+Table neuve : index créés dans la même transaction.
+Une base créée par create_tables() avec les modèles actuels a déjà la table : rien à faire.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+DUE = sa.text("status IN ('PENDING', 'DISPATCHING')")
+
+
+def _uuid():
+    return postgresql.UUID(as_uuid=True)
+
+
+def upgrade() -> None:
+    if not op.get_context().as_sql and sa.inspect(op.get_bind()).has_table("order_events"):
+        return
+    op.create_table(
+        "order_events",
+        sa.Column("id", _uuid(), primary_key=True),
+        sa.Column("order_id", _uuid(), sa.ForeignKey("orders.id"), nullable=False),
+        sa.Column("user_id", _uuid(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("event_type", sa.String(50), nullable=False),
+        sa.Column("from_status", sa.String(50)),
+        sa.Column("payload", sa.JSON(), nullable=False),
+        sa.Column("status", sa.String(20), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("next_attempt_at", sa.DateTime(), nullable=False),
+        sa.Column("delivered_to", sa.JSON(), nullable=False),
+        sa.Column("last_error", sa.Text()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("dispatched_at", sa.DateTime()),
+    )
+    op.create_index("ix_order_events_due", "order_events", ["next_attempt_at"],
+                    postgresql_where=DUE, sqlite_where=DUE)
+    op.create_index("ix_order_events_order_id_created_at", "order_events", ["order_id", "created_at"])
+
+
+def downgrade() -> None:
+    op.drop_table("order_events")
@@ -0,0 +1,49 @@
+"""Planificateur de maintenance : suivi des tâches et index de purge
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17
+
+Table maintenance_job_runs : dernière exécution de chaque tâche périodique.
+Index des purges : password_reset_tokens(expires_at) et carts(updated_at), construits
+sous PostgreSQL avec CREATE INDEX CONCURRENTLY (voir 0002) : ces tables sont en
+écriture permanente.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+INDEXES = (
+    ("ix_password_reset_tokens_expires_at", "password_reset_tokens", ["expires_at"]),
+    ("ix_carts_updated_at", "carts", ["updated_at"]),
+)
+
+
+def upgrade() -> None:
+    if op.get_context().as_sql or not sa.inspect(op.get_bind()).has_table("maintenance_job_runs"):
+        op.create_table(
+            "maintenance_job_runs",
+            sa.Column("name", sa.String(100), primary_key=True),
+            sa.Column("last_started_at", sa.DateTime()),
+            sa.Column("last_finished_at", sa.DateTime()),
+            sa.Column("last_duration_ms", sa.Integer()),
+            sa.Column("last_rows", sa.Integer()),
+            sa.Column("last_error", sa.Text()),
+        )
+    concurrently = op.get_bind().dialect.name == "postgresql"
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, if_not_exists=True, postgresql_concurrently=concurrently)
+
+
+def downgrade() -> None:
+    concurrently = op.get_bind().dialect.name == "postgresql"
+    with op.get_context().autocommit_block():
+        for name, table, _ in INDEXES:
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=concurrently)
+    op.drop_table("maintenance_job_runs")
@@ -0,0 +1,57 @@
+"""File d'envoi des emails (email_outbox)
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17
+
+Table email_outbox : emails mis en file par les endpoints et envoyés par le worker
+(services/email_worker.py), avec son index partiel ix_email_outbox_due.
+Une base créée par create_tables() avec des modèles récents a déjà la table : elle
+n'est pas recréée, seul l'index partiel est ajouté s'il manque (CREATE INDEX
+CONCURRENTLY sous PostgreSQL, voir 0002) et l'ancien index complet supprimé.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+DUE = sa.text("status IN ('PENDING', 'SENDING')")
+
+
+def upgrade() -> None:
+    if op.get_context().as_sql or not sa.inspect(op.get_bind()).has_table("email_outbox"):
+        op.create_table(
+            "email_outbox",
+            sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+            sa.Column("to_email", sa.String(255), nullable=False),
+            sa.Column("to_name", sa.String(255)),
+            sa.Column("subject", sa.String(500), nullable=False),
+            sa.Column("html_content", sa.Text(), nullable=False),
+            sa.Column("status", sa.String(20), nullable=False),
+            sa.Column("attempts", sa.Integer(), nullable=False),
+            sa.Column("next_attempt_at", sa.DateTime(), nullable=False),
+            sa.Column("last_error", sa.Text()),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("sent_at", sa.DateTime()),
+        )
+    concurrently = op.get_bind().dialect.name == "postgresql"
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_email_outbox_due", "email_outbox", ["next_attempt_at"],
+            if_not_exists=True, postgresql_concurrently=concurrently,
+            postgresql_where=DUE, sqlite_where=DUE,
+        )
+        # Remplacé par l'index partiel ix_email_outbox_due
+        op.drop_index(
+            "ix_email_outbox_next_attempt_at", table_name="email_outbox",
+            if_exists=True, postgresql_concurrently=concurrently,
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("email_outbox")
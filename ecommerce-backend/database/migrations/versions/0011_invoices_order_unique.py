@@ -0,0 +1,73 @@
+"""Une seule facture par commande
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-17
+
+Index unique uq_invoices_order_id sur invoices(order_id) : la facture est créée par
+INSERT ... ON CONFLICT DO NOTHING, le consommateur invoice_pdf et le premier
+téléchargement du client ne peuvent plus en créer deux pour la même commande.
+Les doublons existants sont d'abord supprimés (la facture la plus ancienne, dont le
+numéro a pu être communiqué au client, est conservée). L'index unique remplace
+ix_invoices_order_id ; sous PostgreSQL il est construit avec CREATE INDEX CONCURRENTLY
+(voir 0002).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0011"
+down_revision = "0010"
+branch_labels = None
+depends_on = None
+
+invoices = sa.table(
+    "invoices",
+    sa.column("id"),
+    sa.column("order_id"),
+    sa.column("created_at", sa.DateTime),
+)
+
+
+def _delete_duplicates() -> None:
+    bind = op.get_bind()
+    orders = bind.execute(
+        sa.select(invoices.c.order_id)
+        .group_by(invoices.c.order_id)
+        .having(sa.func.count() > 1)
+    ).scalars().all()
+    for order_id in orders:
+        ids = bind.execute(
+            sa.select(invoices.c.id)
+            .where(invoices.c.order_id == order_id)
+            .order_by(invoices.c.created_at, invoices.c.id)
+        ).scalars().all()
+        bind.execute(invoices.delete().where(invoices.c.id.in_(ids[1:])))
+
+
+def upgrade() -> None:
+    if not op.get_context().as_sql:
+        _delete_duplicates()
+    concurrently = op.get_bind().dialect.name == "postgresql"
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "uq_invoices_order_id", "invoices", ["order_id"],
+            unique=True, if_not_exists=True, postgresql_concurrently=concurrently,
+        )
+        op.drop_index(
+            "ix_invoices_order_id", table_name="invoices",
+            if_exists=True, postgresql_concurrently=concurrently,
+        )
+
+
+def downgrade() -> None:
+    concurrently = op.get_bind().dialect.name == "postgresql"
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_invoices_order_id", "invoices", ["order_id"],
+            if_not_exists=True, postgresql_concurrently=concurrently,
+        )
+        op.drop_index(
+            "uq_invoices_order_id", table_name="invoices",
+            if_exists=True, postgresql_concurrently=concurrently,
+        )
@@ -0,0 +1,40 @@
+"""Index de purge des emails envoyés
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-17
+
+Index partiel ix_email_outbox_sent sur email_outbox(sent_at) WHERE status = 'SENT' :
+la tâche de maintenance "email_outbox" supprime par lots les emails envoyés depuis
+plus de EMAIL_OUTBOX_RETENTION_DAYS sans parcourir toute la table. Sous PostgreSQL
+il est construit avec CREATE INDEX CONCURRENTLY (voir 0002).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0012"
+down_revision = "0011"
+branch_labels = None
+depends_on = None
+
+SENT = sa.text("status = 'SENT'")
+
+
+def upgrade() -> None:
+    concurrently = op.get_bind().dialect.name == "postgresql"
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_email_outbox_sent", "email_outbox", ["sent_at"],
+            if_not_exists=True, postgresql_concurrently=concurrently,
+            postgresql_where=SENT, sqlite_where=SENT,
+        )
+
+
+def downgrade() -> None:
+    concurrently = op.get_bind().dialect.name == "postgresql"
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_email_outbox_sent", table_name="email_outbox",
+            if_exists=True, postgresql_concurrently=concurrently,
+        )
@@ -17,7 +17,7 @@ pour mettre à jour la base de données.
 """
 
 # ========== IMPORTS ==========
-from sqlalchemy import Column, String, Integer, Boolean, DateTime, Text, ForeignKey, JSON
+from sqlalchemy import Column, String, Integer, Boolean, DateTime, Text, ForeignKey, JSON, Index, text
 from sqlalchemy.orm import declarative_base  # Base pour créer des modèles
 from sqlalchemy.orm import relationship      # Pour définir les relations entre tables
 from sqlalchemy.dialects.postgresql import UUID  # Type UUID pour PostgreSQL
@@ -94,6 +94,10 @@ class Product(Base):
     Chaque ligne = un produit différent (iPhone, AirPods, etc.)
     """
     __tablename__ = "products"
+    # Index partiel : seuls les produits actifs (catalogue public) sont indexés
+    __table_args__ = (
+        Index("ix_products_active", "id", postgresql_where=text("active"), sqlite_where=text("active = 1")),
+    )
     
     # ===== COLONNES =====
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)  # ID unique du produit
@@ -134,6 +138,10 @@ class Cart(Base):
     Le panier contient plusieurs items (produits + quantités).
     """
     __tablename__ = "carts"
+    # Purge des paniers abandonnés : recherche des paniers inactifs depuis CART_ABANDON_DAYS
+    __table_args__ = (
+        Index("ix_carts_updated_at", "updated_at"),
+    )
     
     # ===== COLONNES =====
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -164,6 +172,10 @@ class CartItem(Base):
     Exemple : "3 x iPhone 15" = 1 ligne avec quantity=3
     """
     __tablename__ = "cart_items"
+    # Une ligne par produit et par panier : recherche (panier, produit) et upsert ON CONFLICT
+    __table_args__ = (
+        Index("uq_cart_items_cart_id_product_id", "cart_id", "product_id", unique=True),
+    )
     
     # ===== COLONNES =====
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -204,6 +216,19 @@ class Order(Base):
     - REMBOURSEE : Commande remboursée
     """
     __tablename__ = "orders"
+    # Index des listes de commandes (toutes triées par created_at décroissant) :
+    # "mes commandes", filtre admin par statut, et liste admin complète (pagination keyset).
+    # Au plus une commande ouverte (CREE) par utilisateur : index unique partiel, aussi utilisé par le checkout.
+    __table_args__ = (
+        Index("ix_orders_user_id_created_at", "user_id", "created_at"),
+        Index("ix_orders_status_created_at", "status", "created_at", "id"),
+        Index("ix_orders_created_at_id", "created_at", "id"),
+        Index(
+            "uq_orders_user_id_open", "user_id", unique=True,
+            postgresql_where=text("status = 'CREE'"),
+            sqlite_where=text("status = 'CREE'"),
+        ),
+    )
     
     # ===== COLONNES =====
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -263,6 +288,9 @@ class OrderItem(Base):
     → La commande doit toujours afficher 999€ (prix au moment de l'achat).
     """
     __tablename__ = "order_items"
+    __table_args__ = (
+        Index("ix_order_items_order_id", "order_id"),
+    )
     
     # ===== COLONNES =====
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -315,6 +343,11 @@ class Invoice(Base):
     Une facture = un document PDF téléchargeable par le client.
     """
     __tablename__ = "invoices"
+    # order_id : une seule facture par commande (création ON CONFLICT) ; created_at : export comptable par période
+    __table_args__ = (
+        Index("uq_invoices_order_id", "order_id", unique=True),
+        Index("ix_invoices_created_at", "created_at"),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     order_id = Column(UUID(as_uuid=True), ForeignKey("orders.id"), nullable=False)  # Commande liée
@@ -337,6 +370,9 @@ class Payment(Base):
     On garde uniquement les 4 derniers chiffres (card_last4) pour référence.
     """
     __tablename__ = "payments"
+    __table_args__ = (
+        Index("ix_payments_order_id", "order_id"),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     order_id = Column(UUID(as_uuid=True), ForeignKey("orders.id"), nullable=False)
@@ -368,6 +404,9 @@ class MessageThread(Base):
     Chaque fil peut être lié à une commande spécifique (optionnel).
     """
     __tablename__ = "message_threads"
+    __table_args__ = (
+        Index("ix_message_threads_user_id", "user_id"),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     
@@ -393,6 +432,10 @@ class Message(Base):
     author_user_id = UUID → message envoyé par le client
     """
     __tablename__ = "messages"
+    # Messages d'un fil, dans l'ordre chronologique
+    __table_args__ = (
+        Index("ix_messages_thread_id_created_at", "thread_id", "created_at"),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     thread_id = Column(UUID(as_uuid=True), ForeignKey("message_threads.id"), nullable=False)
@@ -427,6 +470,10 @@ class PasswordResetToken(Base):
     - Le token est unique et impossible à deviner (32 caractères aléatoires)
     """
     __tablename__ = "password_reset_tokens"
+    # Purge des tokens expirés par le planificateur de maintenance (services/maintenance.py)
+    __table_args__ = (
+        Index("ix_password_reset_tokens_expires_at", "expires_at"),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)  # Utilisateur concerné
@@ -441,3 +488,194 @@ class PasswordResetToken(Base):
     
     # Relations
     user = relationship("User")
+
+class EmailOutbox(Base):
+    """
+    File d'attente durable des emails sortants.
+    
+    Les endpoints (inscription, mot de passe oublié) n'appellent plus Brevo
+    directement : ils insèrent une ligne ici, et le worker d'envoi
+    (services/email_worker.py) la traite en arrière-plan.
+    
+    Fonctionnement :
+    - status PENDING et next_attempt_at <= maintenant → prêt à être envoyé
+    - le worker réserve la ligne (SENDING) et repousse next_attempt_at (bail) :
+      si le worker meurt, la ligne redevient éligible à l'expiration du bail
+    - en cas d'échec, attempts augmente et next_attempt_at recule (backoff exponentiel)
+    - envoyé (SENT) : supprimé après EMAIL_OUTBOX_RETENTION_DAYS par la maintenance
+      (le contenu peut contenir un lien de réinitialisation encore valable)
+    """
+    __tablename__ = "email_outbox"
+    # Index partiel : le worker ne cherche que parmi les emails non terminés
+    __table_args__ = (
+        Index(
+            "ix_email_outbox_due",
+            "next_attempt_at",
+            postgresql_where=text("status IN ('PENDING', 'SENDING')"),
+            sqlite_where=text("status IN ('PENDING', 'SENDING')"),
+        ),
+        # Purge des emails envoyés (tâche de maintenance "email_outbox")
+        Index(
+            "ix_email_outbox_sent",
+            "sent_at",
+            postgresql_where=text("status = 'SENT'"),
+            sqlite_where=text("status = 'SENT'"),
+        ),
+    )
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    to_email = Column(String(255), nullable=False)
+    to_name = Column(String(255), nullable=True)
+    subject = Column(String(500), nullable=False)
+    html_content = Column(Text, nullable=False)
+    
+    status = Column(String(20), nullable=False, default="PENDING")  # Voir enums.EmailStatus
+    attempts = Column(Integer, nullable=False, default=0)           # Nombre d'essais effectués
+    next_attempt_at = Column(DateTime, nullable=False, default=utcnow)
+    last_error = Column(Text, nullable=True)
+    
+    created_at = Column(DateTime, default=utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+# ========================================
+# TABLE STOCK_RESERVATIONS - Stock mis de côté
+# ========================================
+class StockReservation(Base):
+    """
+    Réservation temporaire de stock pour une commande non payée.
+    
+    Au checkout, chaque produit de la commande reçoit une réservation ACTIVE
+    jusqu'à expires_at : ces unités ne peuvent plus être vendues à quelqu'un d'autre.
+    Stock disponible d'un produit = stock_qty - réservations ACTIVE non expirées.
+    
+    Fonctionnement :
+    - paiement → CONSUMED (le stock est alors réellement décrémenté)
+    - annulation ou nouveau checkout de la même commande → RELEASED
+    - délai dépassé → ignorée tout de suite, passée en EXPIRED par la tâche
+      "reservations" du planificateur de maintenance (services/maintenance.py)
+    """
+    __tablename__ = "stock_reservations"
+    # Index partiels : seules les réservations ACTIVE sont lues (calcul du disponible, balayage)
+    __table_args__ = (
+        Index(
+            "ix_stock_reservations_active_product",
+            "product_id", "expires_at",
+            postgresql_where=text("status = 'ACTIVE'"),
+            sqlite_where=text("status = 'ACTIVE'"),
+        ),
+        Index(
+            "ix_stock_reservations_active_expires",
+            "expires_at",
+            postgresql_where=text("status = 'ACTIVE'"),
+            sqlite_where=text("status = 'ACTIVE'"),
+        ),
+        Index("ix_stock_reservations_order_id", "order_id"),
+    )
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    order_id = Column(UUID(as_uuid=True), ForeignKey("orders.id"), nullable=False)
+    product_id = Column(UUID(as_uuid=True), ForeignKey("products.id"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    
+    status = Column(String(20), nullable=False, default="ACTIVE")  # Voir enums.ReservationStatus
+    expires_at = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, default=utcnow)
+
+# ========================================
+# TABLE IDEMPOTENCY_KEYS - Requêtes déjà traitées
+# ========================================
+class IdempotencyKey(Base):
+    """
+    Clés d'idempotence (en-tête Idempotency-Key) de POST /orders/checkout et /orders/{id}/pay.
+    
+    Une ligne par (utilisateur, clé), garantie par un index unique : deux requêtes
+    simultanées avec la même clé ne peuvent pas être traitées toutes les deux.
+    La réponse est enregistrée dans la même transaction que l'effet de la requête,
+    puis rejouée telle quelle aux requêtes répétées.
+    """
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        Index("uq_idempotency_keys_user_id_key", "user_id", "key", unique=True),
+        Index("ix_idempotency_keys_created_at", "created_at"),
+    )
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    key = Column(String(255), nullable=False)
+    endpoint = Column(String(255), nullable=False)       # Ex: "POST /orders/checkout"
+    request_hash = Column(String(64), nullable=False)    # HMAC-SHA256 du corps : même clé, autre requête → refus
+    
+    status = Column(String(20), nullable=False, default="IN_PROGRESS")  # Voir enums.IdempotencyStatus
+    response_status = Column(Integer, nullable=True)
+    response_body = Column(JSON, nullable=True)
+    
+    created_at = Column(DateTime, default=utcnow)  # Début du traitement (bail des requêtes IN_PROGRESS)
+
+# ========================================
+# TABLE ORDER_EVENTS - Outbox du cycle de vie des commandes
+# ========================================
+class OrderEvent(Base):
+    """
+    Événements du cycle de vie des commandes (outbox transactionnelle).
+    
+    Chaque changement de statut (paiement, validation, expédition, livraison,
+    annulation, remboursement) insère une ligne ici dans la MÊME transaction :
+    pas de statut changé sans événement, ni d'événement sans statut changé.
+    Les effets de bord (PDF de facture, emails, statistiques, invalidation du cache
+    catalogue) sont exécutés ensuite par lots par le dispatcher
+    (services/order_event_dispatcher.py), hors de la requête.
+    
+    Fonctionnement (comme email_outbox) :
+    - status PENDING et next_attempt_at <= maintenant → prêt à être diffusé
+    - le dispatcher réserve la ligne (DISPATCHING) et repousse next_attempt_at (bail)
+    - delivered_to liste les consommateurs déjà passés : un nouvel essai ne rejoue
+      que ceux qui ont échoué
+    """
+    __tablename__ = "order_events"
+    __table_args__ = (
+        # Index partiel : le dispatcher ne cherche que parmi les événements non terminés
+        Index(
+            "ix_order_events_due",
+            "next_attempt_at",
+            postgresql_where=text("status IN ('PENDING', 'DISPATCHING')"),
+            sqlite_where=text("status IN ('PENDING', 'DISPATCHING')"),
+        ),
+        Index("ix_order_events_order_id_created_at", "order_id", "created_at"),
+    )
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    order_id = Column(UUID(as_uuid=True), ForeignKey("orders.id"), nullable=False)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    event_type = Column(String(50), nullable=False)     # Nouveau statut de la commande (enums.OrderStatus)
+    from_status = Column(String(50), nullable=True)     # Statut précédent
+    payload = Column(JSON, nullable=False, default=dict)  # Ex: {"amount_cents": 1999, "stock_changed": true}
+    
+    status = Column(String(20), nullable=False, default="PENDING")  # Voir enums.OrderEventStatus
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=utcnow)
+    delivered_to = Column(JSON, nullable=False, default=list)  # Consommateurs ayant traité l'événement
+    last_error = Column(Text, nullable=True)
+    
+    created_at = Column(DateTime, default=utcnow)
+    dispatched_at = Column(DateTime, nullable=True)
+
+# ========================================
+# TABLE MAINTENANCE_JOB_RUNS - Dernière exécution des tâches de maintenance
+# ========================================
+class MaintenanceJobRun(Base):
+    """
+    Dernière exécution de chaque tâche périodique du planificateur de maintenance
+    (services/maintenance.py) : une ligne par tâche.
+    
+    Tous les workers font tourner le planificateur ; un verrou consultatif PostgreSQL
+    par tâche élit celui qui l'exécute, et last_started_at évite qu'un autre worker
+    la relance avant la fin de son intervalle.
+    """
+    __tablename__ = "maintenance_job_runs"
+    
+    name = Column(String(100), primary_key=True)         # Ex: "reset_tokens"
+    last_started_at = Column(DateTime, nullable=True)
+    last_finished_at = Column(DateTime, nullable=True)
+    last_duration_ms = Column(Integer, nullable=True)
+    last_rows = Column(Integer, nullable=True)           # Lignes traitées par la dernière exécution
+    last_error = Column(Text, nullable=True)             # None si la dernière exécution a réussi
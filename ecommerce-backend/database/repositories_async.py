@@ -0,0 +1,102 @@
+"""
+Repositories asynchrones (AsyncSession) des endpoints de lecture les plus sollicités.
+
+Pendant des repositories de repositories_simple.py pour les endpoints `async def` :
+l'attente de PostgreSQL ne bloque aucun thread du threadpool AnyIO.
+Une AsyncSession ne charge rien à la demande : toute relation lue par l'appelant
+est chargée explicitement (selectinload / joinedload).
+"""
+
+from typing import Any, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+
+from .models import Cart, Order, Product, User
+from .repositories_simple import _cart_lines_select, _uuid_or_raw
+
+
+class AsyncPostgreSQLUserRepository:
+    """Lecture des utilisateurs."""
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_by_id(self, user_id: str) -> Optional[User]:
+        """Récupère un utilisateur par ID"""
+        uid = _uuid_or_raw(user_id)
+        result = await self.db.execute(select(User).where(User.id == uid))
+        return result.scalars().first()
+
+
+class AsyncPostgreSQLProductRepository:
+    """Lecture du catalogue."""
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_by_id(self, product_id: str) -> Optional[Product]:
+        """Récupère un produit par ID"""
+        pid = _uuid_or_raw(product_id)
+        result = await self.db.execute(select(Product).where(Product.id == pid))
+        return result.scalars().first()
+
+    async def get_all_active(self) -> List[Product]:
+        """Récupère tous les produits actifs"""
+        result = await self.db.execute(select(Product).where(Product.active == True))  # noqa: E712
+        return list(result.scalars().all())
+
+
+class AsyncPostgreSQLCartRepository:
+    """Lecture du panier d'un utilisateur."""
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_by_user_id(self, user_id: str) -> Optional[Cart]:
+        """Récupère le panier d'un utilisateur avec ses articles"""
+        if user_id == "":
+            return None
+        uid = _uuid_or_raw(user_id)
+        result = await self.db.execute(
+            select(Cart).options(selectinload(Cart.items)).where(Cart.user_id == uid)
+        )
+        return result.scalars().first()
+
+    async def get_lines_with_products(self, user_id: str) -> List[Any]:
+        """Lignes du panier avec prix, nom, stock et statut du produit, en une seule requête (JOIN)."""
+        if user_id == "":
+            return []
+        result = await self.db.execute(_cart_lines_select(user_id))
+        return list(result.all())
+
+
+class AsyncPostgreSQLOrderRepository:
+    """Lecture des commandes d'un utilisateur."""
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_by_id_with_delivery(self, order_id: str) -> Optional[Order]:
+        """Récupère une commande et sa livraison (jointure)"""
+        if not order_id:
+            return None
+        oid = _uuid_or_raw(order_id)
+        result = await self.db.execute(
+            select(Order).options(joinedload(Order.delivery)).where(Order.id == oid)
+        )
+        return result.scalars().first()
+
+    async def get_by_user_id_with_details(self, user_id: str) -> List[Order]:
+        """Récupère les commandes d'un utilisateur avec items et livraisons.
+
+        Même coût fixe que la version synchrone : commandes + livraisons en jointure,
+        puis une requête pour tous les items.
+        """
+        if user_id == "":
+            return []
+        uid = _uuid_or_raw(user_id)
+        result = await self.db.execute(
+            select(Order)
+            .options(selectinload(Order.items), joinedload(Order.delivery))
+            .where(Order.user_id == uid)
+            .order_by(Order.created_at.desc())
+        )
+        return list(result.unique().scalars().all())
@@ -7,15 +7,18 @@ avec signatures simples et retours typés.
 """
 
 import uuid
-from typing import List, Optional, Dict, Any
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from typing import List, Optional, Dict, Any, Tuple
+from sqlalchemy.orm import Session, selectinload, joinedload
+from sqlalchemy import and_, or_, tuple_, insert, update, case, func, select, Select, text
 from .models import (
     User, Product, Cart, CartItem, Order, OrderItem, 
-    Delivery, Invoice, Payment, MessageThread, Message
+    Delivery, Invoice, Payment, MessageThread, Message, EmailOutbox, StockReservation, IdempotencyKey,
+    OrderEvent, MaintenanceJobRun,
 )
-from enums import OrderStatus, DeliveryStatus
-from datetime import datetime
+from enums import (
+    OrderStatus, DeliveryStatus, EmailStatus, ReservationStatus, IdempotencyStatus, OrderEventStatus,
+)
+from datetime import datetime, timedelta, UTC
 
 def _parse_uuid(value: Any) -> Optional[uuid.UUID]:
     """Retourne un UUID si possible, sinon None sans lever d'exception."""
@@ -31,6 +34,30 @@ def _uuid_or_raw(value: Any) -> Any:
     parsed = _parse_uuid(value)
     return parsed if parsed is not None else value
 
+def _dialect_insert(db: Session, model: Any):
+    """INSERT propre au dialecte (PostgreSQL, SQLite en test) pour ON CONFLICT."""
+    if db.get_bind().dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    return dialect_insert(model)
+
+def _cart_lines_select(user_id: Any) -> Select:
+    """Lignes du panier d'un utilisateur jointes à leur produit (une requête, partagée sync/async).
+
+    Colonnes : product_id, quantity, name, price_cents, stock_qty, active.
+    """
+    return (
+        select(
+            CartItem.product_id, CartItem.quantity,
+            Product.name, Product.price_cents, Product.stock_qty, Product.active,
+        )
+        .join(Cart, Cart.id == CartItem.cart_id)
+        .join(Product, Product.id == CartItem.product_id)
+        .where(Cart.user_id == _uuid_or_raw(user_id))
+        .order_by(CartItem.created_at, CartItem.product_id)
+    )
+
 class PostgreSQLUserRepository:
     """Accès aux utilisateurs (CRUD et requêtes de base)."""
     def __init__(self, db: Session):
@@ -112,6 +139,68 @@ class PostgreSQLProductRepository:
         """Récupère tous les produits actifs"""
         return self.db.query(Product).filter(Product.active == True).all()
     
+    def get_many_for_update(self, product_ids: List[str]) -> List[Product]:
+        """Récupère plusieurs produits en une requête (IN) et verrouille leurs lignes.
+        
+        Les lignes sont verrouillées (SELECT ... FOR UPDATE) dans l'ordre des id :
+        deux transactions concurrentes prennent donc les verrous dans le même ordre,
+        ce qui évite les interblocages. Les verrous sont libérés au commit/rollback.
+        """
+        pids = {_uuid_or_raw(pid) for pid in product_ids}
+        if not pids:
+            return []
+        return (
+            self.db.query(Product)
+            .filter(Product.id.in_(pids))
+            .order_by(Product.id)
+            .with_for_update()
+            .all()
+        )
+    
+    def decrement_stock_many(self, quantities: Dict[str, int], hide_threshold: int = 0) -> List[str]:
+        """Décrémente le stock de plusieurs produits de façon atomique (sans commit).
+        
+        Un UPDATE conditionnel par produit (``stock_qty >= quantité``), exécuté dans
+        l'ordre des id pour des verrous cohérents entre transactions concurrentes.
+        Le produit est désactivé dans la même requête si le stock restant passe
+        sous ``hide_threshold``. Retourne les id des produits non décrémentés
+        (stock insuffisant ou produit absent) ; l'appelant doit alors annuler.
+        """
+        failed: List[str] = []
+        for pid in sorted(quantities, key=str):
+            qty = int(quantities[pid])
+            remaining = Product.stock_qty - qty
+            result = self.db.execute(
+                update(Product)
+                .where(Product.id == _uuid_or_raw(pid), Product.stock_qty >= qty)
+                .values(
+                    stock_qty=remaining,
+                    active=case((remaining <= hide_threshold, False), else_=Product.active),
+                )
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount != 1:
+                failed.append(str(pid))
+        return failed
+    
+    def increment_stock_many(self, quantities: Dict[str, int]) -> None:
+        """Remet en stock plusieurs produits (sans commit), dans l'ordre des id.
+        
+        Un produit masqué faute de stock redevient actif s'il repasse au-dessus de zéro.
+        """
+        for pid in sorted(quantities, key=str):
+            qty = int(quantities[pid])
+            restocked = Product.stock_qty + qty
+            self.db.execute(
+                update(Product)
+                .where(Product.id == _uuid_or_raw(pid))
+                .values(
+                    stock_qty=restocked,
+                    active=case((restocked > 0, True), else_=Product.active),
+                )
+                .execution_options(synchronize_session=False)
+            )
+    
     def update(self, product: Product) -> Product:
         """Met à jour un produit"""
         self.db.commit()
@@ -130,6 +219,7 @@ class PostgreSQLProductRepository:
             from database.models import CartItem, OrderItem
             pid = _uuid_or_raw(product_id)
             self.db.query(CartItem).filter(CartItem.product_id == pid).delete()
+            self.db.query(StockReservation).filter(StockReservation.product_id == pid).delete()
             
             # Supprimer tous les éléments de commande associés à ce produit
             # (les commandes sont des archives, donc on supprime les références)
@@ -175,6 +265,12 @@ class PostgreSQLCartRepository:
         uid = _uuid_or_raw(user_id)
         return self.db.query(Cart).filter(Cart.user_id == uid).first()
     
+    def get_lines_with_products(self, user_id: str) -> List[Any]:
+        """Lignes du panier avec prix, nom, stock et statut du produit, en une seule requête (JOIN)."""
+        if user_id == "":
+            return []
+        return list(self.db.execute(_cart_lines_select(user_id)).all())
+    
     def create_cart(self, user_id: str) -> Cart:
         """Crée un panier pour un utilisateur"""
         uid = _uuid_or_raw(user_id)
@@ -204,6 +300,7 @@ class PostgreSQLCartRepository:
                 CartItem.product_id == pid
             )
         ).first()
+        cart.updated_at = datetime.now(UTC)  # Activité du panier (purge des paniers abandonnés)
         if existing_item:
             existing_item.quantity += quantity
             self.db.commit()
@@ -237,6 +334,7 @@ class PostgreSQLCartRepository:
             if not cart_item:
                 return False
             
+            cart.updated_at = datetime.now(UTC)
             if quantity == 0:
                 # Supprimer complètement l'article
                 self.db.delete(cart_item)
@@ -273,6 +371,92 @@ class PostgreSQLCartRepository:
     def clear(self, user_id: str) -> bool:
         """Alias pour clear_cart"""
         return self.clear_cart(user_id)
+    
+    def clear_items(self, user_id: str) -> int:
+        """Vide le panier en une requête, dans la transaction courante (sans commit)."""
+        uid = _uuid_or_raw(user_id)
+        cart_ids = self.db.query(Cart.id).filter(Cart.user_id == uid).scalar_subquery()
+        return (
+            self.db.query(CartItem)
+            .filter(CartItem.cart_id.in_(cart_ids))
+            .delete(synchronize_session=False)
+        )
+
+    def get_or_create_for_update(self, user_id: str) -> Cart:
+        """Récupère (ou crée) le panier et verrouille sa ligne, sans commit.
+
+        Les mutations concurrentes d'un même panier sont ainsi sérialisées.
+        Création par INSERT ... ON CONFLICT DO NOTHING (carts.user_id est unique) :
+        deux premières requêtes simultanées ne créent pas deux paniers.
+        Le panier est verrouillé pour être modifié : updated_at est rafraîchi
+        (les paniers inactifs sont purgés par la maintenance).
+        """
+        uid = _uuid_or_raw(user_id)
+        self.db.execute(
+            _dialect_insert(self.db, Cart)
+            .values(user_id=uid)
+            .on_conflict_do_nothing(index_elements=[Cart.user_id])
+        )
+        cart = self.db.query(Cart).filter(Cart.user_id == uid).with_for_update().one()
+        cart.updated_at = datetime.now(UTC)  # type: ignore
+        return cart
+
+    def get_quantities(self, cart_id: Any) -> Dict[str, int]:
+        """Quantités du panier, indexées par id de produit (str)."""
+        rows = self.db.query(CartItem.product_id, CartItem.quantity).filter(CartItem.cart_id == cart_id).all()
+        return {str(product_id): int(quantity) for product_id, quantity in rows}
+
+    def upsert_items(self, cart_id: Any, quantities: Dict[str, int]) -> None:
+        """Fixe la quantité de plusieurs lignes en un seul INSERT ... ON CONFLICT DO UPDATE (sans commit)."""
+        if not quantities:
+            return
+        now = datetime.now(UTC)
+        stmt = _dialect_insert(self.db, CartItem).values([
+            {"id": uuid.uuid4(), "cart_id": cart_id, "product_id": _uuid_or_raw(pid), "quantity": qty, "created_at": now}
+            for pid, qty in sorted(quantities.items())
+        ])
+        self.db.execute(stmt.on_conflict_do_update(
+            index_elements=[CartItem.cart_id, CartItem.product_id],
+            set_={"quantity": stmt.excluded.quantity},
+        ))
+
+    def delete_items(self, cart_id: Any, product_ids: List[str]) -> int:
+        """Supprime plusieurs lignes du panier en une requête (sans commit)."""
+        if not product_ids:
+            return 0
+        return (
+            self.db.query(CartItem)
+            .filter(CartItem.cart_id == cart_id, CartItem.product_id.in_([_uuid_or_raw(pid) for pid in product_ids]))
+            .delete(synchronize_session=False)
+        )
+
+    def purge_abandoned(
+        self, idle_before: datetime, limit: int, cursor: Optional[Tuple[datetime, uuid.UUID]] = None
+    ) -> Tuple[int, Optional[Tuple[datetime, uuid.UUID]]]:
+        """Supprime jusqu'à `limit` paniers inactifs depuis `idle_before`, avec leurs lignes (sans commit).
+        
+        Pagination keyset sur (updated_at, id) : chaque lot reprend après le dernier panier
+        vu, sans reparcourir ceux qui ont été sautés. Sélection FOR UPDATE SKIP LOCKED :
+        un panier en cours de modification (verrouillé par get_or_create_for_update)
+        n'est pas touché. Le panier d'un utilisateur qui revient est recréé à la demande.
+        Retourne (paniers supprimés, curseur du lot suivant ou None sur le dernier lot).
+        """
+        query = self.db.query(Cart.id, Cart.updated_at).filter(Cart.updated_at < idle_before)
+        if cursor is not None:
+            query = query.filter(tuple_(Cart.updated_at, Cart.id) > tuple_(cursor[0], cursor[1]))
+        rows = (
+            query.order_by(Cart.updated_at, Cart.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        if not rows:
+            return 0, None
+        ids = [row.id for row in rows]
+        self.db.query(CartItem).filter(CartItem.cart_id.in_(ids)).delete(synchronize_session=False)
+        self.db.query(Cart).filter(Cart.id.in_(ids)).delete(synchronize_session=False)
+        next_cursor = (rows[-1].updated_at, rows[-1].id) if len(rows) == limit else None
+        return len(ids), next_cursor
 
 class PostgreSQLOrderRepository:
     """Gestion des commandes et de leur cycle de vie (statuts, items)."""
@@ -317,6 +501,11 @@ class PostgreSQLOrderRepository:
         oid = _uuid_or_raw(order_id)
         return self.db.query(Order).filter(Order.id == oid).first()
     
+    def get_by_id_for_update(self, order_id: str) -> Optional[Order]:
+        """Récupère une commande et verrouille sa ligne (SELECT ... FOR UPDATE)."""
+        oid = _uuid_or_raw(order_id)
+        return self.db.query(Order).filter(Order.id == oid).with_for_update().first()
+    
     def get_by_user_id(self, user_id: str) -> List[Order]:
         """Récupère les commandes d'un utilisateur"""
         if user_id == "":
@@ -324,10 +513,79 @@ class PostgreSQLOrderRepository:
         uid = _uuid_or_raw(user_id)
         return self.db.query(Order).filter(Order.user_id == uid).all()
     
+    def get_by_id_with_details(self, order_id: str) -> Optional[Order]:
+        """Récupère une commande avec ses items et sa livraison (sans requêtes paresseuses)"""
+        if not order_id:
+            return None
+        oid = _uuid_or_raw(order_id)
+        return (
+            self.db.query(Order)
+            .options(selectinload(Order.items), joinedload(Order.delivery))
+            .filter(Order.id == oid)
+            .first()
+        )
+    
+    def get_by_user_id_with_details(self, user_id: str) -> List[Order]:
+        """Récupère les commandes d'un utilisateur avec items et livraisons.
+        
+        Coût fixe : 1 requête pour les commandes (+ livraison en jointure)
+        et 1 requête pour tous les items, quel que soit le nombre de commandes.
+        """
+        if user_id == "":
+            return []
+        uid = _uuid_or_raw(user_id)
+        return (
+            self.db.query(Order)
+            .options(selectinload(Order.items), joinedload(Order.delivery))
+            .filter(Order.user_id == uid)
+            .order_by(Order.created_at.desc())
+            .all()
+        )
+    
     def get_all(self) -> List[Order]:
         """Récupère toutes les commandes"""
         return self.db.query(Order).all()
     
+    def list_page(
+        self,
+        limit: int = 50,
+        cursor: Optional[Tuple[datetime, uuid.UUID]] = None,
+        status: Optional[str] = None,
+        user_id: Optional[str] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+    ) -> Tuple[List[Order], Optional[Tuple[datetime, uuid.UUID]]]:
+        """Récupère une page de commandes (pagination keyset sur created_at, id).
+        
+        Les filtres sont appliqués en SQL et les items/livraisons sont chargés
+        en un nombre fixe de requêtes (selectinload), quelle que soit la taille de la page.
+        Retourne (commandes, curseur_suivant) ; le curseur vaut None sur la dernière page.
+        """
+        query = self.db.query(Order).options(
+            selectinload(Order.items),
+            selectinload(Order.delivery),
+        )
+        if status:
+            query = query.filter(Order.status == status)
+        if user_id:
+            query = query.filter(Order.user_id == _uuid_or_raw(user_id))
+        if created_from is not None:
+            query = query.filter(Order.created_at >= created_from)
+        if created_to is not None:
+            query = query.filter(Order.created_at < created_to)
+        if cursor is not None:
+            # Tri décroissant : on reprend strictement après la dernière ligne vue
+            query = query.filter(tuple_(Order.created_at, Order.id) < tuple_(cursor[0], cursor[1]))
+        
+        # Une ligne de plus que demandé pour savoir s'il existe une page suivante
+        orders = query.order_by(Order.created_at.desc(), Order.id.desc()).limit(limit + 1).all()
+        next_cursor = None
+        if len(orders) > limit:
+            orders = orders[:limit]
+            last = orders[-1]
+            next_cursor = (last.created_at, last.id)
+        return orders, next_cursor
+    
     def update_status(self, order_id: str, status: OrderStatus) -> bool:
         """Met à jour le statut d'une commande"""
         order = self.get_by_id(order_id)
@@ -393,6 +651,110 @@ class PostgreSQLOrderRepository:
         
         return order
     
+    def get_open_order(self, user_id: str, for_update: bool = False) -> Optional[Order]:
+        """Commande ouverte (CREE) de l'utilisateur : au plus une (index unique partiel uq_orders_user_id_open)."""
+        if user_id == "":
+            return None
+        query = self.db.query(Order).filter(
+            Order.user_id == _uuid_or_raw(user_id), Order.status == OrderStatus.CREE.value
+        )
+        if for_update:
+            query = query.with_for_update()
+        return query.first()
+    
+    def get_or_create_open_order(self, user_id: str) -> Order:
+        """Commande ouverte de l'utilisateur, créée au besoin, verrouillée jusqu'à la fin
+        de la transaction (sans commit).
+        
+        Deux checkouts simultanés ne peuvent pas créer deux commandes ouvertes :
+        l'INSERT ... ON CONFLICT DO NOTHING s'appuie sur l'index unique partiel,
+        le perdant relit la commande créée par l'autre.
+        """
+        order = self.get_open_order(user_id, for_update=True)
+        if order is not None:
+            return order
+        self.db.execute(
+            _dialect_insert(self.db, Order)
+            .values(id=uuid.uuid4(), user_id=_uuid_or_raw(user_id), status=OrderStatus.CREE.value)
+            .on_conflict_do_nothing(
+                index_elements=["user_id"], index_where=text(f"status = '{OrderStatus.CREE.value}'")
+            )
+        )
+        return self.get_open_order(user_id, for_update=True)
+    
+    def sync_items(self, order_id: str, items: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Resynchronise les lignes d'une commande avec `items` par différence (sans commit).
+        
+        Une ligne par produit : les lignes inchangées ne sont pas réécrites, les autres
+        partent en au plus trois requêtes (UPDATE groupé par clé primaire, DELETE, INSERT groupé).
+        Retourne le nombre de lignes insérées, modifiées et supprimées.
+        """
+        oid = _uuid_or_raw(order_id)
+        existing: Dict[str, OrderItem] = {}
+        to_delete = []
+        for line in self.db.query(OrderItem).filter(OrderItem.order_id == oid):
+            if str(line.product_id) in existing:
+                to_delete.append(line.id)  # doublon hérité : une seule ligne par produit
+            else:
+                existing[str(line.product_id)] = line
+        
+        to_insert, to_update = [], []
+        for item in items:
+            values = {
+                "name": item["name"],
+                "unit_price_cents": item["unit_price_cents"],
+                "quantity": item["quantity"],
+            }
+            line = existing.pop(str(item["product_id"]), None)
+            if line is None:
+                to_insert.append({"order_id": oid, "product_id": _uuid_or_raw(item["product_id"]), **values})
+            elif any(getattr(line, column) != value for column, value in values.items()):
+                to_update.append({"id": line.id, **values})
+        to_delete.extend(line.id for line in existing.values())
+        
+        if to_update:
+            self.db.execute(update(OrderItem), to_update)
+        if to_delete:
+            self.db.query(OrderItem).filter(OrderItem.id.in_(to_delete)).delete(synchronize_session=False)
+        if to_insert:
+            self.db.execute(insert(OrderItem), to_insert)
+        return {"inserted": len(to_insert), "updated": len(to_update), "deleted": len(to_delete)}
+    
+    def lock_stale_open_orders(
+        self, created_before: datetime, limit: int, cursor: Optional[Tuple[datetime, uuid.UUID]] = None
+    ) -> Tuple[List[Order], Optional[Tuple[datetime, uuid.UUID]]]:
+        """Commandes ouvertes (CREE) créées avant `created_before`, verrouillées (sans commit).
+        
+        Une commande dont une réservation de stock est encore valable est en cours de
+        paiement : elle est ignorée. FOR UPDATE SKIP LOCKED : une commande verrouillée
+        par un checkout ou un paiement en cours n'est pas attendue.
+        Pagination keyset sur (created_at, id), le long de ix_orders_status_created_at :
+        les commandes ignorées ne sont pas relues à chaque lot.
+        Retourne (commandes, curseur du lot suivant ou None sur le dernier lot).
+        """
+        holding = (
+            select(StockReservation.id)
+            .where(
+                StockReservation.order_id == Order.id,
+                StockReservation.status == ReservationStatus.ACTIVE.value,
+                StockReservation.expires_at > datetime.now(UTC),
+            )
+            .exists()
+        )
+        query = self.db.query(Order).filter(
+            Order.status == OrderStatus.CREE.value, Order.created_at < created_before, ~holding
+        )
+        if cursor is not None:
+            query = query.filter(tuple_(Order.created_at, Order.id) > tuple_(cursor[0], cursor[1]))
+        orders = (
+            query.order_by(Order.created_at, Order.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        next_cursor = (orders[-1].created_at, orders[-1].id) if len(orders) == limit else None
+        return orders, next_cursor
+    
     def add_item(self, item_data: Dict[str, Any]) -> OrderItem:
         """Ajoute un article à une commande"""
         oid = _uuid_or_raw(item_data.get("order_id"))
@@ -474,6 +836,24 @@ class PostgreSQLInvoiceRepository:
         """Récupère une facture par ID de commande"""
         oid = _uuid_or_raw(order_id)
         return self.db.query(Invoice).filter(Invoice.order_id == oid).first()
+    
+    def get_or_create_for_order(self, order_id: str, user_id: str, total_cents: int) -> Invoice:
+        """Retourne la facture de la commande, créée si besoin (commit immédiat).
+        
+        INSERT ... ON CONFLICT DO NOTHING sur order_id (index unique) puis relecture :
+        deux créations simultanées (consommateur invoice_pdf, premier téléchargement)
+        aboutissent à la même facture.
+        """
+        self.db.execute(
+            _dialect_insert(self.db, Invoice)
+            .values(
+                id=uuid.uuid4(), order_id=_uuid_or_raw(order_id), user_id=_uuid_or_raw(user_id),
+                total_cents=total_cents, created_at=datetime.now(UTC),
+            )
+            .on_conflict_do_nothing(index_elements=[Invoice.order_id])
+        )
+        self.db.commit()
+        return self.get_by_order_id(order_id)
 
 class PostgreSQLPaymentRepository:
     """Gestion des paiements (création et requêtes par commande)."""
@@ -488,6 +868,13 @@ class PostgreSQLPaymentRepository:
         self.db.refresh(payment)
         return payment
     
+    def add(self, payment_data: Dict[str, Any]) -> Payment:
+        """Ajoute un paiement dans la transaction courante (flush, sans commit)."""
+        payment = Payment(**payment_data)
+        self.db.add(payment)
+        self.db.flush()
+        return payment
+    
     def get_by_id(self, payment_id: str) -> Optional[Payment]:
         """Récupère un paiement par ID"""
         pid = _uuid_or_raw(payment_id)
@@ -579,3 +966,462 @@ class PostgreSQLThreadRepository:
         if getattr(message, "id", None) is None:
             setattr(message, "id", "message123")
         return message
+
+
+class PostgreSQLStockReservationRepository:
+    """Réservations de stock à durée limitée (table stock_reservations), sans commit.
+    
+    Une réservation compte tant qu'elle est ACTIVE et que expires_at n'est pas passé :
+    une réservation expirée est ignorée immédiatement, même avant le passage du balayeur.
+    """
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def held_quantities(self, product_ids: List[str], exclude_order_id: Optional[str] = None) -> Dict[str, int]:
+        """Unités réservées par produit (une requête GROUP BY), hors réservations de `exclude_order_id`."""
+        pids = {_uuid_or_raw(pid) for pid in product_ids}
+        if not pids:
+            return {}
+        query = (
+            self.db.query(StockReservation.product_id, func.sum(StockReservation.quantity))
+            .filter(
+                StockReservation.status == ReservationStatus.ACTIVE.value,
+                StockReservation.expires_at > datetime.now(UTC),
+                StockReservation.product_id.in_(pids),
+            )
+        )
+        if exclude_order_id is not None:
+            query = query.filter(StockReservation.order_id != _uuid_or_raw(exclude_order_id))
+        return {str(pid): int(total or 0) for pid, total in query.group_by(StockReservation.product_id).all()}
+    
+    def _set_status_for_order(self, order_id: str, status: str) -> int:
+        return (
+            self.db.query(StockReservation)
+            .filter(
+                StockReservation.order_id == _uuid_or_raw(order_id),
+                StockReservation.status == ReservationStatus.ACTIVE.value,
+            )
+            .update({"status": status}, synchronize_session=False)
+        )
+    
+    def hold_for_order(self, order_id: str, quantities: Dict[str, int], ttl_seconds: float) -> datetime:
+        """Remplace les réservations de la commande par une par produit, valables `ttl_seconds`.
+        
+        Les anciennes réservations ACTIVE de la commande sont libérées (checkout rejoué).
+        Retourne l'échéance commune des nouvelles réservations.
+        """
+        self._set_status_for_order(order_id, ReservationStatus.RELEASED.value)
+        now = datetime.now(UTC)
+        expires_at = now + timedelta(seconds=ttl_seconds)
+        rows = [
+            {
+                "id": uuid.uuid4(),
+                "order_id": _uuid_or_raw(order_id),
+                "product_id": _uuid_or_raw(pid),
+                "quantity": int(qty),
+                "status": ReservationStatus.ACTIVE.value,
+                "expires_at": expires_at,
+                "created_at": now,
+            }
+            for pid, qty in sorted(quantities.items(), key=lambda kv: str(kv[0]))
+            if int(qty) > 0
+        ]
+        if rows:
+            self.db.execute(insert(StockReservation), rows)
+        return expires_at
+    
+    def consume_for_order(self, order_id: str) -> int:
+        """Convertit les réservations de la commande en vente (paiement)."""
+        return self._set_status_for_order(order_id, ReservationStatus.CONSUMED.value)
+    
+    def release_for_order(self, order_id: str) -> int:
+        """Libère les réservations de la commande (annulation)."""
+        return self._set_status_for_order(order_id, ReservationStatus.RELEASED.value)
+    
+    def expire_batch(self, limit: int) -> int:
+        """Passe en EXPIRED jusqu'à `limit` réservations échues. Retourne leur nombre.
+        
+        Sélection FOR UPDATE SKIP LOCKED : plusieurs balayeurs peuvent tourner en
+        parallèle sans se bloquer ni traiter deux fois la même réservation.
+        """
+        ids = [
+            row.id for row in
+            self.db.query(StockReservation.id)
+            .filter(
+                StockReservation.status == ReservationStatus.ACTIVE.value,
+                StockReservation.expires_at <= datetime.now(UTC),
+            )
+            .order_by(StockReservation.expires_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .all()
+        ]
+        if not ids:
+            return 0
+        self.db.query(StockReservation).filter(StockReservation.id.in_(ids)).update(
+            {"status": ReservationStatus.EXPIRED.value}, synchronize_session=False
+        )
+        return len(ids)
+
+class PostgreSQLIdempotencyKeyRepository:
+    """Clés d'idempotence des requêtes d'écriture (table idempotency_keys)."""
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def claim(self, user_id: str, key: str, endpoint: str, request_hash: str,
+              lock_seconds: float, attempts: int = 3) -> Tuple[bool, Optional[IdempotencyKey]]:
+        """Réserve la clé pour traiter la requête (commit immédiat : visible des requêtes concurrentes).
+        
+        INSERT ... ON CONFLICT DO NOTHING sur (user_id, key) : une seule requête gagne.
+        Retourne (True, None) si la requête doit être traitée, sinon (False, ligne existante).
+        Une clé IN_PROGRESS dont le traitement a commencé il y a plus de `lock_seconds`
+        (processus arrêté en cours de route) peut être reprise par une requête identique.
+        Une clé supprimée entre l'INSERT et sa lecture (release, purge) est réservée à
+        nouveau ; (False, None) si elle disparaît encore après `attempts` essais.
+        """
+        uid = _uuid_or_raw(user_id)
+        for _ in range(attempts):
+            now = datetime.now(UTC)
+            inserted = self.db.execute(
+                _dialect_insert(self.db, IdempotencyKey)
+                .values(
+                    id=uuid.uuid4(), user_id=uid, key=key, endpoint=endpoint, request_hash=request_hash,
+                    status=IdempotencyStatus.IN_PROGRESS.value, created_at=now,
+                )
+                .on_conflict_do_nothing(index_elements=[IdempotencyKey.user_id, IdempotencyKey.key])
+            ).rowcount
+            if inserted == 1:
+                self.db.commit()
+                return True, None
+            
+            existing = (
+                self.db.query(IdempotencyKey)
+                .filter(IdempotencyKey.user_id == uid, IdempotencyKey.key == key)
+                .first()
+            )
+            if existing is not None:
+                break
+            self.db.commit()
+        else:
+            return False, None
+        stale = (
+            existing.status == IdempotencyStatus.IN_PROGRESS.value
+            and existing.endpoint == endpoint
+            and existing.request_hash == request_hash
+            and existing.created_at <= (now - timedelta(seconds=lock_seconds)).replace(tzinfo=None)
+        )
+        if stale:
+            # Reprise d'un bail expiré : compare-and-set sur created_at, un seul preneur
+            taken = (
+                self.db.query(IdempotencyKey)
+                .filter(IdempotencyKey.id == existing.id, IdempotencyKey.created_at == existing.created_at)
+                .update({"created_at": now}, synchronize_session=False)
+            )
+            if taken == 1:
+                self.db.commit()
+                return True, None
+        self.db.commit()
+        return False, existing
+    
+    def complete(self, user_id: str, key: str, response_status: int, response_body: Any) -> None:
+        """Enregistre la réponse (sans commit : validée avec l'effet de la requête)."""
+        self.db.query(IdempotencyKey).filter(
+            IdempotencyKey.user_id == _uuid_or_raw(user_id), IdempotencyKey.key == key
+        ).update(
+            {
+                "status": IdempotencyStatus.COMPLETED.value,
+                "response_status": response_status,
+                "response_body": response_body,
+            },
+            synchronize_session=False,
+        )
+    
+    def release(self, user_id: str, key: str) -> None:
+        """Supprime une clé non aboutie (échec du traitement) : le client peut réessayer."""
+        self.db.query(IdempotencyKey).filter(
+            IdempotencyKey.user_id == _uuid_or_raw(user_id),
+            IdempotencyKey.key == key,
+            IdempotencyKey.status == IdempotencyStatus.IN_PROGRESS.value,
+        ).delete(synchronize_session=False)
+        self.db.commit()
+    
+    def purge_older_than(self, created_before: datetime, limit: int) -> int:
+        """Supprime jusqu'à `limit` clés créées avant `created_before` (sans commit). Retourne leur nombre.
+        
+        Passée la rétention, un nouvel essai avec la même clé est traité comme une
+        nouvelle requête. Sélection FOR UPDATE SKIP LOCKED : une clé en cours de
+        reprise n'est pas touchée.
+        """
+        ids = [
+            row.id for row in
+            self.db.query(IdempotencyKey.id)
+            .filter(IdempotencyKey.created_at < created_before.replace(tzinfo=None))
+            .order_by(IdempotencyKey.created_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .all()
+        ]
+        if not ids:
+            return 0
+        self.db.query(IdempotencyKey).filter(IdempotencyKey.id.in_(ids)).delete(synchronize_session=False)
+        return len(ids)
+
+class PostgreSQLEmailOutboxRepository:
+    """File d'attente durable des emails sortants (table email_outbox)."""
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def enqueue(self, to_email: str, subject: str, html_content: str, to_name: Optional[str] = None) -> EmailOutbox:
+        """Ajoute un email à la file (commit immédiat : l'envoi se fait en arrière-plan)"""
+        email = EmailOutbox(
+            to_email=to_email,
+            to_name=to_name,
+            subject=subject,
+            html_content=html_content,
+            status=EmailStatus.PENDING.value,
+            attempts=0,
+            next_attempt_at=datetime.now(UTC),
+        )
+        self.db.add(email)
+        self.db.commit()
+        return email
+    
+    def claim_batch(self, limit: int, lease_seconds: float) -> List[EmailOutbox]:
+        """Réserve jusqu'à `limit` emails prêts à partir et les passe en SENDING.
+        
+        FOR UPDATE SKIP LOCKED : plusieurs workers peuvent tourner en parallèle sans
+        se bloquer ni réserver deux fois le même email. Un email SENDING dont le bail
+        (next_attempt_at) a expiré redevient éligible (worker arrêté en cours d'envoi).
+        """
+        now = datetime.now(UTC)
+        emails = (
+            self.db.query(EmailOutbox)
+            .filter(
+                EmailOutbox.status.in_([EmailStatus.PENDING.value, EmailStatus.SENDING.value]),
+                EmailOutbox.next_attempt_at <= now,
+            )
+            .order_by(EmailOutbox.next_attempt_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        lease_until = now + timedelta(seconds=lease_seconds)
+        for email in emails:
+            email.status = EmailStatus.SENDING.value  # type: ignore
+            email.attempts = (email.attempts or 0) + 1  # type: ignore
+            email.next_attempt_at = lease_until  # type: ignore
+        self.db.commit()
+        return emails
+
+    def extend_lease(self, email_ids: List[Any], lease_seconds: float) -> None:
+        """Prolonge le bail d'emails encore en cours d'envoi (SENDING).
+
+        Appelé périodiquement par le worker pendant l'envoi d'un lot : tant que le
+        bail court, aucun autre worker ne peut réserver (et renvoyer) ces emails.
+        """
+        if not email_ids:
+            return
+        self.db.query(EmailOutbox).filter(
+            EmailOutbox.id.in_([_uuid_or_raw(i) for i in email_ids]),
+            EmailOutbox.status == EmailStatus.SENDING.value,
+        ).update(
+            {"next_attempt_at": datetime.now(UTC) + timedelta(seconds=lease_seconds)},
+            synchronize_session=False,
+        )
+        self.db.commit()
+
+    def mark_sent(self, email_ids: List[Any]) -> None:
+        """Marque des emails comme envoyés"""
+        if not email_ids:
+            return
+        self.db.query(EmailOutbox).filter(EmailOutbox.id.in_([_uuid_or_raw(i) for i in email_ids])).update(
+            {"status": EmailStatus.SENT.value, "sent_at": datetime.now(UTC), "last_error": None},
+            synchronize_session=False,
+        )
+        self.db.commit()
+    
+    def mark_failed(self, email_id: Any, error: str, retry_at: Optional[datetime]) -> None:
+        """Reprogramme un email (retry_at) ou l'abandonne définitivement (retry_at=None)"""
+        values: Dict[str, Any] = {"last_error": error[:2000]}
+        if retry_at is None:
+            values["status"] = EmailStatus.FAILED.value
+        else:
+            values["status"] = EmailStatus.PENDING.value
+            values["next_attempt_at"] = retry_at
+        self.db.query(EmailOutbox).filter(EmailOutbox.id == _uuid_or_raw(email_id)).update(
+            values, synchronize_session=False
+        )
+        self.db.commit()
+    
+    def purge_sent_older_than(self, sent_before: datetime, limit: int) -> int:
+        """Supprime jusqu'à `limit` emails envoyés avant `sent_before` (sans commit). Retourne leur nombre.
+        
+        Le contenu d'un email envoyé peut contenir un lien de réinitialisation encore
+        valable : il n'est pas conservé au-delà de la rétention. Sélection FOR UPDATE
+        SKIP LOCKED, par l'index partiel ix_email_outbox_sent.
+        """
+        ids = [
+            row.id for row in
+            self.db.query(EmailOutbox.id)
+            .filter(
+                EmailOutbox.status == EmailStatus.SENT.value,
+                EmailOutbox.sent_at < sent_before.replace(tzinfo=None),
+            )
+            .order_by(EmailOutbox.sent_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .all()
+        ]
+        if not ids:
+            return 0
+        self.db.query(EmailOutbox).filter(EmailOutbox.id.in_(ids)).delete(synchronize_session=False)
+        return len(ids)
+    
+    def count_by_status(self) -> Dict[str, int]:
+        """Nombre d'emails par statut (supervision de la file)"""
+        rows = self.db.query(EmailOutbox.status, func.count(EmailOutbox.id)).group_by(EmailOutbox.status).all()
+        return {str(status): int(count) for status, count in rows}
+
+class PostgreSQLOrderEventRepository:
+    """Outbox des événements de commande (table order_events)."""
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def append(self, order: Order, from_status: Optional[str], payload: Optional[Dict[str, Any]] = None) -> OrderEvent:
+        """Enregistre le passage de `order` à son statut actuel (sans commit).
+        
+        Doit être appelé avant le commit qui valide le changement de statut :
+        l'événement est écrit dans la même transaction.
+        """
+        now = datetime.now(UTC)
+        event = OrderEvent(
+            order_id=order.id,
+            user_id=order.user_id,
+            event_type=str(getattr(order.status, "value", order.status)),
+            from_status=str(getattr(from_status, "value", from_status)) if from_status is not None else None,
+            payload=payload or {},
+            status=OrderEventStatus.PENDING.value,
+            attempts=0,
+            next_attempt_at=now,
+            delivered_to=[],
+            created_at=now,
+        )
+        self.db.add(event)
+        return event
+    
+    def claim_batch(self, limit: int, lease_seconds: float) -> List[OrderEvent]:
+        """Réserve jusqu'à `limit` événements prêts, dans l'ordre d'écriture, et les passe en DISPATCHING.
+        
+        FOR UPDATE SKIP LOCKED : plusieurs dispatchers peuvent tourner en parallèle sans
+        réserver deux fois le même événement. Un événement DISPATCHING dont le bail a
+        expiré redevient éligible (dispatcher arrêté en cours de traitement).
+        """
+        now = datetime.now(UTC)
+        events = (
+            self.db.query(OrderEvent)
+            .filter(
+                OrderEvent.status.in_([OrderEventStatus.PENDING.value, OrderEventStatus.DISPATCHING.value]),
+                OrderEvent.next_attempt_at <= now,
+            )
+            .order_by(OrderEvent.next_attempt_at, OrderEvent.created_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        lease_until = now + timedelta(seconds=lease_seconds)
+        for event in events:
+            event.status = OrderEventStatus.DISPATCHING.value  # type: ignore
+            event.attempts = (event.attempts or 0) + 1  # type: ignore
+            event.next_attempt_at = lease_until  # type: ignore
+        self.db.commit()
+        return events
+    
+    def mark_done(self, event_ids: List[Any], delivered_to: List[str]) -> None:
+        """Marque des événements comme traités par tous les consommateurs"""
+        if not event_ids:
+            return
+        self.db.query(OrderEvent).filter(OrderEvent.id.in_([_uuid_or_raw(i) for i in event_ids])).update(
+            {
+                "status": OrderEventStatus.DONE.value,
+                "delivered_to": delivered_to,
+                "dispatched_at": datetime.now(UTC),
+                "last_error": None,
+            },
+            synchronize_session=False,
+        )
+        self.db.commit()
+    
+    def mark_failed(self, event_id: Any, delivered_to: List[str], error: str, retry_at: Optional[datetime]) -> None:
+        """Reprogramme un événement (retry_at) ou l'abandonne définitivement (retry_at=None).
+        
+        delivered_to garde les consommateurs déjà passés : ils ne seront pas rejoués.
+        """
+        values: Dict[str, Any] = {"delivered_to": delivered_to, "last_error": error[:2000]}
+        if retry_at is None:
+            values["status"] = OrderEventStatus.FAILED.value
+        else:
+            values["status"] = OrderEventStatus.PENDING.value
+            values["next_attempt_at"] = retry_at
+        self.db.query(OrderEvent).filter(OrderEvent.id == _uuid_or_raw(event_id)).update(
+            values, synchronize_session=False
+        )
+        self.db.commit()
+    
+    def list_for_order(self, order_id: str) -> List[OrderEvent]:
+        """Historique des événements d'une commande, du plus ancien au plus récent"""
+        return (
+            self.db.query(OrderEvent)
+            .filter(OrderEvent.order_id == _uuid_or_raw(order_id))
+            .order_by(OrderEvent.created_at)
+            .all()
+        )
+    
+    def count_by_status(self) -> Dict[str, int]:
+        """Nombre d'événements par statut (supervision de l'outbox)"""
+        rows = self.db.query(OrderEvent.status, func.count(OrderEvent.id)).group_by(OrderEvent.status).all()
+        return {str(status): int(count) for status, count in rows}
+
+class PostgreSQLMaintenanceJobRunRepository:
+    """Suivi des exécutions des tâches de maintenance (table maintenance_job_runs)."""
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def start_if_due(self, name: str, interval_seconds: float, force: bool = False) -> bool:
+        """Note le début d'une exécution si la précédente date d'au moins `interval_seconds`.
+        
+        UPDATE conditionnel sur la ligne de la tâche : un seul worker gagne par
+        intervalle, même si plusieurs planificateurs se réveillent en même temps.
+        `force` ignore l'intervalle (lancement manuel). Commit immédiat.
+        """
+        now = datetime.now(UTC)
+        self.db.execute(
+            _dialect_insert(self.db, MaintenanceJobRun)
+            .values(name=name)
+            .on_conflict_do_nothing(index_elements=[MaintenanceJobRun.name])
+        )
+        query = self.db.query(MaintenanceJobRun).filter(MaintenanceJobRun.name == name)
+        if not force:
+            query = query.filter(or_(
+                MaintenanceJobRun.last_started_at.is_(None),
+                MaintenanceJobRun.last_started_at <= now - timedelta(seconds=interval_seconds),
+            ))
+        started = query.update({"last_started_at": now}, synchronize_session=False)
+        self.db.commit()
+        return started == 1
+    
+    def mark_finished(self, name: str, duration_ms: int, rows: int, error: Optional[str]) -> None:
+        """Enregistre le résultat de l'exécution en cours (error=None : succès)"""
+        self.db.query(MaintenanceJobRun).filter(MaintenanceJobRun.name == name).update(
+            {
+                "last_finished_at": datetime.now(UTC),
+                "last_duration_ms": duration_ms,
+                "last_rows": rows,
+                "last_error": error[:2000] if error else None,
+            },
+            synchronize_session=False,
+        )
+        self.db.commit()
+    
+    def list_all(self) -> List[MaintenanceJobRun]:
+        """Dernière exécution de chaque tâche, par nom"""
+        return self.db.query(MaintenanceJobRun).order_by(MaintenanceJobRun.name).all()
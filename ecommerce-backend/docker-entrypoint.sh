@@ -27,27 +27,14 @@ do
   sleep 2
 done
 
-# Exécuter les migrations si nécessaire
-echo "📋 Vérification des migrations..."
-python -c "
-import psycopg2
-import os
-try:
-    conn = psycopg2.connect(os.getenv('DATABASE_URL'))
-    cursor = conn.cursor()
-    cursor.execute('SELECT COUNT(*) FROM information_schema.tables WHERE table_schema = \\'public\\';')
-    table_count = cursor.fetchone()[0]
-    if table_count == 0:
-        print('📋 Création des tables...')
-        # Ici vous pourriez exécuter des migrations
-        print('✅ Tables créées!')
-    else:
-        print(f'✅ {table_count} tables trouvées!')
-    conn.close()
-except Exception as e:
-    print(f'❌ Erreur migrations: {e}')
-    exit(1)
-"
+# Migrations Alembic : une seule fois ici, avant que uvicorn ne lance ses workers
+echo "📋 Application des migrations..."
+python -m database.migrate
+
+# Métriques Prometheus partagées entre les workers uvicorn (répertoire vidé à chaque démarrage)
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus_multiproc}"
+rm -rf "${PROMETHEUS_MULTIPROC_DIR}"
+mkdir -p "${PROMETHEUS_MULTIPROC_DIR}"
 
 # Démarrer l'application
 echo "🚀 Démarrage du serveur FastAPI..."
@@ -90,3 +90,61 @@ class MessageThreadStatus(str, Enum):
     OPEN = "OPEN"        # Fil ouvert (conversation active)
     CLOSED = "CLOSED"    # Fil fermé (problème résolu)
     PENDING = "PENDING"  # En attente de réponse
+
+# ========================================
+# STATUTS DES EMAILS EN FILE D'ATTENTE
+# ========================================
+class EmailStatus(str, Enum):
+    """
+    Énumération des statuts d'un email de la file d'envoi (table email_outbox).
+    
+    Cycle de vie : PENDING → SENDING → SENT
+    En cas d'erreur : SENDING → PENDING (nouvel essai plus tard) → ... → FAILED
+    """
+    PENDING = "PENDING"  # En attente d'envoi (ou de nouvel essai)
+    SENDING = "SENDING"  # Réservé par un worker (bail jusqu'à next_attempt_at)
+    SENT = "SENT"        # Accepté par le fournisseur (Brevo)
+    FAILED = "FAILED"    # Abandonné après le nombre maximal d'essais
+
+# ========================================
+# STATUTS DES RÉSERVATIONS DE STOCK
+# ========================================
+class ReservationStatus(str, Enum):
+    """
+    Énumération des statuts d'une réservation de stock (table stock_reservations).
+    
+    Cycle de vie : ACTIVE → CONSUMED (paiement)
+    Sinon : ACTIVE → RELEASED (annulation, nouveau checkout) ou EXPIRED (délai dépassé)
+    """
+    ACTIVE = "ACTIVE"      # Unités mises de côté pour une commande jusqu'à expires_at
+    CONSUMED = "CONSUMED"  # Converties en vente au paiement (stock décrémenté)
+    RELEASED = "RELEASED"  # Libérées avant paiement (commande annulée ou resynchronisée)
+    EXPIRED = "EXPIRED"    # Délai dépassé sans paiement (passées par la maintenance)
+
+# ========================================
+# STATUTS DES CLÉS D'IDEMPOTENCE
+# ========================================
+class IdempotencyStatus(str, Enum):
+    """
+    Énumération des statuts d'une clé d'idempotence (table idempotency_keys).
+    
+    Cycle de vie : IN_PROGRESS → COMPLETED (réponse enregistrée, rejouée ensuite)
+    En cas d'erreur la clé est supprimée : le client peut réessayer avec la même clé.
+    """
+    IN_PROGRESS = "IN_PROGRESS"  # Requête en cours de traitement (les doublons reçoivent 409)
+    COMPLETED = "COMPLETED"      # Traitée : la réponse enregistrée est renvoyée aux doublons
+
+# ========================================
+# STATUTS DES ÉVÉNEMENTS DE COMMANDE
+# ========================================
+class OrderEventStatus(str, Enum):
+    """
+    Énumération des statuts d'un événement de commande (table order_events).
+    
+    Cycle de vie : PENDING → DISPATCHING → DONE
+    En cas d'erreur d'un consommateur : DISPATCHING → PENDING (nouvel essai plus tard) → ... → FAILED
+    """
+    PENDING = "PENDING"          # Écrit avec le changement de statut, en attente de diffusion
+    DISPATCHING = "DISPATCHING"  # Réservé par un dispatcher (bail jusqu'à next_attempt_at)
+    DONE = "DONE"                # Traité par tous les consommateurs
+    FAILED = "FAILED"            # Abandonné après le nombre maximal d'essais
@@ -5,7 +5,8 @@ Script d'initialisation de la base de données
 
 import os
 import sys
-from database.database import create_tables, engine
+from database.database import engine
+from database.migrate import run_migrations
 from database.models import Base
 from database.repositories_simple import PostgreSQLUserRepository, PostgreSQLProductRepository
 from services.auth_service import AuthService
@@ -15,10 +16,10 @@ def init_database():
     """Initialise la base de données avec les tables et données de base"""
     print("🚀 Initialisation de la base de données...")
     
-    # Créer toutes les tables
-    print("📋 Création des tables...")
-    create_tables()
-    print("✅ Tables créées avec succès")
+    # Créer / mettre à jour les tables (migrations Alembic)
+    print("📋 Application des migrations...")
+    run_migrations(engine)
+    print("✅ Schéma à jour")
     
     # Créer une session
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
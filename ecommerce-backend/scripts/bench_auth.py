@@ -0,0 +1,76 @@
+"""
+Microbenchmark de la chaîne d'authentification (current_user_id → current_user).
+
+Compare, pour un même token :
+- "froid"  : caches vidés avant chaque appel (décodage JWT + SELECT users)
+- "chaud"  : claims JWT et utilisateur servis depuis les caches
+
+Utilisation (dans le dossier ecommerce-backend, base accessible via DATABASE_URL):
+  python -m scripts.bench_auth
+  python -m scripts.bench_auth --iterations 5000 --email client@example.com
+"""
+
+import argparse
+import statistics
+import time
+
+import api
+from database.database import SessionLocal
+from database.models import User
+
+
+def _measure(fn, iterations: int) -> list[float]:
+    """Exécute `fn` `iterations` fois et retourne les durées en microsecondes."""
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1_000_000)
+    return samples
+
+
+def _report(label: str, samples: list[float]) -> None:
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{label:<8} médiane {statistics.median(samples):9.1f} µs   p95 {p95:9.1f} µs   ({len(samples)} appels)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la dépendance current_user")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--email", help="Utilisateur à authentifier (défaut: premier utilisateur en base)")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        query = db.query(User)
+        user = query.filter(User.email == args.email).first() if args.email else query.first()
+        if not user:
+            print("❌ Aucun utilisateur en base : lancez d'abord init_db.py ou créez un compte")
+            return
+        token = api._token_auth_service.create_access_token({"sub": str(user.id)})
+        authorization = f"Bearer {token}"
+
+        def chain():
+            api.current_user(authorization, db)
+
+        def cold():
+            api._claims_cache.clear()
+            api.user_cache.invalidate_all()
+            chain()
+            db.expunge_all()
+
+        def warm():
+            chain()
+            db.expunge_all()
+
+        chain()  # préchauffage (connexion, imports)
+        _report("froid", _measure(cold, args.iterations))
+        chain()
+        _report("chaud", _measure(warm, args.iterations))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Serveur HTTP bouchon imitant l'endpoint Brevo POST /v3/smtp/email.
+
+Sert aux tests et au développement du worker email sans appeler Brevo :
+les emails reçus sont gardés en mémoire et consultables via GET /messages.
+
+Utilisation (dans le dossier ecommerce-backend):
+  python -m scripts.email_stub_server --port 8025 --latency 0.2 --fail-rate 0.1
+  export BREVO_API_URL=http://localhost:8025/v3/smtp/email BREVO_API_KEY=stub
+
+Depuis un test :
+  server = EmailStubServer(fail_first=1)
+  server.start()
+  ... server.url, server.requests ...
+  server.stop()
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+
+class EmailStubServer:
+    """Bouchon Brevo configurable (latence, taux d'échec, premiers appels en échec)."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 fail_rate: float = 0.0, fail_first: int = 0, fail_status: int = 503):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.requests: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v3/smtp/email"
+
+    @property
+    def messages(self) -> List[Dict[str, Any]]:
+        """Emails individuels reçus (un par destinataire / messageVersion)."""
+        out: List[Dict[str, Any]] = []
+        with self._lock:
+            for body in self.requests:
+                for version in body.get("messageVersions") or [body]:
+                    for to in version.get("to", []):
+                        out.append({"to": to["email"], "subject": version.get("subject", body.get("subject"))})
+        return out
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            if self.fail_first > 0:
+                self.fail_first -= 1
+                return True
+        return random.random() < self.fail_rate
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):  # silencieux
+                pass
+
+            def _reply(self, status: int, body: Dict[str, Any]) -> None:
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path == "/messages":
+                    self._reply(200, {"messages": stub.messages})
+                else:
+                    self._reply(404, {"message": "not found"})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", "0"))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if stub.latency:
+                    time.sleep(stub.latency)
+                if not self.headers.get("api-key"):
+                    self._reply(401, {"message": "Key not found"})
+                    return
+                if stub._should_fail():
+                    self._reply(stub.fail_status, {"message": "stub failure"})
+                    return
+                with stub._lock:
+                    stub.requests.append(body)
+                    count = len(stub.requests)
+                self._reply(201, {"messageId": f"<stub-{count}@localhost>"})
+
+        return Handler
+
+    def start(self) -> "EmailStubServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bouchon de l'API Brevo pour les tests")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--latency", type=float, default=0.0, help="Latence ajoutée par appel (s)")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Proportion d'appels en échec (0-1)")
+    parser.add_argument("--fail-status", type=int, default=503)
+    args = parser.parse_args()
+
+    server = EmailStubServer(host="0.0.0.0", port=args.port, latency=args.latency,
+                             fail_rate=args.fail_rate, fail_status=args.fail_status)
+    print(f"📭 Bouchon Brevo en écoute sur {server.url} (GET /messages pour consulter)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Script: lance le worker d'envoi des emails en file (table email_outbox) hors de l'API.
+
+Utilisation (dans le dossier ecommerce-backend):
+  python -m scripts.email_worker            # boucle infinie (Ctrl+C pour arrêter)
+  python -m scripts.email_worker --once     # traite ce qui est prêt puis s'arrête
+
+Plusieurs instances peuvent tourner en parallèle (réservation FOR UPDATE SKIP LOCKED).
+Penser à mettre EMAIL_WORKER_IN_PROCESS=0 côté API si l'envoi est confié à ce script.
+"""
+
+import argparse
+
+from services.email_worker import EmailOutboxWorker
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker d'envoi des emails en file")
+    parser.add_argument("--once", action="store_true", help="Vider la file une fois puis quitter")
+    parser.add_argument("--concurrency", type=int, help="Appels HTTP simultanés (défaut: EMAIL_WORKER_CONCURRENCY)")
+    args = parser.parse_args()
+
+    worker = EmailOutboxWorker(concurrency=args.concurrency)
+    try:
+        if args.once:
+            total = 0
+            while True:
+                processed = worker.run_once()
+                total += processed
+                if processed == 0:
+                    break
+            print(f"✅ {total} email(s) traité(s) — {worker.stats()}")
+        else:
+            print(f"📬 Worker email démarré (concurrence={worker.concurrency}, lot={worker.batch_size})")
+            worker.run_forever()
+    except KeyboardInterrupt:
+        print("Arrêt du worker email")
+    finally:
+        worker.stop()
+
+
+if __name__ == "__main__":
+    main()
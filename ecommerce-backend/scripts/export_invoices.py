@@ -0,0 +1,51 @@
+"""
+Script: exporte les factures d'une période pour la comptabilité.
+
+Utilisation (dans le dossier ecommerce-backend):
+  python -m scripts.export_invoices --start 2026-09-01 --end 2026-09-30                 # ZIP de PDF
+  python -m scripts.export_invoices --start 2026-09-01 --end 2026-09-30 --format csv    # grand livre
+  python -m scripts.export_invoices --start 2026-09-01 --end 2026-09-30 --format jsonl -o -
+
+Le fichier est écrit au fil de l'eau : la mémoire utilisée ne dépend pas du nombre de factures.
+"""
+
+import argparse
+import sys
+from datetime import date
+
+from services.invoice_export import InvoiceExporter, EXPORT_FORMATS
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export en masse des factures")
+    parser.add_argument("--start", type=date.fromisoformat, required=True, help="Premier jour inclus (AAAA-MM-JJ)")
+    parser.add_argument("--end", type=date.fromisoformat, required=True, help="Dernier jour inclus (AAAA-MM-JJ)")
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="zip")
+    parser.add_argument("-o", "--output", help="Fichier de sortie (défaut: factures_<début>_<fin>.<ext>, '-' = stdout)")
+    parser.add_argument("--workers", type=int, help="Processus de rendu PDF (défaut: INVOICE_EXPORT_WORKERS)")
+    parser.add_argument("--batch-size", type=int, help="Factures lues par lot (défaut: INVOICE_EXPORT_BATCH_SIZE)")
+    args = parser.parse_args()
+
+    if args.end < args.start:
+        parser.error("--end doit être postérieure à --start")
+
+    exporter = InvoiceExporter(batch_size=args.batch_size, workers=args.workers)
+    chunks = exporter.stream(args.format, args.start, args.end)
+
+    if args.output == "-":
+        for chunk in chunks:
+            sys.stdout.buffer.write(chunk)
+        sys.stdout.buffer.flush()
+        return
+
+    output = args.output or f"factures_{args.start}_{args.end}.{EXPORT_FORMATS[args.format][1]}"
+    written = 0
+    with open(output, "wb") as f:
+        for chunk in chunks:
+            f.write(chunk)
+            written += len(chunk)
+    print(f"✅ Export {args.format} écrit dans {output} ({written} octets)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Test de charge des endpoints de lecture : version async contre version sync.
+
+Des clients virtuels en boucle fermée (chacun enchaîne ses requêtes) appellent
+GET /products, /cart, /orders et /orders/{id}/tracking. Pour chaque niveau de
+concurrence on mesure le débit (requêtes réussies / s) et les percentiles de latence,
+puis on retient le meilleur débit dont le p99 reste sous --p99-ms.
+
+Utilisation (dans le dossier ecommerce-backend, même base et même nombre de workers) :
+  ASYNC_READ_ENDPOINTS=1 uvicorn api:app --port 8000 --workers 1   # version async (défaut)
+  ASYNC_READ_ENDPOINTS=0 uvicorn api:app --port 8001 --workers 1   # référence sync
+  python -m scripts.load_test_reads --url http://localhost:8000 --baseline-url http://localhost:8001
+  python -m scripts.load_test_reads --url http://localhost:8000 --concurrency 16,64,256 --p99-ms 100
+
+Le générateur de charge consomme lui aussi du CPU : le lancer sur une autre machine
+(ou un autre cœur) pour que la mesure porte sur l'API.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import httpx
+
+
+def _percentile(sorted_samples: List[float], fraction: float) -> float:
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, max(0, int(len(sorted_samples) * fraction) - 1))
+    return sorted_samples[index]
+
+
+async def _login(client: httpx.AsyncClient, email: Optional[str], password: str) -> str:
+    """Token d'un utilisateur existant, sinon d'un compte créé pour le test."""
+    if email:
+        response = await client.post("/auth/login", json={"email": email, "password": password})
+    else:
+        response = await client.post("/auth/register", json={
+            "email": f"loadtest_{uuid.uuid4().hex[:10]}@example.com",
+            "password": password,
+            "first_name": "Charge",
+            "last_name": "Test",
+            "address": "1 rue du Test, 75001 Paris",
+        })
+    response.raise_for_status()
+    return response.json()["token"]
+
+
+async def _run_level(url: str, paths: List[str], headers: Dict[str, str], concurrency: int, duration: float) -> Dict[str, float]:
+    """Charge `url` avec `concurrency` clients pendant `duration` secondes."""
+    latencies: List[float] = []
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, headers=headers, limits=limits, timeout=30.0) as client:
+        deadline = time.perf_counter() + duration
+
+        async def user(offset: int) -> None:
+            nonlocal errors
+            i = offset
+            while time.perf_counter() < deadline:
+                path = paths[i % len(paths)]
+                i += 1
+                start = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                    ok = response.status_code < 500
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user(n) for n in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": _percentile(latencies, 0.50) * 1000,
+        "p99_ms": _percentile(latencies, 0.99) * 1000,
+        "mean_ms": (statistics.fmean(latencies) * 1000) if latencies else 0.0,
+        "errors": errors,
+    }
+
+
+async def _benchmark(label: str, url: str, args: argparse.Namespace) -> List[Dict[str, float]]:
+    async with httpx.AsyncClient(base_url=url, timeout=30.0) as client:
+        token = args.token or await _login(client, args.email, args.password)
+    headers = {"Authorization": f"Bearer {token}"}
+    paths = ["/products", "/cart", "/orders"]
+    if args.order_id:
+        paths.append(f"/orders/{args.order_id}/tracking")
+
+    print(f"\n== {label} ({url}) ==")
+    print(f"{'clients':>8} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'moy. ms':>9} {'erreurs':>8}")
+    results = []
+    for concurrency in args.concurrency:
+        await _run_level(url, paths, headers, concurrency, min(2.0, args.duration))  # préchauffage
+        result = await _run_level(url, paths, headers, concurrency, args.duration)
+        results.append(result)
+        print(f"{concurrency:>8} {result['rps']:>9.1f} {result['p50_ms']:>9.1f} {result['p99_ms']:>9.1f} "
+              f"{result['mean_ms']:>9.1f} {result['errors']:>8}")
+    return results
+
+
+def _best_under_target(results: List[Dict[str, float]], p99_ms: float) -> Optional[Dict[str, float]]:
+    eligible = [r for r in results if r["p99_ms"] <= p99_ms and r["errors"] == 0]
+    return max(eligible, key=lambda r: r["rps"]) if eligible else None
+
+
+def _describe(best: Optional[Dict[str, float]]) -> str:
+    if best is None:
+        return "aucun niveau sous l'objectif"
+    return f"{best['rps']:.1f} req/s ({best['concurrency']} clients, p99 {best['p99_ms']:.1f} ms)"
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    measured = {"async": await _benchmark("Endpoints testés", args.url, args)}
+    if args.baseline_url:
+        measured["sync"] = await _benchmark("Référence", args.baseline_url, args)
+
+    print(f"\nMeilleur débit avec p99 <= {args.p99_ms:.0f} ms :")
+    best = {label: _best_under_target(results, args.p99_ms) for label, results in measured.items()}
+    for label, result in best.items():
+        print(f"  {label:<6} {_describe(result)}")
+    if best.get("async") and best.get("sync"):
+        print(f"  gain   x{best['async']['rps'] / best['sync']['rps']:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge des endpoints de lecture (async vs sync)")
+    parser.add_argument("--url", default="http://localhost:8000", help="API à mesurer")
+    parser.add_argument("--baseline-url", help="API de référence (ASYNC_READ_ENDPOINTS=0)")
+    parser.add_argument("--concurrency", default="8,16,32,64,128,256",
+                        type=lambda value: [int(v) for v in value.split(",") if v])
+    parser.add_argument("--duration", type=float, default=15.0, help="Durée de chaque palier (secondes)")
+    parser.add_argument("--p99-ms", type=float, default=200.0, help="Objectif de latence p99")
+    parser.add_argument("--token", help="JWT à utiliser (sinon connexion / création de compte)")
+    parser.add_argument("--email", help="Compte existant (défaut: un compte de test est créé)")
+    parser.add_argument("--password", default="loadtest123")
+    parser.add_argument("--order-id", help="Commande de l'utilisateur pour GET /orders/{id}/tracking")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Script: lance le planificateur des tâches de maintenance hors de l'API.
+
+Utilisation (dans le dossier ecommerce-backend):
+  python -m scripts.maintenance                              # boucle infinie (Ctrl+C pour arrêter)
+  python -m scripts.maintenance --once                       # exécute toutes les tâches puis s'arrête
+  python -m scripts.maintenance --once --job reset_tokens    # une tâche précise (option répétable)
+
+Purge ponctuelle des paniers abandonnés et des commandes CREE trop anciennes, par lots
+de 1000 avec 0,5 s de pause entre deux lots (débit affiché à la fin de chaque tâche) :
+  python -m scripts.maintenance --once --job abandoned_carts --job stale_orders --batch-size 1000 --pause 0.5
+
+--once ignore l'intervalle depuis la dernière exécution, pas le verrou : une tâche
+déjà en cours sur un autre worker est sautée.
+Penser à mettre MAINTENANCE_IN_PROCESS=0 côté API si la maintenance est confiée à ce script.
+"""
+
+import argparse
+
+from services.maintenance import MaintenanceScheduler, default_jobs
+
+
+def main():
+    jobs = default_jobs()
+    parser = argparse.ArgumentParser(description="Planificateur des tâches de maintenance")
+    parser.add_argument("--once", action="store_true", help="Exécuter les tâches une fois puis quitter")
+    parser.add_argument("--job", action="append", choices=[job.name for job in jobs],
+                        help="Tâche à exécuter (défaut: toutes)")
+    parser.add_argument("--batch-size", type=int, help="Lignes par lot (défaut: MAINTENANCE_<TÂCHE>_BATCH_SIZE)")
+    parser.add_argument("--pause", type=float,
+                        help="Secondes de pause entre deux lots (défaut: MAINTENANCE_<TÂCHE>_BATCH_PAUSE_SECONDS)")
+    args = parser.parse_args()
+
+    if args.job:
+        jobs = [job for job in jobs if job.name in args.job]
+    for job in jobs:
+        if args.batch_size:
+            job.batch_size = max(1, args.batch_size)
+        if args.pause is not None:
+            job.pause = max(0.0, args.pause)
+    scheduler = MaintenanceScheduler(jobs)
+    try:
+        if args.once:
+            for name in scheduler.jobs:
+                rows = scheduler.run_job(name, force=True)
+                if rows is None:
+                    print(f"⏭️  {name}: déjà en cours sur un autre worker")
+                else:
+                    counters = scheduler.counters[name]
+                    print(f"✅ {name}: {rows} ligne(s) traitée(s) en {counters['last_batches']} lot(s), "
+                          f"{counters['last_duration_seconds']}s ({counters['last_rows_per_second']} lignes/s)")
+        else:
+            print(f"🧹 Maintenance démarrée ({', '.join(scheduler.jobs)}, vérification toutes les {scheduler.tick}s)")
+            scheduler.run_forever()
+    except KeyboardInterrupt:
+        print("Arrêt de la maintenance")
+    finally:
+        scheduler.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Script: lance le dispatcher des événements de commande (table order_events) hors de l'API.
+
+Utilisation (dans le dossier ecommerce-backend):
+  python -m scripts.order_event_dispatcher            # boucle infinie (Ctrl+C pour arrêter)
+  python -m scripts.order_event_dispatcher --once     # diffuse ce qui est prêt puis s'arrête
+
+Plusieurs instances peuvent tourner en parallèle (réservation FOR UPDATE SKIP LOCKED).
+Penser à mettre ORDER_EVENTS_IN_PROCESS=0 côté API si la diffusion est confiée à ce script.
+L'invalidation du cache catalogue ne parvient aux workers de l'API que via un cache
+partagé (REDIS_URL) : avec le cache mémoire, elle est sans effet hors du processus.
+"""
+
+import argparse
+
+from services.order_event_dispatcher import OrderEventDispatcher, default_consumers
+from utils.cache import SharedCache, build_cache_backend
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dispatcher des événements de commande")
+    parser.add_argument("--once", action="store_true", help="Vider l'outbox une fois puis quitter")
+    parser.add_argument("--batch-size", type=int, help="Événements par lot (défaut: ORDER_EVENT_BATCH_SIZE)")
+    args = parser.parse_args()
+
+    catalog_cache = SharedCache(build_cache_backend(), "catalog")
+    dispatcher = OrderEventDispatcher(
+        default_consumers(invalidate_catalog=catalog_cache.invalidate_all),
+        batch_size=args.batch_size,
+    )
+    try:
+        if args.once:
+            total = 0
+            while True:
+                processed = dispatcher.run_once()
+                total += processed
+                if processed == 0:
+                    break
+            print(f"✅ {total} événement(s) traité(s) — {dispatcher.stats()}")
+        else:
+            print(f"📣 Dispatcher d'événements démarré (lot={dispatcher.batch_size}, "
+                  f"consommateurs={', '.join(c.name for c in dispatcher.consumers)})")
+            dispatcher.run_forever()
+    except KeyboardInterrupt:
+        print("Arrêt du dispatcher d'événements")
+    finally:
+        dispatcher.stop()
+
+
+if __name__ == "__main__":
+    main()
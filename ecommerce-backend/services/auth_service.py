@@ -13,7 +13,7 @@ Ce fichier contient TOUTE la logique d'authentification de l'application :
 C'est le fichier le PLUS IMPORTANT pour la sécurité de votre application !
 
 Rôles:
-- Hachage et vérification des mots de passe (bcrypt + fallback SHA-256)
+- Hachage et vérification des mots de passe (bcrypt dans un pool de processus + fallback SHA-256)
 - Création et validation de tokens JWT (JSON Web Tokens)
 - Gestion des comptes utilisateurs
 - Système "mot de passe oublié"
@@ -38,6 +38,10 @@ from database.models import User, PasswordResetToken
 from database.repositories_simple import PostgreSQLUserRepository
 from enums import OrderStatus
 from sqlalchemy.orm import Session
+from utils.password_hashing import (
+    PasswordHasherBusy, hash_password as _bcrypt_hash, check_password as _bcrypt_check, needs_rehash
+)
+from utils.metrics import BCRYPT_DURATION, BCRYPT_REJECTED, observe_duration
 
 # ========================================
 # CLASSE AuthService
@@ -109,13 +113,19 @@ class AuthService:
         - Hash bcrypt : "$2b$12$xY8Z4aB...60caractères..."
         
         Le hash est IRRÉVERSIBLE : impossible de retrouver le mot de passe original.
+        
+        Le calcul s'exécute dans le pool bcrypt (utils/password_hashing.py), au coût
+        BCRYPT_ROUNDS. Si le pool est saturé, PasswordHasherBusy est propagée.
         """
         try:
-            salt = bcrypt.gensalt()  # Génère un salt aléatoire
-            hashed = bcrypt.hashpw(password.encode("utf-8"), salt)  # Hash le mot de passe
-            return hashed.decode("utf-8")
-        except Exception:
-            # Fallback SHA-256 si bcrypt n'est pas disponible (pour les tests)
+            with observe_duration(BCRYPT_DURATION.labels("hash")):
+                return _bcrypt_hash(password)  # Salt aléatoire + bcrypt, hors du thread courant
+        except PasswordHasherBusy:
+            BCRYPT_REJECTED.inc()
+            raise
+        except ImportError:
+            # Fallback SHA-256 si bcrypt n'est pas installé (pour les tests) ; une erreur
+            # du pool n'arrive jamais ici : elle est propagée (503)
             # ⚠️ SHA-256 simple est MOINS SÉCURISÉ que bcrypt !
             sha = hashlib.sha256(password.encode('utf-8')).hexdigest()
             return f"sha256::{sha}"
@@ -139,9 +149,10 @@ class AuthService:
         - verify_password("motdepassefaux", "$2b$12$xY8Z...") → False
         """
         try:
-            # Essayer bcrypt en premier (méthode sécurisée)
+            # Essayer bcrypt en premier (méthode sécurisée), dans le pool de processus
             if isinstance(hashed_password, str) and not hashed_password.startswith('sha256::'):
-                return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+                with observe_duration(BCRYPT_DURATION.labels("verify")):
+                    return _bcrypt_check(password, hashed_password)
             
             # Fallback SHA-256 pour les tests
             if isinstance(hashed_password, str) and hashed_password.startswith('sha256::'):
@@ -149,6 +160,9 @@ class AuthService:
                 return hashlib.sha256(password.encode('utf-8')).hexdigest() == expected
             
             return False
+        except PasswordHasherBusy:
+            BCRYPT_REJECTED.inc()
+            raise
         except Exception:
             return False
     
@@ -243,7 +257,18 @@ class AuthService:
         if not self.verify_password(password, user.password_hash):  # type: ignore
             return None  # Mot de passe incorrect
         
-        # Étape 3 : Authentification réussie
+        # Étape 3 : Mettre à niveau le hash si besoin (legacy SHA-256 ou coût bcrypt obsolète).
+        # Le mot de passe en clair n'est disponible qu'ici ; un échec n'empêche pas la connexion.
+        if needs_rehash(user.password_hash):  # type: ignore
+            try:
+                new_hash = self.hash_password(password)
+                if not new_hash.startswith('sha256::'):
+                    user.password_hash = new_hash  # type: ignore
+                    self.user_repo.update(user)
+            except Exception:
+                pass
+        
+        # Étape 4 : Authentification réussie
         return user
 
     # API de compatibilité tests unitaires simples
@@ -375,21 +400,35 @@ class AuthService:
         db.commit()
         return True
     
-    def cleanup_expired_tokens(self) -> int:
-        """Supprime les tokens expirés de la base de données.
+    def cleanup_expired_tokens(self, limit: int = 1000) -> int:
+        """Supprime jusqu'à `limit` tokens expirés (les plus anciens d'abord).
+        
+        Un lot borné par appel : le verrou des lignes supprimées reste court.
+        La tâche "reset_tokens" du planificateur de maintenance (services/maintenance.py)
+        rappelle cette méthode tant qu'elle remplit un lot complet.
+        Un token utilisé expire de toute façon une heure après sa création :
+        le critère expires_at (indexé) suffit.
         
         Returns:
             Le nombre de tokens supprimés
         """
         db = self.user_repo.db
         
-        # Supprimer les tokens expirés ou déjà utilisés depuis plus de 24h
         from datetime import UTC
-        cutoff_time = datetime.now(UTC) - timedelta(days=1)
+        ids = [
+            row.id for row in
+            db.query(PasswordResetToken.id)
+            .filter(PasswordResetToken.expires_at < datetime.now(UTC))
+            .order_by(PasswordResetToken.expires_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .all()
+        ]
+        if not ids:
+            return 0
         deleted = db.query(PasswordResetToken).filter(
-            (PasswordResetToken.expires_at < datetime.now(UTC)) |
-            ((PasswordResetToken.used == True) & (PasswordResetToken.created_at < cutoff_time))
-        ).delete()
+            PasswordResetToken.id.in_(ids)
+        ).delete(synchronize_session=False)
         
         db.commit()
         return deleted
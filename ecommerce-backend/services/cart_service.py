@@ -499,71 +499,20 @@ class CartService:
         ```
         
         PERFORMANCE :
-        Cette méthode fait une requête BDD par article du panier (N+1 queries).
-        Pour un panier de 5 articles, ça fait 6 requêtes (1 pour le panier + 5 pour les produits).
-        Dans une version optimisée, on pourrait faire une seule requête avec JOIN.
+        Une seule requête, quel que soit le nombre d'articles : les lignes du panier
+        sont jointes aux produits (cart_repo.get_lines_with_products, aussi utilisé par GET /cart).
         """
-        # ÉTAPE 1 : Récupérer le panier de l'utilisateur depuis la BDD
-        # cart_repo.get_by_user_id() retourne un objet Cart ou None
-        cart = self.cart_repo.get_by_user_id(user_id)
-        
-        # ÉTAPE 2 : Vérifier si le panier existe et contient des articles
-        # Deux conditions à vérifier :
-        # 1. not cart : Le panier n'existe pas (l'utilisateur n'a jamais ajouté d'article)
-        # 2. not cart.items : Le panier existe mais est vide (items = liste vide [])
-        # Opérateur or : "OU logique" - si l'une des conditions est vraie, le bloc s'exécute
-        if not cart or not cart.items:
-            # Panier vide ou inexistant → Total = 0 centimes (0€)
-            # On retourne immédiatement sans faire de calcul
-            return 0
-        
-        # ÉTAPE 3 : Initialiser la variable total à 0
-        # Cette variable va accumuler la somme des (prix × quantité)
-        # Type : int (nombre entier en centimes)
-        total = 0
-        
-        # ÉTAPE 4 : Parcourir tous les articles du panier
-        # for : boucle qui itère sur chaque élément de cart.items
-        # item : variable temporaire qui représente un CartItem à chaque itération
-        # cart.items : liste de CartItem [CartItem1, CartItem2, CartItem3, ...]
-        for item in cart.items:
-            # Pour chaque article, on doit :
-            # 1. Récupérer les infos du produit (notamment le prix)
-            # 2. Vérifier que le produit est actif
-            # 3. Calculer prix × quantité
-            # 4. Ajouter au total
-            
-            # Récupérer les informations complètes du produit depuis la table products
-            # item.product_id : UUID du produit (ex: "7c9e6679-7425-40de-944b-e07fc1f90ae7")
-            # str(item.product_id) : Convertir l'UUID en chaîne de caractères
-            # product_repo.get_by_id() : SELECT * FROM products WHERE id = ?
-            # Retourne : Un objet Product ou None
-            product = self.product_repo.get_by_id(str(item.product_id))
-            
-            # Vérifier que le produit existe ET est actif
-            # Deux conditions avec AND (les deux doivent être vraies) :
-            # 1. product : Le produit existe en BDD (not None)
-            # 2. product.active : Le produit est actif (active = True)
-            # Si un produit a été désactivé, il ne compte PAS dans le total
-            if product and product.active:
-                # Le produit est valide → on peut l'ajouter au total
-                
-                # Calculer le sous-total pour cet article
-                # product.price_cents : Prix unitaire en centimes (ex: 99999 = 999,99€)
-                # item.quantity : Nombre d'unités dans le panier (ex: 2)
-                # Opérateur * : multiplication
-                # Exemple : 99999 centimes × 2 unités = 199998 centimes
-                subtotal = product.price_cents * item.quantity
-                
-                # Ajouter le sous-total au total global
-                # Opérateur += : addition et assignation (équivalent à total = total + subtotal)
-                # Exemple : Si total = 50000 et subtotal = 199998 → total devient 249998
-                total += subtotal
-        
-        # ÉTAPE 5 : Retourner le total calculé
-        # Après avoir parcouru tous les articles, on retourne la somme finale
-        # Type de retour : int (nombre entier en centimes)
-        # Si aucun produit n'était actif, total reste à 0
-        return total
+        # ÉTAPE 1 : Récupérer les lignes du panier AVEC leur produit, en une requête
+        # cart_repo.get_lines_with_products() exécute :
+        #   SELECT cart_items.product_id, cart_items.quantity, products.name,
+        #          products.price_cents, products.stock_qty, products.active
+        #   FROM cart_items JOIN carts ... JOIN products ... WHERE carts.user_id = ?
+        # Retourne : une liste de lignes (vide si pas de panier ou panier vide)
+        lines = self.cart_repo.get_lines_with_products(user_id)
+        
+        # ÉTAPE 2 : Sommer prix × quantité des produits ACTIFS
+        # Un produit désactivé après ajout au panier ne compte PAS dans le total
+        # sum() sur une liste vide → 0 (panier vide ou inexistant)
+        return sum(line.price_cents * line.quantity for line in lines if line.active)
 # FIN DE LA CLASSE CartService
 # FIN DU FICHIER cart_service.py
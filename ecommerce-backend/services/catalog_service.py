@@ -11,17 +11,30 @@ Responsabilités :
 - ✅ Réserver du stock (lors d'un achat)
 - ✅ Libérer du stock (si commande annulée)
 - ✅ Mettre à jour le stock (admin)
+- ✅ Réserver le stock d'une commande pour une durée limitée (checkout → paiement)
 
 GESTION DU STOCK :
 - Reserve : Diminue le stock (lors d'une commande)
 - Release : Augmente le stock (si annulation)
 - Update : Change le stock à une valeur fixe (admin)
+
+RÉSERVATIONS PAR COMMANDE (table stock_reservations) :
+- reserve_for_order : au checkout, met de côté les unités pendant RESERVATION_TTL_SECONDS
+- confirm_for_order : au paiement, décrémente le stock et consomme les réservations
+- release_for_order : à l'annulation, libère les réservations (et remet en stock si payée)
+Stock disponible = stock_qty - réservations actives des AUTRES commandes.
+Ces méthodes ne font pas de commit : l'appelant valide la transaction.
 """
 
 # ========== IMPORTS ==========
-from typing import List, Optional  # Pour le typage Python
+import os
+from datetime import datetime
+from typing import Dict, List, Optional  # Pour le typage Python
 from database.models import Product  # Modèle SQLAlchemy du produit
-from database.repositories_simple import PostgreSQLProductRepository  # Accès BDD
+from database.repositories_simple import (  # Accès BDD
+    PostgreSQLProductRepository,
+    PostgreSQLStockReservationRepository,
+)
 
 # ========================================
 # CLASSE CatalogService
@@ -35,14 +48,25 @@ class CatalogService:
     - La gestion des stocks (réservation, libération)
     """
     
-    def __init__(self, product_repo: PostgreSQLProductRepository):
+    def __init__(self, product_repo: PostgreSQLProductRepository,
+                 reservation_repo: Optional[PostgreSQLStockReservationRepository] = None,
+                 reservation_ttl_seconds: Optional[float] = None):
         """
         Initialise le service avec le repository produits.
         
         Args:
             product_repo: Repository pour accéder à la table products
+            reservation_repo: Repository des réservations (par défaut : même session que product_repo)
+            reservation_ttl_seconds: Durée d'une réservation (défaut : RESERVATION_TTL_SECONDS, 900)
         """
         self.product_repo = product_repo  # Repository pour accéder aux produits
+        if reservation_repo is None and getattr(product_repo, "db", None) is not None:
+            reservation_repo = PostgreSQLStockReservationRepository(product_repo.db)
+        self.reservation_repo = reservation_repo
+        self.reservation_ttl_seconds = (
+            reservation_ttl_seconds if reservation_ttl_seconds is not None
+            else float(os.getenv("RESERVATION_TTL_SECONDS", "900"))
+        )
     
     # ========================================
     # LISTER LES PRODUITS
@@ -172,3 +196,79 @@ class CatalogService:
         product.stock_qty = new_stock  # type: ignore
         self.product_repo.update(product)
         return True
+    
+    # ========================================
+    # RÉSERVATIONS PAR COMMANDE
+    # ========================================
+    def available_stock(self, products: List[Product], exclude_order_id: Optional[str] = None) -> Dict[str, int]:
+        """
+        Stock disponible par produit : stock_qty moins les réservations actives
+        des autres commandes (une requête pour tous les produits).
+        
+        Args:
+            products: Produits concernés (verrouillés par l'appelant pour une décision fiable)
+            exclude_order_id: Commande dont les propres réservations ne comptent pas
+        """
+        held = self.reservation_repo.held_quantities([str(p.id) for p in products], exclude_order_id)
+        return {str(p.id): p.stock_qty - held.get(str(p.id), 0) for p in products}
+    
+    def reserve_for_order(self, order_id: str, quantities: Dict[str, int], products: List[Product]) -> datetime:
+        """
+        Met de côté les unités d'une commande (checkout), en remplaçant ses réservations précédentes.
+        
+        Args:
+            order_id: Commande concernée
+            quantities: Quantité par id de produit
+            products: Les produits de la commande, déjà verrouillés (FOR UPDATE) par l'appelant
+            
+        Returns:
+            L'échéance des réservations
+            
+        Raises:
+            ValueError: Si un produit n'a pas assez de stock disponible
+        """
+        available = self.available_stock(products, exclude_order_id=order_id)
+        for product in products:
+            wanted = quantities.get(str(product.id), 0)
+            left = max(0, available[str(product.id)])
+            if wanted > left:
+                raise ValueError(
+                    f"Stock insuffisant pour {product.name}. Il reste {left} article(s) disponible(s), "
+                    f"vous essayez d'en commander {wanted}."
+                )
+        return self.reservation_repo.hold_for_order(order_id, quantities, self.reservation_ttl_seconds)
+    
+    def confirm_for_order(self, order_id: str, quantities: Dict[str, int], hide_threshold: int = 0) -> List[str]:
+        """
+        Convertit les réservations d'une commande en vente (paiement).
+        
+        Les produits sont verrouillés, puis le disponible est recalculé hors réservations
+        de la commande : une réservation expirée ne bloque donc pas le paiement tant que
+        personne d'autre n'a réservé ces unités entre-temps.
+        
+        Returns:
+            Les id des produits qui n'ont pas pu être décrémentés (liste vide si succès) ;
+            l'appelant doit alors annuler la transaction.
+        """
+        products = self.product_repo.get_many_for_update(list(quantities))
+        available = self.available_stock(products, exclude_order_id=order_id)
+        failed = [pid for pid in quantities if available.get(str(pid), 0) < quantities[pid]]
+        if failed:
+            return [str(pid) for pid in failed]
+        failed = self.product_repo.decrement_stock_many(quantities, hide_threshold=hide_threshold)
+        if not failed:
+            self.reservation_repo.consume_for_order(order_id)
+        return failed
+    
+    def release_for_order(self, order_id: str, restock: Optional[Dict[str, int]] = None) -> None:
+        """
+        Libère les réservations d'une commande (annulation).
+        
+        Args:
+            order_id: Commande annulée
+            restock: Quantités à remettre en stock, uniquement si la commande avait été payée
+                     (avant paiement, le stock n'a jamais été décrémenté)
+        """
+        self.reservation_repo.release_for_order(order_id)
+        if restock:
+            self.product_repo.increment_stock_many(restock)
@@ -14,12 +14,21 @@ Brevo offre :
 Emails envoyés par l'application :
 1. Email de bienvenue (lors de l'inscription)
 2. Email de réinitialisation de mot de passe (mot de passe oublié)
+3. Emails de suivi de commande (paiement, expédition, livraison, annulation,
+   remboursement), mis en file par le dispatcher des événements de commande
+
+ENVOI ASYNCHRONE :
+Les endpoints n'appellent pas Brevo directement : ils mettent l'email en file
+(`enqueue_*`, table email_outbox) et le worker services/email_worker.py l'envoie
+en arrière-plan, par lots (messageVersions) et avec nouvel essai en cas d'échec.
+Les méthodes `send_*` restent disponibles pour un envoi immédiat (scripts).
 
 CONFIGURATION REQUISE (Variables d'environnement):
 - BREVO_API_KEY : Clé API Brevo (obligatoire pour envoyer des emails)
 - SENDER_EMAIL : Email expéditeur (doit être vérifié dans Brevo)
 - SENDER_NAME : Nom de l'expéditeur (ex: "TechStore")
 - FRONTEND_URL : URL du frontend (pour générer les liens de reset)
+- BREVO_API_URL : URL de l'API (optionnel, ex: serveur bouchon scripts/email_stub_server.py)
 
 COMMENT OBTENIR UNE CLÉ API BREVO :
 1. Créer un compte GRATUIT sur https://app.brevo.com
@@ -36,7 +45,7 @@ Les emails sont affichés dans la console au lieu d'être envoyés.
 # ========== IMPORTS ==========
 import os  # Pour lire les variables d'environnement
 import requests  # Pour faire des appels HTTP à l'API Brevo
-from typing import Optional  # Pour le typage Python
+from typing import Optional, List, Dict, Tuple, Any  # Pour le typage Python
 
 # ========================================
 # CLASSE EmailService
@@ -76,7 +85,7 @@ class EmailService:
         self.frontend_url = os.getenv("FRONTEND_URL", "http://localhost:5173")
         
         # URL de l'API Brevo pour envoyer des emails
-        self.api_url = "https://api.brevo.com/v3/smtp/email"
+        self.api_url = os.getenv("BREVO_API_URL", "https://api.brevo.com/v3/smtp/email")
         
         # Mode développement : activé si pas de clé API
         # En mode dev, les emails sont affichés dans la console au lieu d'être envoyés
@@ -168,15 +177,14 @@ class EmailService:
             print(f"❌ Exception lors de l'envoi de l'email: {str(e)}")
             return False
     
-    def send_password_reset_email(self, to_email: str, reset_token: str) -> bool:
-        """Envoie un email de réinitialisation de mot de passe.
+    def render_password_reset_email(self, reset_token: str) -> Tuple[str, str]:
+        """Construit l'email de réinitialisation de mot de passe.
         
         Args:
-            to_email: Email de l'utilisateur
             reset_token: Token de réinitialisation
             
         Returns:
-            True si l'email a été envoyé avec succès, False sinon
+            (sujet, contenu HTML)
         """
         reset_url = f"{self.frontend_url}/reset-password?token={reset_token}"
         
@@ -237,17 +245,16 @@ class EmailService:
         </html>
         """
         
-        return self.send_email(to_email, subject, html_content)
+        return subject, html_content
     
-    def send_welcome_email(self, to_email: str, first_name: str) -> bool:
-        """Envoie un email de bienvenue à un nouvel utilisateur.
+    def render_welcome_email(self, first_name: str) -> Tuple[str, str]:
+        """Construit l'email de bienvenue d'un nouvel utilisateur.
         
         Args:
-            to_email: Email de l'utilisateur
             first_name: Prénom de l'utilisateur
             
         Returns:
-            True si l'email a été envoyé avec succès, False sinon
+            (sujet, contenu HTML)
         """
         subject = f"Bienvenue sur TechStore, {first_name} ! 🎉"
         
@@ -299,5 +306,180 @@ class EmailService:
         </html>
         """
         
+        return subject, html_content
+
+    # Emails de suivi de commande : statut → (titre, phrase d'explication)
+    ORDER_STATUS_MESSAGES = {
+        "PAYEE": ("Commande confirmée", "Nous avons bien reçu votre paiement. Votre facture est disponible dans votre espace client."),
+        "EXPEDIEE": ("Commande expédiée", "Votre commande est en route."),
+        "LIVREE": ("Commande livrée", "Votre commande a été livrée. Merci pour votre achat !"),
+        "ANNULEE": ("Commande annulée", "Votre commande a été annulée."),
+        "REMBOURSEE": ("Commande remboursée", "Votre commande a été remboursée."),
+    }
+    
+    def render_order_status_email(self, first_name: str, order_id: str, status: str,
+                                  details: Optional[Dict[str, Any]] = None) -> Tuple[str, str]:
+        """Construit l'email de suivi d'une commande qui vient de changer de statut.
+        
+        Args:
+            first_name: Prénom du client
+            order_id: ID de la commande
+            status: Nouveau statut (clé de ORDER_STATUS_MESSAGES)
+            details: Montant (amount_cents), transporteur et numéro de suivi si connus
+            
+        Returns:
+            (sujet, contenu HTML)
+        """
+        details = details or {}
+        title, message = self.ORDER_STATUS_MESSAGES[status]
+        reference = str(order_id)[:8].upper()
+        subject = f"{title} - commande {reference}"
+        
+        lines = []
+        if details.get("amount_cents") is not None:
+            lines.append(f"<li>Montant : <strong>{details['amount_cents'] / 100:.2f} €</strong></li>")
+        if details.get("transporteur"):
+            lines.append(f"<li>Transporteur : {details['transporteur']}</li>")
+        if details.get("tracking_number"):
+            lines.append(f"<li>Numéro de suivi : <strong>{details['tracking_number']}</strong></li>")
+        details_html = f"<ul>{''.join(lines)}</ul>" if lines else ""
+        
+        html_content = f"""
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <meta charset="utf-8">
+            <style>
+                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
+                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
+                .header {{ background-color: #2563eb; color: white; padding: 20px; text-align: center; border-radius: 8px 8px 0 0; }}
+                .content {{ background-color: #f9fafb; padding: 30px; border: 1px solid #e5e7eb; }}
+                .footer {{ text-align: center; padding: 20px; color: #6b7280; font-size: 12px; }}
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <div class="header">
+                    <h1>{title}</h1>
+                </div>
+                <div class="content">
+                    <h2>Bonjour {first_name},</h2>
+                    <p>{message}</p>
+                    <p>Commande <strong>{reference}</strong></p>
+                    {details_html}
+                    <p style="margin-top: 30px;">
+                        <a href="{self.frontend_url}/orders" style="display: inline-block; background-color: #2563eb; color: white; padding: 12px 24px; text-decoration: none; border-radius: 6px; font-weight: bold;">
+                            Voir mes commandes
+                        </a>
+                    </p>
+                </div>
+                <div class="footer">
+                    <p>&copy; 2025 TechStore. Tous droits réservés.</p>
+                </div>
+            </div>
+        </body>
+        </html>
+        """
+        
+        return subject, html_content
+
+    # ========================================
+    # ENVOI IMMÉDIAT (synchrone)
+    # ========================================
+    def send_password_reset_email(self, to_email: str, reset_token: str) -> bool:
+        """Envoie immédiatement un email de réinitialisation de mot de passe.
+        
+        Returns:
+            True si l'email a été envoyé avec succès, False sinon
+        """
+        subject, html_content = self.render_password_reset_email(reset_token)
+        return self.send_email(to_email, subject, html_content)
+    
+    def send_welcome_email(self, to_email: str, first_name: str) -> bool:
+        """Envoie immédiatement un email de bienvenue.
+        
+        Returns:
+            True si l'email a été envoyé avec succès, False sinon
+        """
+        subject, html_content = self.render_welcome_email(first_name)
         return self.send_email(to_email, subject, html_content)
 
+    # ========================================
+    # ENVOI ASYNCHRONE (file email_outbox)
+    # ========================================
+    def enqueue_password_reset_email(self, outbox_repo, to_email: str, reset_token: str):
+        """Met en file l'email de réinitialisation (envoyé par le worker)."""
+        subject, html_content = self.render_password_reset_email(reset_token)
+        return outbox_repo.enqueue(to_email, subject, html_content)
+    
+    def enqueue_welcome_email(self, outbox_repo, to_email: str, first_name: str):
+        """Met en file l'email de bienvenue (envoyé par le worker)."""
+        subject, html_content = self.render_welcome_email(first_name)
+        return outbox_repo.enqueue(to_email, subject, html_content)
+    
+    def enqueue_order_status_email(self, outbox_repo, to_email: str, first_name: str, order_id: str,
+                                   status: str, details: Optional[Dict[str, Any]] = None):
+        """Met en file l'email de suivi de commande (envoyé par le worker)."""
+        subject, html_content = self.render_order_status_email(first_name, order_id, status, details)
+        return outbox_repo.enqueue(to_email, subject, html_content, to_name=first_name)
+
+    # ========================================
+    # ENVOI PAR LOTS (utilisé par le worker)
+    # ========================================
+    def build_batch_payload(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Construit le corps Brevo pour un ou plusieurs emails.
+        
+        Un seul email → format classique. Plusieurs → un seul appel avec
+        `messageVersions` (chaque version a son destinataire, son sujet et son HTML).
+        Chaque message est un dict {to_email, to_name, subject, html_content}.
+        """
+        def recipient(m: Dict[str, Any]) -> Dict[str, str]:
+            return {"email": m["to_email"], "name": m.get("to_name") or m["to_email"].split("@")[0]}
+        
+        first = messages[0]
+        payload: Dict[str, Any] = {
+            "sender": {"name": self.sender_name, "email": self.sender_email},
+            "subject": first["subject"],
+            "htmlContent": first["html_content"],
+        }
+        if len(messages) == 1:
+            payload["to"] = [recipient(first)]
+        else:
+            payload["messageVersions"] = [
+                {"to": [recipient(m)], "subject": m["subject"], "htmlContent": m["html_content"]}
+                for m in messages
+            ]
+        return payload
+    
+    def send_batch(self, messages: List[Dict[str, Any]], http: Optional[requests.Session] = None,
+                   timeout: float = 10) -> Tuple[bool, bool, str]:
+        """Envoie un lot d'emails en un appel HTTP.
+        
+        Args:
+            messages: emails à envoyer (voir build_batch_payload)
+            http: session requests partagée (connexions réutilisées) ; sinon requests.post
+            timeout: délai maximal de l'appel
+            
+        Returns:
+            (succès, erreur temporaire ?, message d'erreur). Une erreur temporaire
+            (réseau, 429, 5xx) justifie un nouvel essai ; les autres 4xx non.
+        """
+        if self.dev_mode:
+            for m in messages:
+                print(f"📧 MODE DÉVELOPPEMENT - Email non envoyé: {m['to_email']} / {m['subject']}")
+            return True, False, ""
+        
+        headers = {
+            "accept": "application/json",
+            "api-key": self.api_key,
+            "content-type": "application/json"
+        }
+        try:
+            poster = http.post if http is not None else requests.post
+            response = poster(self.api_url, json=self.build_batch_payload(messages), headers=headers, timeout=timeout)
+        except requests.RequestException as e:
+            return False, True, f"Erreur réseau: {e}"
+        if response.status_code in (200, 201, 202):
+            return True, False, ""
+        retryable = response.status_code == 429 or response.status_code >= 500
+        return False, retryable, f"HTTP {response.status_code}: {response.text[:500]}"
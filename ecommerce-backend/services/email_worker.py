@@ -0,0 +1,216 @@
+"""
+Worker d'envoi des emails en file d'attente (table email_outbox).
+
+Boucle :
+1. Réserver un lot d'emails prêts (FOR UPDATE SKIP LOCKED : plusieurs workers possibles)
+2. Les découper en appels Brevo groupés (messageVersions) de EMAIL_BATCH_SIZE emails
+3. Envoyer ces appels en parallèle (EMAIL_WORKER_CONCURRENCY threads) via une
+   `requests.Session` partagée (connexions HTTP réutilisées)
+4. Marquer SENT, ou reprogrammer avec backoff exponentiel, ou abandonner (FAILED),
+   lot par lot dès qu'un appel se termine ; le bail des envois encore en cours est
+   prolongé tous les EMAIL_LEASE_SECONDS / 3 (pas de double envoi par un autre worker)
+
+Configuration (variables d'environnement) :
+- EMAIL_WORKER_CONCURRENCY (4), EMAIL_BATCH_SIZE (50), EMAIL_MAX_ATTEMPTS (8)
+- EMAIL_BACKOFF_BASE_SECONDS (5), EMAIL_BACKOFF_MAX_SECONDS (3600)
+- EMAIL_WORKER_POLL_SECONDS (2), EMAIL_LEASE_SECONDS (120), EMAIL_HTTP_TIMEOUT_SECONDS (10)
+
+Lancement autonome : python -m scripts.email_worker
+Dans l'API : démarré en thread au démarrage si EMAIL_WORKER_IN_PROCESS=1 (défaut).
+"""
+
+import os
+import random
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, UTC
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from database.database import SessionLocal
+from database.repositories_simple import PostgreSQLEmailOutboxRepository
+from services.email_service import EmailService
+from utils.metrics import EMAILS_PROCESSED
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+class EmailOutboxWorker:
+    """Vide la file email_outbox en arrière-plan."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Any] = SessionLocal,
+        email_service: Optional[EmailService] = None,
+        concurrency: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        max_attempts: Optional[int] = None,
+        backoff_base: Optional[float] = None,
+        backoff_max: Optional[float] = None,
+        poll_interval: Optional[float] = None,
+        lease_seconds: Optional[float] = None,
+        http_timeout: Optional[float] = None,
+    ):
+        self.session_factory = session_factory
+        self.email_service = email_service or EmailService()
+        self.concurrency = max(1, concurrency or _env_int("EMAIL_WORKER_CONCURRENCY", 4))
+        self.batch_size = max(1, batch_size or _env_int("EMAIL_BATCH_SIZE", 50))
+        self.max_attempts = max_attempts or _env_int("EMAIL_MAX_ATTEMPTS", 8)
+        self.backoff_base = backoff_base if backoff_base is not None else _env_float("EMAIL_BACKOFF_BASE_SECONDS", 5)
+        self.backoff_max = backoff_max if backoff_max is not None else _env_float("EMAIL_BACKOFF_MAX_SECONDS", 3600)
+        self.poll_interval = poll_interval if poll_interval is not None else _env_float("EMAIL_WORKER_POLL_SECONDS", 2)
+        self.lease_seconds = lease_seconds if lease_seconds is not None else _env_float("EMAIL_LEASE_SECONDS", 120)
+        self.http_timeout = http_timeout if http_timeout is not None else _env_float("EMAIL_HTTP_TIMEOUT_SECONDS", 10)
+
+        # Session HTTP partagée : pool de connexions dimensionné sur la concurrence
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency, max_retries=0)
+        self.http.mount("https://", adapter)
+        self.http.mount("http://", adapter)
+
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="email-send")
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    # ---------- Politique de nouvel essai ----------
+    def backoff_delay(self, attempts: int) -> float:
+        """Délai avant le prochain essai : base * 2^(essais-1), plafonné, avec ±20 % d'aléa."""
+        delay = min(self.backoff_max, self.backoff_base * (2 ** max(0, attempts - 1)))
+        return delay * random.uniform(0.8, 1.2)
+
+    # ---------- Un passage ----------
+    def run_once(self) -> int:
+        """Réserve et traite un lot. Retourne le nombre d'emails traités."""
+        db = self.session_factory()
+        try:
+            repo = PostgreSQLEmailOutboxRepository(db)
+            claimed = repo.claim_batch(self.batch_size * self.concurrency, self.lease_seconds)
+            # Copier les données : l'envoi se fait hors de la session (threads)
+            messages = [
+                {
+                    "id": e.id,
+                    "to_email": e.to_email,
+                    "to_name": e.to_name,
+                    "subject": e.subject,
+                    "html_content": e.html_content,
+                    "attempts": e.attempts,
+                }
+                for e in claimed
+            ]
+        finally:
+            db.close()
+        if not messages:
+            return 0
+
+        chunks = [messages[i:i + self.batch_size] for i in range(0, len(messages), self.batch_size)]
+        pending = {self._executor.submit(self._send_chunk, chunk): chunk for chunk in chunks}
+        while pending:
+            # Résultats enregistrés lot par lot, dès qu'un appel se termine
+            done, _ = wait(pending, timeout=self.lease_seconds / 3, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.pop(future)
+                self._record(future.result())
+            if pending:
+                # Envois encore en cours (timeouts, isolement d'un message fautif) :
+                # prolonger le bail pour qu'aucun autre worker ne les réserve à nouveau
+                self._extend_lease([m["id"] for chunk in pending.values() for m in chunk])
+        return len(messages)
+
+    def _extend_lease(self, email_ids: List[Any]) -> None:
+        db = self.session_factory()
+        try:
+            PostgreSQLEmailOutboxRepository(db).extend_lease(email_ids, self.lease_seconds)
+        finally:
+            db.close()
+
+    def _send_chunk(self, chunk: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        ok, retryable, error = self.email_service.send_batch(chunk, http=self.http, timeout=self.http_timeout)
+        if ok:
+            return [{"message": m, "ok": True} for m in chunk]
+        if len(chunk) > 1 and not retryable:
+            # Lot refusé (ex: une adresse invalide) : isoler le message fautif
+            isolated: List[Dict[str, Any]] = []
+            for m in chunk:
+                isolated.extend(self._send_chunk([m]))
+            return isolated
+        return [{"message": m, "ok": False, "retryable": retryable, "error": error} for m in chunk]
+
+    def _record(self, results: List[Dict[str, Any]]) -> None:
+        db = self.session_factory()
+        try:
+            repo = PostgreSQLEmailOutboxRepository(db)
+            sent = sum(1 for r in results if r["ok"])
+            repo.mark_sent([r["message"]["id"] for r in results if r["ok"]])
+            self.sent += sent
+            EMAILS_PROCESSED.labels("sent").inc(sent)
+            now = datetime.now(UTC)
+            for r in results:
+                if r["ok"]:
+                    continue
+                m = r["message"]
+                if r["retryable"] and m["attempts"] < self.max_attempts:
+                    retry_at = now + timedelta(seconds=self.backoff_delay(m["attempts"]))
+                    self.retried += 1
+                    EMAILS_PROCESSED.labels("retried").inc()
+                else:
+                    retry_at = None
+                    self.failed += 1
+                    EMAILS_PROCESSED.labels("failed").inc()
+                    print(f"❌ Email abandonné pour {m['to_email']} après {m['attempts']} essai(s): {r['error']}")
+                repo.mark_failed(m["id"], r["error"], retry_at)
+        finally:
+            db.close()
+
+    # ---------- Boucle en arrière-plan ----------
+    def wake(self) -> None:
+        """Réveille la boucle (appelé après une mise en file pour un envoi sans attendre le poll)."""
+        self._wake.set()
+
+    def run_forever(self) -> None:
+        while not self._stop.is_set():
+            try:
+                processed = self.run_once()
+            except Exception as e:
+                print(f"⚠️ Worker email: erreur lors du traitement de la file: {e}")
+                processed = 0
+            if processed == 0:
+                # File vide : attendre le prochain poll ou un réveil explicite
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run_forever, name="email-outbox-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._executor.shutdown(wait=False)
+        self.http.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": bool(self._thread and self._thread.is_alive()),
+            "concurrency": self.concurrency,
+            "batch_size": self.batch_size,
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
@@ -0,0 +1,260 @@
+"""
+Export en masse des factures pour la comptabilité (clôture mensuelle).
+
+Trois formats, produits en flux (générateurs de `bytes`) :
+- "zip"   : une archive contenant le PDF de chaque facture
+- "csv"   : un grand livre, une ligne par article facturé
+- "jsonl" : un objet JSON par facture, avec ses lignes
+
+La mémoire reste constante quel que soit le volume :
+- les lignes sont lues par lots avec `yield_per` (curseur côté serveur sous PostgreSQL)
+  et la session est vidée après chaque lot
+- l'archive ZIP est écrite au fil de l'eau (seul son répertoire central, ~100 octets
+  par fichier, reste en mémoire jusqu'à la fin)
+- les PDF sont rendus dans un pool de processus, un lot à la fois ; ceux déjà présents
+  dans `invoice_pdf_store` sont relus tels quels
+
+Configuration : INVOICE_EXPORT_BATCH_SIZE (200), INVOICE_EXPORT_WORKERS (min(4, nb CPU) ; 0 = rendu direct)
+"""
+
+import csv
+import io
+import json
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, time, timedelta, UTC
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload, selectinload
+
+from database.database import SessionLocal
+from database.models import Invoice, Order, OrderItem, Payment, User
+from services.invoice_pdf import (
+    build_invoice_render_data,
+    invoice_pdf_store,
+    render_digest,
+    render_invoice_pdf_bytes,
+)
+
+EXPORT_FORMATS = {
+    "zip": ("application/zip", "zip"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "jsonl": ("application/x-ndjson", "jsonl"),
+}
+
+LEDGER_COLUMNS = [
+    "invoice_number", "invoice_id", "issued_at", "order_id", "customer_email",
+    "customer_name", "product_id", "product_name", "unit_price_cents", "quantity",
+    "line_total_cents", "invoice_total_cents",
+]
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+def _period_bounds(start: date, end: date) -> Tuple[datetime, datetime]:
+    """[début du jour `start`, début du lendemain de `end`[ en UTC (bornes incluses côté jour)."""
+    return (
+        datetime.combine(start, time.min, tzinfo=UTC),
+        datetime.combine(end + timedelta(days=1), time.min, tzinfo=UTC),
+    )
+
+
+def invoice_number(invoice_id) -> str:
+    return f"INV-{str(invoice_id)[:8].upper()}"
+
+
+class _StreamSink:
+    """Fichier en écriture seule, non positionnable : zipfile y écrit en mode flux."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class InvoiceExporter:
+    """Produit un export de factures sur une période, lot par lot."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Any] = SessionLocal,
+        batch_size: Optional[int] = None,
+        workers: Optional[int] = None,
+        store=None,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = max(1, batch_size or _env_int("INVOICE_EXPORT_BATCH_SIZE", 200))
+        self.workers = workers if workers is not None else _env_int(
+            "INVOICE_EXPORT_WORKERS", min(4, os.cpu_count() or 1)
+        )
+        self.store = store if store is not None else invoice_pdf_store
+
+    def stream(self, fmt: str, start: date, end: date) -> Iterator[bytes]:
+        if fmt == "zip":
+            return self.stream_zip(start, end)
+        if fmt == "csv":
+            return self.stream_csv(start, end)
+        if fmt == "jsonl":
+            return self.stream_jsonl(start, end)
+        raise ValueError(f"Format d'export inconnu: {fmt}")
+
+    # ---------- Grand livre (CSV / JSON Lines) ----------
+    def _iter_ledger_batches(self, start: date, end: date) -> Iterator[list]:
+        """Lots de lignes (facture × article), triés par date, facture puis nom d'article."""
+        lower, upper = _period_bounds(start, end)
+        stmt = (
+            select(
+                Invoice.id, Invoice.created_at, Invoice.order_id, Invoice.total_cents,
+                User.email, User.first_name, User.last_name,
+                OrderItem.product_id, OrderItem.name, OrderItem.unit_price_cents, OrderItem.quantity,
+            )
+            .join(User, User.id == Invoice.user_id)
+            .join(OrderItem, OrderItem.order_id == Invoice.order_id)
+            .where(Invoice.created_at >= lower, Invoice.created_at < upper)
+            # Lignes d'une facture dans un ordre stable (l'id d'une ligne est aléatoire)
+            .order_by(Invoice.created_at, Invoice.id, OrderItem.name, OrderItem.product_id)
+            .execution_options(yield_per=self.batch_size)
+        )
+        db = self.session_factory()
+        try:
+            yield from db.execute(stmt).partitions()
+        finally:
+            db.close()
+
+    def stream_csv(self, start: date, end: date) -> Iterator[bytes]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(LEDGER_COLUMNS)
+        for rows in self._iter_ledger_batches(start, end):
+            for r in rows:
+                writer.writerow([
+                    invoice_number(r.id), str(r.id), r.created_at.isoformat(), str(r.order_id), r.email,
+                    f"{r.first_name} {r.last_name}", str(r.product_id), r.name, r.unit_price_cents,
+                    r.quantity, r.unit_price_cents * r.quantity, r.total_cents,
+                ])
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+
+    def stream_jsonl(self, start: date, end: date) -> Iterator[bytes]:
+        current: Optional[Dict[str, Any]] = None
+        for rows in self._iter_ledger_batches(start, end):
+            out = []
+            for r in rows:
+                if current is None or current["invoice_id"] != str(r.id):
+                    # Lignes triées par facture : la précédente est complète
+                    if current is not None:
+                        out.append(json.dumps(current, ensure_ascii=False))
+                    current = {
+                        "invoice_id": str(r.id),
+                        "number": invoice_number(r.id),
+                        "issued_at": r.created_at.isoformat(),
+                        "order_id": str(r.order_id),
+                        "customer": {"email": r.email, "first_name": r.first_name, "last_name": r.last_name},
+                        "total_cents": r.total_cents,
+                        "lines": [],
+                    }
+                current["lines"].append({
+                    "product_id": str(r.product_id),
+                    "name": r.name,
+                    "unit_price_cents": r.unit_price_cents,
+                    "quantity": r.quantity,
+                    "line_total_cents": r.unit_price_cents * r.quantity,
+                })
+            if out:
+                yield ("\n".join(out) + "\n").encode("utf-8")
+        if current is not None:
+            yield (json.dumps(current, ensure_ascii=False) + "\n").encode("utf-8")
+
+    # ---------- Archive de PDF ----------
+    def _iter_render_batches(self, start: date, end: date) -> Iterator[List[Tuple[str, Dict[str, Any]]]]:
+        """Lots de (nom de fichier, données de rendu) ; la session est vidée après chaque lot."""
+        lower, upper = _period_bounds(start, end)
+        stmt = (
+            select(Invoice)
+            .where(Invoice.created_at >= lower, Invoice.created_at < upper)
+            .order_by(Invoice.created_at, Invoice.id)
+            .execution_options(yield_per=self.batch_size)
+        )
+        db = self.session_factory()
+        try:
+            for invoices in db.execute(stmt).scalars().partitions():
+                order_ids = [inv.order_id for inv in invoices]
+                orders = {
+                    o.id: o
+                    for o in db.query(Order)
+                    .options(selectinload(Order.items), joinedload(Order.delivery), joinedload(Order.user))
+                    .filter(Order.id.in_(order_ids))
+                }
+                payments: Dict[Any, List[Payment]] = {}
+                for p in db.query(Payment).filter(Payment.order_id.in_(order_ids)):
+                    payments.setdefault(p.order_id, []).append(p)
+
+                batch = []
+                for inv in invoices:
+                    order = orders.get(inv.order_id)
+                    if order is None:
+                        continue
+                    data = build_invoice_render_data(order, inv, payments.get(inv.order_id, []))
+                    batch.append((f"{invoice_number(inv.id)}_{inv.id}.pdf", str(inv.id), data))
+                # Les objets du lot ne sont plus utiles : ne pas les garder dans l'identity map
+                db.expunge_all()
+                yield batch
+        finally:
+            db.close()
+
+    def _render_batch(self, executor: Optional[ProcessPoolExecutor], batch) -> Iterator[Tuple[str, bytes]]:
+        """PDF d'un lot dans l'ordre : relus depuis le stockage disque ou rendus dans le pool."""
+        pending = []
+        for name, invoice_id, data in batch:
+            path = self.store.get(invoice_id, render_digest(data)) if self.store else None
+            pending.append((name, path, data))
+
+        to_render = [data for _, path, data in pending if path is None]
+        if executor is not None:
+            rendered = executor.map(render_invoice_pdf_bytes, to_render, chunksize=4)
+        else:
+            rendered = map(render_invoice_pdf_bytes, to_render)
+
+        for name, path, _ in pending:
+            if path is not None:
+                with open(path, "rb") as f:
+                    yield name, f.read()
+            else:
+                yield name, next(rendered)
+
+    def stream_zip(self, start: date, end: date) -> Iterator[bytes]:
+        executor = None
+        if self.workers > 0:
+            executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        sink = _StreamSink()
+        try:
+            with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+                for batch in self._iter_render_batches(start, end):
+                    for name, pdf in self._render_batch(executor, batch):
+                        archive.writestr(name, pdf)
+                        yield sink.drain()
+            yield sink.drain()
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
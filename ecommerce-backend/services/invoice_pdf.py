@@ -0,0 +1,370 @@
+"""
+Rendu PDF des factures et stockage sur disque adressé par contenu.
+
+- Les styles ReportLab sont construits une seule fois par processus
+- Chaque PDF est écrit directement dans un fichier `{invoice_id}-{empreinte}.pdf`,
+  l'empreinte étant le SHA-256 des données rendues : tant que la facture, le
+  paiement et la livraison ne changent pas, le même fichier est resservi
+- L'empreinte sert aussi d'ETag pour les téléchargements (If-None-Match → 304)
+- `prerender_invoice_pdf` génère le PDF en tâche de fond dès le passage en PAYEE
+
+Configuration : INVOICE_PDF_DIR (défaut : data/invoice_pdfs dans ecommerce-backend)
+"""
+
+import glob
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime
+from functools import lru_cache
+from typing import IO, Any, Callable, Dict, List, Optional, Tuple
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_RIGHT
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+
+from database.database import SessionLocal
+from database.models import Invoice, Order, Payment
+from database.repositories_simple import (
+    PostgreSQLInvoiceRepository,
+    PostgreSQLOrderRepository,
+    PostgreSQLPaymentRepository,
+)
+
+
+# ------------------------------- Styles --------------------------------
+@lru_cache(maxsize=1)
+def invoice_styles() -> Dict[str, ParagraphStyle]:
+    """Styles de la facture, construits une fois par processus (lecture seule ensuite)."""
+    styles = getSampleStyleSheet()
+    return {
+        "title": ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=24,
+            spaceAfter=30,
+            alignment=TA_CENTER,
+            textColor=colors.HexColor('#1f2937')
+        ),
+        "heading": ParagraphStyle(
+            'CustomHeading',
+            parent=styles['Heading2'],
+            fontSize=16,
+            spaceAfter=12,
+            textColor=colors.HexColor('#374151')
+        ),
+        "normal": ParagraphStyle(
+            'CustomNormal',
+            parent=styles['Normal'],
+            fontSize=10,
+            spaceAfter=6
+        ),
+        "total": ParagraphStyle(
+            'TotalStyle',
+            parent=styles['Normal'],
+            fontSize=14,
+            alignment=TA_RIGHT,
+            textColor=colors.HexColor('#1f2937')
+        ),
+        "footer": ParagraphStyle(
+            'FooterStyle',
+            parent=styles['Normal'],
+            fontSize=10,
+            alignment=TA_CENTER,
+            textColor=colors.HexColor('#6b7280')
+        ),
+    }
+
+
+_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f3f4f6')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('ALIGN', (1, 0), (1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 9),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+
+
+# ------------------------------- Rendu --------------------------------
+def _build_story(invoice_data, order_data, user_data, payment_data=None, delivery_data=None) -> list:
+    styles = invoice_styles()
+    normal_style = styles["normal"]
+    heading_style = styles["heading"]
+    story = []
+
+    # En-tête
+    story.append(Paragraph("FACTURE", styles["title"]))
+    story.append(Spacer(1, 20))
+
+    # Informations de la facture
+    invoice_date = datetime.fromtimestamp(invoice_data['issued_at']).strftime("%d/%m/%Y %H:%M")
+    story.append(Paragraph(f"<b>Numéro de facture:</b> {invoice_data['number']}", normal_style))
+    story.append(Paragraph(f"<b>Date d'émission:</b> {invoice_date}", normal_style))
+    story.append(Paragraph(f"<b>Commande:</b> #{order_data['id'][-8:]}", normal_style))
+    story.append(Spacer(1, 20))
+
+    # Informations client
+    story.append(Paragraph("FACTURÉ À:", heading_style))
+    story.append(Paragraph(f"{user_data['first_name']} {user_data['last_name']}", normal_style))
+    story.append(Paragraph(user_data['address'], normal_style))
+    story.append(Spacer(1, 20))
+
+    # Tableau des articles
+    story.append(Paragraph("DÉTAIL DES ARTICLES", heading_style))
+    table_data = [['ID Produit', 'Nom', 'Prix unitaire', 'Quantité', 'Total']]
+    total_cents = 0
+    for line in invoice_data['lines']:
+        unit_price = line['unit_price_cents'] / 100
+        quantity = line['quantity']
+        line_total = (line['unit_price_cents'] * quantity) / 100
+        total_cents += line['unit_price_cents'] * quantity
+
+        table_data.append([
+            line['product_id'][:8],
+            line['name'],
+            f"{unit_price:.2f} €",
+            str(quantity),
+            f"{line_total:.2f} €"
+        ])
+
+    table = Table(table_data, colWidths=[1.2*inch, 2.5*inch, 1*inch, 0.8*inch, 1*inch])
+    table.setStyle(_TABLE_STYLE)
+    story.append(table)
+    story.append(Spacer(1, 20))
+
+    # Total
+    story.append(Paragraph(f"<b>TOTAL: {total_cents / 100:.2f} €</b>", styles["total"]))
+    story.append(Spacer(1, 30))
+
+    # Informations de paiement
+    if payment_data:
+        story.append(Paragraph("INFORMATIONS DE PAIEMENT", heading_style))
+        story.append(Paragraph(f"<b>Montant payé:</b> {payment_data['amount_cents'] / 100:.2f} €", normal_style))
+        story.append(Paragraph(f"<b>Statut:</b> {'PAYÉ ✓' if payment_data['status'] == 'SUCCEEDED' else 'ÉCHEC'}", normal_style))
+        story.append(Paragraph(f"<b>Date de paiement:</b> {datetime.fromtimestamp(payment_data['created_at']).strftime('%d/%m/%Y %H:%M')}", normal_style))
+        story.append(Spacer(1, 20))
+
+    # Informations de livraison
+    if delivery_data:
+        story.append(Paragraph("INFORMATIONS DE LIVRAISON", heading_style))
+        story.append(Paragraph(f"<b>Transporteur:</b> {delivery_data['transporteur']}", normal_style))
+        if delivery_data.get('tracking_number'):
+            story.append(Paragraph(f"<b>Numéro de suivi:</b> {delivery_data['tracking_number']}", normal_style))
+        story.append(Paragraph(f"<b>Statut:</b> {delivery_data['delivery_status']}", normal_style))
+        story.append(Spacer(1, 20))
+
+    # Pied de page
+    story.append(Spacer(1, 30))
+    story.append(Paragraph("Merci pour votre achat !", styles["footer"]))
+    return story
+
+
+def render_invoice_pdf(target, invoice_data, order_data, user_data, payment_data=None, delivery_data=None) -> None:
+    """Écrit le PDF de la facture dans `target` (chemin de fichier ou objet fichier)."""
+    doc = SimpleDocTemplate(target, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
+    doc.build(_build_story(invoice_data, order_data, user_data, payment_data, delivery_data))
+
+
+def render_invoice_pdf_bytes(render_data: Dict[str, Any]) -> bytes:
+    """Rend le PDF en mémoire à partir de `build_invoice_render_data` (utilisable dans un pool de processus)."""
+    buffer = io.BytesIO()
+    render_invoice_pdf(buffer, **render_data)
+    return buffer.getvalue()
+
+
+def generate_invoice_pdf(invoice_data, order_data, user_data, payment_data=None, delivery_data=None) -> io.BytesIO:
+    """Génère un PDF de facture en mémoire (préférer `InvoicePdfStore` pour les téléchargements)."""
+    buffer = io.BytesIO()
+    render_invoice_pdf(buffer, invoice_data, order_data, user_data, payment_data, delivery_data)
+    buffer.seek(0)
+    return buffer
+
+
+# ------------------------------- Données --------------------------------
+def get_or_create_invoice(db, order: Order) -> Invoice:
+    """Retourne la facture de la commande, créée à la volée si elle n'existe pas encore."""
+    invoice_repo = PostgreSQLInvoiceRepository(db)
+    invoice = invoice_repo.get_by_order_id(str(order.id))
+    if not invoice:
+        # Création concurrente possible (consommateur invoice_pdf) : ON CONFLICT puis relecture
+        total_cents = sum(item.unit_price_cents * item.quantity for item in order.items)
+        invoice = invoice_repo.get_or_create_for_order(str(order.id), str(order.user_id), total_cents)
+    return invoice
+
+
+def build_invoice_render_data(order: Order, invoice: Invoice, payments: List[Payment]) -> Dict[str, Any]:
+    """Rassemble tout ce qui apparaît sur le PDF (arguments de `render_invoice_pdf`)."""
+    user = order.user
+    payment_data = None
+    if payments:
+        payment = payments[0]  # Prendre le premier paiement
+        payment_data = {
+            "amount_cents": payment.amount_cents,
+            "status": payment.status,
+            "created_at": payment.created_at.timestamp()
+        }
+
+    delivery_data = None
+    if order.delivery:
+        delivery_data = {
+            "transporteur": order.delivery.transporteur,
+            "tracking_number": order.delivery.tracking_number,
+            "delivery_status": order.delivery.delivery_status
+        }
+
+    return {
+        "invoice_data": {
+            "id": str(invoice.id),
+            "number": f"INV-{str(invoice.id)[:8].upper()}",
+            "issued_at": invoice.created_at.timestamp(),
+            "lines": [
+                {
+                    "product_id": str(item.product_id),
+                    "name": item.name,
+                    "unit_price_cents": item.unit_price_cents,
+                    "quantity": item.quantity
+                }
+                for item in order.items
+            ]
+        },
+        "order_data": {
+            "id": str(order.id),
+            "user_id": str(order.user_id),
+            "status": order.status
+        },
+        "user_data": {
+            "first_name": user.first_name,
+            "last_name": user.last_name,
+            "address": user.address
+        },
+        "payment_data": payment_data,
+        "delivery_data": delivery_data,
+    }
+
+
+def render_digest(render_data: Dict[str, Any]) -> str:
+    """Empreinte stable des données rendues (clé du fichier et ETag)."""
+    payload = json.dumps(render_data, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()[:32]
+
+
+# ------------------------------- Stockage --------------------------------
+class InvoicePdfStore:
+    """Répertoire de PDF `{invoice_id}-{empreinte}.pdf`, écrits de façon atomique."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.renders = 0
+
+    def path_for(self, invoice_id: str, digest: str) -> str:
+        return os.path.join(self.directory, f"{invoice_id}-{digest}.pdf")
+
+    def get(self, invoice_id: str, digest: str) -> Optional[str]:
+        path = self.path_for(invoice_id, digest)
+        return path if os.path.exists(path) else None
+
+    def get_or_render(self, invoice_id: str, render_data: Dict[str, Any], digest: Optional[str] = None) -> Tuple[str, str]:
+        """Retourne (chemin, empreinte) du PDF, en le générant s'il n'existe pas encore."""
+        digest = digest or render_digest(render_data)
+        path = self.get(invoice_id, digest)
+        if path:
+            with self._lock:
+                self.hits += 1
+            return path, digest
+
+        os.makedirs(self.directory, exist_ok=True)
+        # Écriture dans un fichier temporaire du même répertoire puis renommage atomique :
+        # un lecteur concurrent ne voit jamais de PDF partiel
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=f".{invoice_id}-", suffix=".tmp")
+        os.close(fd)
+        try:
+            render_invoice_pdf(tmp_path, **render_data)
+            path = self.path_for(invoice_id, digest)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        with self._lock:
+            self.renders += 1
+        self._remove_stale(invoice_id, keep=path)
+        return path, digest
+
+    def open_or_render(self, invoice_id: str, render_data: Dict[str, Any], digest: Optional[str] = None) -> IO[bytes]:
+        """Ouvre le PDF (généré au besoin) et retourne le fichier ouvert, à fermer par l'appelant.
+
+        Le fichier est servi depuis ce descripteur : si un rendu concurrent supprime
+        cette version entre-temps (`_remove_stale`), la lecture en cours n'est pas
+        interrompue. Si elle a disparu avant l'ouverture, elle est générée à nouveau.
+        """
+        path, _ = self.get_or_render(invoice_id, render_data, digest)
+        try:
+            return open(path, "rb")
+        except FileNotFoundError:
+            path, _ = self.get_or_render(invoice_id, render_data, digest)
+            return open(path, "rb")
+
+    def _remove_stale(self, invoice_id: str, keep: str) -> None:
+        """Supprime les versions précédentes de la facture (statut ou livraison modifiés depuis).
+
+        Un téléchargement en cours d'une ancienne version n'est pas affecté : il lit
+        depuis un fichier déjà ouvert (`open_or_render`).
+        """
+        for old in glob.glob(os.path.join(self.directory, f"{glob.escape(invoice_id)}-*.pdf")):
+            if old != keep:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"directory": self.directory, "hits": self.hits, "renders": self.renders}
+
+
+_DEFAULT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "invoice_pdfs")
+invoice_pdf_store = InvoicePdfStore(os.getenv("INVOICE_PDF_DIR", _DEFAULT_DIR))
+
+
+def render_order_invoice_pdf(db: Any, order_id: str, store: Optional[InvoicePdfStore] = None) -> bool:
+    """Crée au besoin la facture d'une commande payée et génère son PDF (erreurs propagées).
+
+    Retourne False si la commande n'existe pas.
+    """
+    store = store or invoice_pdf_store
+    order = PostgreSQLOrderRepository(db).get_by_id_with_details(order_id)
+    if not order:
+        return False
+    invoice = get_or_create_invoice(db, order)
+    payments = PostgreSQLPaymentRepository(db).get_by_order_id(order_id)
+    store.get_or_render(str(invoice.id), build_invoice_render_data(order, invoice, payments))
+    return True
+
+
+def prerender_invoice_pdf(
+    order_id: str,
+    session_factory: Callable[[], Any] = SessionLocal,
+    store: Optional[InvoicePdfStore] = None,
+) -> None:
+    """Tâche de fond : crée la facture d'une commande payée et génère son PDF."""
+    db = session_factory()
+    try:
+        render_order_invoice_pdf(db, order_id, store)
+    except Exception as e:
+        print(f"⚠️ Pré-génération du PDF de la commande {order_id} impossible: {e}")
+    finally:
+        db.close()
@@ -0,0 +1,349 @@
+"""
+Planificateur des tâches de maintenance périodiques.
+
+Tâches (une exécution = des lots bornés, une transaction courte par lot, avec une
+pause entre deux lots pour laisser les réplicas suivre) :
+- reset_tokens : supprime les tokens de réinitialisation de mot de passe expirés
+- reservations : passe en EXPIRED les réservations de stock échues
+- abandoned_carts : supprime les paniers inactifs depuis CART_ABANDON_DAYS
+- stale_orders : annule les commandes CREE de plus de ORDER_OPEN_TTL_HOURS sans
+  réservation de stock valable (événement ANNULEE écrit, sans email au client)
+- idempotency_keys : supprime les clés d'idempotence de plus de IDEMPOTENCY_KEY_RETENTION_HOURS
+- email_outbox : supprime les emails envoyés depuis plus de EMAIL_OUTBOX_RETENTION_DAYS
+  (leur contenu peut contenir un lien de réinitialisation encore valable)
+Les deux purges parcourent leur table par pagination keyset. Chaque exécution
+rapporte son débit (lignes/s) dans les logs, les statistiques et les métriques.
+
+Chaque worker de l'API peut faire tourner le planificateur. Élection par tâche :
+- verrou consultatif PostgreSQL (pg_try_advisory_xact_lock) tenu pendant l'exécution :
+  jamais deux exécutions simultanées d'une même tâche
+- ligne de maintenance_job_runs mise à jour conditionnellement : une seule exécution
+  par intervalle, tous workers confondus
+Sous SQLite (tests), seul un verrou local au processus est pris.
+
+Configuration (variables d'environnement) :
+- MAINTENANCE_TICK_SECONDS (30) : fréquence de vérification des tâches dues
+- MAINTENANCE_<TÂCHE>_INTERVAL_SECONDS, MAINTENANCE_<TÂCHE>_BATCH_SIZE et
+  MAINTENANCE_<TÂCHE>_BATCH_PAUSE_SECONDS, par ex. MAINTENANCE_RESET_TOKENS_INTERVAL_SECONDS (3600),
+  MAINTENANCE_RESERVATIONS_BATCH_SIZE (500)
+- MAINTENANCE_BATCH_PAUSE_SECONDS (0.1) : pause par défaut entre deux lots
+- CART_ABANDON_DAYS (30), ORDER_OPEN_TTL_HOURS (24), IDEMPOTENCY_KEY_RETENTION_HOURS (24),
+  EMAIL_OUTBOX_RETENTION_DAYS (7)
+
+Lancement autonome : python -m scripts.maintenance
+Dans l'API : démarré en thread au démarrage si MAINTENANCE_IN_PROCESS=1 (défaut).
+"""
+
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, UTC
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from database.database import SessionLocal
+from database.repositories_simple import (
+    PostgreSQLCartRepository,
+    PostgreSQLEmailOutboxRepository,
+    PostgreSQLIdempotencyKeyRepository,
+    PostgreSQLMaintenanceJobRunRepository,
+    PostgreSQLOrderEventRepository,
+    PostgreSQLOrderRepository,
+    PostgreSQLStockReservationRepository,
+    PostgreSQLUserRepository,
+)
+from enums import OrderStatus
+from services.auth_service import AuthService
+from utils.metrics import (
+    MAINTENANCE_JOB_BATCHES, MAINTENANCE_JOB_DURATION, MAINTENANCE_JOB_ROWS, MAINTENANCE_JOB_RUNS,
+)
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+def _lock_key(name: str) -> int:
+    """Clé du verrou consultatif d'une tâche (bigint signé stable, dérivé du nom)."""
+    digest = hashlib.sha256(f"maintenance:{name}".encode()).digest()
+    return int.from_bytes(digest[:8], "big", signed=True)
+
+
+# ---------- Tâches ----------
+# Un lot : run_batch(db, limit, cursor) -> (lignes traitées, curseur du lot suivant),
+# curseur None sur le dernier lot.
+BatchResult = Tuple[int, Optional[Any]]
+
+
+class MaintenanceJob:
+    """Tâche périodique : `run_batch(db, limit, cursor)` traite un lot (sans commit).
+
+    Le curseur retourné est passé au lot suivant (pagination keyset) ; None termine
+    l'exécution. `pause` : secondes d'attente entre deux lots.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        run_batch: Callable[[Any, int, Optional[Any]], BatchResult],
+        interval: float,
+        batch_size: int,
+        pause: float = 0.0,
+    ):
+        self.name = name
+        self.run_batch = run_batch
+        self.interval = interval
+        self.batch_size = max(1, batch_size)
+        self.pause = max(0.0, pause)
+
+
+def _until_short_batch(count: int, limit: int) -> BatchResult:
+    # Les lignes traitées sortent du critère de sélection : pas de curseur,
+    # on continue tant que les lots sont complets
+    return count, (True if count >= limit else None)
+
+
+def purge_reset_tokens(db: Any, limit: int, cursor: Optional[Any] = None) -> BatchResult:
+    return _until_short_batch(AuthService(PostgreSQLUserRepository(db)).cleanup_expired_tokens(limit), limit)
+
+
+def expire_reservations(db: Any, limit: int, cursor: Optional[Any] = None) -> BatchResult:
+    return _until_short_batch(PostgreSQLStockReservationRepository(db).expire_batch(limit), limit)
+
+
+def purge_idempotency_keys(db: Any, limit: int, cursor: Optional[Any], retention: timedelta) -> BatchResult:
+    purged = PostgreSQLIdempotencyKeyRepository(db).purge_older_than(datetime.now(UTC) - retention, limit)
+    return _until_short_batch(purged, limit)
+
+
+def purge_sent_emails(db: Any, limit: int, cursor: Optional[Any], retention: timedelta) -> BatchResult:
+    purged = PostgreSQLEmailOutboxRepository(db).purge_sent_older_than(datetime.now(UTC) - retention, limit)
+    return _until_short_batch(purged, limit)
+
+
+def purge_abandoned_carts(db: Any, limit: int, cursor: Optional[Any], max_idle: timedelta) -> BatchResult:
+    return PostgreSQLCartRepository(db).purge_abandoned(datetime.now(UTC) - max_idle, limit, cursor)
+
+
+def expire_stale_orders(db: Any, limit: int, cursor: Optional[Any], max_age: timedelta) -> BatchResult:
+    """Annule un lot de commandes ouvertes trop anciennes et libère leurs réservations.
+
+    L'événement ANNULEE est écrit dans la même transaction (notify=False : la commande
+    n'a jamais été payée, pas d'email au client).
+    """
+    now = datetime.now(UTC)
+    orders, next_cursor = PostgreSQLOrderRepository(db).lock_stale_open_orders(now - max_age, limit, cursor)
+    reservations = PostgreSQLStockReservationRepository(db)
+    events = PostgreSQLOrderEventRepository(db)
+    for order in orders:
+        reservations.release_for_order(str(order.id))
+        order.status = OrderStatus.ANNULEE.value  # type: ignore
+        order.cancelled_at = now  # type: ignore
+        events.append(order, OrderStatus.CREE, {"reason": "expired", "notify": False})
+    return len(orders), next_cursor
+
+
+def _job(
+    name: str, run_batch: Callable[[Any, int, Optional[Any]], BatchResult], interval: float, batch_size: int
+) -> MaintenanceJob:
+    prefix = f"MAINTENANCE_{name.upper()}"
+    return MaintenanceJob(
+        name,
+        run_batch,
+        _env_float(f"{prefix}_INTERVAL_SECONDS", interval),
+        _env_int(f"{prefix}_BATCH_SIZE", batch_size),
+        _env_float(f"{prefix}_BATCH_PAUSE_SECONDS", _env_float("MAINTENANCE_BATCH_PAUSE_SECONDS", 0.1)),
+    )
+
+
+def default_jobs() -> List[MaintenanceJob]:
+    """Tâches de l'application, intervalles et tailles de lot lus dans l'environnement."""
+    max_idle = timedelta(days=_env_float("CART_ABANDON_DAYS", 30))
+    max_age = timedelta(hours=_env_float("ORDER_OPEN_TTL_HOURS", 24))
+    key_retention = timedelta(hours=_env_float("IDEMPOTENCY_KEY_RETENTION_HOURS", 24))
+    email_retention = timedelta(days=_env_float("EMAIL_OUTBOX_RETENTION_DAYS", 7))
+    return [
+        _job("reset_tokens", purge_reset_tokens, 3600, 1000),
+        _job("reservations", expire_reservations, 60, 500),
+        _job("abandoned_carts", lambda db, limit, cursor: purge_abandoned_carts(db, limit, cursor, max_idle), 3600, 500),
+        _job("stale_orders", lambda db, limit, cursor: expire_stale_orders(db, limit, cursor, max_age), 900, 200),
+        _job("idempotency_keys",
+             lambda db, limit, cursor: purge_idempotency_keys(db, limit, cursor, key_retention), 3600, 1000),
+        _job("email_outbox", lambda db, limit, cursor: purge_sent_emails(db, limit, cursor, email_retention), 3600, 1000),
+    ]
+
+
+# ---------- Planificateur ----------
+class MaintenanceScheduler:
+    """Exécute les tâches de maintenance dues, en arrière-plan."""
+
+    def __init__(
+        self,
+        jobs: List[MaintenanceJob],
+        session_factory: Callable[[], Any] = SessionLocal,
+        tick: Optional[float] = None,
+    ):
+        self.jobs = {job.name: job for job in jobs}
+        self.session_factory = session_factory
+        self.tick = tick if tick is not None else _env_float("MAINTENANCE_TICK_SECONDS", 30)
+        self._local_locks = {name: threading.Lock() for name in self.jobs}
+        self._next_check: Dict[str, float] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.counters = {
+            name: {"runs": 0, "rows": 0, "errors": 0, "last_batches": 0,
+                   "last_duration_seconds": None, "last_rows_per_second": None}
+            for name in self.jobs
+        }
+
+    # ---------- Élection ----------
+    @contextmanager
+    def _leadership(self, name: str) -> Iterator[bool]:
+        """True si ce worker peut exécuter la tâche, verrou tenu jusqu'à la sortie du bloc.
+
+        Le verrou consultatif est lié à la transaction d'une session dédiée (compatible
+        avec un pooler en mode transaction) : il est libéré par le rollback final,
+        ou par PostgreSQL si le worker meurt.
+        """
+        local = self._local_locks[name]
+        if not local.acquire(blocking=False):
+            yield False
+            return
+        db = self.session_factory()
+        try:
+            if db.get_bind().dialect.name == "postgresql":
+                yield bool(db.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": _lock_key(name)}).scalar())
+            else:
+                yield True
+        finally:
+            db.rollback()
+            db.close()
+            local.release()
+
+    # ---------- Une exécution ----------
+    def run_job(self, name: str, force: bool = False) -> Optional[int]:
+        """Exécute la tâche si elle est due et qu'aucun autre worker ne l'exécute.
+
+        Retourne le nombre de lignes traitées, ou None si la tâche n'a pas été lancée.
+        `force` ignore l'intervalle depuis la dernière exécution (pas le verrou).
+        """
+        job = self.jobs[name]
+        with self._leadership(name) as leader:
+            if not leader or not self._start(job, force):
+                return None
+            start = time.perf_counter()
+            rows = batches = 0
+            cursor = None
+            error = None
+            try:
+                while not self._stop.is_set():
+                    count, cursor = self._run_batch(job, cursor)
+                    rows += count
+                    batches += 1
+                    # Pause entre deux lots (interrompue par stop()) : les réplicas rattrapent
+                    if cursor is None or self._stop.wait(job.pause):
+                        break
+            except Exception as e:
+                error = str(e) or e.__class__.__name__
+                print(f"⚠️ Maintenance: échec de la tâche {name} après {rows} ligne(s): {error}")
+            duration = time.perf_counter() - start
+            self._finish(job, duration, rows, batches, error)
+        return rows
+
+    def _start(self, job: MaintenanceJob, force: bool) -> bool:
+        db = self.session_factory()
+        try:
+            return PostgreSQLMaintenanceJobRunRepository(db).start_if_due(job.name, job.interval, force)
+        finally:
+            db.close()
+
+    def _run_batch(self, job: MaintenanceJob, cursor: Optional[Any]) -> BatchResult:
+        db = self.session_factory()
+        try:
+            result = job.run_batch(db, job.batch_size, cursor)
+            db.commit()
+            return result
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _finish(self, job: MaintenanceJob, duration: float, rows: int, batches: int, error: Optional[str]) -> None:
+        MAINTENANCE_JOB_DURATION.labels(job.name).observe(duration)
+        MAINTENANCE_JOB_RUNS.labels(job.name, "error" if error else "ok").inc()
+        MAINTENANCE_JOB_ROWS.labels(job.name).inc(rows)
+        MAINTENANCE_JOB_BATCHES.labels(job.name).inc(batches)
+        throughput = rows / duration if duration > 0 else 0.0
+        if rows:
+            print(f"🧹 Maintenance {job.name}: {rows} ligne(s) en {batches} lot(s), "
+                  f"{duration:.1f}s ({throughput:.0f} lignes/s)")
+        counters = self.counters[job.name]
+        counters["runs"] += 1
+        counters["rows"] += rows
+        counters["errors"] += 1 if error else 0
+        counters["last_batches"] = batches
+        counters["last_duration_seconds"] = round(duration, 3)
+        counters["last_rows_per_second"] = round(throughput, 1)
+        db = self.session_factory()
+        try:
+            PostgreSQLMaintenanceJobRunRepository(db).mark_finished(job.name, int(duration * 1000), rows, error)
+        finally:
+            db.close()
+
+    def run_pending(self) -> Dict[str, Optional[int]]:
+        """Lance les tâches dont l'intervalle local est écoulé. Retourne les lignes traitées par tâche lancée."""
+        results: Dict[str, Optional[int]] = {}
+        for name, job in self.jobs.items():
+            if self._stop.is_set():
+                break
+            now = time.monotonic()
+            if now < self._next_check.get(name, 0):
+                continue
+            # Même si un autre worker l'a exécutée : pas de nouvel essai avant un intervalle
+            self._next_check[name] = now + job.interval
+            rows = self.run_job(name)
+            if rows is not None:
+                results[name] = rows
+        return results
+
+    # ---------- Boucle en arrière-plan ----------
+    def run_forever(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_pending()
+            except Exception as e:
+                print(f"⚠️ Maintenance: erreur du planificateur: {e}")
+            self._stop.wait(self.tick)
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run_forever, name="maintenance-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": bool(self._thread and self._thread.is_alive()),
+            "tick_seconds": self.tick,
+            "jobs": {
+                name: {
+                    "interval_seconds": job.interval, "batch_size": job.batch_size,
+                    "batch_pause_seconds": job.pause, **self.counters[name],
+                }
+                for name, job in self.jobs.items()
+            },
+        }
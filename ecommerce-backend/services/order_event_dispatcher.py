@@ -0,0 +1,327 @@
+"""
+Dispatcher des événements de commande (outbox order_events).
+
+Les endpoints qui changent le statut d'une commande écrivent un événement dans la
+même transaction et ne font plus d'effet de bord eux-mêmes. Ce dispatcher :
+1. Réserve un lot d'événements prêts (FOR UPDATE SKIP LOCKED : plusieurs dispatchers possibles)
+2. Passe le lot à chaque consommateur, en un seul appel par consommateur :
+   - invoice_pdf : facture et PDF des commandes payées (re-rendu à chaque changement de statut)
+   - email : email de suivi au client (mis en file dans email_outbox)
+   - analytics : compteurs Prometheus par type d'événement et montants
+   - catalog_cache : invalidation du cache catalogue quand le stock a changé
+3. Marque DONE, ou reprogramme avec backoff exponentiel les événements dont un
+   consommateur a échoué (seuls les consommateurs en échec sont rejoués), ou abandonne (FAILED).
+   Un événement en erreur n'entraîne pas ses voisins de lot : seuls les événements
+   signalés par le consommateur (ou tout le lot s'il lève une exception) sont rejoués
+
+Configuration (variables d'environnement) :
+- ORDER_EVENT_BATCH_SIZE (100), ORDER_EVENT_MAX_ATTEMPTS (8)
+- ORDER_EVENT_BACKOFF_BASE_SECONDS (5), ORDER_EVENT_BACKOFF_MAX_SECONDS (3600)
+- ORDER_EVENT_POLL_SECONDS (1), ORDER_EVENT_LEASE_SECONDS (120)
+
+Lancement autonome : python -m scripts.order_event_dispatcher
+Dans l'API : démarré en thread au démarrage si ORDER_EVENTS_IN_PROCESS=1 (défaut).
+"""
+
+import os
+import random
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, UTC
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from database.database import SessionLocal
+from database.models import User
+from database.repositories_simple import (
+    PostgreSQLEmailOutboxRepository,
+    PostgreSQLOrderEventRepository,
+    _uuid_or_raw,
+)
+from enums import OrderStatus
+from services.email_service import EmailService
+from services.invoice_pdf import render_order_invoice_pdf
+from utils.metrics import ORDER_EVENTS, ORDER_EVENTS_AMOUNT_CENTS, ORDER_EVENTS_DISPATCH
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+# ---------- Consommateurs ----------
+class OrderEventConsumer(ABC):
+    """Consommateur d'événements de commande.
+
+    `handle` reçoit tout le lot d'événements qu'il accepte (dicts : id, order_id,
+    user_id, event_type, from_status, payload) et une session dédiée. Il retourne les
+    erreurs des seuls événements en échec ({id: message}, None si tout a réussi) :
+    ceux-là seuls sont rejoués plus tard. Une exception fait rejouer tout le lot,
+    pour ce consommateur seulement.
+    """
+    name = ""
+    event_types: Optional[frozenset] = None  # None : tous les types
+
+    def accepts(self, event: Dict[str, Any]) -> bool:
+        return self.event_types is None or event["event_type"] in self.event_types
+
+    @abstractmethod
+    def handle(self, db: Any, events: List[Dict[str, Any]]) -> Optional[Dict[Any, str]]:
+        ...
+
+
+class InvoicePdfConsumer(OrderEventConsumer):
+    """Facture et PDF des commandes payées : le premier téléchargement est servi depuis le disque."""
+    name = "invoice_pdf"
+    event_types = frozenset({
+        OrderStatus.PAYEE.value, OrderStatus.EXPEDIEE.value, OrderStatus.LIVREE.value, OrderStatus.REMBOURSEE.value,
+    })
+
+    def handle(self, db: Any, events: List[Dict[str, Any]]) -> Optional[Dict[Any, str]]:
+        # Un seul rendu par commande, dans son dernier état. La facture est validée dès sa
+        # création : un échec n'annule que le travail en cours pour cette commande.
+        errors: Dict[Any, str] = {}
+        for order_id in dict.fromkeys(e["order_id"] for e in events):
+            try:
+                render_order_invoice_pdf(db, order_id)
+            except Exception as e:
+                db.rollback()
+                errors.update({event["id"]: str(e) for event in events if event["order_id"] == order_id})
+        return errors
+
+
+class OrderEmailConsumer(OrderEventConsumer):
+    """Email de suivi au client, mis en file (le worker email l'envoie)."""
+    name = "email"
+    event_types = frozenset(EmailService.ORDER_STATUS_MESSAGES)
+
+    def __init__(self, email_service: Optional[EmailService] = None, on_enqueued: Optional[Callable[[], None]] = None):
+        self.email_service = email_service or EmailService()
+        self.on_enqueued = on_enqueued
+
+    def accepts(self, event: Dict[str, Any]) -> bool:
+        # notify=False : changement sans intérêt pour le client (commande jamais payée expirée)
+        return super().accepts(event) and event["payload"].get("notify", True)
+
+    def handle(self, db: Any, events: List[Dict[str, Any]]) -> Optional[Dict[Any, str]]:
+        user_ids = {_uuid_or_raw(e["user_id"]) for e in events}
+        users = {str(u.id): (str(u.email), str(u.first_name))
+                 for u in db.query(User).filter(User.id.in_(user_ids))}
+        outbox = PostgreSQLEmailOutboxRepository(db)
+        errors: Dict[Any, str] = {}
+        enqueued = False
+        for event in events:
+            user = users.get(event["user_id"])
+            if user is None:
+                continue
+            # Chaque email est validé à sa mise en file : un échec ne fait pas renvoyer les autres
+            try:
+                self.email_service.enqueue_order_status_email(
+                    outbox, user[0], user[1], event["order_id"], event["event_type"], event["payload"]
+                )
+                enqueued = True
+            except Exception as e:
+                db.rollback()
+                errors[event["id"]] = str(e)
+        if enqueued and self.on_enqueued is not None:
+            self.on_enqueued()
+        return errors
+
+
+class AnalyticsConsumer(OrderEventConsumer):
+    """Compteurs Prometheus : événements par type, montants payés et remboursés."""
+    name = "analytics"
+
+    def handle(self, db: Any, events: List[Dict[str, Any]]) -> Optional[Dict[Any, str]]:
+        for event in events:
+            ORDER_EVENTS.labels(event["event_type"]).inc()
+            amount = event["payload"].get("amount_cents")
+            if amount:
+                ORDER_EVENTS_AMOUNT_CENTS.labels(event["event_type"]).inc(amount)
+        return None
+
+
+class CatalogCacheConsumer(OrderEventConsumer):
+    """Invalide le cache catalogue (une fois par lot) quand un événement a modifié le stock."""
+    name = "catalog_cache"
+
+    def __init__(self, invalidate: Callable[[], None]):
+        self.invalidate = invalidate
+
+    def accepts(self, event: Dict[str, Any]) -> bool:
+        return bool(event["payload"].get("stock_changed"))
+
+    def handle(self, db: Any, events: List[Dict[str, Any]]) -> Optional[Dict[Any, str]]:
+        self.invalidate()
+        return None
+
+
+def default_consumers(
+    invalidate_catalog: Optional[Callable[[], None]] = None,
+    email_service: Optional[EmailService] = None,
+    on_email_enqueued: Optional[Callable[[], None]] = None,
+) -> List[OrderEventConsumer]:
+    """Consommateurs de l'application ; sans `invalidate_catalog`, pas d'invalidation du cache."""
+    consumers: List[OrderEventConsumer] = [
+        InvoicePdfConsumer(),
+        OrderEmailConsumer(email_service, on_email_enqueued),
+        AnalyticsConsumer(),
+    ]
+    if invalidate_catalog is not None:
+        consumers.append(CatalogCacheConsumer(invalidate_catalog))
+    return consumers
+
+
+# ---------- Dispatcher ----------
+class OrderEventDispatcher:
+    """Vide l'outbox order_events en arrière-plan, par lots."""
+
+    def __init__(
+        self,
+        consumers: List[OrderEventConsumer],
+        session_factory: Callable[[], Any] = SessionLocal,
+        batch_size: Optional[int] = None,
+        max_attempts: Optional[int] = None,
+        backoff_base: Optional[float] = None,
+        backoff_max: Optional[float] = None,
+        poll_interval: Optional[float] = None,
+        lease_seconds: Optional[float] = None,
+    ):
+        self.consumers = consumers
+        self.session_factory = session_factory
+        self.batch_size = max(1, batch_size or _env_int("ORDER_EVENT_BATCH_SIZE", 100))
+        self.max_attempts = max_attempts or _env_int("ORDER_EVENT_MAX_ATTEMPTS", 8)
+        self.backoff_base = backoff_base if backoff_base is not None else _env_float("ORDER_EVENT_BACKOFF_BASE_SECONDS", 5)
+        self.backoff_max = backoff_max if backoff_max is not None else _env_float("ORDER_EVENT_BACKOFF_MAX_SECONDS", 3600)
+        self.poll_interval = poll_interval if poll_interval is not None else _env_float("ORDER_EVENT_POLL_SECONDS", 1)
+        self.lease_seconds = lease_seconds if lease_seconds is not None else _env_float("ORDER_EVENT_LEASE_SECONDS", 120)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.dispatched = 0
+        self.retried = 0
+        self.failed = 0
+
+    # ---------- Politique de nouvel essai ----------
+    def backoff_delay(self, attempts: int) -> float:
+        """Délai avant le prochain essai : base * 2^(essais-1), plafonné, avec ±20 % d'aléa."""
+        delay = min(self.backoff_max, self.backoff_base * (2 ** max(0, attempts - 1)))
+        return delay * random.uniform(0.8, 1.2)
+
+    # ---------- Un passage ----------
+    def run_once(self) -> int:
+        """Réserve et diffuse un lot. Retourne le nombre d'événements traités."""
+        db = self.session_factory()
+        try:
+            claimed = PostgreSQLOrderEventRepository(db).claim_batch(self.batch_size, self.lease_seconds)
+            # Copier les données : chaque consommateur travaille dans sa propre session
+            events = [
+                {
+                    "id": e.id,
+                    "order_id": str(e.order_id),
+                    "user_id": str(e.user_id),
+                    "event_type": e.event_type,
+                    "from_status": e.from_status,
+                    "payload": dict(e.payload or {}),
+                    "attempts": e.attempts,
+                    "delivered_to": list(e.delivered_to or []),
+                    "errors": [],
+                }
+                for e in claimed
+            ]
+        finally:
+            db.close()
+        if not events:
+            return 0
+
+        for consumer in self.consumers:
+            pending = [e for e in events if consumer.name not in e["delivered_to"]]
+            batch = [e for e in pending if consumer.accepts(e)]
+            failed = self._run_consumer(consumer, batch) if batch else set()
+            for event in pending:
+                # Événement non concerné : considéré comme traité par ce consommateur
+                if event["id"] not in failed or not consumer.accepts(event):
+                    event["delivered_to"].append(consumer.name)
+        self._record(events)
+        return len(events)
+
+    def _run_consumer(self, consumer: OrderEventConsumer, batch: List[Dict[str, Any]]) -> Set[Any]:
+        """Passe le lot au consommateur. Retourne les id des événements en échec."""
+        db = self.session_factory()
+        try:
+            errors = consumer.handle(db, batch) or {}
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            errors = {event["id"]: str(e) for event in batch}
+        finally:
+            db.close()
+        ORDER_EVENTS_DISPATCH.labels(consumer.name, "error" if errors else "ok").inc()
+        for event in batch:
+            if event["id"] in errors:
+                event["errors"].append(f"{consumer.name}: {errors[event['id']]}")
+        return set(errors)
+
+    def _record(self, events: List[Dict[str, Any]]) -> None:
+        db = self.session_factory()
+        try:
+            repo = PostgreSQLOrderEventRepository(db)
+            done = [e for e in events if not e["errors"]]
+            repo.mark_done([e["id"] for e in done], [c.name for c in self.consumers])
+            self.dispatched += len(done)
+            now = datetime.now(UTC)
+            for event in events:
+                if not event["errors"]:
+                    continue
+                if event["attempts"] < self.max_attempts:
+                    retry_at = now + timedelta(seconds=self.backoff_delay(event["attempts"]))
+                    self.retried += 1
+                else:
+                    retry_at = None
+                    self.failed += 1
+                    print(f"❌ Événement {event['event_type']} de la commande {event['order_id']} abandonné "
+                          f"après {event['attempts']} essai(s): {'; '.join(event['errors'])}")
+                repo.mark_failed(event["id"], event["delivered_to"], "; ".join(event["errors"]), retry_at)
+        finally:
+            db.close()
+
+    # ---------- Boucle en arrière-plan ----------
+    def wake(self) -> None:
+        """Réveille la boucle (appelé après un changement de statut pour diffuser sans attendre le poll)."""
+        self._wake.set()
+
+    def run_forever(self) -> None:
+        while not self._stop.is_set():
+            try:
+                processed = self.run_once()
+            except Exception as e:
+                print(f"⚠️ Dispatcher d'événements: erreur lors du traitement de l'outbox: {e}")
+                processed = 0
+            if processed == 0:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run_forever, name="order-event-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": bool(self._thread and self._thread.is_alive()),
+            "batch_size": self.batch_size,
+            "consumers": [c.name for c in self.consumers],
+            "dispatched": self.dispatched,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
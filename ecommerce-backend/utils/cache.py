@@ -0,0 +1,469 @@
+"""
+Couche de cache : LRU + TTL en mémoire et cache partagé multi-workers.
+
+Utilisé pour servir les lectures fréquentes et rarement modifiées (catalogue
+produits, utilisateur courant, PDF de facture) sans aller en base à chaque requête.
+
+Contrats:
+- `TTLCache` : cache local au processus, borné (`maxsize`) et expirant (`ttl`)
+- `SharedCache` : espace de noms versionné au-dessus d'un backend
+  (`InMemoryBackend`, `RedisBackend`). `invalidate_all()` incrémente la version
+  du namespace ; les autres workers la relisent au plus tard après
+  `version_check_interval` secondes, leurs anciennes clés deviennent inaccessibles.
+  `invalidate(key)` n'atteint que le backend : le L1 des autres workers est borné
+  par `local_ttl` (ex: `version_check_interval` pour les utilisateurs)
+- Les valeurs sont sérialisées avec pickle : ne cacher que des données internes
+- Une panne du backend ne casse jamais une requête : elle compte comme un miss
+"""
+import logging
+import math
+import os
+import pickle
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from utils.metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Cache LRU avec expiration par entrée et compteurs hit/miss."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0, name: str = "cache"):
+        if maxsize <= 0:
+            raise ValueError("maxsize doit être strictement positif")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._hit_metric = CACHE_REQUESTS.labels(name, "hit")
+        self._miss_metric = CACHE_REQUESTS.labels(name, "miss")
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Retourne la valeur si présente et non expirée, sinon `default`."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                self._miss_metric.inc()
+                return default
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                self.misses += 1
+                self._miss_metric.inc()
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            self._hit_metric.inc()
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Enregistre une valeur (TTL par défaut du cache si `ttl` est None)."""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_set(self, key: Hashable, loader: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        """Retourne la valeur en cache ou la calcule via `loader()` et la stocke.
+
+        `loader` est appelé hors verrou : deux requêtes simultanées sur une clé
+        absente peuvent toutes deux charger, la dernière écriture gagne.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        value = loader()
+        self.set(key, value, ttl)
+        return value
+
+    def invalidate(self, key: Hashable) -> None:
+        """Supprime une entrée si elle existe."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Vide complètement le cache (les compteurs sont conservés)."""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Compteurs pour le monitoring (taille, hits, misses, ratio)."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+# ========== BACKENDS ==========
+
+class CacheBackend(ABC):
+    """Interface minimale d'un backend de cache (valeurs en bytes)."""
+
+    #: True si le stockage est partagé entre processus (Redis)
+    shared = False
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def incr(self, key: str) -> int:
+        ...
+
+    def get_int(self, key: str) -> int:
+        raw = self.get(key)
+        return int(raw) if raw is not None else 0
+
+
+class InMemoryBackend(CacheBackend):
+    """Backend local au processus (développement, worker unique)."""
+
+    shared = False
+
+    def __init__(self, maxsize: int = 4096):
+        self._cache = TTLCache(maxsize=maxsize, ttl=math.inf, name="memory-backend")
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            if key in self._counters:
+                return str(self._counters[key]).encode()
+        return self._cache.get(key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        self._cache.set(key, value, ttl=math.inf if ttl is None else ttl)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._counters.pop(key, None)
+        self._cache.invalidate(key)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+
+class RedisBackend(CacheBackend):
+    """Backend Redis partagé par tous les workers (client `redis-py` ou `FakeRedis`)."""
+
+    shared = True
+
+    def __init__(self, client: Any):
+        self.client = client
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisBackend":
+        import redis  # dépendance optionnelle : importée seulement si Redis est configuré
+        client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        return cls(client)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        if ttl is None:
+            self.client.set(key, value)
+        else:
+            # Redis attend un entier ; toujours au moins 1 seconde
+            self.client.set(key, value, ex=max(1, int(math.ceil(ttl))))
+
+    def delete(self, key: str) -> None:
+        self.client.delete(key)
+
+    def incr(self, key: str) -> int:
+        return int(self.client.incr(key))
+
+
+class FakeRedis:
+    """Client Redis minimal en mémoire (get/set/delete/incr) pour les tests.
+
+    Plusieurs `RedisBackend(FakeRedis())` partageant la même instance simulent
+    plusieurs workers branchés sur un même serveur Redis.
+    """
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[Optional[float], bytes]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key: str, value: Any, ex: Optional[int] = None) -> bool:
+        if not isinstance(value, bytes):
+            value = str(value).encode()
+        with self._lock:
+            self._data[key] = (time.monotonic() + ex if ex else None, value)
+        return True
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            return sum(1 for k in keys if self._data.pop(k, None) is not None)
+
+    def incr(self, key: str) -> int:
+        current = self.get(key)
+        value = int(current) + 1 if current is not None else 1
+        self.set(key, value)
+        return value
+
+
+def build_cache_backend() -> CacheBackend:
+    """Construit le backend depuis l'environnement.
+
+    - CACHE_BACKEND=redis|memory|fake (défaut : redis si REDIS_URL est défini, sinon memory)
+    - REDIS_URL=redis://host:6379/0
+    En cas d'échec de connexion à Redis, on retombe sur le backend mémoire.
+    """
+    kind = os.getenv("CACHE_BACKEND", "").strip().lower()
+    redis_url = os.getenv("REDIS_URL", "").strip()
+    if not kind:
+        kind = "redis" if redis_url else "memory"
+
+    if kind == "fake":
+        return RedisBackend(FakeRedis())
+    if kind == "redis":
+        try:
+            backend = RedisBackend.from_url(redis_url or "redis://localhost:6379/0")
+            backend.client.ping()
+            return backend
+        except Exception as e:
+            logger.warning("Cache Redis indisponible (%s), repli sur le cache mémoire", e)
+    return InMemoryBackend()
+
+
+# ========== CACHE PARTAGÉ VERSIONNÉ ==========
+
+class SharedCache:
+    """Espace de noms de cache partagé, invalidé par numéro de version.
+
+    Les clés réelles sont `"{namespace}:v{version}:{key}"`. Invalider revient à
+    incrémenter `"{namespace}:version"` dans le backend : aucune suppression de
+    masse, les anciennes entrées expirent d'elles-mêmes (TTL).
+
+    Un petit cache local (L1) évite un aller-retour réseau par lecture ; il est
+    indexé par clé versionnée, donc un changement de version l'invalide aussi.
+    La version est relue au plus toutes les `version_check_interval` secondes :
+    c'est le délai maximal pour qu'un worker voie une invalidation faite ailleurs.
+
+    `invalidate(key)` ne vide que le L1 du worker appelant : `local_ttl` borne la durée
+    de vie des entrées du L1, donc le délai avant que les autres workers voient la
+    suppression (relecture du backend partagé, ou du loader sans backend partagé :
+    plusieurs workers sur InMemoryBackend ont chacun leur propre L1).
+    """
+
+    def __init__(
+        self,
+        backend: CacheBackend,
+        namespace: str,
+        ttl: float = 60.0,
+        local_maxsize: int = 1024,
+        version_check_interval: float = 1.0,
+        local_ttl: Optional[float] = None,
+    ):
+        self.backend = backend
+        self.namespace = namespace
+        self.ttl = ttl
+        self.version_check_interval = version_check_interval
+        # Appliqué quel que soit le backend : sans backend partagé, le L1 de chaque
+        # worker est le seul stockage et invalidate() n'atteint pas celui des autres
+        self.local_ttl = min(ttl, local_ttl) if local_ttl is not None else ttl
+        self.local = TTLCache(maxsize=local_maxsize, ttl=self.local_ttl, name=f"{namespace}-local")
+        self._version_key = f"{namespace}:version"
+        self._version = 0
+        self._version_checked_at = -math.inf
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._metrics = {
+            "hits": CACHE_REQUESTS.labels(namespace, "hit"),
+            "misses": CACHE_REQUESTS.labels(namespace, "miss"),
+            "errors": CACHE_REQUESTS.labels(namespace, "error"),
+        }
+
+    def _current_version(self) -> int:
+        now = time.monotonic()
+        if now - self._version_checked_at < self.version_check_interval:
+            return self._version
+        try:
+            version = self.backend.get_int(self._version_key)
+        except Exception as e:
+            # Backend indisponible : on garde la dernière version connue
+            self._count("errors")
+            logger.debug("Lecture de version du cache %s impossible: %s", self.namespace, e)
+            version = self._version
+        with self._lock:
+            self._version = version
+            self._version_checked_at = now
+        return version
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:v{self._current_version()}:{key}"
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+        self._metrics[counter].inc()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Retourne la valeur (L1 puis backend partagé) ou `default`."""
+        full_key = self._key(key)
+        value = self.local.get(full_key, _MISSING)
+        if value is not _MISSING:
+            self._count("hits")
+            return value
+        if not self.backend.shared:
+            self._count("misses")
+            return default
+        try:
+            raw = self.backend.get(full_key)
+        except Exception as e:
+            self._count("errors")
+            logger.debug("Lecture du cache %s impossible: %s", self.namespace, e)
+            raw = None
+        if raw is None:
+            self._count("misses")
+            return default
+        try:
+            value = pickle.loads(raw)
+        except Exception:
+            self._count("errors")
+            self._count("misses")
+            return default
+        self.local.set(full_key, value)
+        self._count("hits")
+        return value
+
+    def get_local(self, key: str, default: Any = None) -> Any:
+        """Lecture du seul L1, sans aucun appel au backend, ou `default`.
+
+        Pour un appelant qui ne doit pas bloquer (boucle d'événements) : sur un miss,
+        appeler `get()` hors de la boucle. Dès que la version doit être relue
+        (`version_check_interval` écoulé), retourne `default` : une invalidation
+        faite par un autre worker est vue dans le même délai qu'avec `get()`.
+        """
+        if time.monotonic() - self._version_checked_at >= self.version_check_interval:
+            return default
+        value = self.local.get(f"{self.namespace}:v{self._version}:{key}", _MISSING)
+        if value is _MISSING:
+            return default
+        self._count("hits")
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Enregistre une valeur dans le L1 et, si partagé, dans le backend."""
+        full_key = self._key(key)
+        self.local.set(full_key, value, None if ttl is None else min(ttl, self.local_ttl))
+        if not self.backend.shared:
+            return
+        try:
+            self.backend.set(full_key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL),
+                             self.ttl if ttl is None else ttl)
+        except Exception as e:
+            self._count("errors")
+            logger.debug("Écriture du cache %s impossible: %s", self.namespace, e)
+
+    def get_or_set(self, key: str, loader: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        """Retourne la valeur en cache ou la calcule via `loader()` et la stocke."""
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        value = loader()
+        self.set(key, value, ttl)
+        return value
+
+    def invalidate(self, key: str) -> None:
+        """Supprime une clé dans la version courante (L1 local + backend).
+
+        Les autres workers la voient disparaître à l'expiration de leur L1 (`local_ttl`).
+        """
+        full_key = self._key(key)
+        self.local.invalidate(full_key)
+        if not self.backend.shared:
+            return
+        try:
+            self.backend.delete(full_key)
+        except Exception as e:
+            self._count("errors")
+            logger.debug("Suppression dans le cache %s impossible: %s", self.namespace, e)
+
+    def invalidate_all(self) -> None:
+        """Invalide tout le namespace pour tous les workers (nouvelle version)."""
+        try:
+            version = self.backend.incr(self._version_key)
+        except Exception as e:
+            # Sans backend, on invalide au moins ce worker
+            self._count("errors")
+            logger.warning("Invalidation du cache %s non propagée: %s", self.namespace, e)
+            version = self._version + 1
+        with self._lock:
+            self._version = version
+            self._version_checked_at = time.monotonic()
+        self.local.clear()
+
+    def clear(self) -> None:
+        """Alias de `invalidate_all()` (compatibilité avec `TTLCache`)."""
+        self.invalidate_all()
+
+    def stats(self) -> Dict[str, Any]:
+        """Compteurs pour le monitoring."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "name": self.namespace,
+                "backend": type(self.backend).__name__,
+                "version": self._version,
+                "ttl_seconds": self.ttl,
+                "local_ttl_seconds": self.local_ttl,
+                "version_check_interval": self.version_check_interval,
+                "local_size": len(self.local),
+                "hits": self.hits,
+                "misses": self.misses,
+                "errors": self.errors,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
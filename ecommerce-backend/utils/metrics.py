@@ -0,0 +1,294 @@
+"""
+Métriques Prometheus de l'API (exposées sur GET /metrics).
+
+Contenu:
+- HTTP : latence par route (histogramme), requêtes en cours, compteur par code de statut.
+  Le label `route` est le modèle de chemin ("/orders/{order_id}"), jamais l'URL brute
+- Pool SQLAlchemy : connexions empruntées, overflow, attente pour obtenir une connexion
+- Authentification : durée bcrypt (hash / vérification), rejets du pool bcrypt, décodage JWT
+- Caches : lectures par résultat (hit / miss / errors) ; le ratio se calcule côté Prometheus
+- File d'emails : profondeur par statut (lue en base au moment du scrape), envois du worker
+
+Plusieurs workers uvicorn : définir PROMETHEUS_MULTIPROC_DIR (répertoire vide au
+démarrage, voir docker-entrypoint.sh). Chaque worker y écrit ses valeurs et
+/metrics agrège tous les processus, quel que soit celui qui répond au scrape.
+
+`prometheus_client` est optionnel : sans lui, les métriques sont des objets
+inertes et /metrics répond 503.
+"""
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST,
+        CollectorRegistry,
+        Counter,
+        Gauge,
+        Histogram,
+        REGISTRY,
+        generate_latest,
+        multiprocess,
+    )
+    from prometheus_client.core import GaugeMetricFamily
+    PROMETHEUS_AVAILABLE = True
+except ImportError:  # dépendance optionnelle
+    PROMETHEUS_AVAILABLE = False
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+MULTIPROCESS = PROMETHEUS_AVAILABLE and bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+# Buckets de latence HTTP : de 5 ms à 10 s
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Attente d'une connexion du pool : l'essentiel doit rester sous la milliseconde
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+
+class _NoopMetric:
+    """Remplace une métrique quand prometheus_client n'est pas installé."""
+
+    def labels(self, *args: Any, **kwargs: Any) -> "_NoopMetric":
+        return self
+
+    def inc(self, amount: float = 1) -> None:
+        pass
+
+    def dec(self, amount: float = 1) -> None:
+        pass
+
+    def set(self, value: float) -> None:
+        pass
+
+    def observe(self, value: float) -> None:
+        pass
+
+
+def _counter(name: str, doc: str, labels: Iterable[str] = ()):
+    return Counter(name, doc, list(labels)) if PROMETHEUS_AVAILABLE else _NoopMetric()
+
+
+def _histogram(name: str, doc: str, labels: Iterable[str] = (), buckets: Optional[Tuple[float, ...]] = None):
+    if not PROMETHEUS_AVAILABLE:
+        return _NoopMetric()
+    return Histogram(name, doc, list(labels), buckets=buckets or Histogram.DEFAULT_BUCKETS)
+
+
+def _gauge(name: str, doc: str, labels: Iterable[str] = (), multiprocess_mode: str = "livesum"):
+    # livesum : somme sur les workers vivants (valeur d'un worker arrêté ignorée)
+    if not PROMETHEUS_AVAILABLE:
+        return _NoopMetric()
+    return Gauge(name, doc, list(labels), multiprocess_mode=multiprocess_mode)
+
+
+# ---------- HTTP ----------
+HTTP_REQUESTS = _counter("http_requests_total", "Requêtes HTTP traitées", ["method", "route", "status"])
+HTTP_LATENCY = _histogram(
+    "http_request_duration_seconds", "Durée de traitement des requêtes HTTP", ["method", "route"], LATENCY_BUCKETS
+)
+HTTP_IN_PROGRESS = _gauge("http_requests_in_progress", "Requêtes HTTP en cours", ["method"])
+
+# ---------- Pool de connexions SQLAlchemy ----------
+DB_POOL_CHECKED_OUT = _gauge("db_pool_checked_out_connections", "Connexions empruntées au pool")
+DB_POOL_OVERFLOW = _gauge("db_pool_overflow_connections", "Connexions ouvertes au-delà de pool_size")
+DB_POOL_SIZE = _gauge("db_pool_size_connections", "Taille configurée du pool (pool_size)")
+DB_POOL_WAIT = _histogram(
+    "db_pool_checkout_wait_seconds", "Attente pour obtenir une connexion du pool", buckets=POOL_WAIT_BUCKETS
+)
+
+# ---------- Authentification ----------
+BCRYPT_DURATION = _histogram(
+    "bcrypt_duration_seconds", "Durée des opérations bcrypt (file d'attente du pool comprise)", ["operation"],
+    (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+BCRYPT_REJECTED = _counter("bcrypt_rejected_total", "Opérations bcrypt refusées (pool saturé ou délai dépassé)")
+JWT_DECODE_DURATION = _histogram(
+    "jwt_decode_duration_seconds", "Durée de vérification d'un JWT (hors cache)",
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.01),
+)
+
+# ---------- Caches ----------
+CACHE_REQUESTS = _counter("cache_requests_total", "Lectures de cache par résultat", ["cache", "result"])
+
+# ---------- Emails ----------
+EMAILS_PROCESSED = _counter("email_outbox_processed_total", "Emails traités par le worker", ["result"])
+
+# ---------- Événements de commande ----------
+ORDER_EVENTS = _counter("order_events_total", "Événements de commande diffusés, par type", ["event_type"])
+ORDER_EVENTS_AMOUNT_CENTS = _counter(
+    "order_events_amount_cents_total", "Montants des commandes payées / remboursées (centimes)", ["event_type"]
+)
+ORDER_EVENTS_DISPATCH = _counter(
+    "order_events_dispatch_total", "Passages des consommateurs d'événements de commande", ["consumer", "result"]
+)
+
+# ---------- Maintenance ----------
+MAINTENANCE_JOB_DURATION = _histogram(
+    "maintenance_job_duration_seconds", "Durée des exécutions des tâches de maintenance", ["job"],
+    (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0),
+)
+MAINTENANCE_JOB_RUNS = _counter(
+    "maintenance_job_runs_total", "Exécutions des tâches de maintenance par résultat", ["job", "result"]
+)
+MAINTENANCE_JOB_ROWS = _counter("maintenance_job_rows_total", "Lignes traitées par les tâches de maintenance", ["job"])
+MAINTENANCE_JOB_BATCHES = _counter(
+    "maintenance_job_batches_total", "Lots (transactions) exécutés par les tâches de maintenance", ["job"]
+)
+
+
+# ---------- Instrumentation HTTP (middleware ASGI) ----------
+_route_paths: Dict[Any, str] = {}
+
+
+def route_template(scope: Dict[str, Any]) -> str:
+    """Modèle de chemin de la route qui a traité la requête ("/orders/{order_id}"), ou "unmatched"."""
+    # Le routeur Starlette ajoute "endpoint" au scope de la requête une fois la route trouvée
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    if endpoint not in _route_paths:
+        router = scope.get("router") or getattr(scope.get("app"), "router", None)
+        for route in getattr(router, "routes", []):
+            _route_paths.setdefault(getattr(route, "endpoint", None), getattr(route, "path", "unmatched"))
+    return _route_paths.get(endpoint, "unmatched")
+
+
+class PrometheusMiddleware:
+    """Mesure chaque requête HTTP ; le label route est résolu après le routage."""
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        in_progress = HTTP_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_progress.dec()
+            route = route_template(scope)
+            HTTP_LATENCY.labels(method, route).observe(elapsed)
+            HTTP_REQUESTS.labels(method, route, str(status["code"])).inc()
+
+
+# ---------- Instrumentation du pool SQLAlchemy ----------
+def instrument_engine(engine: Any) -> None:
+    """Suit l'état du pool de `engine` (événements checkout/checkin) et l'attente de connexion."""
+    if not PROMETHEUS_AVAILABLE:
+        return
+    from sqlalchemy import event
+
+    pool = engine.pool
+    if getattr(pool, "_metrics_instrumented", False):
+        return
+    size = getattr(pool, "size", None)
+    if callable(size):
+        DB_POOL_SIZE.set(size())
+
+    def _update_overflow() -> None:
+        overflow = getattr(pool, "overflow", None)
+        if callable(overflow):
+            DB_POOL_OVERFLOW.set(max(0, overflow()))
+
+    def on_checkout(*_args: Any) -> None:
+        DB_POOL_CHECKED_OUT.inc()
+        _update_overflow()
+
+    def on_checkin(*_args: Any) -> None:
+        # L'événement précède le retour effectif au pool : compter soi-même
+        DB_POOL_CHECKED_OUT.dec()
+        _update_overflow()
+
+    event.listen(pool, "checkout", on_checkout)
+    event.listen(pool, "checkin", on_checkin)
+
+    # Pas d'événement "début d'attente" dans SQLAlchemy : on chronomètre Pool.connect()
+    original_connect = pool.connect
+
+    def timed_connect():
+        start = time.perf_counter()
+        try:
+            return original_connect()
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - start)
+
+    pool.connect = timed_connect
+    pool._metrics_instrumented = True
+
+
+# ---------- Chronométrage ----------
+@contextmanager
+def observe_duration(histogram: Any) -> Iterator[None]:
+    """Observe la durée du bloc `with` dans `histogram` (exceptions comprises)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start)
+
+
+# ---------- Exposition ----------
+if PROMETHEUS_AVAILABLE:
+    class _ScrapeTimeCollector:
+        """Jauges calculées au moment du scrape (ex: profondeur de la file d'emails en base)."""
+
+        def __init__(self, name: str, doc: str, label: str, read: Callable[[], Dict[str, float]]):
+            self.name = name
+            self.doc = doc
+            self.label = label
+            self.read = read
+
+        def collect(self):
+            family = GaugeMetricFamily(self.name, self.doc, labels=[self.label])
+            try:
+                values = self.read()
+            except Exception:
+                values = {}
+            for key, value in values.items():
+                family.add_metric([str(key)], value)
+            yield family
+
+
+def render_metrics(scrape_gauges: Iterable[Tuple[str, str, str, Callable[[], Dict[str, float]]]] = ()) -> Tuple[bytes, str]:
+    """Retourne (corps, content-type) de l'exposition Prometheus de tous les workers."""
+    if not PROMETHEUS_AVAILABLE:
+        raise RuntimeError("prometheus_client n'est pas installé")
+    registry = CollectorRegistry()
+    if MULTIPROCESS:
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry.register(_RegistryProxy(REGISTRY))
+    for name, doc, label, read in scrape_gauges:
+        registry.register(_ScrapeTimeCollector(name, doc, label, read))
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+class _RegistryProxy:
+    """Expose le registre global dans un registre de scrape sans le modifier."""
+
+    def __init__(self, registry: Any):
+        self.registry = registry
+
+    def collect(self):
+        return self.registry.collect()
+
+
+def mark_process_dead(pid: Optional[int] = None) -> None:
+    """À l'arrêt d'un worker : retire ses jauges "live" des agrégats multiprocess."""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(pid or os.getpid())
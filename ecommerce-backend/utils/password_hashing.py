@@ -0,0 +1,166 @@
+"""
+Hachage bcrypt déporté dans un pool de processus borné.
+
+bcrypt est volontairement lent (~250 ms de CPU au coût 12) : exécuté dans le
+threadpool de FastAPI, une rafale de connexions bloque les requêtes panier et
+catalogue. Les appels sont donc envoyés dans un pool de processus dédié.
+
+Contrats:
+- `BCRYPT_ROUNDS` : coût bcrypt des nouveaux hash (défaut 12)
+- `BCRYPT_POOL_WORKERS` : nombre de processus (défaut 2 ; 0 = exécution directe)
+- `BCRYPT_POOL_MAX_PENDING` : nombre maximal d'appels en cours ou en file, y compris
+  ceux abandonnés sur délai dépassé et pas encore terminés ; au-delà,
+  `PasswordHasherBusy` est levée immédiatement (l'API répond 503)
+- `BCRYPT_TIMEOUT_SECONDS` : attente maximale d'un résultat (lève aussi `PasswordHasherBusy`)
+- Un processus mort (OOM, kill) casse le pool : il est reconstruit et l'appel réessayé
+  une fois, puis `PasswordHasherBusy`
+- Le module ne dépend que de bcrypt : les processus enfants (spawn) le réimportent seul
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional, Tuple
+
+import bcrypt
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+
+class PasswordHasherBusy(Exception):
+    """Le pool bcrypt est saturé : réessayer plus tard (HTTP 503)."""
+
+
+# ---- Fonctions exécutées dans les processus du pool (doivent être picklables) ----
+
+def _hashpw(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds))
+
+
+def _checkpw(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
+
+class PasswordHasherPool:
+    """Pool de processus bcrypt avec limite de file d'attente."""
+
+    def __init__(self, workers: int, max_pending: int, timeout: float):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Créé à la première utilisation, donc dans le worker uvicorn et non dans le parent.
+        # "spawn" évite de forker un processus qui a déjà des threads.
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+        return self._executor
+
+    def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Exécute `fn(*args)` dans le pool ; lève `PasswordHasherBusy` si saturé ou indisponible."""
+        if self.workers <= 0:
+            return fn(*args)
+        try:
+            return self._submit(fn, args)
+        except BrokenProcessPool:
+            # Un processus du pool est mort (OOM, kill) : pool reconstruit, un seul nouvel essai
+            try:
+                return self._submit(fn, args)
+            except BrokenProcessPool:
+                raise PasswordHasherBusy("Pool de hachage indisponible")
+
+    def _submit(self, fn: Callable[..., Any], args: Tuple[Any, ...]) -> Any:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise PasswordHasherBusy("Trop de demandes d'authentification en cours")
+            self._pending += 1
+        executor = self._get_executor()
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._release()
+            self._discard(executor)
+            raise
+        except Exception:
+            self._release()
+            raise
+        # Libéré à la fin réelle du calcul : un bcrypt abandonné sur délai dépassé
+        # (cancel() n'interrompt pas un appel déjà démarré) occupe toujours un processus
+        future.add_done_callback(lambda _: self._release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise PasswordHasherBusy("Délai de hachage dépassé")
+        except BrokenProcessPool:
+            self._discard(executor)
+            raise
+
+    def _discard(self, executor: ProcessPoolExecutor) -> None:
+        """Abandonne un pool cassé ; le suivant est créé à la prochaine demande."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _release(self) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"workers": self.workers, "pending": self._pending, "max_pending": self.max_pending}
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+_workers = int(os.getenv("BCRYPT_POOL_WORKERS", "2"))
+hasher_pool = PasswordHasherPool(
+    workers=_workers,
+    max_pending=int(os.getenv("BCRYPT_POOL_MAX_PENDING", str(max(1, _workers) * 8))),
+    timeout=float(os.getenv("BCRYPT_TIMEOUT_SECONDS", "5")),
+)
+
+
+def hash_password(password: str, rounds: Optional[int] = None) -> str:
+    """Retourne le hash bcrypt de `password` (coût `BCRYPT_ROUNDS` par défaut)."""
+    hashed = hasher_pool.run(_hashpw, password.encode("utf-8"), rounds or BCRYPT_ROUNDS)
+    return hashed.decode("utf-8")
+
+
+def check_password(password: str, hashed: str) -> bool:
+    """Vérifie `password` contre un hash bcrypt."""
+    return bool(hasher_pool.run(_checkpw, password.encode("utf-8"), hashed.encode("utf-8")))
+
+
+def bcrypt_cost(hashed: str) -> Optional[int]:
+    """Extrait le coût d'un hash bcrypt ("$2b$12$..." → 12), None si format inconnu."""
+    parts = hashed.split("$")
+    if len(parts) < 4 or not parts[1].startswith("2"):
+        return None
+    try:
+        return int(parts[2])
+    except ValueError:
+        return None
+
+
+def needs_rehash(hashed: str) -> bool:
+    """True si le hash doit être recalculé : format SHA-256 legacy ou coût bcrypt obsolète."""
+    if not isinstance(hashed, str):
+        return False
+    if hashed.startswith("sha256::"):
+        return True
+    cost = bcrypt_cost(hashed)
+    return cost is not None and cost < BCRYPT_ROUNDS
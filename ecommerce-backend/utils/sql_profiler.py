@@ -0,0 +1,206 @@
+"""
+Profilage des requêtes SQL : totaux par requête HTTP, journal des requêtes lentes, top-N.
+
+Branché sur les événements `before_cursor_execute` / `after_cursor_execute` du moteur :
+- Par requête HTTP (`ServerTimingMiddleware`) : nombre de requêtes SQL et temps DB cumulé,
+  renvoyés dans l'en-tête `Server-Timing: db;dur=12.3;desc="5 req. SQL"`
+- Requête lente (durée >= SQL_SLOW_QUERY_MS) : journalisée avec la route HTTP
+  et la méthode de repository appelante ("PostgreSQLOrderRepository.list_page")
+- Cumul par instruction SQL (paramètres et listes IN normalisés) pour GET /admin/sql/top.
+  Cumul propre à chaque worker, borné à SQL_PROFILER_MAX_STATEMENTS instructions distinctes
+
+Configuration : SQL_PROFILER_ENABLED (1), SQL_SLOW_QUERY_MS (200), SQL_PROFILER_MAX_STATEMENTS (500)
+"""
+import contextvars
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from utils.metrics import route_template
+
+logger = logging.getLogger("sql.slow")
+
+SLOW_QUERY_SECONDS = float(os.getenv("SQL_SLOW_QUERY_MS", "200")) / 1000
+MAX_STATEMENTS = int(os.getenv("SQL_PROFILER_MAX_STATEMENTS", "500"))
+
+# Listes de paramètres de longueur variable ("IN (?, ?, ?)" / "IN (%(id_1_1)s, ...)") ramenées à une forme unique
+_PARAM_LIST = re.compile(r"\((?:\s*(?:\?|%\([^)]+\)s|\$\d+)\s*,)+\s*(?:\?|%\([^)]+\)s|\$\d+)\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class RequestQueryStats:
+    """Compteurs SQL d'une requête HTTP."""
+
+    __slots__ = ("scope", "count", "seconds")
+
+    def __init__(self, scope: Optional[Dict[str, Any]] = None):
+        self.scope = scope
+        self.count = 0
+        self.seconds = 0.0
+
+
+_current: contextvars.ContextVar[Optional[RequestQueryStats]] = contextvars.ContextVar("sql_request_stats", default=None)
+
+
+def current_request_stats() -> Optional[RequestQueryStats]:
+    return _current.get()
+
+
+def normalize_statement(statement: str) -> str:
+    return _PARAM_LIST.sub("(…)", _WHITESPACE.sub(" ", statement).strip())
+
+
+def _calling_repository_method() -> Optional[str]:
+    """Premier cadre de la pile appartenant à une méthode de PostgreSQL*Repository."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        instance = frame.f_locals.get("self")
+        if instance is not None:
+            cls = type(instance).__name__
+            if cls.startswith("PostgreSQL") and cls.endswith("Repository"):
+                return f"{cls}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+class StatementStats:
+    """Cumul des exécutions d'une instruction SQL normalisée (propre au worker)."""
+
+    def __init__(self, max_statements: int = MAX_STATEMENTS):
+        self.max_statements = max_statements
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._stats
+
+    def record(self, key: str, seconds: float, caller: Optional[str]) -> None:
+        """Ajoute une exécution de l'instruction normalisée `key`."""
+        with self._lock:
+            entry = self._stats.get(key)
+            if entry is None:
+                if len(self._stats) >= self.max_statements:
+                    self.dropped += 1
+                    return
+                entry = self._stats[key] = {"calls": 0, "total_seconds": 0.0, "max_seconds": 0.0, "callers": set()}
+            entry["calls"] += 1
+            entry["total_seconds"] += seconds
+            entry["max_seconds"] = max(entry["max_seconds"], seconds)
+            if caller and len(entry["callers"]) < 5:
+                entry["callers"].add(caller)
+
+    def top(self, limit: int = 20, order_by: str = "total_seconds") -> List[Dict[str, Any]]:
+        """Instructions triées par `order_by` ("total_seconds", "max_seconds" ou "calls")."""
+        with self._lock:
+            rows = [
+                {
+                    "statement": statement,
+                    "calls": e["calls"],
+                    "total_ms": round(e["total_seconds"] * 1000, 3),
+                    "mean_ms": round(e["total_seconds"] * 1000 / e["calls"], 3),
+                    "max_ms": round(e["max_seconds"] * 1000, 3),
+                    "callers": sorted(e["callers"]),
+                    "_sort": e[order_by] if order_by in e else e["total_seconds"],
+                }
+                for statement, e in self._stats.items()
+            ]
+        rows.sort(key=lambda r: r.pop("_sort"), reverse=True)
+        return rows[:limit]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+            self.dropped = 0
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._stats)
+
+
+statement_stats = StatementStats()
+
+
+def instrument_engine(engine: Any, slow_query_seconds: Optional[float] = None) -> None:
+    """Branche le profilage sur `engine` (idempotent)."""
+    from sqlalchemy import event
+
+    if getattr(engine, "_sql_profiler_instrumented", False):
+        return
+    engine._sql_profiler_instrumented = True
+    threshold = SLOW_QUERY_SECONDS if slow_query_seconds is None else slow_query_seconds
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("sql_profiler_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("sql_profiler_start")
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+
+        request = _current.get()
+        if request is not None:
+            request.count += 1
+            request.seconds += elapsed
+
+        # Remonter la pile seulement au premier passage d'une instruction ou si elle est lente
+        key = normalize_statement(statement)
+        slow = elapsed >= threshold
+        caller = _calling_repository_method() if slow or key not in statement_stats else None
+        statement_stats.record(key, elapsed, caller)
+        if slow:
+            route = "-"
+            if request is not None and request.scope is not None:
+                route = f"{request.scope.get('method', '')} {route_template(request.scope)}"
+            logger.warning(
+                "Requête SQL lente (%.1f ms) route=%s appelant=%s : %s",
+                elapsed * 1000, route, caller or "-", key[:500],
+            )
+
+    @event.listens_for(engine, "handle_error")
+    def _on_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None:
+            starts = conn.info.get("sql_profiler_start")
+            if starts:
+                starts.pop()
+
+
+class ServerTimingMiddleware:
+    """Mesure le SQL de chaque requête HTTP et l'annonce dans l'en-tête Server-Timing."""
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestQueryStats(scope)
+        token = _current.set(stats)
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                total_ms = (time.perf_counter() - start) * 1000
+                timing = (
+                    f'db;dur={stats.seconds * 1000:.1f};desc="{stats.count} req. SQL", '
+                    f"app;dur={total_ms:.1f}"
+                )
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timing.encode("ascii")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
@@ -1,4 +1,4 @@
-import React, { useState } from "react";
+import React, { useRef, useState } from "react";
 // Modal de paiement avec validations enrichies et feedback utilisateur.
 import { api } from "../lib/api";
 import {
@@ -46,6 +46,8 @@ export default function PaymentModal({
   const [pending, setPending] = useState(false);
   const [error, setError] = useState("");
   const [success, setSuccess] = useState(false);
+  // Clé d'idempotence du paiement : un nouvel essai après coupure réseau ne débite pas deux fois
+  const paymentKey = useRef(null);
 
   if (!isOpen) return null;
 
@@ -123,6 +125,7 @@ export default function PaymentModal({
     setError("");
 
     try {
+      if (!paymentKey.current) paymentKey.current = api.newIdempotencyKey();
       const result = await api.processPayment({
         orderId,
         cardNumber: sanitizeNumeric(cardNumber),
@@ -132,8 +135,10 @@ export default function PaymentModal({
         postalCode: sanitizeNumeric(postalCode),
         phone: sanitizeNumeric(phone),
         streetNumber: sanitizeNumeric(streetNumber),
-        streetName: streetName.trim()
+        streetName: streetName.trim(),
+        idempotencyKey: paymentKey.current
       });
+      paymentKey.current = null;
 
       if (result.status === "SUCCEEDED") {
         setSuccess(true);
@@ -144,6 +149,7 @@ export default function PaymentModal({
         setError("Paiement refusé. Vérifiez votre carte bancaire.");
       }
     } catch (err) {
+      if (err.status) paymentKey.current = null; // le serveur a répondu : nouvelle clé au prochain essai
       // Ne pas logger les détails de l'erreur qui pourraient contenir des données sensibles (numéro de carte, etc.)
       // Logger uniquement le type d'erreur sans les détails
       if (err.status) {
@@ -260,23 +260,56 @@ async function clearCart() {
   return request("/cart/clear", { method: "DELETE" });
 }
 
+/**
+ * Apply several cart operations in one request / one transaction.
+ * @param {{operations: Array<{op: "add"|"remove"|"set", product_id: string, qty?: number}>, atomic?: boolean}} payload
+ * @returns {Promise<{cart: object, rejected: Array<{product_id: string, reason: string}>}>}
+ */
+async function batchCart({ operations, atomic = true }) {
+  return request("/cart/batch", { method: "POST", body: JSON.stringify({ operations, atomic }) });
+}
+
+/**
+ * Replace the whole cart content (all-or-nothing).
+ * @param {Array<{product_id: string, qty: number}>} items
+ */
+async function replaceCart(items) {
+  return request("/cart", { method: "PUT", body: JSON.stringify({ items }) });
+}
+
+/**
+ * New Idempotency-Key value: one per user action, reused as-is when retrying it.
+ * @returns {string}
+ */
+function newIdempotencyKey() {
+  if (globalThis.crypto?.randomUUID) return globalThis.crypto.randomUUID();
+  return `${Date.now().toString(16)}-${Math.random().toString(16).slice(2)}`;
+}
+
+function idempotencyHeaders(idempotencyKey) {
+  return idempotencyKey ? { "Idempotency-Key": idempotencyKey } : {};
+}
+
 /**
  * Create an order from the current cart.
+ * @param {string} [idempotencyKey] - same key on retry => same order, no duplicate
  * @returns {Promise<{order_id:string,total_cents:number,status:string}>}
  */
-async function checkout() {
-  return request("/orders/checkout", { method: "POST" });
+async function checkout(idempotencyKey) {
+  return request("/orders/checkout", { method: "POST", headers: idempotencyHeaders(idempotencyKey) });
 }
 
 /**
  * Pay an order with card details.
  * @param {string} order_id
  * @param {{card_number:string,exp_month:number,exp_year:number,cvc:string}} card
+ * @param {string} [idempotencyKey] - same key on retry => same payment, no double charge
  * @returns {Promise<object>}
  */
-async function payOrder(order_id, { card_number, exp_month, exp_year, cvc }) {
+async function payOrder(order_id, { card_number, exp_month, exp_year, cvc }, idempotencyKey) {
   return request(`/orders/${order_id}/pay`, {
     method: "POST",
+    headers: idempotencyHeaders(idempotencyKey),
     body: JSON.stringify({ card_number, exp_month, exp_year, cvc }),
   });
 }
@@ -363,12 +396,13 @@ async function getOrderTracking(orderId) {
 
 /**
  * Pay an order with extended fields (address, phone, postal code).
- * @param {{orderId:string,cardNumber:string,expMonth:number,expYear:number,cvc:string,postalCode?:string,phone?:string,streetNumber?:string,streetName?:string}} params
+ * @param {{orderId:string,cardNumber:string,expMonth:number,expYear:number,cvc:string,postalCode?:string,phone?:string,streetNumber?:string,streetName?:string,idempotencyKey?:string}} params
  * @returns {Promise<object>}
  */
-async function processPayment({ orderId, cardNumber, expMonth, expYear, cvc, postalCode, phone, streetNumber, streetName }) {
+async function processPayment({ orderId, cardNumber, expMonth, expYear, cvc, postalCode, phone, streetNumber, streetName, idempotencyKey }) {
   return request(`/orders/${orderId}/pay`, {
     method: "POST",
+    headers: idempotencyHeaders(idempotencyKey),
     body: JSON.stringify({ 
       card_number: cardNumber, 
       exp_month: expMonth, 
@@ -427,9 +461,10 @@ async function adminDeleteProduct(id) {
    ========================= */
 
 /**
- * Admin: list orders with optional filters.
+ * Admin: list orders with optional filters (keyset pagination).
+ * Pass the returned `next_cursor` as `cursor` to fetch the next page.
  * @param {Record<string,string>} [params]
- * @returns {Promise<Array<object>>}
+ * @returns {Promise<{items: Array<object>, next_cursor: string|null}>}
  */
 async function adminListOrders(params = {}) {
   const qs = new URLSearchParams(params).toString();
@@ -650,8 +685,8 @@ export const api = {
   // Catalogue / Panier / Commandes (user)
   listProducts, getProduct,
   viewCart, getCart,
-  addToCart, removeFromCart, clearCart,
-  checkout,
+  addToCart, removeFromCart, clearCart, batchCart, replaceCart,
+  checkout, newIdempotencyKey,
   payOrder, payByCard, processPayment,
   myOrders, getOrders, getOrder, cancelOrder,
   getInvoice, downloadInvoicePDF,
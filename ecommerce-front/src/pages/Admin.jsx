@@ -22,6 +22,8 @@ export default function Admin() {
   // État pour les commandes clients
   const [orders, setOrders] = useState([]);
   const [ordersLoading, setOrdersLoading] = useState(false);
+  const [ordersCursor, setOrdersCursor] = useState(null); // curseur de la page suivante
+  const [ordersParams, setOrdersParams] = useState({});
   const [selectedUserId, setSelectedUserId] = useState("");
   const [selectedOrderId, setSelectedOrderId] = useState("");
   const [searchMode, setSearchMode] = useState("all"); // "all", "user", "order"
@@ -66,17 +68,21 @@ export default function Admin() {
 
   useEffect(() => { load(); }, []);
 
-  // Fonction pour charger les commandes
-  async function loadOrders(params = {}) {
+  // Fonction pour charger les commandes (cursor = page suivante à ajouter à la liste)
+  async function loadOrders(params = {}, cursor = null) {
     setOrdersLoading(true);
     setErr("");
     try {
-      const data = await api.adminListOrders(params);
-      setOrders(data || []);
+      const data = await api.adminListOrders(cursor ? { ...params, cursor } : params);
+      const page = data?.items || [];
+      setOrders(prev => (cursor ? [...prev, ...page] : page));
+      setOrdersCursor(data?.next_cursor || null);
+      setOrdersParams(params);
     } catch (e) {
       console.error("Erreur chargement commandes:", e);
       setErr(e.message || "Impossible de charger les commandes.");
-      setOrders([]);
+      if (!cursor) setOrders([]);
+      setOrdersCursor(null);
     } finally {
       setOrdersLoading(false);
     }
@@ -632,6 +638,14 @@ export default function Admin() {
                 ))}
               </div>
             )}
+
+            {ordersCursor && !ordersLoading && (
+              <div style={{ marginTop: 12, textAlign: "center" }}>
+                <button onClick={() => loadOrders(ordersParams, ordersCursor)} style={secondaryBtn}>
+                  Charger plus de commandes
+                </button>
+              </div>
+            )}
           </div>
         )}
       </section>
@@ -20,7 +20,7 @@
 // ============================================================
 
 // ========== IMPORTS ==========
-import React, { useEffect, useMemo, useState } from "react"; // React : bibliothèque UI
+import React, { useEffect, useMemo, useRef, useState } from "react"; // React : bibliothèque UI
                                                               // useEffect : effets de bord (chargement données)
                                                               // useMemo : optimisation calculs (éviter recalculs inutiles)
                                                               // useState : gestion d'état
@@ -64,6 +64,10 @@ export default function Cart() {
   // orderId : ID de la commande créée après checkout (pour le paiement)
   // null = pas de commande en cours
   const [orderId, setOrderId] = useState(null);
+
+  // Clé d'idempotence de la commande en cours : réutilisée si la requête est relancée
+  // après une coupure réseau (pas de commande en double), renouvelée après une réponse.
+  const checkoutKey = useRef(null);
   
   // err : message d'erreur à afficher (ex: "Stock insuffisant")
   const [err, setErr] = useState("");
@@ -224,6 +228,8 @@ export default function Cart() {
    */
   const totalCents = useMemo(() => {
     if (!cart) return 0;
+    // Panier serveur : total calculé côté API avec les prix en base
+    if (typeof cart.total_cents === "number") return cart.total_cents;
     // reduce : somme de (prix unitaire * quantité) pour chaque article
     return items.reduce((sum, it) => {
       const unit = priceById.get(it.product_id) || 0;
@@ -388,11 +394,14 @@ export default function Cart() {
         return;
       }
 
-      const res = await api.checkout();
+      if (!checkoutKey.current) checkoutKey.current = api.newIdempotencyKey();
+      const res = await api.checkout(checkoutKey.current);
+      checkoutKey.current = null;
       setOrderId(res.order_id);
       setShowPaymentModal(true);
       setMsg("Commande créée avec succès !");
     } catch (e) {
+      if (e.status) checkoutKey.current = null; // le serveur a répondu : nouvelle clé au prochain essai
       setErr(e.message);
     } finally {
       setPending(false);
@@ -484,8 +493,8 @@ export default function Cart() {
         <>
           <ul style={{ listStyle: "none", padding: 0, margin: 0, maxWidth: 680 }}>
             {items.map((it) => {
-              const name = nameById.get(it.product_id) || it.product_id;
-              const unit = priceById.get(it.product_id) || 0;
+              const name = it.name || nameById.get(it.product_id) || it.product_id;
+              const unit = it.unit_price_cents ?? priceById.get(it.product_id) ?? 0;
               const line = unit * it.quantity;
               return (
                 <li
@@ -30,32 +30,26 @@ export default function Login() {
         if (items.length > 0) {
           console.log(`Synchronisation de ${items.length} articles du panier local...`);
           
-          // Garder trace des articles qui n'ont pas pu être synchronisés
-          const failedItems = {};
-          let successCount = 0;
+          // Un seul appel : toutes les lignes ajoutées dans une transaction côté serveur.
+          // atomic=false : les articles refusés (stock insuffisant, produit indisponible)
+          // sont renvoyés dans `rejected` au lieu de faire échouer toute la synchronisation.
+          const { rejected = [] } = await api.batchCart({
+            operations: items.map((item) => ({ op: "add", product_id: item.product_id, qty: item.quantity })),
+            atomic: false,
+          });
           
-          // Ajouter chaque article du panier local au panier serveur
-          for (const item of items) {
-            try {
-              await api.addToCart({ product_id: item.product_id, qty: item.quantity });
-              console.log(`Article ${item.product_id} (qty: ${item.quantity}) synchronisé`);
-              successCount++;
-            } catch (itemError) {
-              console.warn(`Erreur pour l'article ${item.product_id}:`, itemError);
-              // Garder l'article dans le panier local s'il n'a pas pu être synchronisé
-              failedItems[item.product_id] = item;
-            }
-          }
-          
-          // Si tous les articles ont été synchronisés, vider le panier local
-          if (successCount === items.length) {
+          if (rejected.length === 0) {
             localStorage.removeItem('localCart');
             console.log('Panier local synchronisé et vidé');
           } else {
-            // Sinon, garder seulement les articles qui ont échoué
-            const remainingCart = { items: failedItems };
-            localStorage.setItem('localCart', JSON.stringify(remainingCart));
-            console.log(`${items.length - successCount} article(s) n'ont pas pu être synchronisés (stock insuffisant ou produit indisponible)`);
+            // Garder seulement les articles qui ont été refusés
+            const failedItems = {};
+            for (const { product_id, reason } of rejected) {
+              console.warn(`Erreur pour l'article ${product_id}: ${reason}`);
+              if (localCart.items[product_id]) failedItems[product_id] = localCart.items[product_id];
+            }
+            localStorage.setItem('localCart', JSON.stringify({ items: failedItems }));
+            console.log(`${rejected.length} article(s) n'ont pas pu être synchronisés (stock insuffisant ou produit indisponible)`);
           }
         }
       }
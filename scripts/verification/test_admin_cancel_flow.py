@@ -144,7 +144,8 @@ def test_admin_cancel_order():
         print(f"❌ Erreur lors de la récupération des commandes: {response.status_code}")
         return False
     
-    orders = response.json()
+    # Réponse paginée : {"items": [...], "next_cursor": ...} (première page suffit ici)
+    orders = response.json()["items"]
     print(f"✅ {len(orders)} commandes trouvées")
     
     # 3. Trouver une commande annulable (CREE, VALIDEE, ou PAYEE)
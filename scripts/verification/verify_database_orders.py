@@ -226,7 +226,7 @@ def main():
     
     # Vérification des tables
     if not check_tables():
-        print("\n💡 Conseil : Exécutez 'create_tables()' pour créer les tables")
+        print("\n💡 Conseil : Exécutez 'python -m database.migrate' (dans ecommerce-backend) pour créer les tables")
     
     # Vérification de la persistance
     check_order_persistence()
@@ -361,3 +361,29 @@ def sample_products(product_repo):
     return p1, p2, p3
 
 
+
+
+# Base SQLite en mémoire partagée par les threads (StaticPool) : modules qui testent
+# les repositories, workers et tâches de fond sur le schéma réel
+@pytest.fixture
+def session_factory():
+    import os, sys
+    backend_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "ecommerce-backend")
+    if backend_path not in sys.path:
+        sys.path.insert(0, backend_path)
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+    from database.models import Base
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
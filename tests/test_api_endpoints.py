@@ -14,10 +14,23 @@ if backend_path not in sys.path:
     sys.path.insert(0, backend_path)
 
 from api import app
+from database.migrate import run_migrations
 
 client = TestClient(app)
 
 
+@pytest.fixture(scope="module", autouse=True)
+def _schema():
+    """Schéma à jour avant les tests (api.py ne crée plus les tables à l'import).
+
+    Le client reste ouvert pour tout le module : une seule boucle d'événements,
+    comme un worker uvicorn (les connexions asyncpg y sont rattachées).
+    """
+    run_migrations()
+    with client:
+        yield
+
+
 # ==================== Tests des endpoints publics ====================
 
 def test_get_root():
@@ -40,6 +53,15 @@ def test_get_health():
     assert "timestamp" in data
 
 
+def test_get_metrics():
+    """Test GET /metrics - Exposition Prometheus"""
+    response = client.get("/metrics")
+    # 503 si prometheus_client n'est pas installé
+    assert response.status_code in [200, 503]
+    if response.status_code == 200:
+        assert "http_requests_total" in response.text
+
+
 def test_post_init_data():
     """Test POST /init-data - Initialisation des données"""
     response = client.post("/init-data")
@@ -392,6 +414,120 @@ def test_post_cart_clear():
         assert response.status_code == 200
 
 
+def test_put_cart():
+    """Test PUT /cart - Remplacer le contenu du panier"""
+    import uuid
+    email = f"cart_put_{uuid.uuid4().hex[:8]}@example.com"
+    
+    register_payload = {
+        "email": email,
+        "password": "password123",
+        "first_name": "Paul",
+        "last_name": "Girard",
+        "address": "5 rue de Rivoli, 75001 Paris"
+    }
+    
+    register_response = client.post("/auth/register", json=register_payload)
+    token = register_response.json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    products = [p for p in client.get("/products").json() if p["stock_qty"] >= 2]
+    
+    if len(products) > 0:
+        product_id = products[0]["id"]
+        
+        response = client.put("/cart", json={"items": [{"product_id": product_id, "qty": 2}]}, headers=headers)
+        assert response.status_code == 200
+        assert response.json()["cart"]["items"][product_id]["quantity"] == 2
+        
+        # Totaux calculés avec le prix réel du produit
+        cart = client.get("/cart", headers=headers).json()
+        line = cart["items"][product_id]
+        assert line["name"] == products[0]["name"]
+        assert line["unit_price_cents"] == products[0]["price_cents"]
+        assert line["line_total_cents"] == 2 * products[0]["price_cents"]
+        assert line["available"] is True
+        assert cart["total_cents"] == 2 * products[0]["price_cents"]
+        
+        # Tout ou rien : un produit inconnu annule la requête, le panier reste inchangé
+        response = client.put(
+            "/cart",
+            json={"items": [{"product_id": str(uuid.uuid4()), "qty": 1}]},
+            headers=headers
+        )
+        assert response.status_code == 404
+        assert client.get("/cart", headers=headers).json()["items"][product_id]["quantity"] == 2
+        
+        # Liste vide : panier vidé
+        response = client.put("/cart", json={"items": []}, headers=headers)
+        assert response.status_code == 200
+        assert response.json()["cart"]["items"] == {}
+
+
+def test_post_cart_batch():
+    """Test POST /cart/batch - Plusieurs opérations de panier en une requête"""
+    import uuid
+    email = f"cart_batch_{uuid.uuid4().hex[:8]}@example.com"
+    
+    register_payload = {
+        "email": email,
+        "password": "password123",
+        "first_name": "Léa",
+        "last_name": "Roux",
+        "address": "8 rue de la Paix, 75002 Paris"
+    }
+    
+    register_response = client.post("/auth/register", json=register_payload)
+    token = register_response.json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    products = [p for p in client.get("/products").json() if p["stock_qty"] >= 3]
+    
+    if len(products) > 0:
+        product = products[0]
+        product_id = product["id"]
+        
+        response = client.post(
+            "/cart/batch",
+            json={"operations": [
+                {"op": "add", "product_id": product_id, "qty": 2},
+                {"op": "add", "product_id": product_id, "qty": 1},
+                {"op": "remove", "product_id": product_id, "qty": 1},
+            ]},
+            headers=headers
+        )
+        assert response.status_code == 200
+        assert response.json()["cart"]["items"][product_id]["quantity"] == 2
+        
+        # atomic=False : l'opération hors stock est refusée, les autres sont appliquées
+        unknown_id = str(uuid.uuid4())
+        response = client.post(
+            "/cart/batch",
+            json={"operations": [
+                {"op": "set", "product_id": product_id, "qty": 1},
+                {"op": "add", "product_id": unknown_id, "qty": 1},
+                {"op": "add", "product_id": product_id, "qty": product["stock_qty"] + 1},
+            ], "atomic": False},
+            headers=headers
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["cart"]["items"][product_id]["quantity"] == 1
+        assert [r["product_id"] for r in data["rejected"]] == [unknown_id, product_id]
+        
+        # atomic=True (défaut) : stock insuffisant, rien n'est appliqué
+        response = client.post(
+            "/cart/batch",
+            json={"operations": [
+                {"op": "remove", "product_id": product_id, "qty": 0},
+                {"op": "set", "product_id": product_id, "qty": product["stock_qty"] + 1},
+            ]},
+            headers=headers
+        )
+        assert response.status_code == 400
+        assert client.get("/cart", headers=headers).json()["items"][product_id]["quantity"] == 1
+
+
 # ==================== Tests des commandes ====================
 
 def test_post_orders_checkout():
@@ -438,6 +574,79 @@ def test_post_orders_checkout():
             assert "total_cents" in data
 
 
+def test_post_orders_checkout_idempotency_key():
+    """Test POST /orders/checkout avec Idempotency-Key - un nouvel essai rejoue la première réponse"""
+    import uuid
+    client.post("/init-data")
+    register_response = client.post("/auth/register", json={
+        "email": f"idem_{uuid.uuid4().hex[:8]}@example.com",
+        "password": "password123",
+        "first_name": "Claire",
+        "last_name": "Petit",
+        "address": "12 rue des Lilas, 75001 Paris"
+    })
+    headers = {"Authorization": f"Bearer {register_response.json()['token']}"}
+    product = next(p for p in client.get("/products").json() if p["stock_qty"] > 0)
+    client.post("/cart/add", json={"product_id": product["id"], "qty": 1}, headers=headers)
+
+    key_headers = {**headers, "Idempotency-Key": uuid.uuid4().hex}
+    first = client.post("/orders/checkout", headers=key_headers)
+    assert first.status_code == 200
+    assert "Idempotent-Replayed" not in first.headers
+
+    replay = client.post("/orders/checkout", headers=key_headers)
+    assert replay.status_code == 200
+    assert replay.headers["Idempotent-Replayed"] == "true"
+    assert replay.json() == first.json()
+
+    # Même clé pour une autre requête : refusée
+    order_id = first.json()["order_id"]
+    payment_payload = {"card_number": "4111111111111111", "exp_month": 12, "exp_year": 2030, "cvc": "123"}
+    reused = client.post(f"/orders/{order_id}/pay", json=payment_payload, headers=key_headers)
+    assert reused.status_code == 422
+
+    # Paiement rejoué : un seul débit, même réponse
+    pay_headers = {**headers, "Idempotency-Key": uuid.uuid4().hex}
+    paid = client.post(f"/orders/{order_id}/pay", json=payment_payload, headers=pay_headers)
+    assert paid.status_code == 200
+    again = client.post(f"/orders/{order_id}/pay", json=payment_payload, headers=pay_headers)
+    assert again.status_code == 200
+    assert again.json() == paid.json()
+    assert client.post(f"/orders/{order_id}/pay", json={**payment_payload, "card_number": "5555555555554444"},
+                       headers=pay_headers).status_code == 422
+    # Le CVC n'entre pas dans l'empreinte : il n'est jamais conservé, même haché
+    assert client.post(f"/orders/{order_id}/pay", json={**payment_payload, "cvc": "456"},
+                       headers=pay_headers).headers["Idempotent-Replayed"] == "true"
+
+def test_post_orders_checkout_reuses_open_order():
+    """Test POST /orders/checkout rejoué - même commande ouverte, lignes resynchronisées avec le panier"""
+    import uuid
+    client.post("/init-data")
+    register_response = client.post("/auth/register", json={
+        "email": f"reopen_{uuid.uuid4().hex[:8]}@example.com",
+        "password": "password123",
+        "first_name": "Hugo",
+        "last_name": "Roux",
+        "address": "3 rue des Pins, 75001 Paris"
+    })
+    headers = {"Authorization": f"Bearer {register_response.json()['token']}"}
+    first, second = [p for p in client.get("/products").json() if p["stock_qty"] > 2][:2]
+    client.post("/cart/add", json={"product_id": first["id"], "qty": 1}, headers=headers)
+    order_id = client.post("/orders/checkout", headers=headers).json()["order_id"]
+
+    client.put("/cart", json={"items": [{"product_id": first["id"], "qty": 2},
+                                        {"product_id": second["id"], "qty": 1}]}, headers=headers)
+    response = client.post("/orders/checkout", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["order_id"] == order_id
+    assert response.json()["total_cents"] == 2 * first["price_cents"] + second["price_cents"]
+
+    items = client.get(f"/orders/{order_id}", headers=headers).json()["items"]
+    assert sorted((i["product_id"], i["quantity"]) for i in items) == sorted(
+        [(first["id"], 2), (second["id"], 1)])
+    open_orders = [o for o in client.get("/orders", headers=headers).json() if o["status"] == "CREE"]
+    assert [o["id"] for o in open_orders] == [order_id]
+
 def test_get_orders():
     """Test GET /orders - Liste des commandes de l'utilisateur"""
     # Créer un utilisateur
@@ -563,6 +772,52 @@ def test_post_orders_cancel():
                 assert response.status_code in [200, 400]  # Peut être déjà payé
 
 
+def test_post_orders_cancel_restocks_only_paid_orders():
+    """Test POST /orders/{order_id}/cancel - le stock n'est remis en place que si la commande était payée"""
+    import uuid
+    from database.database import SessionLocal
+    from database.models import Product
+    register_response = client.post("/auth/register", json={
+        "email": f"restock_{uuid.uuid4().hex[:8]}@example.com",
+        "password": "password123",
+        "first_name": "Nina",
+        "last_name": "Leroy",
+        "address": "7 rue des Ormes, 75001 Paris"
+    })
+    headers = {"Authorization": f"Bearer {register_response.json()['token']}"}
+    db = SessionLocal()
+    product = Product(name=f"Stock {uuid.uuid4().hex[:6]}", price_cents=1500, stock_qty=5)
+    db.add(product)
+    db.commit()
+    product_id = str(product.id)
+
+    def stock_qty():
+        db.expire_all()
+        return db.get(Product, product.id).stock_qty
+
+    def checkout():
+        response = client.post("/orders/checkout", headers=headers)
+        assert response.status_code == 200
+        return response.json()["order_id"]
+
+    # Commande non payée : le stock n'a jamais été décrémenté, il ne bouge pas
+    client.post("/cart/add", json={"product_id": product_id, "qty": 2}, headers=headers)
+    unpaid = checkout()
+    assert client.post(f"/orders/{unpaid}/cancel", headers=headers).status_code == 200
+    assert stock_qty() == 5
+
+    # Commande payée (le panier n'est vidé qu'au paiement) : le stock décrémenté est remis en place
+    paid = checkout()
+    payment_payload = {"card_number": "4111111111111111", "exp_month": 12, "exp_year": 2030, "cvc": "123"}
+    assert client.post(f"/orders/{paid}/pay", json=payment_payload, headers=headers).status_code == 200
+    assert stock_qty() == 3
+    response = client.post(f"/orders/{paid}/cancel", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["refunded"] is True
+    assert stock_qty() == 5
+    db.close()
+
+
 def test_post_orders_pay():
     """Test POST /orders/{order_id}/pay - Payer une commande"""
     # Créer un utilisateur et passer une commande
@@ -749,6 +1004,69 @@ def test_get_orders_invoice_download():
                 assert response.status_code in [200, 404]
 
 
+def test_get_orders_invoice_download_prerendered_with_etag(tmp_path, monkeypatch):
+    """Test GET /orders/{order_id}/invoice/download - PDF pré-généré après paiement, ETag et 304"""
+    import glob
+    import time
+    import uuid
+    from api import order_event_dispatcher
+    from database.database import SessionLocal
+    from database.models import Invoice, Product
+    from services.invoice_pdf import invoice_pdf_store
+    monkeypatch.setattr(invoice_pdf_store, "directory", str(tmp_path))
+    register_response = client.post("/auth/register", json={
+        "email": f"invoice_etag_{uuid.uuid4().hex[:8]}@example.com",
+        "password": "password123",
+        "first_name": "Claire",
+        "last_name": "Morel",
+        "address": "12 rue des Lilas, 75001 Paris"
+    })
+    headers = {"Authorization": f"Bearer {register_response.json()['token']}"}
+    db = SessionLocal()
+    product = Product(name=f"Facture {uuid.uuid4().hex[:6]}", price_cents=2500, stock_qty=5)
+    db.add(product)
+    db.commit()
+    product_id = str(product.id)
+    db.close()
+
+    client.post("/cart/add", json={"product_id": product_id, "qty": 1}, headers=headers)
+    order_id = client.post("/orders/checkout", headers=headers).json()["order_id"]
+    payment_payload = {"card_number": "4111111111111111", "exp_month": 12, "exp_year": 2030, "cvc": "123"}
+    assert client.post(f"/orders/{order_id}/pay", json=payment_payload, headers=headers).status_code == 200
+
+    # Le consommateur invoice_pdf de l'événement PAYEE crée la facture et son PDF hors de la requête
+    def prerendered():
+        db = SessionLocal()
+        try:
+            invoice_id = db.query(Invoice.id).filter(Invoice.order_id == uuid.UUID(order_id)).scalar()
+        finally:
+            db.close()
+        return glob.glob(str(tmp_path / f"{invoice_id}-*.pdf")) if invoice_id else []
+
+    deadline = time.monotonic() + 10
+    while not prerendered() and time.monotonic() < deadline:
+        order_event_dispatcher.run_once()
+        time.sleep(0.05)
+    [pdf_path] = prerendered()
+    renders = invoice_pdf_store.stats()["renders"]
+
+    url = f"/orders/{order_id}/invoice/download"
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/pdf"
+    with open(pdf_path, "rb") as f:
+        assert response.content == f.read()
+    assert invoice_pdf_store.stats()["renders"] == renders  # servi depuis le disque
+    etag = response.headers["etag"]
+    assert etag.startswith('"') and etag.strip('"') in pdf_path
+
+    cached = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == etag
+    assert cached.content == b""
+    assert client.get(url, headers={**headers, "If-None-Match": '"autre"'}).status_code == 200
+
+
 def test_get_orders_tracking():
     """Test GET /orders/{order_id}/tracking - Suivi de livraison"""
     # Créer un utilisateur et passer une commande
@@ -1069,6 +1387,41 @@ def test_post_admin_products_reset_defaults():
     assert response.status_code in [401, 403, 200]
 
 
+def test_get_admin_cache_stats():
+    """Test GET /admin/cache/stats - Compteurs du cache catalogue (admin)"""
+    response = client.get("/admin/cache/stats")
+    # Devrait échouer sans auth admin
+    assert response.status_code in [401, 403, 200]
+
+
+def test_get_admin_emails_stats():
+    """Test GET /admin/emails/stats - État de la file d'envoi des emails (admin)"""
+    response = client.get("/admin/emails/stats")
+    # Devrait échouer sans auth admin
+    assert response.status_code in [401, 403, 200]
+
+
+def test_get_admin_sql_top():
+    """Test GET /admin/sql/top - Instructions SQL les plus coûteuses (admin)"""
+    response = client.get("/admin/sql/top?limit=10&order_by=total")
+    # Devrait échouer sans auth admin
+    assert response.status_code in [401, 403, 200]
+
+
+def test_delete_admin_sql_top():
+    """Test DELETE /admin/sql/top - Remise à zéro des cumuls SQL (admin)"""
+    response = client.delete("/admin/sql/top")
+    # Devrait échouer sans auth admin
+    assert response.status_code in [401, 403, 200]
+
+
+def test_get_admin_invoices_export():
+    """Test GET /admin/invoices/export - Export comptable des factures (admin)"""
+    response = client.get("/admin/invoices/export?start=2026-09-01&end=2026-09-30&format=csv")
+    # Devrait échouer sans auth admin
+    assert response.status_code in [401, 403, 200]
+
+
 # ==================== Tests admin - Commandes ====================
 
 def test_get_admin_orders():
@@ -1078,6 +1431,66 @@ def test_get_admin_orders():
     assert response.status_code in [401, 403, 200]
 
 
+def test_get_admin_orders_keyset_pagination():
+    """Test GET /admin/orders - parcours par next_cursor sans doublon ni trou, filtres appliqués"""
+    import uuid
+    from datetime import datetime
+    from database.database import SessionLocal
+    from database.models import Order, User
+    email = f"admin_orders_{uuid.uuid4().hex[:8]}@example.com"
+    register_response = client.post("/auth/register", json={
+        "email": email,
+        "password": "adminpass123",
+        "first_name": "Admin",
+        "last_name": "Orders",
+        "address": "1 rue Admin, 75001 Paris"
+    })
+    assert register_response.status_code == 200
+    headers = {"Authorization": f"Bearer {register_response.json()['token']}"}
+
+    # Commandes créées au même instant : seul l'id départage l'ordre de tri
+    db = SessionLocal()
+    admin = db.query(User).filter(User.email == email).one()
+    admin.is_admin = True
+    customers = [User(email=f"paged_{uuid.uuid4().hex[:8]}@example.com", password_hash="x",
+                      first_name="Paul", last_name="Martin", address="5 rue des Tests, 75001 Paris")
+                 for _ in range(2)]
+    db.add_all(customers)
+    db.flush()
+    created_at = datetime(2026, 3, 1, 12, 0)
+    statuses = ["PAYEE"] * 5 + ["CREE", "LIVREE"]
+    orders = [Order(user_id=customers[0].id, status=status, created_at=created_at) for status in statuses]
+    orders += [Order(user_id=customers[1].id, status="PAYEE", created_at=created_at) for _ in range(2)]
+    db.add_all(orders)
+    db.commit()
+    customer_id = str(customers[0].id)
+    expected = {str(o.id) for o in orders[:7]}
+    expected_paid = {str(o.id) for o in orders[:5]}
+    db.close()
+
+    def walk(**params):
+        seen, cursor = [], None
+        while True:
+            query = {"limit": 2, **params, **({"cursor": cursor} if cursor else {})}
+            response = client.get("/admin/orders", params=query, headers=headers)
+            assert response.status_code == 200, response.text
+            page = response.json()
+            assert len(page["items"]) <= 2
+            seen += page["items"]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return seen
+
+    seen = walk(user_id=customer_id)
+    ids = [order["id"] for order in seen]
+    assert len(ids) == len(set(ids)) and set(ids) == expected
+    assert {order["user_id"] for order in seen} == {customer_id}
+
+    paid = walk(user_id=customer_id, status="PAYEE")
+    assert sorted(order["id"] for order in paid) == sorted(expected_paid)
+    assert {order["status"] for order in paid} == {"PAYEE"}
+
+
 def test_get_admin_orders_by_id():
     """Test GET /admin/orders/{order_id} - Détails admin d'une commande"""
     # Utiliser un ID fictif
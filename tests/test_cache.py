@@ -0,0 +1,112 @@
+"""
+Tests du cache partagé versionné (SharedCache) sur un Redis simulé (FakeRedis) :
+plusieurs instances branchées sur le même FakeRedis jouent le rôle de workers.
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+backend_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "ecommerce-backend")
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from utils.cache import CacheBackend, FakeRedis, InMemoryBackend, RedisBackend, SharedCache
+
+
+class BrokenBackend(CacheBackend):
+    """Redis injoignable : toutes les opérations échouent."""
+
+    shared = True
+
+    def get(self, key):
+        raise ConnectionError("redis indisponible")
+
+    set = delete = incr = get
+
+
+def _workers(count=2, **kwargs):
+    redis = FakeRedis()
+    return [SharedCache(RedisBackend(redis), "users", version_check_interval=0, **kwargs) for _ in range(count)]
+
+
+def test_hit_and_miss_through_the_shared_backend():
+    worker_a, worker_b = _workers()
+    assert worker_a.get("42") is None
+    worker_a.set("42", {"email": "a@example.com"})
+    # Lu dans Redis par l'autre worker, puis servi par son L1
+    assert worker_b.get("42") == {"email": "a@example.com"}
+    assert worker_b.get("42") == {"email": "a@example.com"}
+    assert (worker_a.stats()["misses"], worker_b.stats()["hits"]) == (1, 2)
+    assert worker_a.get_or_set("7", lambda: "chargé") == "chargé"
+    assert worker_b.get_or_set("7", lambda: "rechargé") == "chargé"
+
+
+def test_invalidate_all_is_seen_by_another_worker():
+    worker_a, worker_b = _workers()
+    worker_a.set("42", "ancien")
+    assert worker_b.get("42") == "ancien"
+    worker_a.invalidate_all()
+    assert worker_b.get("42") is None
+    assert worker_b.stats()["version"] == 1
+
+
+def test_invalidate_reaches_other_workers_after_local_ttl():
+    worker_a, worker_b = _workers(local_ttl=0.05)
+    worker_a.set("42", "ancien")
+    assert worker_b.get("42") == "ancien"
+    worker_a.invalidate("42")
+    assert worker_a.get("42") is None
+    # L1 de l'autre worker borné à local_ttl, puis relecture de Redis
+    time.sleep(0.1)
+    assert worker_b.get("42") is None
+
+
+def test_local_ttl_also_bounds_workers_without_a_shared_backend():
+    # Deux workers sur InMemoryBackend : chacun son stockage, invalidate() reste local
+    worker_a = SharedCache(InMemoryBackend(), "users", ttl=60, local_ttl=0.05)
+    worker_b = SharedCache(InMemoryBackend(), "users", ttl=60, local_ttl=0.05)
+    assert worker_b.local_ttl == 0.05
+    worker_b.set("42", "ancien")
+    worker_a.invalidate("42")
+    time.sleep(0.1)
+    assert worker_b.get("42") is None
+    assert _workers(1, ttl=60, local_ttl=1)[0].local_ttl == 1
+
+
+def test_backend_must_implement_the_whole_interface():
+    class GetOnly(CacheBackend):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        GetOnly()
+    BrokenBackend()
+
+
+def test_get_local_never_calls_the_backend():
+    cache = SharedCache(BrokenBackend(), "users", version_check_interval=60)
+    cache.set("42", "valeur")
+    errors = cache.stats()["errors"]
+    assert cache.get_local("42") == "valeur"
+    assert cache.get_local("absent") is None
+    assert cache.stats()["errors"] == errors
+    # Version à relire : le L1 n'est pas servi, get() passe par le backend
+    worker_a, worker_b = _workers()
+    worker_a.set("42", "valeur")
+    assert worker_a.get_local("42") is None
+    assert worker_b.get("42") == "valeur"
+
+
+def test_backend_errors_degrade_to_the_local_cache():
+    cache = SharedCache(BrokenBackend(), "users", version_check_interval=0)
+    cache.set("42", "valeur")
+    assert cache.get("42") == "valeur"
+    assert cache.get("absent") is None
+    cache.invalidate_all()
+    assert cache.get("42") is None
+    stats = cache.stats()
+    assert stats["errors"] > 0
+    assert stats["version"] == 1
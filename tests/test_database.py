@@ -0,0 +1,55 @@
+"""
+Tests de la configuration de connexion (database/database.py).
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+backend_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "ecommerce-backend")
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from database import database
+
+
+@pytest.mark.parametrize("url,expected", [
+    ("postgresql://u:p@db:5432/shop", "postgresql+asyncpg://u:p@db:5432/shop"),
+    ("postgresql+psycopg2://u:p@db/shop", "postgresql+asyncpg://u:p@db/shop"),
+    ("sqlite:////tmp/shop.sqlite", "sqlite+aiosqlite:////tmp/shop.sqlite"),
+    ("postgresql+asyncpg://u:p@db/shop", "postgresql+asyncpg://u:p@db/shop"),
+])
+def test_async_database_url(url, expected):
+    assert database.async_database_url(url) == expected
+
+
+def test_pool_options_from_env(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "3")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "0")
+    monkeypatch.setenv("DB_POOL_PRE_PING", "0")
+    options = database._pool_options()
+    assert options["pool_size"] == 3
+    assert options["max_overflow"] == 0
+    assert options["pool_pre_ping"] is False
+
+    monkeypatch.setattr(database, "DB_USE_PGBOUNCER", True)
+    assert database._pool_options() == {"poolclass": database.NullPool}
+
+
+def test_async_session(monkeypatch, tmp_path):
+    pytest.importorskip("aiosqlite")
+    from sqlalchemy import text
+
+    monkeypatch.setenv("ASYNC_DATABASE_URL", f"sqlite+aiosqlite:///{tmp_path / 'async.sqlite'}")
+
+    async def scenario():
+        await database.dispose_async_engine()
+        try:
+            async with database.AsyncSessionLocal() as db:
+                return (await db.execute(text("SELECT 41 + 1"))).scalar()
+        finally:
+            await database.dispose_async_engine()
+
+    assert asyncio.run(scenario()) == 42
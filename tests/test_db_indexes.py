@@ -0,0 +1,146 @@
+"""
+Vérifie, par EXPLAIN sur un jeu de données, que les recherches fréquentes utilisent
+les index créés par les migrations Alembic (database/migrations).
+
+Par défaut sur SQLite (EXPLAIN QUERY PLAN). Pour vérifier sur PostgreSQL, définir
+TEST_POSTGRES_URL vers une base vide dédiée aux tests (EXPLAIN (FORMAT JSON),
+enable_seqscan désactivé pour que le plan ne dépende pas du volume de données).
+"""
+
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta, UTC
+
+import pytest
+from sqlalchemy import create_engine, insert, select
+
+backend_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "ecommerce-backend")
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from alembic import command
+from alembic.config import Config
+
+from database.models import (
+    Cart, CartItem, Invoice, Message, MessageThread, Order, OrderItem, Payment, Product, User,
+)
+
+
+def _alembic_config(connection) -> Config:
+    cfg = Config(os.path.join(backend_path, "alembic.ini"))
+    cfg.set_main_option("script_location", os.path.join(backend_path, "database", "migrations"))
+    cfg.attributes["connection"] = connection
+    cfg.attributes["configure_logger"] = False
+    return cfg
+
+
+@pytest.fixture(scope="module")
+def seeded():
+    url = os.getenv("TEST_POSTGRES_URL") or "sqlite://"
+    engine = create_engine(url)
+    with engine.connect() as conn:
+        command.upgrade(_alembic_config(conn), "head")
+        conn.commit()
+
+        now = datetime.now(UTC)
+        users = [{"id": uuid.uuid4(), "email": f"u{i}@example.com", "password_hash": "x",
+                  "first_name": "Jean", "last_name": "Test", "address": "1 rue du Test", "is_admin": False}
+                 for i in range(40)]
+        products = [{"id": uuid.uuid4(), "name": f"P{i}", "price_cents": 100 + i, "stock_qty": 10,
+                     "active": i % 4 != 0} for i in range(40)]
+        carts = [{"id": uuid.uuid4(), "user_id": u["id"]} for u in users]
+        cart_items = [{"id": uuid.uuid4(), "cart_id": c["id"], "product_id": p["id"], "quantity": 1}
+                      for c in carts for p in products[:5]]
+        statuses = ["CREE", "VALIDEE", "PAYEE", "EXPEDIEE", "LIVREE", "ANNULEE"]
+        # Au plus une commande ouverte (CREE) par utilisateur (uq_orders_user_id_open)
+        orders = [{"id": uuid.uuid4(), "user_id": users[i % len(users)]["id"],
+                   "status": statuses[i % len(statuses)] if i < len(users) else statuses[1 + i % (len(statuses) - 1)],
+                   "created_at": now - timedelta(minutes=i)} for i in range(1200)]
+        order_items = [{"id": uuid.uuid4(), "order_id": o["id"], "product_id": products[j]["id"], "name": "P",
+                        "unit_price_cents": 100, "quantity": 1} for o in orders for j in range(2)]
+        payments = [{"id": uuid.uuid4(), "order_id": o["id"], "amount_cents": 200, "status": "SUCCEEDED",
+                     "payment_method": "CARD"} for o in orders[::2]]
+        invoices = [{"id": uuid.uuid4(), "order_id": o["id"], "user_id": o["user_id"], "total_cents": 200,
+                     "created_at": o["created_at"]} for o in orders[::2]]
+        threads = [{"id": uuid.uuid4(), "user_id": users[i % len(users)]["id"], "subject": "Aide", "closed": False}
+                   for i in range(200)]
+        messages = [{"id": uuid.uuid4(), "thread_id": t["id"], "content": "Bonjour", "created_at": now}
+                    for t in threads for _ in range(3)]
+        for model, rows in [
+            (User, users), (Product, products), (Cart, carts), (CartItem, cart_items), (Order, orders),
+            (OrderItem, order_items), (Payment, payments), (Invoice, invoices),
+            (MessageThread, threads), (Message, messages),
+        ]:
+            conn.execute(insert(model), rows)
+        conn.commit()
+        conn.exec_driver_sql("ANALYZE")
+        conn.commit()
+
+        yield conn, {"user": users[0]["id"], "order": orders[0]["id"], "cart": carts[0]["id"],
+                     "product": products[1]["id"], "thread": threads[0]["id"]}
+
+        if conn.dialect.name == "postgresql":
+            conn.rollback()
+            command.downgrade(_alembic_config(conn), "base")
+            conn.commit()
+    engine.dispose()
+
+
+def _plan_indexes(conn, stmt) -> set:
+    """Noms des index utilisés par le plan d'exécution de `stmt`."""
+    sql = str(stmt.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    if conn.dialect.name == "postgresql":
+        conn.exec_driver_sql("SET enable_seqscan = off")
+        plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + sql).scalar()
+        conn.exec_driver_sql("RESET enable_seqscan")
+        found = set()
+
+        def walk(node):
+            if "Index Name" in node:
+                found.add(node["Index Name"])
+            for child in node.get("Plans", []):
+                walk(child)
+
+        walk(plan[0]["Plan"])
+        return found
+    found = set()
+    for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql):
+        detail = row[-1]
+        for marker in ("USING INDEX ", "USING COVERING INDEX "):
+            if marker in detail:
+                found.add(detail.split(marker, 1)[1].split(" ")[0])
+    return found
+
+
+HOT_QUERIES = [
+    ("ix_orders_user_id_created_at",
+     lambda ids: select(Order).where(Order.user_id == ids["user"]).order_by(Order.created_at.desc())),
+    ("ix_orders_status_created_at",
+     lambda ids: select(Order).where(Order.status == "PAYEE")
+     .order_by(Order.created_at.desc(), Order.id.desc()).limit(50)),
+    ("ix_orders_created_at_id",
+     lambda ids: select(Order).order_by(Order.created_at.desc(), Order.id.desc()).limit(50)),
+    ("uq_orders_user_id_open",
+     lambda ids: select(Order).where(Order.user_id == ids["user"], Order.status == "CREE")),
+    ("ix_order_items_order_id",
+     lambda ids: select(OrderItem).where(OrderItem.order_id == ids["order"])),
+    ("uq_cart_items_cart_id_product_id",
+     lambda ids: select(CartItem).where(CartItem.cart_id == ids["cart"], CartItem.product_id == ids["product"])),
+    ("ix_payments_order_id",
+     lambda ids: select(Payment).where(Payment.order_id == ids["order"])),
+    ("uq_invoices_order_id",
+     lambda ids: select(Invoice).where(Invoice.order_id == ids["order"])),
+    ("ix_message_threads_user_id",
+     lambda ids: select(MessageThread).where(MessageThread.user_id == ids["user"])),
+    ("ix_messages_thread_id_created_at",
+     lambda ids: select(Message).where(Message.thread_id == ids["thread"]).order_by(Message.created_at)),
+    ("ix_products_active",
+     lambda ids: select(Product).where(Product.active == True).order_by(Product.id)),  # noqa: E712
+]
+
+
+@pytest.mark.parametrize("index_name,build", HOT_QUERIES, ids=[name for name, _ in HOT_QUERIES])
+def test_hot_query_uses_index(seeded, index_name, build):
+    conn, ids = seeded
+    assert index_name in _plan_indexes(conn, build(ids))
@@ -0,0 +1,137 @@
+"""
+Tests de la file d'envoi des emails (email_outbox + worker) contre le bouchon Brevo.
+"""
+
+import os
+import sys
+import threading
+import time
+from datetime import datetime, UTC
+
+import pytest
+
+backend_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "ecommerce-backend")
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from database.models import EmailOutbox
+from database.repositories_simple import PostgreSQLEmailOutboxRepository
+from enums import EmailStatus
+from services.email_service import EmailService
+from services.email_worker import EmailOutboxWorker
+from scripts.email_stub_server import EmailStubServer
+
+
+@pytest.fixture
+def stub():
+    server = EmailStubServer().start()
+    yield server
+    server.stop()
+
+
+def _worker(session_factory, stub, **kwargs):
+    service = EmailService()
+    service.api_url = stub.url
+    service.api_key = "stub-key"
+    service.dev_mode = False
+    return EmailOutboxWorker(session_factory=session_factory, email_service=service,
+                             poll_interval=0.01, backoff_base=60, **kwargs)
+
+
+def _enqueue(session_factory, count):
+    db = session_factory()
+    repo = PostgreSQLEmailOutboxRepository(db)
+    for i in range(count):
+        repo.enqueue(f"user{i}@example.com", f"Sujet {i}", f"<p>Bonjour {i}</p>")
+    db.close()
+
+
+def _statuses(session_factory):
+    db = session_factory()
+    try:
+        return PostgreSQLEmailOutboxRepository(db).count_by_status()
+    finally:
+        db.close()
+
+
+def test_worker_sends_queued_emails_in_batches(session_factory, stub):
+    _enqueue(session_factory, 5)
+    worker = _worker(session_factory, stub, batch_size=2, concurrency=2)
+    try:
+        # Un passage réserve au plus batch_size * concurrency = 4 emails
+        assert worker.run_once() == 4
+        assert worker.run_once() == 1
+        assert worker.run_once() == 0
+    finally:
+        worker.stop()
+
+    assert _statuses(session_factory) == {EmailStatus.SENT.value: 5}
+    # 5 emails par lots de 2 → 3 appels HTTP, dont 2 en messageVersions
+    assert len(stub.requests) == 3
+    assert sum(1 for body in stub.requests if "messageVersions" in body) == 2
+    assert sorted(m["to"] for m in stub.messages) == [f"user{i}@example.com" for i in range(5)]
+
+
+def test_worker_retries_with_backoff_on_provider_error(session_factory, stub):
+    stub.fail_first = 1
+    _enqueue(session_factory, 1)
+    worker = _worker(session_factory, stub)
+    try:
+        assert worker.run_once() == 1
+        # Erreur 503 : reprogrammé dans le futur, pas encore renvoyé
+        assert _statuses(session_factory) == {EmailStatus.PENDING.value: 1}
+        assert worker.run_once() == 0
+
+        db = session_factory()
+        email = db.query(EmailOutbox).one()
+        assert email.attempts == 1
+        assert "503" in email.last_error
+        email.next_attempt_at = datetime.now(UTC)
+        db.commit()
+        db.close()
+
+        assert worker.run_once() == 1
+    finally:
+        worker.stop()
+    assert _statuses(session_factory) == {EmailStatus.SENT.value: 1}
+
+
+def test_worker_gives_up_on_permanent_error(session_factory, stub):
+    stub.fail_first = 1
+    stub.fail_status = 400
+    _enqueue(session_factory, 1)
+    worker = _worker(session_factory, stub)
+    try:
+        worker.run_once()
+    finally:
+        worker.stop()
+    assert _statuses(session_factory) == {EmailStatus.FAILED.value: 1}
+
+
+def test_worker_records_each_chunk_and_keeps_the_lease_while_sending(session_factory, stub):
+    _enqueue(session_factory, 2)
+    worker = _worker(session_factory, stub, batch_size=1, concurrency=2, lease_seconds=0.3)
+    send_batch = worker.email_service.send_batch
+
+    def slow_for_user1(messages, **kwargs):
+        if messages[0]["to_email"] == "user1@example.com":
+            time.sleep(1)
+        return send_batch(messages, **kwargs)
+
+    worker.email_service.send_batch = slow_for_user1
+    runner = threading.Thread(target=worker.run_once)
+    try:
+        runner.start()
+        time.sleep(0.6)
+        # Le lot rapide est déjà enregistré ; le lent reste réservé au-delà du bail initial
+        assert _statuses(session_factory) == {EmailStatus.SENT.value: 1, EmailStatus.SENDING.value: 1}
+        db = session_factory()
+        try:
+            assert PostgreSQLEmailOutboxRepository(db).claim_batch(10, 60) == []
+        finally:
+            db.close()
+        runner.join()
+    finally:
+        worker.stop()
+    assert _statuses(session_factory) == {EmailStatus.SENT.value: 2}
+    assert len(stub.messages) == 2
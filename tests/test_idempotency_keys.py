@@ -0,0 +1,73 @@
+"""
+Tests de la réservation des clés d'idempotence (PostgreSQLIdempotencyKeyRepository.claim).
+"""
+
+import os
+import sys
+
+backend_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "ecommerce-backend")
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from database.models import IdempotencyKey, User
+from database.repositories_simple import PostgreSQLIdempotencyKeyRepository
+
+ENDPOINT = "POST /orders/checkout"
+
+
+def _user_id(db):
+    user = User(email="idem@example.com", password_hash="x", first_name="Jean", last_name="Test",
+                address="1 rue du Test, 75001 Paris")
+    db.add(user)
+    db.commit()
+    return str(user.id)
+
+
+def test_second_claim_returns_the_existing_key(db):
+    user_id = _user_id(db)
+    repo = PostgreSQLIdempotencyKeyRepository(db)
+    assert repo.claim(user_id, "k1", ENDPOINT, "h", 60) == (True, None)
+
+    claimed, existing = repo.claim(user_id, "k1", ENDPOINT, "h", 60)
+    assert claimed is False
+    assert existing.status == "IN_PROGRESS"
+
+
+def test_key_released_between_insert_and_select_is_claimed_again(db, monkeypatch):
+    user_id = _user_id(db)
+    repo = PostgreSQLIdempotencyKeyRepository(db)
+    repo.claim(user_id, "k1", ENDPOINT, "h", 60)
+    execute = db.execute
+    released = []
+
+    def execute_then_release(statement, *args, **kwargs):
+        result = execute(statement, *args, **kwargs)
+        if not released:
+            # La requête qui détenait la clé échoue et la libère juste après notre INSERT
+            released.append(True)
+            repo.release(user_id, "k1")
+        return result
+
+    monkeypatch.setattr(db, "execute", execute_then_release)
+    assert repo.claim(user_id, "k1", ENDPOINT, "h", 60) == (True, None)
+    assert db.query(IdempotencyKey).filter(IdempotencyKey.key == "k1").count() == 1
+
+
+def test_key_that_keeps_disappearing_is_not_claimed(db, monkeypatch):
+    user_id = _user_id(db)
+    repo = PostgreSQLIdempotencyKeyRepository(db)
+    execute = db.execute
+
+    def flapping(statement, *args, **kwargs):
+        if not getattr(statement, "is_insert", False):
+            return execute(statement, *args, **kwargs)
+        # Détenteurs successifs : la clé existe à chaque INSERT et disparaît avant la lecture
+        db.add(IdempotencyKey(user_id=user_id, key="k1", endpoint=ENDPOINT, request_hash="h",
+                              status="IN_PROGRESS"))
+        db.flush()
+        result = execute(statement, *args, **kwargs)
+        repo.release(user_id, "k1")
+        return result
+
+    monkeypatch.setattr(db, "execute", flapping)
+    assert repo.claim(user_id, "k1", ENDPOINT, "h", 60, attempts=2) == (False, None)
@@ -0,0 +1,107 @@
+"""
+Tests de l'export comptable des factures (services/invoice_export.py) : contenu
+des flux ZIP, CSV et JSON Lines, filtrés par période.
+"""
+
+import csv
+import io
+import json
+import os
+import sys
+import zipfile
+from datetime import date, datetime
+
+import pytest
+
+backend_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "ecommerce-backend")
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from database.models import Invoice, Order, OrderItem, Payment, Product, User
+from services.invoice_export import LEDGER_COLUMNS, InvoiceExporter, invoice_number
+from services.invoice_pdf import InvoicePdfStore
+
+JANUARY = (date(2026, 1, 1), date(2026, 1, 31))
+
+
+@pytest.fixture
+def invoices(session_factory):
+    """Deux factures en janvier (la seconde avec deux articles), une en février."""
+    db = session_factory()
+    user = User(email="compta@example.com", password_hash="x", first_name="Léa", last_name="Durand",
+                address="1 rue du Test, 75001 Paris")
+    keyboard = Product(name="Clavier", price_cents=4990, stock_qty=5)
+    mouse = Product(name="Souris", price_cents=1990, stock_qty=5)
+    db.add_all([user, keyboard, mouse])
+    db.flush()
+    ids = []
+    for issued_at, lines in [
+        (datetime(2026, 1, 5, 9, 30), [(keyboard, 1)]),
+        (datetime(2026, 1, 31, 23, 59), [(mouse, 1), (keyboard, 2)]),
+        (datetime(2026, 2, 1, 0, 0), [(mouse, 3)]),
+    ]:
+        order = Order(user_id=user.id, status="PAYEE", created_at=issued_at)
+        db.add(order)
+        db.flush()
+        db.add_all([OrderItem(order_id=order.id, product_id=p.id, name=p.name, unit_price_cents=p.price_cents,
+                              quantity=qty) for p, qty in lines])
+        total = sum(p.price_cents * qty for p, qty in lines)
+        db.add(Payment(order_id=order.id, amount_cents=total, status="SUCCEEDED", payment_method="CARD",
+                       card_last4="1111"))
+        invoice = Invoice(order_id=order.id, user_id=user.id, total_cents=total, created_at=issued_at)
+        db.add(invoice)
+        db.flush()
+        ids.append(str(invoice.id))
+    db.commit()
+    db.close()
+    return ids
+
+
+def _exporter(session_factory, tmp_path):
+    # Lots d'une ligne : les factures à cheval sur deux lots sont reconstituées
+    return InvoiceExporter(session_factory, batch_size=1, workers=0, store=InvoicePdfStore(str(tmp_path)))
+
+
+def test_csv_ledger_has_one_row_per_invoiced_item(session_factory, invoices, tmp_path):
+    body = b"".join(_exporter(session_factory, tmp_path).stream("csv", *JANUARY)).decode("utf-8")
+    rows = list(csv.DictReader(io.StringIO(body)))
+
+    assert list(rows[0]) == LEDGER_COLUMNS
+    # Lignes d'une facture triées par nom d'article, quel que soit l'ordre d'insertion
+    assert [(r["invoice_id"], r["product_name"], r["quantity"], r["line_total_cents"]) for r in rows] == [
+        (invoices[0], "Clavier", "1", "4990"),
+        (invoices[1], "Clavier", "2", "9980"),
+        (invoices[1], "Souris", "1", "1990"),
+    ]
+    assert {r["invoice_total_cents"] for r in rows if r["invoice_id"] == invoices[1]} == {"11970"}
+    assert rows[0]["invoice_number"] == invoice_number(invoices[0])
+    assert rows[0]["customer_name"] == "Léa Durand"
+
+
+def test_jsonl_has_one_object_per_invoice(session_factory, invoices, tmp_path):
+    body = b"".join(_exporter(session_factory, tmp_path).stream("jsonl", *JANUARY)).decode("utf-8")
+    records = [json.loads(line) for line in body.splitlines()]
+
+    assert [r["invoice_id"] for r in records] == invoices[:2]
+    assert [len(r["lines"]) for r in records] == [1, 2]
+    assert [line["name"] for line in records[1]["lines"]] == ["Clavier", "Souris"]
+    assert records[1]["total_cents"] == sum(line["line_total_cents"] for line in records[1]["lines"])
+    assert records[1]["customer"] == {"email": "compta@example.com", "first_name": "Léa", "last_name": "Durand"}
+
+
+def test_zip_contains_one_pdf_per_invoice_of_the_period(session_factory, invoices, tmp_path):
+    exporter = _exporter(session_factory, tmp_path)
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(exporter.stream("zip", date(2026, 2, 1), date(2026, 2, 28)))))
+
+    assert archive.namelist() == [f"{invoice_number(invoices[2])}_{invoices[2]}.pdf"]
+    assert archive.read(archive.namelist()[0]).startswith(b"%PDF")
+
+
+def test_empty_period_and_unknown_format(session_factory, invoices, tmp_path):
+    exporter = _exporter(session_factory, tmp_path)
+    empty = (date(2025, 12, 1), date(2025, 12, 31))
+    assert b"".join(exporter.stream("jsonl", *empty)) == b""
+    assert b"".join(exporter.stream("csv", *empty)).decode("utf-8").strip() == ",".join(LEDGER_COLUMNS)
+    assert zipfile.ZipFile(io.BytesIO(b"".join(exporter.stream("zip", *empty)))).namelist() == []
+    with pytest.raises(ValueError):
+        exporter.stream("xlsx", *empty)
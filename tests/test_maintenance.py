@@ -0,0 +1,207 @@
+"""
+Tests du planificateur de maintenance (tokens expirés, paniers abandonnés,
+commandes CREE trop anciennes, élection d'un seul exécutant par tâche).
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta, UTC
+
+backend_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "ecommerce-backend")
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from database.models import (
+    Cart, CartItem, EmailOutbox, IdempotencyKey, MaintenanceJobRun, Order, OrderEvent, PasswordResetToken, Product, User,
+)
+from database.repositories_simple import PostgreSQLProductRepository
+from enums import EmailStatus, OrderStatus
+from services.catalog_service import CatalogService
+from services.maintenance import (
+    MaintenanceJob, MaintenanceScheduler, default_jobs, expire_stale_orders, purge_abandoned_carts,
+    purge_idempotency_keys, purge_reset_tokens, purge_sent_emails,
+)
+
+
+def _user(db):
+    user = User(email=f"u{db.query(User).count()}@example.com", password_hash="x",
+                first_name="Jean", last_name="Test", address="1 rue du Test, 75001 Paris")
+    db.add(user)
+    db.flush()
+    return user
+
+
+def _scheduler(session_factory, name, run_batch, batch_size=2):
+    return MaintenanceScheduler([MaintenanceJob(name, run_batch, interval=3600, batch_size=batch_size)],
+                                session_factory=session_factory)
+
+
+def _old_order(db, age=timedelta(days=2)):
+    order = Order(user_id=_user(db).id, status=OrderStatus.CREE.value, created_at=datetime.now(UTC) - age)
+    db.add(order)
+    db.flush()
+    return order
+
+
+def test_expired_reset_tokens_are_deleted_in_batches(session_factory, db):
+    user = _user(db)
+    now = datetime.now(UTC)
+    for i in range(5):
+        db.add(PasswordResetToken(user_id=user.id, token=f"old{i}", expires_at=now - timedelta(minutes=i + 1)))
+    db.add(PasswordResetToken(user_id=user.id, token="valid", expires_at=now + timedelta(hours=1)))
+    db.commit()
+
+    assert _scheduler(session_factory, "reset_tokens", purge_reset_tokens).run_job("reset_tokens") == 5
+    assert [t.token for t in db.query(PasswordResetToken)] == ["valid"]
+
+
+def test_abandoned_carts_are_purged_with_their_items(session_factory, db):
+    product = Product(name="Clavier", price_cents=1000, stock_qty=5)
+    db.add(product)
+    old_user, active_user = _user(db), _user(db)
+    old_cart = Cart(user_id=old_user.id, updated_at=datetime.now(UTC) - timedelta(days=40))
+    active_cart = Cart(user_id=active_user.id)
+    db.add_all([old_cart, active_cart])
+    db.flush()
+    db.add_all([CartItem(cart_id=old_cart.id, product_id=product.id, quantity=1),
+                CartItem(cart_id=active_cart.id, product_id=product.id, quantity=2)])
+    db.commit()
+    active_cart_id = active_cart.id
+
+    scheduler = _scheduler(session_factory, "abandoned_carts",
+                           lambda s, limit, cursor: purge_abandoned_carts(s, limit, cursor, timedelta(days=30)))
+    assert scheduler.run_job("abandoned_carts") == 1
+    db.expire_all()
+    assert [c.id for c in db.query(Cart)] == [active_cart_id]
+    assert [i.quantity for i in db.query(CartItem)] == [2]
+
+
+def test_old_idempotency_keys_are_purged_in_batches(session_factory, db):
+    user = _user(db)
+    now = datetime.now(UTC).replace(tzinfo=None)
+    for i in range(5):
+        db.add(IdempotencyKey(user_id=user.id, key=f"old{i}", endpoint="POST /orders/checkout",
+                              request_hash="0" * 64, status="COMPLETED", created_at=now - timedelta(days=2, minutes=i)))
+    db.add(IdempotencyKey(user_id=user.id, key="recent", endpoint="POST /orders/checkout",
+                          request_hash="0" * 64, status="COMPLETED", created_at=now))
+    db.commit()
+    batches = []
+
+    def run_batch(s, limit, cursor):
+        result = purge_idempotency_keys(s, limit, cursor, timedelta(hours=24))
+        batches.append(result[0])
+        return result
+
+    assert _scheduler(session_factory, "idempotency_keys", run_batch, batch_size=2).run_job("idempotency_keys") == 5
+    assert batches == [2, 2, 1]
+    assert [k.key for k in db.query(IdempotencyKey)] == ["recent"]
+    assert "idempotency_keys" in {job.name for job in default_jobs()}
+
+
+def test_sent_emails_are_purged_after_retention(session_factory, db):
+    now = datetime.now(UTC).replace(tzinfo=None)
+
+    def email(status, sent_at=None):
+        return EmailOutbox(to_email="client@example.com", subject="Réinitialisation",
+                           html_content="<a href='https://example.com/reset?token=t'>lien</a>",
+                           status=status.value, attempts=1, next_attempt_at=now, sent_at=sent_at)
+
+    db.add_all([email(EmailStatus.SENT, now - timedelta(days=8, minutes=i)) for i in range(3)])
+    db.add_all([email(EmailStatus.SENT, now - timedelta(hours=1)), email(EmailStatus.PENDING),
+                email(EmailStatus.FAILED)])
+    db.commit()
+
+    def run_batch(s, limit, cursor):
+        return purge_sent_emails(s, limit, cursor, timedelta(days=7))
+
+    assert _scheduler(session_factory, "email_outbox", run_batch, batch_size=2).run_job("email_outbox") == 3
+    assert sorted(e.status for e in db.query(EmailOutbox)) == ["FAILED", "PENDING", "SENT"]
+    assert "email_outbox" in {job.name for job in default_jobs()}
+
+
+def test_stale_open_orders_are_cancelled_unless_stock_is_held(session_factory, db):
+    product = Product(name="Clavier", price_cents=1000, stock_qty=5)
+    db.add(product)
+    old = datetime.now(UTC) - timedelta(days=2)
+    stale = Order(user_id=_user(db).id, status=OrderStatus.CREE.value, created_at=old)
+    paying = Order(user_id=_user(db).id, status=OrderStatus.CREE.value, created_at=old)
+    recent = Order(user_id=_user(db).id, status=OrderStatus.CREE.value)
+    db.add_all([stale, paying, recent])
+    db.commit()
+    # Checkout rejoué sur une ancienne commande : ses réservations sont encore valables
+    CatalogService(PostgreSQLProductRepository(db)).reserve_for_order(str(paying.id), {str(product.id): 1}, [product])
+    db.commit()
+
+    scheduler = _scheduler(session_factory, "stale_orders",
+                           lambda s, limit, cursor: expire_stale_orders(s, limit, cursor, timedelta(hours=24)))
+    assert scheduler.run_job("stale_orders") == 1
+    db.expire_all()
+    assert {str(o.id): o.status for o in db.query(Order)} == {
+        str(stale.id): OrderStatus.ANNULEE.value,
+        str(paying.id): OrderStatus.CREE.value,
+        str(recent.id): OrderStatus.CREE.value,
+    }
+    event = db.query(OrderEvent).one()
+    assert (str(event.order_id), event.from_status, event.payload["notify"]) == (str(stale.id), "CREE", False)
+
+
+def test_stale_order_purge_walks_keyset_batches(session_factory, db):
+    product = Product(name="Clavier", price_cents=1000, stock_qty=5)
+    db.add(product)
+    # La plus ancienne commande est en cours de paiement : elle ne bloque pas les lots suivants
+    paying = _old_order(db, timedelta(days=5))
+    stale = [_old_order(db, timedelta(days=4 - i)) for i in range(3)]
+    db.commit()
+    CatalogService(PostgreSQLProductRepository(db)).reserve_for_order(str(paying.id), {str(product.id): 1}, [product])
+    db.commit()
+    cursors = []
+
+    def run_batch(s, limit, cursor):
+        cursors.append(cursor)
+        return expire_stale_orders(s, limit, cursor, timedelta(hours=24))
+
+    scheduler = _scheduler(session_factory, "stale_orders", run_batch, batch_size=2)
+    assert scheduler.run_job("stale_orders") == 3
+    # Deux lots : le second reprend après la dernière commande du premier (created_at, id)
+    assert cursors[0] is None
+    assert cursors[1][1] == stale[1].id
+    stats = scheduler.stats()["jobs"]["stale_orders"]
+    assert (stats["rows"], stats["last_batches"]) == (3, 2)
+    assert stats["last_rows_per_second"] > 0
+    db.expire_all()
+    assert db.query(Order).filter(Order.status == OrderStatus.CREE.value).one().id == paying.id
+
+
+def test_job_runs_once_per_interval_across_workers(session_factory):
+    calls = []
+
+    def run_batch(db, limit, cursor):
+        calls.append(limit)
+        return 0, None
+
+    worker_a = _scheduler(session_factory, "noop", run_batch)
+    worker_b = _scheduler(session_factory, "noop", run_batch)
+    assert worker_a.run_job("noop") == 0
+    # Déjà exécutée dans l'intervalle, par ce worker ou un autre
+    assert worker_a.run_job("noop") is None
+    assert worker_b.run_job("noop") is None
+    assert worker_b.run_job("noop", force=True) == 0
+    assert len(calls) == 2
+
+    # Tâche déjà en cours dans ce processus : pas de seconde exécution simultanée
+    with worker_a._leadership("noop") as leader:
+        assert leader
+        assert worker_a.run_job("noop", force=True) is None
+
+
+def test_failed_job_is_recorded(session_factory):
+    def run_batch(db, limit, cursor):
+        raise RuntimeError("base indisponible")
+
+    scheduler = _scheduler(session_factory, "broken", run_batch)
+    assert scheduler.run_job("broken") == 0
+    assert scheduler.stats()["jobs"]["broken"]["errors"] == 1
+    db = session_factory()
+    run = db.query(MaintenanceJobRun).one()
+    db.close()
+    assert (run.name, run.last_rows, run.last_error) == ("broken", 0, "base indisponible")
@@ -0,0 +1,128 @@
+"""
+Tests du lancement des migrations (database/migrate.py) sur SQLite.
+"""
+
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta, UTC
+
+import pytest
+from sqlalchemy import MetaData, create_engine, insert, inspect, select, text
+
+backend_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "ecommerce-backend")
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from alembic.script import ScriptDirectory
+
+from database.migrate import BASELINE_TABLES, alembic_config, run_migrations
+from database.models import Base, Cart, CartItem, Order, Payment, Product, User
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrate.sqlite'}")
+    yield engine
+    engine.dispose()
+
+
+HEAD = ScriptDirectory.from_config(alembic_config()).get_current_head()
+
+
+# Index du schéma d'origine (les autres ont été ajoutés par les migrations)
+BASELINE_INDEXES = {"ix_users_email", "ix_password_reset_tokens_token"}
+
+
+def _create_baseline_schema(engine, tables=BASELINE_TABLES) -> None:
+    """Schéma créé par l'ancien create_tables() : tables d'origine, sans les index ajoutés depuis."""
+    legacy = MetaData()
+    for name in tables:
+        table = Base.metadata.tables[name].to_metadata(legacy)
+        for index in list(table.indexes):
+            if index.name not in BASELINE_INDEXES:
+                table.indexes.discard(index)
+    legacy.create_all(engine)
+
+
+def _version(engine) -> str:
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT version_num FROM alembic_version")).scalar()
+
+
+def test_fresh_database_upgraded_to_head(engine):
+    run_migrations(engine)
+    tables = set(inspect(engine).get_table_names())
+    assert {"users", "orders", "email_outbox", "alembic_version"} <= tables
+    assert _version(engine) == HEAD
+
+    # Deuxième lancement (nouveau conteneur) : rien à faire
+    run_migrations(engine)
+    assert _version(engine) == HEAD
+
+
+def test_legacy_database_stamped_and_paid_at_backfilled(engine):
+    # Base créée par l'ancien create_tables(), sans table alembic_version
+    _create_baseline_schema(engine)
+    assert "email_outbox" not in inspect(engine).get_table_names()
+    user_id = uuid.uuid4()
+    created = datetime(2026, 1, 1, 12, 0)
+    paid = created + timedelta(minutes=5)
+    orders = [
+        {"id": uuid.uuid4(), "user_id": user_id, "status": status, "created_at": created}
+        for status in ("PAYEE", "LIVREE", "CREE")
+    ]
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"id": user_id, "email": "a@example.com", "password_hash": "x",
+                                     "first_name": "A", "last_name": "B", "address": "1 rue"}])
+        conn.execute(insert(Order), orders)
+        conn.execute(insert(Payment), [{"id": uuid.uuid4(), "order_id": orders[0]["id"], "amount_cents": 100,
+                                        "status": "SUCCEEDED", "payment_method": "CARD", "created_at": paid}])
+
+    run_migrations(engine)
+
+    assert _version(engine) == HEAD
+    inspector = inspect(engine)
+    assert set(Base.metadata.tables) <= set(inspector.get_table_names())
+    assert "ix_email_outbox_due" in {ix["name"] for ix in inspector.get_indexes("email_outbox")}
+    with engine.connect() as conn:
+        paid_at = dict(conn.execute(select(Order.id, Order.paid_at)).all())
+    assert paid_at[orders[0]["id"]] == paid
+    assert paid_at[orders[1]["id"]] == created  # pas de paiement enregistré : date de commande
+    assert paid_at[orders[2]["id"]] is None
+
+
+def test_database_created_by_recent_create_tables_upgraded(engine):
+    # create_tables() avec les modèles actuels : les révisions ne recréent rien
+    Base.metadata.create_all(engine)
+    run_migrations(engine)
+    assert _version(engine) == HEAD
+
+
+def test_incomplete_legacy_database_not_stamped(engine):
+    _create_baseline_schema(engine, tables=["users"])
+    with pytest.raises(RuntimeError, match="tables absentes"):
+        run_migrations(engine)
+    assert "alembic_version" not in inspect(engine).get_table_names()
+
+
+def test_duplicate_cart_lines_merged_before_unique_index(engine):
+    run_migrations(engine, "0003")
+    user_id, product_id, cart_id = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"id": user_id, "email": "c@example.com", "password_hash": "x",
+                                     "first_name": "A", "last_name": "B", "address": "1 rue"}])
+        conn.execute(insert(Product), [{"id": product_id, "name": "P", "price_cents": 100, "stock_qty": 5}])
+        conn.execute(insert(Cart), [{"id": cart_id, "user_id": user_id}])
+        conn.execute(insert(CartItem), [
+            {"id": uuid.uuid4(), "cart_id": cart_id, "product_id": product_id, "quantity": q,
+             "created_at": datetime(2026, 1, 1, 12, i)}
+            for i, q in enumerate((1, 2, 3))
+        ])
+
+    run_migrations(engine)
+
+    with engine.connect() as conn:
+        assert conn.execute(select(CartItem.quantity)).scalars().all() == [6]
+    indexes = {ix["name"]: ix for ix in inspect(engine).get_indexes("cart_items")}
+    assert indexes["uq_cart_items_cart_id_product_id"]["unique"]
@@ -0,0 +1,173 @@
+"""
+Tests de l'outbox des événements de commande (order_events) et de son dispatcher.
+"""
+
+import os
+import sys
+import uuid
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+backend_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "ecommerce-backend")
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from database.models import EmailOutbox, Invoice, Order, OrderEvent, User
+from database.repositories_simple import PostgreSQLInvoiceRepository, PostgreSQLOrderEventRepository
+from enums import OrderEventStatus, OrderStatus
+from services.email_service import EmailService
+from services import order_event_dispatcher
+from services.order_event_dispatcher import (
+    InvoicePdfConsumer, OrderEmailConsumer, OrderEventConsumer, OrderEventDispatcher,
+)
+
+
+class RecordingConsumer(OrderEventConsumer):
+    def __init__(self, name, event_types=None, failures=0):
+        self.name = name
+        self.event_types = frozenset(event_types) if event_types else None
+        self.failures = failures
+        self.calls = []
+
+    def handle(self, db, events):
+        self.calls.append([e["event_type"] for e in events])
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("consommateur indisponible")
+
+
+def _order_event(session_factory, status, from_status=OrderStatus.CREE.value, **payload):
+    db = session_factory()
+    user = User(email=f"u{db.query(User).count()}@example.com", password_hash="x",
+                first_name="Jean", last_name="Test", address="1 rue du Test, 75001 Paris")
+    db.add(user)
+    db.flush()
+    order = Order(user_id=user.id, status=status)
+    db.add(order)
+    db.flush()
+    PostgreSQLOrderEventRepository(db).append(order, from_status, payload)
+    db.commit()
+    order_id = str(order.id)
+    db.close()
+    return order_id
+
+
+def _events(session_factory):
+    db = session_factory()
+    try:
+        return {e.event_type: (e.status, sorted(e.delivered_to), e.attempts) for e in db.query(OrderEvent)}
+    finally:
+        db.close()
+
+
+def test_event_is_written_with_the_status_change(session_factory):
+    db = session_factory()
+    user = User(email="rollback@example.com", password_hash="x", first_name="Jean", last_name="Test",
+                address="1 rue du Test, 75001 Paris")
+    db.add(user)
+    db.flush()
+    order = Order(user_id=user.id, status=OrderStatus.PAYEE.value)
+    db.add(order)
+    db.flush()
+    event = PostgreSQLOrderEventRepository(db).append(order, OrderStatus.CREE, {"amount_cents": 1999})
+    assert (event.event_type, event.from_status) == ("PAYEE", "CREE")
+    db.rollback()
+    assert db.query(OrderEvent).count() == 0
+    db.close()
+
+
+def test_dispatcher_batches_events_per_consumer(session_factory):
+    _order_event(session_factory, "PAYEE", amount_cents=1999, stock_changed=True)
+    _order_event(session_factory, "EXPEDIEE", from_status="PAYEE")
+    everything = RecordingConsumer("all")
+    paid_only = RecordingConsumer("paid", event_types={"PAYEE"})
+    dispatcher = OrderEventDispatcher([everything, paid_only], session_factory=session_factory)
+
+    assert dispatcher.run_once() == 2
+    assert dispatcher.run_once() == 0
+    # Un seul appel par consommateur pour tout le lot, filtré par type
+    assert [sorted(call) for call in everything.calls] == [["EXPEDIEE", "PAYEE"]]
+    assert paid_only.calls == [["PAYEE"]]
+    assert _events(session_factory) == {
+        "PAYEE": (OrderEventStatus.DONE.value, ["all", "paid"], 1),
+        "EXPEDIEE": (OrderEventStatus.DONE.value, ["all", "paid"], 1),
+    }
+
+
+def test_failed_consumer_is_retried_alone_then_abandoned(session_factory):
+    _order_event(session_factory, "PAYEE")
+    healthy = RecordingConsumer("healthy")
+    flaky = RecordingConsumer("flaky", failures=5)
+    dispatcher = OrderEventDispatcher([healthy, flaky], session_factory=session_factory,
+                                      backoff_base=0, max_attempts=2)
+
+    assert dispatcher.run_once() == 1
+    assert _events(session_factory) == {"PAYEE": (OrderEventStatus.PENDING.value, ["healthy"], 1)}
+    assert dispatcher.run_once() == 1
+    # Le consommateur qui a réussi n'est pas rejoué
+    assert len(healthy.calls) == 1
+    assert len(flaky.calls) == 2
+    assert _events(session_factory) == {"PAYEE": (OrderEventStatus.FAILED.value, ["healthy"], 2)}
+    assert dispatcher.run_once() == 0
+
+
+def test_failed_event_does_not_fail_its_batch(session_factory, monkeypatch):
+    broken = _order_event(session_factory, "PAYEE")
+    _order_event(session_factory, "EXPEDIEE", from_status="PAYEE")
+    rendered = []
+
+    def render(db, order_id):
+        if order_id == broken:
+            raise RuntimeError("PDF illisible")
+        rendered.append(order_id)
+        return True
+
+    monkeypatch.setattr(order_event_dispatcher, "render_order_invoice_pdf", render)
+    dispatcher = OrderEventDispatcher([InvoicePdfConsumer()], session_factory=session_factory, backoff_base=0)
+
+    assert dispatcher.run_once() == 2
+    # Seul l'événement en échec est rejoué, avec sa propre erreur
+    assert len(rendered) == 1
+    assert _events(session_factory) == {
+        "PAYEE": (OrderEventStatus.PENDING.value, [], 1),
+        "EXPEDIEE": (OrderEventStatus.DONE.value, ["invoice_pdf"], 1),
+    }
+    db = session_factory()
+    assert db.query(OrderEvent).filter(OrderEvent.event_type == "PAYEE").one().last_error == "invoice_pdf: PDF illisible"
+    db.close()
+
+
+def test_email_consumer_queues_order_status_email(session_factory):
+    _order_event(session_factory, "EXPEDIEE", from_status="PAYEE", transporteur="Colissimo", tracking_number="TRK42")
+    _order_event(session_factory, "VALIDEE")
+    woken = []
+    dispatcher = OrderEventDispatcher([OrderEmailConsumer(EmailService(), on_enqueued=lambda: woken.append(1))],
+                                      session_factory=session_factory)
+
+    assert dispatcher.run_once() == 2
+    db = session_factory()
+    emails = db.query(EmailOutbox).all()
+    db.close()
+    # Pas d'email pour une validation interne
+    assert len(emails) == 1
+    assert emails[0].subject.startswith("Commande expédiée")
+    assert "TRK42" in emails[0].html_content
+    assert woken == [1]
+
+
+def test_invoice_is_created_once_per_order(session_factory):
+    order_id = _order_event(session_factory, OrderStatus.PAYEE.value)
+    consumer_db, download_db = session_factory(), session_factory()
+    user_id = str(consumer_db.get(Order, uuid.UUID(order_id)).user_id)
+    # Consommateur invoice_pdf et premier téléchargement : tous deux ont vu "pas de facture"
+    first = PostgreSQLInvoiceRepository(consumer_db).get_or_create_for_order(order_id, user_id, 1999)
+    second = PostgreSQLInvoiceRepository(download_db).get_or_create_for_order(order_id, user_id, 1999)
+    assert first.id == second.id
+    assert consumer_db.query(Invoice).count() == 1
+
+    consumer_db.add(Invoice(order_id=first.order_id, user_id=first.user_id, total_cents=1999))
+    with pytest.raises(IntegrityError):
+        consumer_db.commit()
+    consumer_db.close()
+    download_db.close()
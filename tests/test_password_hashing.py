@@ -0,0 +1,124 @@
+"""
+Tests du pool bcrypt borné (utils/password_hashing.py) et de la mise à niveau
+des hash à la connexion.
+"""
+
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import bcrypt
+import pytest
+
+backend_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "ecommerce-backend")
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from services.auth_service import AuthService
+from utils import password_hashing
+from utils.password_hashing import PasswordHasherBusy, PasswordHasherPool, bcrypt_cost
+
+
+def _wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition jamais atteinte"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def pool_factory():
+    pools = []
+
+    def build(**kwargs):
+        pool = PasswordHasherPool(**{"workers": 1, "max_pending": 1, "timeout": 10.0, **kwargs})
+        pools.append(pool)
+        return pool
+
+    yield build
+    for pool in pools:
+        pool.shutdown()
+
+
+def test_saturated_pool_rejects_immediately(pool_factory):
+    pool = pool_factory(max_pending=1)
+    worker = threading.Thread(target=pool.run, args=(time.sleep, 0.5))
+    worker.start()
+    _wait_for(lambda: pool.stats()["pending"] == 1)
+
+    start = time.monotonic()
+    with pytest.raises(PasswordHasherBusy):
+        pool.run(time.sleep, 0)
+    assert time.monotonic() - start < 0.2
+    worker.join()
+    assert pool.stats()["pending"] == 0
+    assert pool.run(max, 1, 2) == 2
+
+
+def test_timed_out_call_keeps_its_slot_until_it_finishes(pool_factory):
+    pool = pool_factory(max_pending=1, timeout=0.1)
+    with pytest.raises(PasswordHasherBusy):
+        pool.run(time.sleep, 1.0)
+    # Le calcul abandonné tourne encore dans le pool : la place n'est pas rendue
+    assert pool.stats()["pending"] == 1
+    with pytest.raises(PasswordHasherBusy):
+        pool.run(time.sleep, 0)
+    _wait_for(lambda: pool.stats()["pending"] == 0)
+
+
+def test_dead_pool_process_is_replaced(pool_factory):
+    pool = pool_factory(max_pending=2)
+    assert pool.run(max, 1, 2) == 2
+    # Processus tué (ex: OOM killer) : le pool est cassé, puis reconstruit
+    for process in list(pool._executor._processes.values()):
+        process.kill()
+        process.join()
+    assert pool.run(max, 3, 4) == 4
+    assert pool.stats()["pending"] == 0
+
+
+def test_pool_errors_never_fall_back_to_sha256(monkeypatch):
+    def broken(password):
+        raise PasswordHasherBusy("Pool de hachage indisponible")
+
+    monkeypatch.setattr("services.auth_service._bcrypt_hash", broken)
+    with pytest.raises(PasswordHasherBusy):
+        AuthService(_Users(SimpleNamespace(email="a@example.com"))).hash_password("password123")
+
+    monkeypatch.setattr("services.auth_service._bcrypt_hash", lambda password: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        AuthService(_Users(SimpleNamespace(email="a@example.com"))).hash_password("password123")
+
+
+class _Users:
+    def __init__(self, user):
+        self.user = user
+        self.updates = 0
+
+    def get_by_email(self, email):
+        return self.user if email == self.user.email else None
+
+    def update(self, user):
+        self.updates += 1
+        return user
+
+
+@pytest.mark.parametrize("stored", [
+    bcrypt.hashpw(b"password123", bcrypt.gensalt(rounds=4)).decode(),
+    "sha256::ef92b778bafe771e89245b89ecbc08a44a4e166c06659911881f383d4473e94f",
+])
+def test_login_upgrades_outdated_hash(monkeypatch, stored):
+    monkeypatch.setattr(password_hashing, "BCRYPT_ROUNDS", 5)
+    monkeypatch.setattr(password_hashing.hasher_pool, "workers", 0)
+    users = _Users(SimpleNamespace(email="a@example.com", password_hash=stored))
+    auth = AuthService(users)
+
+    assert auth.authenticate_user("a@example.com", "password123") is users.user
+    assert bcrypt_cost(users.user.password_hash) == 5
+    assert users.updates == 1
+    # Hash à jour : pas de nouveau calcul à la connexion suivante
+    assert auth.authenticate_user("a@example.com", "password123") is users.user
+    assert users.updates == 1
+    assert auth.authenticate_user("a@example.com", "mauvais") is None
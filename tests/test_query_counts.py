@@ -0,0 +1,111 @@
+"""
+Non-régression du nombre de requêtes SQL des lectures de commandes (pas de N+1).
+
+Le nombre de requêtes SQL d'une requête HTTP est lu dans l'en-tête Server-Timing
+(utils/sql_profiler.py) : il ne doit pas dépendre du nombre de commandes ni de lignes.
+"""
+
+import os
+import re
+import sys
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+backend_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "ecommerce-backend")
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from api import app
+from database.database import SessionLocal
+from database.migrate import run_migrations
+from database.models import Delivery, Order, OrderItem, Product, User
+from enums import OrderStatus
+
+client = TestClient(app)
+
+MANY = 6
+
+
+@pytest.fixture(scope="module", autouse=True)
+def _schema():
+    """Schéma à jour, client ouvert pour tout le module (voir test_api_endpoints.py)."""
+    run_migrations()
+    with client:
+        yield
+
+
+def _customer():
+    """Nouveau client inscrit : (en-têtes d'authentification, id)."""
+    email = f"queries_{uuid.uuid4().hex[:8]}@example.com"
+    response = client.post("/auth/register", json={
+        "email": email,
+        "password": "password123",
+        "first_name": "Paul",
+        "last_name": "Martin",
+        "address": "5 rue des Tests, 75001 Paris"
+    })
+    assert response.status_code == 200, response.text
+    db = SessionLocal()
+    try:
+        user_id = db.query(User.id).filter(User.email == email).scalar()
+    finally:
+        db.close()
+    return {"Authorization": f"Bearer {response.json()['token']}"}, user_id
+
+
+def _orders(user_id, orders, items):
+    """Crée `orders` commandes payées et livrées de `items` lignes chacune. Retourne leurs id."""
+    db = SessionLocal()
+    try:
+        products = [Product(name=f"Produit {i}", price_cents=100 + i, stock_qty=10) for i in range(items)]
+        db.add_all(products)
+        db.flush()
+        ids = []
+        for _ in range(orders):
+            order = Order(user_id=user_id, status=OrderStatus.PAYEE.value)
+            db.add(order)
+            db.flush()
+            db.add_all([OrderItem(order_id=order.id, product_id=p.id, name=p.name,
+                                  unit_price_cents=p.price_cents, quantity=1) for p in products])
+            db.add(Delivery(order_id=order.id, transporteur="Colissimo", tracking_number=uuid.uuid4().hex[:12],
+                            address="5 rue des Tests, 75001 Paris", delivery_status="EN_COURS"))
+            ids.append(str(order.id))
+        db.commit()
+        return ids
+    finally:
+        db.close()
+
+
+def _sql_count(path, headers):
+    """Nombre de requêtes SQL de GET `path`, cache utilisateur déjà chaud."""
+    client.get(path, headers=headers)
+    response = client.get(path, headers=headers)
+    assert response.status_code == 200, response.text
+    return int(re.search(r'desc="(\d+) req\. SQL"', response.headers["server-timing"]).group(1)), response.json()
+
+
+def test_order_list_query_count_is_constant():
+    one_headers, one_user = _customer()
+    many_headers, many_user = _customer()
+    _orders(one_user, orders=1, items=1)
+    _orders(many_user, orders=MANY, items=MANY)
+
+    one, one_body = _sql_count("/orders", one_headers)
+    many, many_body = _sql_count("/orders", many_headers)
+    assert (len(one_body), len(many_body)) == (1, MANY)
+    assert all(len(order["items"]) == MANY and order["delivery"] for order in many_body)
+    assert many == one
+
+
+def test_order_detail_query_count_is_constant():
+    headers, user_id = _customer()
+    [small] = _orders(user_id, orders=1, items=1)
+    [large] = _orders(user_id, orders=1, items=MANY)
+
+    one, one_body = _sql_count(f"/orders/{small}", headers)
+    many, many_body = _sql_count(f"/orders/{large}", headers)
+    assert (len(one_body["items"]), len(many_body["items"])) == (1, MANY)
+    assert many_body["delivery"]["transporteur"] == "Colissimo"
+    assert many == one
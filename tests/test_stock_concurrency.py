@@ -0,0 +1,96 @@
+"""
+Test de charge du décrément conditionnel du stock : des paiements simultanés se
+disputent les dernières unités d'un produit, sans jamais de survente.
+
+Nécessite de vrais verrous de ligne : définir TEST_POSTGRES_URL vers une base
+PostgreSQL vide dédiée aux tests (voir test_db_indexes.py), sinon le test est ignoré.
+"""
+
+import os
+import sys
+import threading
+import uuid
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+backend_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "ecommerce-backend")
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from database.migrate import run_migrations
+from database.models import Order, OrderItem, Payment, Product, User
+from enums import OrderStatus
+
+POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+pytestmark = pytest.mark.skipif(not POSTGRES_URL, reason="TEST_POSTGRES_URL non défini")
+
+STOCK = 3
+BUYERS = 12
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine(POSTGRES_URL, pool_size=BUYERS, max_overflow=0)
+    run_migrations(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def _open_orders(db, product, count):
+    """Une commande CREE d'une unité de `product` par acheteur : [(user_id, order_id)]."""
+    orders = []
+    for _ in range(count):
+        user = User(email=f"stress_{uuid.uuid4().hex[:12]}@example.com", password_hash="x",
+                    first_name="Jean", last_name="Test", address="1 rue du Test, 75001 Paris")
+        db.add(user)
+        db.flush()
+        order = Order(user_id=user.id, status=OrderStatus.CREE.value)
+        db.add(order)
+        db.flush()
+        db.add(OrderItem(order_id=order.id, product_id=product.id, name=product.name,
+                         unit_price_cents=product.price_cents, quantity=1))
+        orders.append((str(user.id), str(order.id)))
+    db.commit()
+    return orders
+
+
+def test_concurrent_payments_never_oversell_the_last_units(session_factory):
+    from api import PayIn, pay_order
+
+    db = session_factory()
+    product = Product(name=f"Dernières unités {uuid.uuid4().hex[:6]}", price_cents=1000, stock_qty=STOCK)
+    db.add(product)
+    db.commit()
+    orders = _open_orders(db, product, BUYERS)
+    card = PayIn(card_number="4111111111111111", exp_month=12, exp_year=2030, cvc="123")
+    start = threading.Barrier(BUYERS)
+    results = {}
+
+    def pay(user_id, order_id):
+        session = session_factory()
+        try:
+            start.wait()
+            pay_order(order_id, card, uid=user_id, db=session, idempotency_key=None)
+            results[order_id] = 200
+        except HTTPException as e:
+            results[order_id] = e.status_code
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=pay, args=order) for order in orders]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Exactement `STOCK` paiements acceptés, les autres refusés pour stock insuffisant
+    assert sorted(results.values()) == [200] * STOCK + [409] * (BUYERS - STOCK)
+    db.expire_all()
+    assert db.get(Product, product.id).stock_qty == 0
+    order_ids = [uuid.UUID(order_id) for _, order_id in orders]
+    assert db.query(Payment).filter(Payment.order_id.in_(order_ids)).count() == STOCK
+    assert db.query(Order).filter(Order.id.in_(order_ids), Order.status == OrderStatus.PAYEE.value).count() == STOCK
+    db.close()
@@ -0,0 +1,147 @@
+"""
+Tests des réservations de stock (checkout → paiement) et du balayeur des réservations échues.
+"""
+
+import os
+import sys
+
+import pytest
+
+backend_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "ecommerce-backend")
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from database.models import Order, Product, StockReservation, User
+from database.repositories_simple import PostgreSQLProductRepository
+from enums import ReservationStatus
+from services.catalog_service import CatalogService
+from services.maintenance import MaintenanceJob, MaintenanceScheduler, expire_reservations
+
+
+def _product(db, stock_qty, active=True):
+    product = Product(name="Clavier", price_cents=1000, stock_qty=stock_qty, active=active)
+    db.add(product)
+    db.commit()
+    return product
+
+
+def _order(db):
+    user = User(email=f"u{db.query(User).count()}@example.com", password_hash="x",
+                first_name="Jean", last_name="Test", address="1 rue du Test, 75001 Paris")
+    db.add(user)
+    db.flush()
+    order = Order(user_id=user.id, status="CREE")
+    db.add(order)
+    db.commit()
+    return str(order.id)
+
+
+def _statuses(db, order_id):
+    rows = db.query(StockReservation.status).filter(StockReservation.order_id == Order.id, Order.id == order_id)
+    return sorted(status for (status,) in rows)
+
+
+def test_reservation_blocks_units_for_other_orders(db):
+    product = _product(db, stock_qty=3)
+    first, second = _order(db), _order(db)
+    catalog = CatalogService(PostgreSQLProductRepository(db))
+    pid = str(product.id)
+
+    catalog.reserve_for_order(first, {pid: 2}, [product])
+    db.commit()
+    assert catalog.available_stock([product]) == {pid: 1}
+
+    with pytest.raises(ValueError, match="Il reste 1 article"):
+        catalog.reserve_for_order(second, {pid: 2}, [product])
+    catalog.reserve_for_order(second, {pid: 1}, [product])
+    db.commit()
+    # Le stock physique n'est décrémenté qu'au paiement
+    db.refresh(product)
+    assert product.stock_qty == 3
+
+
+def test_replayed_checkout_replaces_previous_holds(db):
+    product = _product(db, stock_qty=3)
+    order_id = _order(db)
+    catalog = CatalogService(PostgreSQLProductRepository(db))
+
+    catalog.reserve_for_order(order_id, {str(product.id): 2}, [product])
+    catalog.reserve_for_order(order_id, {str(product.id): 3}, [product])
+    db.commit()
+
+    assert _statuses(db, order_id) == [ReservationStatus.ACTIVE.value, ReservationStatus.RELEASED.value]
+    assert catalog.available_stock([product]) == {str(product.id): 0}
+
+
+def test_confirm_consumes_holds_and_decrements_stock(db):
+    product = _product(db, stock_qty=3)
+    paying, other = _order(db), _order(db)
+    catalog = CatalogService(PostgreSQLProductRepository(db))
+    pid = str(product.id)
+
+    catalog.reserve_for_order(paying, {pid: 2}, [product])
+    catalog.reserve_for_order(other, {pid: 1}, [product])
+    db.commit()
+
+    assert catalog.confirm_for_order(paying, {pid: 2}) == []
+    db.commit()
+    db.refresh(product)
+    assert product.stock_qty == 1
+    assert _statuses(db, paying) == [ReservationStatus.CONSUMED.value]
+    # La réservation de l'autre commande tient toujours : le dernier article est à elle
+    assert catalog.available_stock([product]) == {pid: 0}
+
+
+def test_expired_hold_no_longer_blocks_but_payment_rechecks_stock(db):
+    product = _product(db, stock_qty=2)
+    late, other = _order(db), _order(db)
+    pid = str(product.id)
+
+    CatalogService(PostgreSQLProductRepository(db), reservation_ttl_seconds=-1).reserve_for_order(
+        late, {pid: 2}, [product]
+    )
+    db.commit()
+    catalog = CatalogService(PostgreSQLProductRepository(db))
+    assert catalog.available_stock([product]) == {pid: 2}
+
+    # Les unités libérées par l'expiration ont été réservées par quelqu'un d'autre
+    catalog.reserve_for_order(other, {pid: 1}, [product])
+    db.commit()
+    assert catalog.confirm_for_order(late, {pid: 2}) == [pid]
+    db.rollback()
+    db.refresh(product)
+    assert product.stock_qty == 2
+
+
+def test_release_for_order_restocks_the_given_quantities(db):
+    product = _product(db, stock_qty=0, active=False)
+    order_id = _order(db)
+    catalog = CatalogService(PostgreSQLProductRepository(db))
+
+    catalog.release_for_order(order_id, {str(product.id): 2})
+    db.commit()
+    db.refresh(product)
+    assert product.stock_qty == 2
+    assert product.active is True
+
+
+def test_sweeper_expires_stale_holds_in_batches(session_factory, db):
+    product = _product(db, stock_qty=10)
+    orders = [_order(db) for _ in range(5)]
+    stale = CatalogService(PostgreSQLProductRepository(db), reservation_ttl_seconds=-1)
+    for order_id in orders[:3]:
+        stale.reserve_for_order(order_id, {str(product.id): 1}, [product])
+    CatalogService(PostgreSQLProductRepository(db)).reserve_for_order(orders[3], {str(product.id): 1}, [product])
+    db.commit()
+
+    scheduler = MaintenanceScheduler(
+        [MaintenanceJob("reservations", expire_reservations, interval=60, batch_size=2)],
+        session_factory=session_factory,
+    )
+    assert scheduler.run_job("reservations") == 3
+    assert scheduler.run_job("reservations", force=True) == 0
+
+    counts = {}
+    for (status,) in db.query(StockReservation.status):
+        counts[status] = counts.get(status, 0) + 1
+    assert counts == {ReservationStatus.EXPIRED.value: 3, ReservationStatus.ACTIVE.value: 1}